@@ -1,14 +1,17 @@
 """
-Simple in-memory rate limiter for authentication endpoints.
-For production with multiple workers, use Redis-based rate limiting.
+Rate limits for authentication endpoints.
+Counting is done by services/rate_limiter, so limits hold across workers when
+RATE_LIMIT_STORAGE is "shared" or "database".
 """
 import os
-import time
-from collections import defaultdict
-from threading import Lock
 from fastapi import HTTPException, Request
 import logging
 
+try:
+    from backend_v2.services.rate_limiter import Rule, get_limiter
+except ImportError:
+    from services.rate_limiter import Rule, get_limiter
+
 logger = logging.getLogger(__name__)
 
 # Disable rate limiting in test environment
@@ -37,99 +40,24 @@ PASSWORD_RESET_WINDOW_SECONDS = 3600  # 1 hour window
 PASSWORD_RESET_LOCKOUT_SECONDS = 3600  # 1 hour lockout after max attempts
 
 
-class RateLimiter:
-    """Thread-safe in-memory rate limiter."""
-
-    def __init__(self):
-        self._attempts = defaultdict(list)  # key -> list of timestamps
-        self._lockouts = {}  # key -> lockout_until timestamp
-        self._lock = Lock()
-
-    def _cleanup_old_attempts(self, key: str, window_seconds: int):
-        """Remove attempts older than the window."""
-        cutoff = time.time() - window_seconds
-        self._attempts[key] = [t for t in self._attempts[key] if t > cutoff]
-
-    def _is_locked_out(self, key: str) -> bool:
-        """Check if key is currently locked out."""
-        if key in self._lockouts:
-            if time.time() < self._lockouts[key]:
-                return True
-            else:
-                # Lockout expired, remove it
-                del self._lockouts[key]
-        return False
-
-    def check_rate_limit(
-        self,
-        key: str,
-        max_attempts: int,
-        window_seconds: int,
-        lockout_seconds: int = 0
-    ) -> bool:
-        """
-        Check if request is within rate limit.
-
-        Args:
-            key: Unique identifier (e.g., IP address, email)
-            max_attempts: Maximum attempts allowed in window
-            window_seconds: Time window in seconds
-            lockout_seconds: If > 0, lock out for this many seconds after max attempts
-
-        Returns:
-            True if request is allowed, raises HTTPException if rate limited
-        """
-        with self._lock:
-            # Check if locked out
-            if self._is_locked_out(key):
-                remaining = int(self._lockouts[key] - time.time())
-                remaining_minutes = max(1, (remaining + 59) // 60)  # Round up to minutes
-                logger.warning(f"Rate limit lockout for {key}, {remaining}s remaining")
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Account temporarily locked due to too many failed attempts. Please wait {remaining_minutes} minute{'s' if remaining_minutes != 1 else ''} before trying again.",
-                    headers={"Retry-After": str(remaining)}
-                )
-
-            # Cleanup old attempts
-            self._cleanup_old_attempts(key, window_seconds)
-
-            # Check current attempts
-            current_attempts = len(self._attempts[key])
-
-            if current_attempts >= max_attempts:
-                # Apply lockout if configured
-                if lockout_seconds > 0:
-                    self._lockouts[key] = time.time() + lockout_seconds
-                    lockout_minutes = max(1, (lockout_seconds + 59) // 60)
-                    logger.warning(f"Rate limit exceeded for {key}, locked out for {lockout_seconds}s")
-                    raise HTTPException(
-                        status_code=429,
-                        detail=f"Account temporarily locked due to too many failed attempts. Please wait {lockout_minutes} minute{'s' if lockout_minutes != 1 else ''} before trying again.",
-                        headers={"Retry-After": str(lockout_seconds)}
-                    )
-                else:
-                    raise HTTPException(
-                        status_code=429,
-                        detail="Too many requests. Please slow down.",
-                        headers={"Retry-After": str(window_seconds)}
-                    )
-
-            # Record this attempt
-            self._attempts[key].append(time.time())
-            return True
-
-    def reset(self, key: str):
-        """Reset rate limit for a key (e.g., after successful login)."""
-        with self._lock:
-            if key in self._attempts:
-                del self._attempts[key]
-            if key in self._lockouts:
-                del self._lockouts[key]
-
-
-# Global rate limiter instance
-_rate_limiter = RateLimiter()
+def _check(key: str, max_attempts: int, window_seconds: int, lockout_seconds: int = 0):
+    """Count an attempt for key; raises HTTPException(429) when it is over the limit."""
+    decision = get_limiter().hit(key, Rule(max_attempts, window_seconds, lockout_seconds))
+    if decision.allowed:
+        return True
+    if decision.locked:
+        remaining_minutes = max(1, (decision.retry_after + 59) // 60)  # Round up to minutes
+        logger.warning(f"Rate limit lockout for {key}, {decision.retry_after}s remaining")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Account temporarily locked due to too many failed attempts. Please wait {remaining_minutes} minute{'s' if remaining_minutes != 1 else ''} before trying again.",
+            headers={"Retry-After": str(decision.retry_after)}
+        )
+    raise HTTPException(
+        status_code=429,
+        detail="Too many requests. Please slow down.",
+        headers={"Retry-After": str(decision.retry_after)}
+    )
 
 
 def get_client_ip(request: Request) -> str:
@@ -151,7 +79,7 @@ def check_login_rate_limit(request: Request):
     if IS_TEST_ENV:
         return  # Skip rate limiting in tests
     client_ip = get_client_ip(request)
-    _rate_limiter.check_rate_limit(
+    _check(
         key=f"login:{client_ip}",
         max_attempts=MAX_LOGIN_ATTEMPTS,
         window_seconds=LOGIN_WINDOW_SECONDS,
@@ -167,7 +95,7 @@ def check_register_rate_limit(request: Request):
     if IS_TEST_ENV:
         return  # Skip rate limiting in tests
     client_ip = get_client_ip(request)
-    _rate_limiter.check_rate_limit(
+    _check(
         key=f"register:{client_ip}",
         max_attempts=MAX_REGISTER_ATTEMPTS,
         window_seconds=REGISTER_WINDOW_SECONDS,
@@ -178,7 +106,7 @@ def check_register_rate_limit(request: Request):
 def reset_login_rate_limit(request: Request):
     """Reset login rate limit after successful login."""
     client_ip = get_client_ip(request)
-    _rate_limiter.reset(f"login:{client_ip}")
+    get_limiter().reset(f"login:{client_ip}")
 
 
 def check_profile_scan_rate_limit(user_id: int):
@@ -194,7 +122,7 @@ def check_profile_scan_rate_limit(user_id: int):
     """
     if IS_TEST_ENV:
         return  # Skip rate limiting in tests
-    _rate_limiter.check_rate_limit(
+    _check(
         key=f"profile_scan:{user_id}",
         max_attempts=MAX_PROFILE_SCANS_PER_DAY,
         window_seconds=PROFILE_SCAN_WINDOW_SECONDS,
@@ -210,7 +138,7 @@ def check_vault_unlock_rate_limit(request: Request):
     if IS_TEST_ENV:
         return  # Skip rate limiting in tests
     client_ip = get_client_ip(request)
-    _rate_limiter.check_rate_limit(
+    _check(
         key=f"vault_unlock:{client_ip}",
         max_attempts=MAX_VAULT_UNLOCK_ATTEMPTS,
         window_seconds=VAULT_UNLOCK_WINDOW_SECONDS,
@@ -221,7 +149,7 @@ def check_vault_unlock_rate_limit(request: Request):
 def reset_vault_unlock_rate_limit(request: Request):
     """Reset vault unlock rate limit after successful unlock."""
     client_ip = get_client_ip(request)
-    _rate_limiter.reset(f"vault_unlock:{client_ip}")
+    get_limiter().reset(f"vault_unlock:{client_ip}")
 
 
 def check_password_reset_rate_limit(request: Request):
@@ -232,7 +160,7 @@ def check_password_reset_rate_limit(request: Request):
     if IS_TEST_ENV:
         return  # Skip rate limiting in tests
     client_ip = get_client_ip(request)
-    _rate_limiter.check_rate_limit(
+    _check(
         key=f"password_reset:{client_ip}",
         max_attempts=MAX_PASSWORD_RESET_ATTEMPTS,
         window_seconds=PASSWORD_RESET_WINDOW_SECONDS,
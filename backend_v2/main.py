@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 import os
 import sys
 import asyncio
+import threading
 import logging
 
 # Fix for Windows Python 3.8+ subprocess in asyncio
@@ -16,15 +17,21 @@ from prometheus_fastapi_instrumentator import Instrumentator
 
 # Support both local development (backend_v2.X) and production (X) imports
 try:
-    from backend_v2.routers import auth, users, dashboard, documents, health, admin, vault, notifications, subscription, payment, gdpr, support, lifestyle, medications, sharing, blog, analytics, sitemap, referral, analyzer, seo_prerender, social
+    from backend_v2.routers import auth, users, dashboard, documents, health, admin, vault, notifications, subscription, payment, gdpr, support, lifestyle, medications, sharing, blog, analytics, sitemap, referral, analyzer, seo_prerender, social, changes
     from backend_v2.database import Base, engine, SessionLocal
     from backend_v2.routers.auth import seed_default_user
     from backend_v2.services.scheduler import init_scheduler, shutdown_scheduler
+    from backend_v2.services.security_headers import SecurityHeadersMiddleware
+    from backend_v2.services.data_version import NotModified, not_modified_handler
+    from backend_v2.services import search_index
 except ImportError:
-    from routers import auth, users, dashboard, documents, health, admin, vault, notifications, subscription, payment, gdpr, support, lifestyle, medications, sharing, blog, analytics, sitemap, referral, analyzer, seo_prerender, social
+    from routers import auth, users, dashboard, documents, health, admin, vault, notifications, subscription, payment, gdpr, support, lifestyle, medications, sharing, blog, analytics, sitemap, referral, analyzer, seo_prerender, social, changes
     from database import Base, engine, SessionLocal
     from routers.auth import seed_default_user
     from services.scheduler import init_scheduler, shutdown_scheduler
+    from services.security_headers import SecurityHeadersMiddleware
+    from services.data_version import NotModified, not_modified_handler
+    from services import search_index
 
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
@@ -51,6 +58,9 @@ db.close()
 
 app = FastAPI(title="Healthy v2 API", version="2.0")
 
+# Conditional GET on authenticated reads (services/data_version)
+app.add_exception_handler(NotModified, not_modified_handler)
+
 # CORS - configurable via environment (no hardcoded production IPs)
 default_origins = [
     "http://localhost:5173",  # React Vite dev
@@ -68,49 +78,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization", "X-Vault-Token"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    # Prevent clickjacking
-    response.headers["X-Frame-Options"] = "DENY"
-    # Prevent MIME type sniffing
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    # XSS protection for older browsers
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    # Control referrer information
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    # Restrict browser features
-    response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-    # Prevent caching of authenticated API responses
-    # Routes are at /auth, /users, etc. (Nginx strips /api prefix before proxying)
-    excluded_paths = ("/", "/health", "/metrics", "/api/health", "/api/metrics", "/sitemap.xml", "/blog/feed.xml")
-    seo_prefixes = ("/prerender/", "/public/stats", "/blog/articles", "/analyzer/")
-    is_seo_path = any(request.url.path.startswith(p) for p in seo_prefixes)
-    if is_seo_path:
-        response.headers["Cache-Control"] = "public, max-age=3600, s-maxage=3600"
-    elif request.url.path not in excluded_paths:
-        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate"
-        response.headers["Pragma"] = "no-cache"
-    # HSTS - only in production (when CORS_ORIGINS contains https://)
-    if any("https://" in o for o in origins):
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    # Content Security Policy - restrict resource loading
-    response.headers["Content-Security-Policy"] = (
-        "default-src 'self'; "
-        "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://cdnjs.cloudflare.com https://www.googletagmanager.com; "
-        "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
-        "font-src 'self' https://fonts.gstatic.com; "
-        "img-src 'self' data: blob: https:; "
-        "connect-src 'self' https://analize.online https://*.googleapis.com https://*.google-analytics.com https://*.analytics.google.com; "
-        "frame-ancestors 'none'; "
-        "base-uri 'self'; "
-        "form-action 'self'"
-    )
-    return response
+# Security and cache headers (pure ASGI; headers precomputed from the origins)
+app.add_middleware(SecurityHeadersMiddleware, origins=origins)
 
 
 # Routers
@@ -136,6 +109,10 @@ app.include_router(referral.router)
 app.include_router(analyzer.router)
 app.include_router(seo_prerender.router)
 app.include_router(social.router)
+app.include_router(changes.router)
+
+# Index blog articles for /blog/search as they are written
+search_index.register_listeners()
 
 # Prometheus metrics instrumentation for HTTP request tracking
 # Exposes metrics at /api/metrics for Prometheus scraping
@@ -162,10 +139,43 @@ def startup_event():
 
     init_scheduler()
 
+    # Pre-render the SEO pages so the first crawler burst is served from memory
+    if os.getenv("PRERENDER_WARMUP", "true").lower() == "true":
+        threading.Thread(target=_warm_prerender_cache, name="prerender-warmup", daemon=True).start()
+
+    # Index the biomarker / condition reference pages for /blog/search
+    threading.Thread(target=_sync_search_index, name="search-index-sync", daemon=True).start()
+
+
+def _warm_prerender_cache():
+    db = SessionLocal()
+    try:
+        seo_prerender.warm_up(db)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"SEO prerender warm-up failed: {e}")
+    finally:
+        db.close()
+
+
+def _sync_search_index():
+    db = SessionLocal()
+    try:
+        search_index.sync_reference_data(db)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Search index sync failed: {e}")
+    finally:
+        db.close()
+
 
 @app.on_event("shutdown")
 def shutdown_event():
     shutdown_scheduler()
+    # Write out page views still waiting in the buffer
+    try:
+        from services import pageview_buffer
+    except ImportError:
+        from backend_v2.services import pageview_buffer
+    pageview_buffer.flush()
 
 
 @app.get("/")
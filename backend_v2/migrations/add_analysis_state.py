@@ -0,0 +1,67 @@
+"""
+Migration: Add incremental analysis state columns to health_reports.
+
+This migration:
+1. Adds biomarker_fingerprint (fingerprint of the biomarkers a report analyzed)
+2. Adds analysis_state (hashed marker digests / specialist config as JSON)
+
+Reports created before this migration have no state, so each user's next
+analysis runs in full and later ones are incremental.
+
+Run with:
+    python -m backend_v2.migrations.add_analysis_state
+
+Safe to run multiple times - existing columns are skipped.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLUMNS = [
+    ("biomarker_fingerprint", "VARCHAR(64)", "VARCHAR(64)"),
+    ("analysis_state", "TEXT", "TEXT"),
+]
+
+
+def run_migration():
+    """Add incremental analysis columns to health_reports."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+    except ImportError:
+        from database import engine, SessionLocal
+
+    db = SessionLocal()
+
+    try:
+        is_postgres = 'postgresql' in str(engine.url)
+
+        for column_name, pg_type, sqlite_type in COLUMNS:
+            if is_postgres:
+                db.execute(text(f"ALTER TABLE health_reports ADD COLUMN IF NOT EXISTS {column_name} {pg_type}"))
+            else:
+                try:
+                    db.execute(text(f"ALTER TABLE health_reports ADD COLUMN {column_name} {sqlite_type}"))
+                except Exception:
+                    db.rollback()
+                    logger.info(f"{column_name} column already exists")
+
+        db.commit()
+        logger.info("Migration complete: health_reports analysis state columns ready")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
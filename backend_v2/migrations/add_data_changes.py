@@ -0,0 +1,57 @@
+"""
+Migration: Create the data_changes table (delta sync change feed) and backfill it.
+
+This migration:
+1. Creates data_changes with its (user_id, id) feed index and the
+   (entity, entity_id) unique constraint
+2. Adds one row per existing document, test result, health report,
+   notification, medication and medication log, so a first sync returns
+   the data that predates the feed
+
+Run with:
+    python -m backend_v2.migrations.add_data_changes
+
+Safe to run multiple times - the table is created only if missing and only
+entities without a row are backfilled.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Create data_changes and backfill existing entities."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+        from backend_v2.models import DataChange
+        from backend_v2.services import change_feed
+    except ImportError:
+        from database import engine, SessionLocal
+        from models import DataChange
+        from services import change_feed
+
+    DataChange.__table__.create(bind=engine, checkfirst=True)
+    logger.info("data_changes table ready")
+
+    db = SessionLocal()
+
+    try:
+        total = change_feed.backfill(db)
+        logger.info(f"Migration complete: {total} entities added to the change feed")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
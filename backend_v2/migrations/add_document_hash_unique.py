@@ -0,0 +1,86 @@
+"""
+Migration: Make (user_id, file_hash) unique on documents.
+
+This migration:
+1. Removes duplicate documents (same user and file content), keeping the
+   oldest, together with their test results and timeline events
+2. Creates the uq_documents_user_file_hash unique index used for set-based
+   duplicate detection at sync time
+
+This replaces the periodic duplicate cleanup job: once the index exists,
+duplicates can no longer be stored.
+
+Run with:
+    python -m backend_v2.migrations.add_document_hash_unique
+
+Safe to run multiple times - the index is only created if missing.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+from sqlalchemy import func
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "uq_documents_user_file_hash"
+
+
+def remove_duplicates(db) -> int:
+    """Delete all but the oldest document per (user_id, file_hash)."""
+    try:
+        from backend_v2.models import Document, TestResult
+        from backend_v2.services.health_events import delete_document_events
+    except ImportError:
+        from models import Document, TestResult
+        from services.health_events import delete_document_events
+
+    keep = db.query(func.min(Document.id))\
+        .filter(Document.file_hash.isnot(None))\
+        .group_by(Document.user_id, Document.file_hash)
+    duplicate_ids = [row[0] for row in db.query(Document.id).filter(
+        Document.file_hash.isnot(None),
+        Document.id.notin_(keep)
+    ).all()]
+
+    if duplicate_ids:
+        db.query(TestResult).filter(TestResult.document_id.in_(duplicate_ids))\
+            .delete(synchronize_session=False)
+        delete_document_events(db, duplicate_ids)
+        db.query(Document).filter(Document.id.in_(duplicate_ids))\
+            .delete(synchronize_session=False)
+    return len(duplicate_ids)
+
+
+def run_migration():
+    """Remove existing duplicates, then add the unique index."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+        from backend_v2.models import Document
+    except ImportError:
+        from database import engine, SessionLocal
+        from models import Document
+
+    db = SessionLocal()
+    try:
+        removed = remove_duplicates(db)
+        db.commit()
+        logger.info(f"Removed {removed} duplicate documents")
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    index = next(i for i in Document.__table__.indexes if i.name == INDEX_NAME)
+    index.create(bind=engine, checkfirst=True)
+    logger.info(f"{INDEX_NAME} index ready")
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,59 @@
+"""
+Migration: Create the append-only health_events table and backfill it.
+
+This migration:
+1. Creates health_events with its (user_id, occurred_at, id) keyset index
+   and the (user_id, dedupe_key) unique constraint
+2. Backfills document, analysis and range-crossing events for every user
+
+Run with:
+    python -m backend_v2.migrations.add_health_events
+
+Safe to run multiple times - the table is created only if missing and
+events are de-duplicated by their dedupe key.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Create health_events and backfill events for existing history."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+        from backend_v2.models import HealthEvent, User
+        from backend_v2.services.health_events import backfill_user_events
+    except ImportError:
+        from database import engine, SessionLocal
+        from models import HealthEvent, User
+        from services.health_events import backfill_user_events
+
+    HealthEvent.__table__.create(bind=engine, checkfirst=True)
+    logger.info("health_events table ready")
+
+    db = SessionLocal()
+
+    try:
+        total = 0
+        user_ids = [row[0] for row in db.query(User.id).all()]
+        for user_id in user_ids:
+            total += backfill_user_events(db, user_id)
+            db.commit()
+        logger.info(f"Migration complete: {total} events backfilled for {len(user_ids)} users")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
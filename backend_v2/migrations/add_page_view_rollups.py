@@ -0,0 +1,52 @@
+"""
+Migration: Create the page_view_rollups table and backfill it.
+
+page_view_rollups holds hourly and daily page-view aggregates (with unique
+visitor sketches) that the analytics dashboard reads instead of scanning
+page_views.
+
+Run with:
+    python -m backend_v2.migrations.add_page_view_rollups
+
+Safe to run multiple times - the table is only created if missing, and the
+backfill rebuilds every rollup from page_views.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Create page_view_rollups if it does not exist, then backfill it."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+        from backend_v2.models import PageViewRollup
+        from backend_v2.services import analytics_rollup
+    except ImportError:
+        from database import engine, SessionLocal
+        from models import PageViewRollup
+        from services import analytics_rollup
+
+    PageViewRollup.__table__.create(bind=engine, checkfirst=True)
+    logger.info("page_view_rollups table ready")
+
+    db = SessionLocal()
+    try:
+        days = analytics_rollup.backfill(db)
+        logger.info(f"Migration complete: rolled up {days} days of page views")
+    except Exception as e:
+        logger.error(f"Backfill failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
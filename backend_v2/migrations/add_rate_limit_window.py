@@ -0,0 +1,90 @@
+"""
+Migration: Add sliding-window columns to rate_limit_counters and make
+(identifier, action) unique.
+
+services/rate_limiter.DatabaseStorage keeps one row per key with the
+previous window's count, a lockout deadline and an expiry used to evict idle
+keys. Duplicate rows (possible before the unique index) are removed first.
+
+Run with:
+    python -m backend_v2.migrations.add_rate_limit_window
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Add previous_count, blocked_until and expires_at; dedupe and add the unique index."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+    except ImportError:
+        from database import engine, SessionLocal
+
+    db = SessionLocal()
+
+    try:
+        is_postgres = 'postgresql' in str(engine.url)
+
+        if is_postgres:
+            db.execute(text("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                   WHERE table_name='rate_limit_counters' AND column_name='previous_count') THEN
+                        ALTER TABLE rate_limit_counters ADD COLUMN previous_count INTEGER DEFAULT 0;
+                    END IF;
+                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                   WHERE table_name='rate_limit_counters' AND column_name='blocked_until') THEN
+                        ALTER TABLE rate_limit_counters ADD COLUMN blocked_until TIMESTAMP;
+                    END IF;
+                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                   WHERE table_name='rate_limit_counters' AND column_name='expires_at') THEN
+                        ALTER TABLE rate_limit_counters ADD COLUMN expires_at TIMESTAMP;
+                    END IF;
+                END $$;
+            """))
+        else:
+            for column, type_ in (("previous_count", "INTEGER DEFAULT 0"),
+                                  ("blocked_until", "DATETIME"),
+                                  ("expires_at", "DATETIME")):
+                try:
+                    db.execute(text(f"ALTER TABLE rate_limit_counters ADD COLUMN {column} {type_}"))
+                except Exception:
+                    logger.info(f"{column} column already exists")
+
+        # Keep the newest row per key before enforcing uniqueness
+        db.execute(text("""
+            DELETE FROM rate_limit_counters WHERE id NOT IN (
+                SELECT MAX(id) FROM rate_limit_counters GROUP BY identifier, action
+            )
+        """))
+        db.execute(text("DROP INDEX IF EXISTS ix_rate_limit_identifier_action"))
+        db.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_rate_limit_identifier_action "
+            "ON rate_limit_counters (identifier, action)"
+        ))
+        db.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_rate_limit_counters_expires_at ON rate_limit_counters (expires_at)"
+        ))
+
+        db.commit()
+        logger.info("Migration complete: rate_limit_counters uses sliding windows")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
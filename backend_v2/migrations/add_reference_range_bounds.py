@@ -0,0 +1,74 @@
+"""
+Migration: Add structured reference range columns to test_results and backfill them.
+
+This migration:
+1. Adds ref_low, ref_high, ref_low_inclusive, ref_high_inclusive, ref_qualitative
+2. Drops the (document_id, flags) index earlier versions created; no query used it
+3. Parses every distinct reference_range once and backfills existing rows
+
+Run with:
+    python -m backend_v2.migrations.add_reference_range_bounds
+
+Safe to run multiple times - existing columns and parsed rows are skipped.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLUMNS = [
+    ("ref_low", "DOUBLE PRECISION", "REAL"),
+    ("ref_high", "DOUBLE PRECISION", "REAL"),
+    ("ref_low_inclusive", "BOOLEAN", "BOOLEAN"),
+    ("ref_high_inclusive", "BOOLEAN", "BOOLEAN"),
+    ("ref_qualitative", "VARCHAR", "VARCHAR"),
+]
+
+
+def run_migration():
+    """Add reference range columns and backfill existing results."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+        from backend_v2.services.reference_ranges import backfill_reference_ranges
+    except ImportError:
+        from database import engine, SessionLocal
+        from services.reference_ranges import backfill_reference_ranges
+
+    db = SessionLocal()
+
+    try:
+        is_postgres = 'postgresql' in str(engine.url)
+
+        for column_name, pg_type, sqlite_type in COLUMNS:
+            if is_postgres:
+                db.execute(text(f"ALTER TABLE test_results ADD COLUMN IF NOT EXISTS {column_name} {pg_type}"))
+            else:
+                try:
+                    db.execute(text(f"ALTER TABLE test_results ADD COLUMN {column_name} {sqlite_type}"))
+                except Exception:
+                    db.rollback()
+                    logger.info(f"{column_name} column already exists")
+
+        db.execute(text("DROP INDEX IF EXISTS ix_test_results_document_flags"))
+        db.commit()
+        logger.info("Reference range columns ready")
+
+        updated = backfill_reference_ranges(db)
+        logger.info(f"Migration complete: {updated} results backfilled")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,53 @@
+"""
+Migration: Create the search_documents table and its full-text index.
+
+search_documents holds the folded text of blog articles and the biomarker /
+condition reference pages. On SQLite it is indexed by an FTS5 table kept in
+sync by triggers; on PostgreSQL by a generated tsvector column with a GIN
+index (see services/search_index.py).
+
+Run with:
+    python -m backend_v2.migrations.add_search_index
+
+Safe to run multiple times - the schema is only created if missing, and
+every article and reference page is reindexed.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Create the search schema if it does not exist, then index all content."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+        from backend_v2.services import search_index
+    except ImportError:
+        from database import engine, SessionLocal
+        from services import search_index
+
+    with engine.begin() as connection:
+        search_index.ensure_schema(connection)
+    logger.info("search_documents table and full-text index ready")
+
+    db = SessionLocal()
+    try:
+        articles = search_index.reindex_articles(db)
+        pages = search_index.sync_reference_data(db)
+        logger.info(f"Migration complete: indexed {articles} articles and {pages} reference pages")
+    except Exception as e:
+        logger.error(f"Indexing failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,67 @@
+"""
+Migration: Add lease_expires_at and heartbeat_at columns to sync_jobs (sync job leases).
+
+Run with:
+    python -m backend_v2.migrations.add_sync_job_lease
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Add lease_expires_at and heartbeat_at columns to sync_jobs."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+    except ImportError:
+        from database import engine, SessionLocal
+
+    db = SessionLocal()
+
+    try:
+        is_postgres = 'postgresql' in str(engine.url)
+
+        if is_postgres:
+            db.execute(text("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                   WHERE table_name='sync_jobs' AND column_name='lease_expires_at') THEN
+                        ALTER TABLE sync_jobs ADD COLUMN lease_expires_at TIMESTAMP;
+                    END IF;
+                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                   WHERE table_name='sync_jobs' AND column_name='heartbeat_at') THEN
+                        ALTER TABLE sync_jobs ADD COLUMN heartbeat_at TIMESTAMP;
+                    END IF;
+                END $$;
+            """))
+        else:
+            try:
+                db.execute(text("ALTER TABLE sync_jobs ADD COLUMN lease_expires_at DATETIME"))
+            except Exception:
+                logger.info("lease_expires_at column already exists")
+            try:
+                db.execute(text("ALTER TABLE sync_jobs ADD COLUMN heartbeat_at DATETIME"))
+            except Exception:
+                logger.info("heartbeat_at column already exists")
+
+        db.commit()
+        logger.info("Migration complete: lease columns added to sync_jobs")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,37 @@
+"""
+Migration: Create the sync_progress table.
+
+sync_progress holds the latest sync/upload progress snapshot per user and
+provider so every worker can see it and stream it to clients.
+
+Run with:
+    python -m backend_v2.migrations.add_sync_progress
+
+Safe to run multiple times - the table is only created if missing.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Create sync_progress if it does not exist."""
+    try:
+        from backend_v2.database import engine
+        from backend_v2.models import SyncProgress
+    except ImportError:
+        from database import engine
+        from models import SyncProgress
+
+    SyncProgress.__table__.create(bind=engine, checkfirst=True)
+    logger.info("sync_progress table ready")
+
+
+if __name__ == "__main__":
+    run_migration()
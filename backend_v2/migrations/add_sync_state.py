@@ -0,0 +1,59 @@
+"""
+Migration: Add sync_state column to linked_accounts (incremental provider sync).
+
+Run with:
+    python -m backend_v2.migrations.add_sync_state
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Add sync_state column to linked_accounts. Existing accounts start with a full sync."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+    except ImportError:
+        from database import engine, SessionLocal
+
+    db = SessionLocal()
+
+    try:
+        is_postgres = 'postgresql' in str(engine.url)
+
+        if is_postgres:
+            db.execute(text("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                   WHERE table_name='linked_accounts' AND column_name='sync_state') THEN
+                        ALTER TABLE linked_accounts ADD COLUMN sync_state TEXT;
+                    END IF;
+                END $$;
+            """))
+        else:
+            try:
+                db.execute(text("ALTER TABLE linked_accounts ADD COLUMN sync_state TEXT"))
+            except Exception:
+                logger.info("sync_state column already exists")
+
+        db.commit()
+        logger.info("Migration complete: sync_state added to linked_accounts")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,52 @@
+"""
+Migration: Add data_version column to users (conditional GET for authenticated reads).
+
+Run with:
+    python -m backend_v2.migrations.add_user_data_version
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Add data_version column to users."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+    except ImportError:
+        from database import engine, SessionLocal
+
+    db = SessionLocal()
+
+    try:
+        is_postgres = 'postgresql' in str(engine.url)
+
+        if is_postgres:
+            db.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version BIGINT DEFAULT 0"))
+        else:
+            try:
+                db.execute(text("ALTER TABLE users ADD COLUMN data_version BIGINT DEFAULT 0"))
+            except Exception:
+                logger.info("data_version column already exists")
+
+        db.execute(text("UPDATE users SET data_version = 0 WHERE data_version IS NULL"))
+        db.commit()
+        logger.info("Migration complete: data_version added to users")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
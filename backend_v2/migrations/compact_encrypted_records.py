@@ -0,0 +1,77 @@
+"""
+Migration: Add test_results.record_enc and convert encrypted rows to the compact formats.
+
+This migration:
+1. Adds record_enc (one ciphertext holding a result's value and numeric value)
+2. Unlocks user vaults with the service key (VAULT_SERVICE_KEY)
+3. Writes record_enc for each unlocked user's value_enc / numeric_value_enc
+   pairs and re-encrypts report bodies zlib-compressed
+
+Users without a service-encrypted vault key are converted by the scheduler
+the next time their vault is unlocked.
+
+Rollback: value_enc / numeric_value_enc are kept, so older code still reads
+converted test results; clear them later with drop_legacy_result_values.
+Compressed report bodies can only be read by code with
+services/encrypted_records.
+
+Run with:
+    python -m backend_v2.migrations.compact_encrypted_records
+
+Safe to run multiple times - the column is added only if missing and only
+rows still in the old formats are converted.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Add record_enc and compact the records of service-unlocked users."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+        from backend_v2.services import encrypted_records
+        from backend_v2.services.user_vault import unlock_all_service_vaults, unlocked_user_ids
+    except ImportError:
+        from database import engine, SessionLocal
+        from services import encrypted_records
+        from services.user_vault import unlock_all_service_vaults, unlocked_user_ids
+
+    db = SessionLocal()
+
+    try:
+        if 'postgresql' in str(engine.url):
+            db.execute(text("ALTER TABLE test_results ADD COLUMN IF NOT EXISTS record_enc BYTEA"))
+        else:
+            try:
+                db.execute(text("ALTER TABLE test_results ADD COLUMN record_enc BLOB"))
+            except Exception:
+                db.rollback()
+                logger.info("record_enc column already exists")
+        db.commit()
+        logger.info("record_enc column ready")
+
+        unlock_all_service_vaults()
+        totals = encrypted_records.compact_unlocked_users(db, unlocked_user_ids())
+        logger.info(
+            f"Migration complete: {totals['test_results']} test results and "
+            f"{totals['reports']} reports compacted for {totals['users']} users"
+        )
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
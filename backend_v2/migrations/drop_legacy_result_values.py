@@ -0,0 +1,53 @@
+"""
+Migration: Clear value_enc / numeric_value_enc of test results converted to record_enc.
+
+compact_encrypted_records keeps the legacy ciphertexts next to record_enc so
+that code from before record_enc can still read converted results. Run this
+once a rollback past record_enc is no longer needed, to reclaim their space.
+Rows without record_enc are left alone.
+
+Run with:
+    python -m backend_v2.migrations.drop_legacy_result_values
+
+Safe to run multiple times.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Clear the legacy encrypted value columns of compacted test results."""
+    try:
+        from backend_v2.database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+
+    db = SessionLocal()
+
+    try:
+        result = db.execute(text(
+            "UPDATE test_results SET value_enc = NULL, numeric_value_enc = NULL "
+            "WHERE record_enc IS NOT NULL "
+            "AND (value_enc IS NOT NULL OR numeric_value_enc IS NOT NULL)"
+        ))
+        db.commit()
+        logger.info(f"Migration complete: legacy values cleared from {result.rowcount} test results")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
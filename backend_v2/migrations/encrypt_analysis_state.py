@@ -0,0 +1,64 @@
+"""
+Migration: Move incremental analysis state of health_reports into the vault.
+
+This migration:
+1. Adds analysis_state_enc (session state encrypted like content_enc)
+2. Clears the plaintext biomarker_fingerprint and analysis_state columns:
+   their unsalted digests of marker names and readings could be brute-forced
+
+Cleared reports have no state, so each user's next analysis runs in full and
+later ones are incremental again.
+
+Run with:
+    python -m backend_v2.migrations.encrypt_analysis_state
+
+Safe to run multiple times - the column is added only if missing.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Add analysis_state_enc and clear the plaintext analysis state."""
+    try:
+        from backend_v2.database import engine, SessionLocal
+    except ImportError:
+        from database import engine, SessionLocal
+
+    db = SessionLocal()
+
+    try:
+        if 'postgresql' in str(engine.url):
+            db.execute(text("ALTER TABLE health_reports ADD COLUMN IF NOT EXISTS analysis_state_enc BYTEA"))
+        else:
+            try:
+                db.execute(text("ALTER TABLE health_reports ADD COLUMN analysis_state_enc BLOB"))
+            except Exception:
+                db.rollback()
+                logger.info("analysis_state_enc column already exists")
+
+        result = db.execute(text("""
+            UPDATE health_reports SET biomarker_fingerprint = NULL, analysis_state = NULL
+            WHERE biomarker_fingerprint IS NOT NULL OR analysis_state IS NOT NULL
+        """))
+        db.commit()
+        logger.info(f"Migration complete: plaintext analysis state cleared on {result.rowcount} reports")
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
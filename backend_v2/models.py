@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text, LargeBinary, Index, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
@@ -33,6 +33,7 @@ class User(Base):
     is_admin = Column(Boolean, default=False)  # Admin access
     language = Column(String, default="ro")  # User's preferred language (ro/en)
     created_at = Column(DateTime, default=utc_now)
+    data_version = Column(BigInteger, default=0)  # Bumped on any change to the user's data (services/data_version)
 
     # Email verification
     email_verified = Column(Boolean, default=False)
@@ -102,6 +103,7 @@ class LinkedAccount(Base):
     sync_frequency = Column(String, default="daily")  # daily, weekly, manual
     sync_enabled = Column(Boolean, default=True)  # Enable/disable auto-sync
     status = Column(String, default="ACTIVE")  # ACTIVE, SYNCING, ERROR
+    sync_state = Column(Text, nullable=True)  # JSON: documents already synced + portal count (see sync_watermark)
 
     user = relationship("User", back_populates="linked_accounts")
 
@@ -127,6 +129,11 @@ class Document(Base):
     user = relationship("User", back_populates="documents")
     results = relationship("TestResult", back_populates="document", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Set-based duplicate detection at sync time; NULL hashes never conflict
+        Index('uq_documents_user_file_hash', 'user_id', 'file_hash', unique=True),
+    )
+
 class TestResult(Base):
     __tablename__ = "test_results"
 
@@ -139,8 +146,15 @@ class TestResult(Base):
     # Vault-encrypted fields
     value_enc = Column(LargeBinary, nullable=True)  # Encrypted with vault
     numeric_value_enc = Column(LargeBinary, nullable=True)  # Encrypted with vault
+    record_enc = Column(LargeBinary, nullable=True)  # Compact record: value + numeric value in one ciphertext (services/encrypted_records)
     unit = Column(String, nullable=True)
     reference_range = Column(String, nullable=True)
+    # Structured bounds parsed from reference_range at ingest (services/reference_ranges.py)
+    ref_low = Column(Float, nullable=True)
+    ref_high = Column(Float, nullable=True)
+    ref_low_inclusive = Column(Boolean, nullable=True)
+    ref_high_inclusive = Column(Boolean, nullable=True)
+    ref_qualitative = Column(String, nullable=True)  # negative, positive - expected qualitative result
     flags = Column(String, default="NORMAL")  # NORMAL, HIGH, LOW - kept unencrypted for filtering
     category = Column(String, default="General")
 
@@ -158,14 +172,67 @@ class HealthReport(Base):
     findings = Column(Text, nullable=True)  # Legacy - will be removed after migration
     recommendations = Column(Text, nullable=True)  # Legacy - will be removed after migration
     # Vault-encrypted content (JSON with summary, findings, recommendations)
-    content_enc = Column(LargeBinary, nullable=True)  # Encrypted with vault
+    content_enc = Column(LargeBinary, nullable=True)  # Encrypted with vault (zlib-compressed, services/encrypted_records)
     risk_level = Column(String, default="normal")  # normal, attention, concern, urgent - kept for filtering
     created_at = Column(DateTime, default=utc_now)
     biomarkers_analyzed = Column(Integer, default=0)
+    # Incremental analysis: session state (marker digests, fingerprints, specialist
+    # config) used to compute the next delta, encrypted with vault like content_enc
+    analysis_state_enc = Column(LargeBinary, nullable=True)
+    biomarker_fingerprint = Column(String(64), nullable=True)  # Legacy - cleared by migrations/encrypt_analysis_state.py
+    analysis_state = Column(Text, nullable=True)  # Legacy - cleared by migrations/encrypt_analysis_state.py
 
     user = relationship("User", back_populates="health_reports")
 
 
+class HealthEvent(Base):
+    """Append-only timeline event, written at ingest and analysis time."""
+    __tablename__ = "health_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    event_type = Column(String(20), nullable=False)  # document, analysis, improvement, alert
+    occurred_at = Column(DateTime, nullable=False)
+    title = Column(String)
+    subtitle = Column(String, nullable=True)
+    link = Column(String, nullable=True)
+    risk_level = Column(String, nullable=True)  # analysis events
+    biomarker = Column(String, nullable=True)  # canonical name for improvement/alert events
+    # Source rows (no FK: events are removed explicitly when their source is deleted)
+    document_id = Column(Integer, nullable=True, index=True)
+    report_id = Column(Integer, nullable=True)
+    dedupe_key = Column(String(120), nullable=False)  # e.g. "document:12", "transition:12:Glucose"
+    created_at = Column(DateTime, default=utc_now)
+
+    __table_args__ = (
+        # Keyset pagination: WHERE user_id = ? AND (occurred_at, id) < (?, ?) ORDER BY occurred_at DESC, id DESC
+        Index('ix_health_events_user_occurred', 'user_id', 'occurred_at', 'id'),
+        UniqueConstraint('user_id', 'dedupe_key', name='uq_health_events_user_dedupe'),
+    )
+
+
+class DataChange(Base):
+    """Latest change to one synced row (services/change_feed); id is the change sequence number."""
+    __tablename__ = "data_changes"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # No FK: rows of deleted accounts are pruned by the change feed janitor
+    user_id = Column(Integer, nullable=False)
+    entity = Column(String(20), nullable=False)  # document, test_result, health_report, notification, medication, medication_log
+    entity_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, default=False, nullable=False)  # Tombstone
+    changed_at = Column(DateTime, default=utc_now, nullable=False)
+
+    __table_args__ = (
+        # Feed: WHERE user_id = ? AND id > ? ORDER BY id
+        Index('ix_data_changes_user_seq', 'user_id', 'id'),
+        # One row per entity, replaced on every change
+        UniqueConstraint('entity', 'entity_id', name='uq_data_changes_entity'),
+        # Never reuse the id of a replaced row (SQLite otherwise reuses the highest rowid)
+        {'sqlite_autoincrement': True},
+    )
+
+
 class SyncJob(Base):
     """Track sync jobs for reliability and retry logic."""
     __tablename__ = "sync_jobs"
@@ -175,6 +242,10 @@ class SyncJob(Base):
     linked_account_id = Column(Integer, ForeignKey("linked_accounts.id"))
     provider_name = Column(String)
     status = Column(String, default="pending")  # pending, running, completed, failed
+    source = Column(String, default="scheduled")  # scheduled, manual
+    worker_id = Column(String, nullable=True)  # host:pid of the crawler worker that claimed it
+    lease_expires_at = Column(DateTime, nullable=True)  # Reclaimable once past (owner stopped heartbeating)
+    heartbeat_at = Column(DateTime, nullable=True)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     documents_found = Column(Integer, default=0)
@@ -187,6 +258,28 @@ class SyncJob(Base):
     linked_account = relationship("LinkedAccount")
 
 
+class SyncProgress(Base):
+    """Latest progress snapshot per user and channel, shared across workers."""
+    __tablename__ = "sync_progress"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    channel = Column(String(50), nullable=False)  # provider name, or "upload" for manual uploads
+    stage = Column(String(30))
+    message = Column(String, nullable=True)
+    progress = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    is_complete = Column(Boolean, default=False)
+    is_error = Column(Boolean, default=False)
+    error_type = Column(String(30), nullable=True)
+    version = Column(BigInteger, nullable=False, index=True)  # publish time in ms, monotonic per channel
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'channel', name='uq_sync_progress_user_channel'),
+    )
+
+
 class Notification(Base):
     """Track notifications sent to users."""
     __tablename__ = "notifications"
@@ -437,13 +530,16 @@ class RateLimitCounter(Base):
     id = Column(Integer, primary_key=True, index=True)
     identifier = Column(String, index=True)  # user_id, ip_address, or combination
     action = Column(String, index=True)  # api_call, login, upload, analyze, etc.
-    count = Column(Integer, default=0)
+    count = Column(Integer, default=0)  # Hits in the current window
     window_start = Column(DateTime, default=utc_now)
     window_minutes = Column(Integer, default=60)  # Window size in minutes
+    previous_count = Column(Integer, default=0)  # Hits in the window before (sliding window estimate)
+    blocked_until = Column(DateTime, nullable=True)  # Lockout deadline
+    expires_at = Column(DateTime, nullable=True, index=True)  # Row can be dropped after this
 
     __table_args__ = (
-        # Composite index for fast lookups
-        Index('ix_rate_limit_identifier_action', 'identifier', 'action'),
+        # One counter per identifier/action (services/rate_limiter.DatabaseStorage)
+        Index('ix_rate_limit_identifier_action', 'identifier', 'action', unique=True),
     )
 
 
@@ -755,6 +851,25 @@ class LeadCapture(Base):
     converted = Column(Boolean, default=False)  # Did they register?
 
 
+class SearchDocument(Base):
+    """Diacritic-folded text of a searchable page (see services/search_index)."""
+    __tablename__ = "search_documents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)  # blog, biomarker, condition
+    ref = Column(String, nullable=False)  # Slug of the article / reference entry
+    label = Column(String, nullable=False, default="")  # Display title, as written
+    title = Column(Text, nullable=False, default="")
+    tags = Column(Text, nullable=False, default="")
+    body = Column(Text, nullable=False, default="")  # Plain text, HTML stripped
+    published = Column(Boolean, default=True)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
+
+    __table_args__ = (
+        UniqueConstraint("kind", "ref", name="uq_search_document"),
+    )
+
+
 class PageView(Base):
     """Track anonymous page views for visitor analytics."""
     __tablename__ = "page_views"
@@ -773,3 +888,22 @@ class PageView(Base):
     is_mobile = Column(Boolean, default=False)
     user_id = Column(Integer, nullable=True)  # If logged in
     created_at = Column(DateTime, default=utc_now, index=True)
+
+
+class PageViewRollup(Base):
+    """Page views and unique visitors per hour/day and dimension (see services/analytics_rollup)."""
+    __tablename__ = "page_view_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10), nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)  # UTC start of the hour/day
+    dimension = Column(String(20), nullable=False)  # all, page, funnel, source, device, visitor_type, all_time
+    key = Column(String(500), nullable=False, default="")  # e.g. page path, funnel step, referrer domain
+    pageviews = Column(Integer, default=0)
+    visitors = Column(Integer, default=0)  # Estimated unique visitors
+    sketch = Column(LargeBinary)  # HyperLogLog registers of the visitors
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "dimension", "key", name="uq_page_view_rollup"),
+        Index("ix_page_view_rollups_lookup", "dimension", "granularity", "bucket_start"),
+    )
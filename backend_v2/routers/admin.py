@@ -12,11 +12,17 @@ try:
     from backend_v2.models import User, Document, TestResult, LinkedAccount, HealthReport, SyncJob, AuditLog, AbuseFlag, UsageMetrics, OpenAIUsageLog, LeadCapture
     from backend_v2.routers.documents import get_current_user
     from backend_v2.services.audit_service import AuditService
+    from backend_v2.services.user_vault import clear_user_vault_session, end_all_user_vault_sessions
+    from backend_v2.services import report_cache, provider_health, prerender_cache
+    from backend_v2.routers import seo_prerender
 except ImportError:
     from database import get_db
     from models import User, Document, TestResult, LinkedAccount, HealthReport, SyncJob, AuditLog, AbuseFlag, UsageMetrics, OpenAIUsageLog, LeadCapture
     from routers.documents import get_current_user
     from services.audit_service import AuditService
+    from services.user_vault import clear_user_vault_session, end_all_user_vault_sessions
+    from services import report_cache, provider_health, prerender_cache
+    from routers import seo_prerender
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -251,6 +257,19 @@ def get_sync_jobs(
     return result
 
 
+@router.get("/provider-health")
+def get_provider_health(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Circuit breaker state, success rate and p95 sync duration per provider."""
+    return provider_health.snapshot(db)
+
+
+@router.post("/prerender/warm")
+def warm_prerender_cache(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Pre-render every known SEO page (static, biomarkers, conditions, blog) into this worker's cache."""
+    rendered = seo_prerender.warm_up(db)
+    return {"rendered": rendered, "cache": prerender_cache.stats()}
+
+
 @router.post("/users/{user_id}/set-admin")
 def set_user_admin(
     user_id: int,
@@ -1268,6 +1287,7 @@ def end_user_sessions(
 
     audit_service = AuditService(db)
     audit_service.end_all_sessions(user_id)
+    end_all_user_vault_sessions(user_id)
 
     # Log the admin action
     audit_service.log_action(
@@ -1299,6 +1319,7 @@ def disable_user(
     # End all sessions
     audit_service = AuditService(db)
     audit_service.end_all_sessions(user_id)
+    clear_user_vault_session(user_id)
 
     # Log the action
     audit_service.log_action(
@@ -1,7 +1,7 @@
 """Visitor analytics router — self-hosted page-view tracking."""
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct, cast, Date, and_
+from sqlalchemy import func, distinct
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 from typing import Optional
@@ -12,10 +12,16 @@ try:
     from backend_v2.database import get_db
     from backend_v2.models import PageView, User
     from backend_v2.routers.documents import get_current_user
+    from backend_v2.services import pageview_buffer, analytics_rollup
+    from backend_v2.services.analytics_rollup import FUNNEL_PAGES
+    from backend_v2.services.rate_limiter import Rule, get_limiter
 except ImportError:
     from database import get_db
     from models import PageView, User
     from routers.documents import get_current_user
+    from services import pageview_buffer, analytics_rollup
+    from services.analytics_rollup import FUNNEL_PAGES
+    from services.rate_limiter import Rule, get_limiter
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -50,23 +56,6 @@ def _hash_ip(ip: str) -> str:
     return hashlib.sha256(ip.encode()).hexdigest()
 
 
-def _extract_domain(referrer: str) -> str:
-    """Pull the bare domain from a referrer URL; empty → 'direct'."""
-    if not referrer:
-        return "direct"
-    # Strip protocol
-    ref = referrer.split("//", 1)[-1]
-    # Strip path
-    domain = ref.split("/", 1)[0].split("?", 1)[0].lower()
-    # Strip www.
-    if domain.startswith("www."):
-        domain = domain[4:]
-    # If it's our own domain, treat as direct
-    if domain in ("analize.online", "localhost", "127.0.0.1"):
-        return "direct"
-    return domain or "direct"
-
-
 def _period_to_delta(period: str) -> timedelta:
     mapping = {
         "today": timedelta(days=1),
@@ -77,37 +66,12 @@ def _period_to_delta(period: str) -> timedelta:
     return mapping.get(period, timedelta(days=7))
 
 
-# In-memory rate-limit store (session_id -> list of timestamps)
-# Kept simple; not shared across workers, but good enough for a single-process deploy.
-_rate_buckets: dict[str, list[float]] = {}
-_RATE_LIMIT = 100  # max pageviews per session per hour
-_RATE_WINDOW = 3600  # seconds
+_PAGEVIEW_RULE = Rule(100, 3600)  # max pageviews per session per hour
 
 
 def _check_rate_limit(session_id: str) -> bool:
     """Return True if the request is allowed."""
-    import time
-
-    now = time.time()
-    bucket = _rate_buckets.get(session_id, [])
-
-    # Purge old entries
-    bucket = [t for t in bucket if now - t < _RATE_WINDOW]
-
-    if len(bucket) >= _RATE_LIMIT:
-        _rate_buckets[session_id] = bucket
-        return False
-
-    bucket.append(now)
-    _rate_buckets[session_id] = bucket
-
-    # Lazy cleanup: if too many sessions tracked, drop oldest half
-    if len(_rate_buckets) > 10_000:
-        keys = sorted(_rate_buckets, key=lambda k: _rate_buckets[k][-1] if _rate_buckets[k] else 0)
-        for k in keys[: len(keys) // 2]:
-            del _rate_buckets[k]
-
-    return True
+    return get_limiter().hit(f"pageview:{session_id}", _PAGEVIEW_RULE).allowed
 
 
 # ---------------------------------------------------------------------------
@@ -126,8 +90,8 @@ class PageViewIn(BaseModel):
 
 
 @router.post("/pageview", status_code=204)
-def track_pageview(data: PageViewIn, request: Request, db: Session = Depends(get_db)):
-    """Record a single page view. Fire-and-forget from the frontend."""
+def track_pageview(data: PageViewIn, request: Request):
+    """Record a single page view. Fire-and-forget from the frontend; written in batches (pageview_buffer)."""
     if not data.session_id or not data.page:
         return Response(status_code=204)
 
@@ -142,7 +106,7 @@ def track_pageview(data: PageViewIn, request: Request, db: Session = Depends(get
     # x-forwarded-for may contain multiple IPs; take the first
     client_ip = client_ip.split(",")[0].strip() if client_ip else ""
 
-    pv = PageView(
+    pageview_buffer.record(dict(
         session_id=data.session_id[:64],
         page=data.page[:500],
         referrer=data.referrer[:1000] if data.referrer else None,
@@ -154,9 +118,7 @@ def track_pageview(data: PageViewIn, request: Request, db: Session = Depends(get
         screen_width=data.screen_width,
         is_mobile=_is_mobile(ua),
         user_id=data.user_id,
-    )
-    db.add(pv)
-    db.commit()
+    ))
     return Response(status_code=204)
 
 
@@ -164,17 +126,16 @@ def track_pageview(data: PageViewIn, request: Request, db: Session = Depends(get
 # Admin dashboard endpoints
 # ---------------------------------------------------------------------------
 
-# Funnel page sequence — order matters
-FUNNEL_PAGES = [
-    ("/", "home"),
-    ("/pricing", "pricing"),
-    ("/login", "login_page"),
-    ("/register", "registered"),
-    ("/dashboard", "dashboard"),
-    ("/accounts", "linked_accounts"),
-    ("/documents", "documents"),
-    ("/health-reports", "health_reports"),
-]
+def _top(db, cutoff, prefix: str, limit: int):
+    """Most viewed pages under prefix, with their unique visitors."""
+    rows = analytics_rollup.pageviews(db, "page", cutoff, prefix=prefix, limit=limit)
+    unique = analytics_rollup.unique_visitors(db, "page", cutoff, keys=[page for page, _ in rows])
+    return [{"page": page, "views": views, "unique": unique.get(page, 0)} for page, views in rows]
+
+
+def _views_by_day(db, cutoff, prefix: str):
+    return [{"date": r["date"], "views": r["pageviews"]}
+            for r in analytics_rollup.by_day(db, "page", cutoff, prefix=prefix)]
 
 
 @router.get("/dashboard")
@@ -183,220 +144,66 @@ def analytics_dashboard(
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin),
 ):
+    """Visitor analytics from the hourly/daily rollups (see analytics_rollup); unique counts are estimates."""
     delta = _period_to_delta(period)
-    cutoff = datetime.now(timezone.utc) - delta
+    now = datetime.now(timezone.utc)
+    cutoff = now - delta
+    cutoff_7d = now - timedelta(days=7)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
     # --- visitors ---
-    # Use ip_hash for unique counting — it's stable across sessions/tabs/localStorage clears.
-    # session_id (now persistent via localStorage) is used as fallback identifier.
-    total_pv = db.query(func.count(PageView.id)).filter(PageView.created_at >= cutoff).scalar() or 0
+    # Unique visitors are counted by ip_hash (stable across sessions/tabs/localStorage
+    # clears), by session_id for the rare view without one.
+    total_pv = analytics_rollup.total_pageviews(db, cutoff)
+    unique_visitors = analytics_rollup.unique_visitors(db, "all", cutoff).get("", 0)
+    returning_visitors = analytics_rollup.returning_visitors(db, cutoff)
+    by_day = [{"date": r["date"], "visitors": r["visitors"], "pageviews": r["pageviews"]}
+              for r in analytics_rollup.by_day(db, "all", cutoff)]
 
-    # Count unique visitors by ip_hash (most reliable), fall back to session_id for empty ip_hash
-    unique_by_ip = db.query(func.count(distinct(PageView.ip_hash))).filter(
-        PageView.created_at >= cutoff, PageView.ip_hash != "", PageView.ip_hash.isnot(None)
-    ).scalar() or 0
-    # Count sessions with no ip_hash (shouldn't happen, but be safe)
-    unique_no_ip = db.query(func.count(distinct(PageView.session_id))).filter(
-        PageView.created_at >= cutoff, ((PageView.ip_hash == "") | (PageView.ip_hash.is_(None)))
-    ).scalar() or 0
-    unique_sessions = unique_by_ip + unique_no_ip
-
-    # Returning = ip_hashes with pageviews BOTH before and after cutoff
-    returning_sessions = 0
-    if unique_sessions:
-        ips_before = db.query(PageView.ip_hash).filter(
-            PageView.created_at < cutoff, PageView.ip_hash != "", PageView.ip_hash.isnot(None)
-        ).distinct().subquery()
-        returning_sessions = (
-            db.query(func.count(distinct(PageView.ip_hash)))
-            .filter(
-                PageView.created_at >= cutoff,
-                PageView.ip_hash != "",
-                PageView.ip_hash.isnot(None),
-                PageView.ip_hash.in_(ips_before.select()),
-            )
-            .scalar() or 0
-        )
-
-    # By day
-    day_rows = (
-        db.query(
-            func.date(PageView.created_at).label("day"),
-            func.count(PageView.id).label("pageviews"),
-            func.count(distinct(PageView.ip_hash)).label("visitors"),
-        )
-        .filter(PageView.created_at >= cutoff, PageView.ip_hash != "", PageView.ip_hash.isnot(None))
-        .group_by(func.date(PageView.created_at))
-        .order_by(func.date(PageView.created_at))
-        .all()
-    )
-    by_day = [{"date": str(r.day), "visitors": r.visitors, "pageviews": r.pageviews} for r in day_rows]
-
-    # --- top pages ---
-    page_rows = (
-        db.query(
-            PageView.page,
-            func.count(PageView.id).label("views"),
-            func.count(distinct(PageView.ip_hash)).label("unique"),
-        )
-        .filter(PageView.created_at >= cutoff)
-        .group_by(PageView.page)
-        .order_by(func.count(PageView.id).desc())
-        .limit(20)
-        .all()
-    )
-    top_pages = [{"page": r.page, "views": r.views, "unique": r.unique} for r in page_rows]
+    top_pages = _top(db, cutoff, prefix=None, limit=20)
 
     # --- funnel ---
-    funnel = {}
-    for page_path, funnel_key in FUNNEL_PAGES:
-        cnt = (
-            db.query(func.count(distinct(PageView.ip_hash)))
-            .filter(PageView.created_at >= cutoff, PageView.page.like(f"{page_path}%"))
-            .scalar() or 0
-        )
-        funnel[funnel_key] = cnt
+    funnel_unique = analytics_rollup.unique_visitors(db, "funnel", cutoff)
+    funnel = {step: funnel_unique.get(step, 0) for _, step in FUNNEL_PAGES}
 
     # --- sources ---
-    # We need to process referrers in Python (domain extraction)
-    ref_rows = (
-        db.query(PageView.referrer, func.count(distinct(PageView.ip_hash)).label("visitors"))
-        .filter(PageView.created_at >= cutoff)
-        .group_by(PageView.referrer)
-        .all()
-    )
-    source_map: dict[str, int] = {}
-    for r in ref_rows:
-        domain = _extract_domain(r.referrer)
-        source_map[domain] = source_map.get(domain, 0) + r.visitors
     sources = sorted(
-        [{"source": k, "visitors": v} for k, v in source_map.items()],
+        [{"source": k, "visitors": v} for k, v in analytics_rollup.unique_visitors(db, "source", cutoff).items()],
         key=lambda x: x["visitors"],
         reverse=True,
     )
 
     # --- devices ---
-    mobile_count = db.query(func.count(distinct(PageView.ip_hash))).filter(
-        PageView.created_at >= cutoff, PageView.is_mobile == True,
-        PageView.ip_hash != "", PageView.ip_hash.isnot(None)
-    ).scalar() or 0
-    desktop_count = max(0, unique_by_ip - mobile_count)
+    mobile_count = analytics_rollup.unique_visitors(db, "device", cutoff).get("mobile", 0)
+    desktop_count = max(0, unique_visitors - mobile_count)
 
-    # --- NEW: total registered users ---
+    # --- registered users ---
     total_users = db.query(func.count(User.id)).scalar() or 0
-    cutoff_7d = datetime.now(timezone.utc) - timedelta(days=7)
     new_users_7d = db.query(func.count(User.id)).filter(User.created_at >= cutoff_7d).scalar() or 0
 
-    # --- NEW: pageview breakdowns ---
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    pageviews_today = db.query(func.count(PageView.id)).filter(PageView.created_at >= today_start).scalar() or 0
-    pageviews_7d = db.query(func.count(PageView.id)).filter(PageView.created_at >= cutoff_7d).scalar() or 0
-
-    # --- NEW: blog views ---
-    blog_views_30d = db.query(func.count(PageView.id)).filter(
-        PageView.created_at >= cutoff, PageView.page.like("/blog%")
-    ).scalar() or 0
-    blog_views_7d = db.query(func.count(PageView.id)).filter(
-        PageView.created_at >= cutoff_7d, PageView.page.like("/blog%")
-    ).scalar() or 0
-
-    blog_day_rows = (
-        db.query(
-            func.date(PageView.created_at).label("day"),
-            func.count(PageView.id).label("views"),
-        )
-        .filter(PageView.created_at >= cutoff, PageView.page.like("/blog%"))
-        .group_by(func.date(PageView.created_at))
-        .order_by(func.date(PageView.created_at))
-        .all()
-    )
-    blog_by_day = [{"date": str(r.day), "views": r.views} for r in blog_day_rows]
-
-    # --- Top blog articles (individual slugs) ---
-    blog_article_rows = (
-        db.query(
-            PageView.page,
-            func.count(PageView.id).label("views"),
-            func.count(distinct(PageView.ip_hash)).label("unique"),
-        )
-        .filter(
-            PageView.created_at >= cutoff,
-            PageView.page.like("/blog/%"),  # Only individual articles, not /blog listing
-            PageView.ip_hash != "", PageView.ip_hash.isnot(None),
-        )
-        .group_by(PageView.page)
-        .order_by(func.count(PageView.id).desc())
-        .limit(30)
-        .all()
-    )
-    top_blog_articles = [
-        {"page": r.page, "slug": r.page.replace("/blog/", ""), "views": r.views, "unique": r.unique}
-        for r in blog_article_rows
-    ]
-
-    # --- Biomarker page views ---
-    biomarker_views_30d = db.query(func.count(PageView.id)).filter(
-        PageView.created_at >= cutoff, PageView.page.like("/biomarker%")
-    ).scalar() or 0
-    biomarker_views_7d = db.query(func.count(PageView.id)).filter(
-        PageView.created_at >= cutoff_7d, PageView.page.like("/biomarker%")
-    ).scalar() or 0
-
-    biomarker_day_rows = (
-        db.query(
-            func.date(PageView.created_at).label("day"),
-            func.count(PageView.id).label("views"),
-        )
-        .filter(PageView.created_at >= cutoff, PageView.page.like("/biomarker%"))
-        .group_by(func.date(PageView.created_at))
-        .order_by(func.date(PageView.created_at))
-        .all()
-    )
-    biomarker_by_day = [{"date": str(r.day), "views": r.views} for r in biomarker_day_rows]
-
-    # Top biomarker pages (individual slugs)
-    top_biomarker_rows = (
-        db.query(
-            PageView.page,
-            func.count(PageView.id).label("views"),
-            func.count(distinct(PageView.ip_hash)).label("unique"),
-        )
-        .filter(
-            PageView.created_at >= cutoff,
-            PageView.page.like("/biomarker/%"),  # Only individual biomarker pages
-            PageView.ip_hash != "", PageView.ip_hash.isnot(None),
-        )
-        .group_by(PageView.page)
-        .order_by(func.count(PageView.id).desc())
-        .limit(20)
-        .all()
-    )
-    top_biomarkers = [
-        {"page": r.page, "slug": r.page.replace("/biomarker/", ""), "views": r.views, "unique": r.unique}
-        for r in top_biomarker_rows
-    ]
-
-    # --- Analyzer page views ---
-    analyzer_views_30d = db.query(func.count(PageView.id)).filter(
-        PageView.created_at >= cutoff, PageView.page.like("/analyzer%")
-    ).scalar() or 0
-    analyzer_views_7d = db.query(func.count(PageView.id)).filter(
-        PageView.created_at >= cutoff_7d, PageView.page.like("/analyzer%")
-    ).scalar() or 0
-
-    analyzer_day_rows = (
-        db.query(
-            func.date(PageView.created_at).label("day"),
-            func.count(PageView.id).label("views"),
-        )
-        .filter(PageView.created_at >= cutoff, PageView.page.like("/analyzer%"))
-        .group_by(func.date(PageView.created_at))
-        .order_by(func.date(PageView.created_at))
-        .all()
-    )
-    analyzer_by_day = [{"date": str(r.day), "views": r.views} for r in analyzer_day_rows]
-
-    # --- NEW: new accounts by day ---
+    # --- pageview breakdowns ---
+    pageviews_today = analytics_rollup.total_pageviews(db, today_start)
+    pageviews_7d = analytics_rollup.total_pageviews(db, cutoff_7d)
+
+    # --- blog views ---
+    blog_views_30d = analytics_rollup.total_pageviews(db, cutoff, prefix="/blog")
+    blog_views_7d = analytics_rollup.total_pageviews(db, cutoff_7d, prefix="/blog")
+    blog_by_day = _views_by_day(db, cutoff, "/blog")
+    # Individual articles only, not the /blog listing
+    top_blog_articles = [dict(r, slug=r["page"].replace("/blog/", "")) for r in _top(db, cutoff, "/blog/", 30)]
+
+    # --- biomarker page views ---
+    biomarker_views_30d = analytics_rollup.total_pageviews(db, cutoff, prefix="/biomarker")
+    biomarker_views_7d = analytics_rollup.total_pageviews(db, cutoff_7d, prefix="/biomarker")
+    biomarker_by_day = _views_by_day(db, cutoff, "/biomarker")
+    top_biomarkers = [dict(r, slug=r["page"].replace("/biomarker/", "")) for r in _top(db, cutoff, "/biomarker/", 20)]
+
+    # --- analyzer page views ---
+    analyzer_views_30d = analytics_rollup.total_pageviews(db, cutoff, prefix="/analyzer")
+    analyzer_views_7d = analytics_rollup.total_pageviews(db, cutoff_7d, prefix="/analyzer")
+    analyzer_by_day = _views_by_day(db, cutoff, "/analyzer")
+
+    # --- new accounts by day ---
     accounts_day_rows = (
         db.query(
             func.date(User.created_at).label("day"),
@@ -409,41 +216,16 @@ def analytics_dashboard(
     )
     new_accounts_by_day = [{"date": str(r.day), "count": r.count} for r in accounts_day_rows]
 
-    # --- NEW: visitor types ---
-    # Logged in: ip_hashes with at least one pageview with user_id set
-    logged_in_ips = db.query(func.count(distinct(PageView.ip_hash))).filter(
-        PageView.created_at >= cutoff,
-        PageView.user_id.isnot(None),
-        PageView.ip_hash != "", PageView.ip_hash.isnot(None)
-    ).scalar() or 0
-
-    # Refcode: visitors with utm_source/medium set but not logged in
-    refcode_ips = db.query(func.count(distinct(PageView.ip_hash))).filter(
-        PageView.created_at >= cutoff,
-        PageView.user_id.is_(None),
-        PageView.ip_hash != "", PageView.ip_hash.isnot(None),
-        (PageView.utm_source.isnot(None) | PageView.utm_medium.isnot(None))
-    ).scalar() or 0
-
-    anonymous_ips = max(0, unique_by_ip - logged_in_ips - refcode_ips)
-
-    # --- NEW: conversion from refcode visitors ---
-    # Count users who registered via a referral code
-    try:
-        from backend_v2.models import Referral
-    except ImportError:
-        from models import Referral
-    referral_registrations = 0
-    try:
-        referral_registrations = db.query(func.count(Referral.id)).filter(
-            Referral.created_at >= cutoff,
-            Referral.referred_id.isnot(None)
-        ).scalar() or 0
-    except Exception:
-        pass
+    # --- visitor types ---
+    # Logged in: visitors with at least one pageview with user_id set;
+    # refcode: visitors arriving with utm_source/medium, not logged in
+    visitor_types = analytics_rollup.unique_visitors(db, "visitor_type", cutoff)
+    logged_in_visitors = visitor_types.get("logged_in", 0)
+    refcode_visitors = visitor_types.get("refcode", 0)
+    anonymous_visitors = max(0, unique_visitors - logged_in_visitors - refcode_visitors)
 
     conversion_rate = 0.0
-    conversion_base = refcode_ips or unique_by_ip
+    conversion_base = refcode_visitors or unique_visitors
     if conversion_base > 0 and funnel.get("registered", 0) > 0:
         conversion_rate = round((funnel["registered"] / conversion_base) * 100, 1)
 
@@ -451,8 +233,8 @@ def analytics_dashboard(
         "period": period,
         "visitors": {
             "total": total_pv,
-            "unique": unique_sessions,
-            "returning": returning_sessions,
+            "unique": unique_visitors,
+            "returning": returning_visitors,
             "by_day": by_day,
         },
         "top_pages": top_pages,
@@ -462,7 +244,6 @@ def analytics_dashboard(
             "mobile": mobile_count,
             "desktop": desktop_count,
         },
-        # New fields for enhanced dashboard
         "total_users": total_users,
         "new_users_7d": new_users_7d,
         "pageviews_today": pageviews_today,
@@ -480,9 +261,9 @@ def analytics_dashboard(
         "analyzer_by_day": analyzer_by_day,
         "new_accounts_by_day": new_accounts_by_day,
         "visitor_types": {
-            "logged_in": logged_in_ips,
-            "refcode": refcode_ips,
-            "anonymous": anonymous_ips,
+            "logged_in": logged_in_visitors,
+            "refcode": refcode_visitors,
+            "anonymous": anonymous_visitors,
         },
         "conversion_30d": {
             "rate": conversion_rate,
@@ -14,10 +14,12 @@ try:
     from backend_v2.database import get_db
     from backend_v2.services.ai_service import AIService
     from backend_v2.models import TestResult, Document, HealthReport, LeadCapture
+    from backend_v2.services.rate_limiter import Rule, get_limiter
 except ImportError:
     from database import get_db
     from services.ai_service import AIService
     from models import TestResult, Document, HealthReport, LeadCapture
+    from services.rate_limiter import Rule, get_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -27,40 +29,17 @@ FREE_PREVIEW_COUNT = 5
 MAX_ANALYSES_PER_IP_PER_DAY = 3
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20 MB
 
-# ---------- In-memory rate limiter ----------
-_rate_limits: dict[str, list[float]] = {}
-_last_cleanup = time.time()
+_ANALYSIS_RULE = Rule(MAX_ANALYSES_PER_IP_PER_DAY, 86400)
 
-def _cleanup_rate_limits():
-    global _last_cleanup
-    now = time.time()
-    if now - _last_cleanup < 3600:
-        return
-    cutoff = now - 86400
-    to_delete = []
-    for ip, timestamps in _rate_limits.items():
-        _rate_limits[ip] = [t for t in timestamps if t > cutoff]
-        if not _rate_limits[ip]:
-            to_delete.append(ip)
-    for ip in to_delete:
-        del _rate_limits[ip]
-    _last_cleanup = now
 
 def _check_rate_limit(request: Request):
-    _cleanup_rate_limits()
     ip = request.client.host if request.client else "unknown"
     ip_hash = hashlib.sha256(ip.encode()).hexdigest()[:16]
-    now = time.time()
-    cutoff = now - 86400
-    hits = _rate_limits.get(ip_hash, [])
-    hits = [t for t in hits if t > cutoff]
-    if len(hits) >= MAX_ANALYSES_PER_IP_PER_DAY:
+    if not get_limiter().hit(f"analyzer:{ip_hash}", _ANALYSIS_RULE).allowed:
         raise HTTPException(
             status_code=429,
             detail="Daily analysis limit reached. Create a free account for unlimited access.",
         )
-    hits.append(now)
-    _rate_limits[ip_hash] = hits
 
 
 def _gate_results(results: list[dict], total: int) -> dict:
@@ -137,6 +116,7 @@ def analyze_text(
         "metadata": metadata,
         **_gate_results(results, len(results)),
         "message": f"Create a free account to see all {len(results)} biomarkers with AI specialist recommendations" if len(results) > FREE_PREVIEW_COUNT else None,
+        "partial": bool(data.get("partial")),
     }
 
 
@@ -189,30 +169,24 @@ def analyze_pdf(
         "metadata": metadata,
         **_gate_results(results, len(results)),
         "message": f"Create a free account to see all {len(results)} biomarkers with AI specialist recommendations" if len(results) > FREE_PREVIEW_COUNT else None,
+        "partial": bool(data.get("partial")),
     }
 
 
 # ---------- Nutrition Preview ----------
 MAX_NUTRITION_PREVIEW_PER_IP_PER_DAY = 1
-_nutrition_rate_limits: dict[str, list[float]] = {}
+_NUTRITION_RULE = Rule(MAX_NUTRITION_PREVIEW_PER_IP_PER_DAY, 86400)
 _nutrition_cache: dict[str, dict] = {}
 _nutrition_cache_times: dict[str, float] = {}
 
 def _check_nutrition_rate_limit(request: Request):
-    _cleanup_rate_limits()
     ip = request.client.host if request.client else "unknown"
     ip_hash = hashlib.sha256(ip.encode()).hexdigest()[:16]
-    now = time.time()
-    cutoff = now - 86400
-    hits = _nutrition_rate_limits.get(ip_hash, [])
-    hits = [t for t in hits if t > cutoff]
-    if len(hits) >= MAX_NUTRITION_PREVIEW_PER_IP_PER_DAY:
+    if not get_limiter().hit(f"nutrition_preview:{ip_hash}", _NUTRITION_RULE).allowed:
         raise HTTPException(
             status_code=429,
             detail="You can generate 1 nutrition preview per day. Create a free account for weekly meal plans.",
         )
-    hits.append(now)
-    _nutrition_rate_limits[ip_hash] = hits
 
 
 class NutritionPreviewRequest(BaseModel):
@@ -15,26 +15,34 @@ logger = logging.getLogger(__name__)
 try:
     from backend_v2.database import get_db
     from backend_v2.models import User
-    from backend_v2.auth.security import verify_password, get_password_hash, create_access_token
+    from backend_v2.auth.security import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_DAYS
     from backend_v2.auth.rate_limiter import check_login_rate_limit, check_register_rate_limit, reset_login_rate_limit, check_password_reset_rate_limit
     from backend_v2.services.email_service import get_email_service
     from backend_v2.services.audit_service import AuditService
-    from backend_v2.services.user_vault import UserVault, set_user_vault_session, get_user_vault, save_service_encrypted_key
+    from backend_v2.services.user_vault import UserVault, set_user_vault_session, get_user_vault, save_service_encrypted_key, end_user_vault_session, add_login_session
     from backend_v2.services.user_migration import setup_vault_for_legacy_user
 except ImportError:
     from database import get_db
     from models import User
-    from auth.security import verify_password, get_password_hash, create_access_token
+    from auth.security import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_DAYS
     from auth.rate_limiter import check_login_rate_limit, check_register_rate_limit, reset_login_rate_limit, check_password_reset_rate_limit
     from services.email_service import get_email_service
     from services.audit_service import AuditService
-    from services.user_vault import UserVault, set_user_vault_session, get_user_vault, save_service_encrypted_key
+    from services.user_vault import UserVault, set_user_vault_session, get_user_vault, save_service_encrypted_key, end_user_vault_session, add_login_session
     from services.user_migration import setup_vault_for_legacy_user
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+def issue_access_token(user: User) -> str:
+    """Access token for a new login session; the vault stays unlocked until its logout."""
+    session_id = secrets.token_urlsafe(16)
+    expires = timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
+    add_login_session(user.id, session_id, (datetime.now(timezone.utc) + expires).timestamp())
+    return create_access_token(data={"sub": user.email, "jti": session_id}, expires_delta=expires)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -228,7 +236,7 @@ def register(
             db.commit()
             referral_applied = True
 
-    access_token = create_access_token(data={"sub": new_user.email})
+    access_token = issue_access_token(new_user)
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -353,7 +361,7 @@ def login(
         status="success"
     )
 
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = issue_access_token(user)
     response = {
         "access_token": access_token,
         "token_type": "bearer",
@@ -494,7 +502,7 @@ async def google_login(token_data: GoogleToken, request: Request, db: Session =
     needs_vault_unlock = user.vault_data is not None
 
     # Generate access token
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = issue_access_token(user)
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -1031,6 +1039,42 @@ def get_vault_status(request: Request, db: Session = Depends(get_db)):
     }
 
 
+@router.post("/logout")
+def logout(request: Request, db: Session = Depends(get_db)):
+    """
+    End this login session. The user's last logout locks their vault on the
+    server and drops their decrypted data from memory.
+    """
+    from jose import jwt
+    try:
+        from backend_v2.auth.security import SECRET_KEY, ALGORITHM
+    except ImportError:
+        from auth.security import SECRET_KEY, ALGORITHM
+
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    token = auth_header.replace("Bearer ", "")
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        email: str = payload.get("sub")
+        if email is None:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    current_user = db.query(User).filter(User.email == email).first()
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    end_user_vault_session(current_user.id, payload.get("jti"))
+    AuditService(db).end_session(current_user.id, token)
+
+    return {"message": "Logged out"}
+
+
 class UnlockDataRequest(BaseModel):
     password: str
 
@@ -1,39 +1,28 @@
 """Blog API router for public SEO articles."""
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
-from datetime import datetime, timezone
 from typing import Optional
-import html as html_mod
 
 try:
     from backend_v2.database import get_db
     from backend_v2.models import User, BlogArticle
     from backend_v2.routers.documents import get_current_user
+    from backend_v2.services import search_index, sitemap_cache
 except ImportError:
     from database import get_db
     from models import User, BlogArticle
     from routers.documents import get_current_user
+    from services import search_index, sitemap_cache
 
 router = APIRouter(prefix="/blog", tags=["blog"])
 
 
-@router.get("/articles")
-def list_articles(
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=50),
-    tag: Optional[str] = None,
-    biomarker: Optional[str] = None,
-    db: Session = Depends(get_db),
-):
-    """Public: paginated list of published blog articles."""
-    query = db.query(BlogArticle).filter(BlogArticle.status == "published")
-
+def _filter_by_columns(query, tag: Optional[str], biomarker: Optional[str]):
+    """Substring filters, for when the search index can't answer (see list_articles)."""
     if tag:
         # Match tag in comma-separated tags field
         query = query.filter(BlogArticle.tags.ilike(f"%{tag}%"))
-
     if biomarker:
         # Search for biomarker name in tags, title, or content
         query = query.filter(
@@ -41,10 +30,38 @@ def list_articles(
             (BlogArticle.title.ilike(f"%{biomarker}%")) |
             (BlogArticle.content_html.ilike(f"%{biomarker}%"))
         )
+    return query
+
+
+@router.get("/articles")
+def list_articles(
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=50),
+    tag: Optional[str] = None,
+    biomarker: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Public: paginated list of published blog articles."""
+    query = db.query(BlogArticle).filter(BlogArticle.status == "published")
+    order = [desc(BlogArticle.published_at)]
+
+    # Tag (in the tags) and biomarker (anywhere in the article) go through the full-text
+    # index, unless a filter has no searchable terms or the index is missing articles
+    if tag or biomarker:
+        filters = [value for value in (tag, biomarker) if value]
+        matches = None
+        if all(search_index.terms(value) for value in filters) and search_index.articles_indexed(db):
+            matches = search_index.matching(db, biomarker, kinds=("blog",), tag=tag)
+        if matches is not None:
+            query = query.join(matches, matches.c.ref == BlogArticle.slug)
+            if biomarker:
+                order.insert(0, matches.c.rank)
+        else:
+            query = _filter_by_columns(query, tag, biomarker)
 
     total = query.count()
     articles = (
-        query.order_by(desc(BlogArticle.published_at))
+        query.order_by(*order)
         .offset((page - 1) * limit)
         .limit(limit)
         .all()
@@ -122,52 +139,35 @@ def list_tags(db: Session = Depends(get_db)):
     return {"tags": [{"tag": k, "count": v} for k, v in sorted(tag_counts.items(), key=lambda x: -x[1])]}
 
 
-@router.get("/feed.xml", include_in_schema=False)
-def blog_rss_feed(db: Session = Depends(get_db)):
-    """Public RSS 2.0 feed for blog articles."""
-    articles = (
-        db.query(BlogArticle)
-        .filter(BlogArticle.status == "published")
-        .order_by(desc(BlogArticle.published_at))
-        .limit(50)
-        .all()
+@router.get("/search")
+def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(blog|biomarker|condition)$"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    """Public: ranked full-text search over articles and the biomarker / condition pages."""
+    total, hits = search_index.search(
+        db, q, kinds=(kind,) if kind else None, limit=limit, offset=(page - 1) * limit
     )
+    return {
+        "results": [{"kind": k, "slug": ref, "title": title} for k, ref, title in hits],
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "has_more": page * limit < total,
+    }
 
-    base_url = "https://analize.online"
-    now = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000")
-
-    items = []
-    for a in articles:
-        pub_date = a.published_at.strftime("%a, %d %b %Y %H:%M:%S +0000") if a.published_at else now
-        item_title = html_mod.escape(a.title or "")
-        item_desc = html_mod.escape(a.meta_description or a.excerpt or "")
-        link = f"{base_url}/blog/{a.slug}"
-        items.append(
-            f"    <item>\n"
-            f"      <title>{item_title}</title>\n"
-            f"      <link>{link}</link>\n"
-            f"      <guid isPermaLink=\"true\">{link}</guid>\n"
-            f"      <description>{item_desc}</description>\n"
-            f"      <pubDate>{pub_date}</pubDate>\n"
-            f"    </item>"
-        )
-
-    xml = (
-        '<?xml version="1.0" encoding="UTF-8"?>\n'
-        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n'
-        '  <channel>\n'
-        f'    <title>Blog Sănătate — Analize.Online</title>\n'
-        f'    <link>{base_url}/blog</link>\n'
-        f'    <description>Articole despre sănătate, nutriție, rețete românești sănătoase, ghiduri biomarkeri și sfaturi de la specialiști AI.</description>\n'
-        f'    <language>ro</language>\n'
-        f'    <lastBuildDate>{now}</lastBuildDate>\n'
-        f'    <atom:link href="{base_url}/blog/feed.xml" rel="self" type="application/rss+xml" />\n'
-        + "\n".join(items) + "\n"
-        '  </channel>\n'
-        '</rss>\n'
-    )
 
-    return Response(content=xml, media_type="application/rss+xml; charset=utf-8")
+@router.get("/feed.xml", include_in_schema=False)
+def blog_rss_feed(request: Request, db: Session = Depends(get_db)):
+    """Public RSS 2.0 feed for blog articles (cached, see services/sitemap_cache)."""
+    document = sitemap_cache.rss_feed(db)
+    if document is None:
+        raise HTTPException(status_code=503, detail="Feed temporarily unavailable",
+                            headers={"Retry-After": "60"})
+    return sitemap_cache.respond(request, document)
 
 
 def _require_admin(current_user: User = Depends(get_current_user)):
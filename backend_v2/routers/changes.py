@@ -0,0 +1,193 @@
+"""
+Delta sync API: everything created, updated or deleted for the user since a cursor.
+"""
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, joinedload
+
+try:
+    from backend_v2.database import get_db
+    from backend_v2.models import (
+        User, Document, TestResult, HealthReport, Notification, Medication, MedicationLog,
+    )
+    from backend_v2.routers.documents import get_current_user
+    from backend_v2.routers.dashboard import get_biomarker_value, VaultRequiredError
+    from backend_v2.routers.health import get_report_content
+    from backend_v2.services import change_feed, data_version
+    from backend_v2.services.biomarker_normalizer import normalize_biomarker_name
+except ImportError:
+    from database import get_db
+    from models import (
+        User, Document, TestResult, HealthReport, Notification, Medication, MedicationLog,
+    )
+    from routers.documents import get_current_user
+    from routers.dashboard import get_biomarker_value, VaultRequiredError
+    from routers.health import get_report_content
+    from services import change_feed, data_version
+    from services.biomarker_normalizer import normalize_biomarker_name
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+# ETag / 304 from the user's data version (services/data_version)
+_unchanged = data_version.conditional_get(get_current_user)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _document(d: Document, user: User) -> dict:
+    # Same shape as GET /documents/
+    return {
+        "id": d.id,
+        "filename": d.filename,
+        "provider": d.provider,
+        "upload_date": _isoformat(d.upload_date),
+        "document_date": _isoformat(d.document_date),
+        "is_processed": d.is_processed,
+        "patient_name": d.patient_name,
+        "patient_cnp_prefix": d.patient_cnp_prefix
+    }
+
+
+def _test_result(r: TestResult, user: User) -> dict:
+    # Same shape as GET /dashboard/biomarkers
+    try:
+        value, numeric_value = get_biomarker_value(r, user.id, raise_on_vault_required=True)
+    except VaultRequiredError:
+        raise HTTPException(
+            status_code=503,
+            detail="Your vault is locked. Please log out and log back in to view your data."
+        )
+    return {
+        "id": r.id,
+        "name": r.test_name,
+        "normalized_name": r.canonical_name or normalize_biomarker_name(r.test_name)[0],
+        "value": numeric_value if numeric_value is not None else value,
+        "unit": r.unit,
+        "range": r.reference_range,
+        "ref_low": r.ref_low,
+        "ref_high": r.ref_high,
+        "date": r.document.document_date.strftime("%Y-%m-%d") if r.document.document_date else "Unknown",
+        "provider": r.document.provider,
+        "status": "normal" if r.flags == "NORMAL" else ("low" if r.flags == "LOW" else "high"),
+        "document_id": r.document_id
+    }
+
+
+def _health_report(r: HealthReport, user: User) -> dict:
+    # Same shape as GET /health/reports
+    content = get_report_content(r, user.id)
+    return {
+        "id": r.id,
+        "report_type": r.report_type,
+        "title": r.title,
+        "summary": content["summary"],
+        "risk_level": r.risk_level,
+        "biomarkers_analyzed": r.biomarkers_analyzed,
+        "created_at": _isoformat(r.created_at),
+        "findings": content["findings"],
+        "recommendations": content["recommendations"]
+    }
+
+
+def _notification(n: Notification, user: User) -> dict:
+    return {
+        "id": n.id,
+        "notification_type": n.notification_type,
+        "title": n.title,
+        "message": n.message,
+        "is_read": n.is_read,
+        "created_at": _isoformat(n.created_at)
+    }
+
+
+def _medication(m: Medication, user: User) -> dict:
+    # GET /medications without the per-day adherence (logs come as their own changes)
+    return {
+        "id": m.id,
+        "name": m.name,
+        "dosage": m.dosage,
+        "frequency": m.frequency,
+        "time_of_day": m.time_of_day,
+        "notes": m.notes,
+        "is_active": m.is_active,
+        "source": m.source,
+        "created_at": _isoformat(m.created_at),
+        "updated_at": _isoformat(m.updated_at)
+    }
+
+
+def _medication_log(log: MedicationLog, user: User) -> dict:
+    return {
+        "id": log.id,
+        "medication_id": log.medication_id,
+        "taken_at": _isoformat(log.taken_at),
+        "date": log.date,
+        "time_slot": log.time_slot
+    }
+
+
+# entity -> (model, serializer)
+_SERIALIZERS = {
+    "document": (Document, _document),
+    "test_result": (TestResult, _test_result),
+    "health_report": (HealthReport, _health_report),
+    "notification": (Notification, _notification),
+    "medication": (Medication, _medication),
+    "medication_log": (MedicationLog, _medication_log),
+}
+
+
+def _load(db: Session, user: User, entity: str, ids: List[int]) -> Dict[int, dict]:
+    model, serialize = _SERIALIZERS[entity]
+    query = db.query(model).filter(model.id.in_(ids))
+    if model is TestResult:
+        query = query.join(Document).options(joinedload(TestResult.document)).filter(Document.user_id == user.id)
+    else:
+        query = query.filter(model.user_id == user.id)
+    return {row.id: serialize(row, user) for row in query.all()}
+
+
+@router.get("", dependencies=[Depends(_unchanged)])
+def get_changes(
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=change_feed.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Changes to the user's documents, test results, health reports,
+    notifications, medications and medication logs after cursor, oldest first.
+
+    Apply each change in order: upsert "data" by (type, id), or remove the row
+    when "deleted" (a deleted document also removes its test results). When
+    "reset" is true, clear the local store first. Request again with the
+    returned cursor while "has_more" is true.
+    """
+    page = change_feed.read(db, current_user.id, cursor, limit)
+
+    ids_by_entity: Dict[str, List[int]] = {}
+    for change in page.changes:
+        if not change.deleted:
+            ids_by_entity.setdefault(change.entity, []).append(change.entity_id)
+    current = {entity: _load(db, current_user, entity, ids) for entity, ids in ids_by_entity.items()}
+
+    changes = []
+    for change in page.changes:
+        data = None if change.deleted else current[change.entity].get(change.entity_id)
+        changes.append({
+            "seq": change.id,
+            "type": change.entity,
+            "id": change.entity_id,
+            "deleted": data is None,  # Also when the row was deleted after its change was read
+            "data": data,
+        })
+
+    return {
+        "changes": changes,
+        "cursor": page.cursor,
+        "has_more": page.has_more,
+        "reset": page.reset,
+    }
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from typing import Optional
@@ -12,6 +13,12 @@ try:
         normalize_biomarker_name, get_canonical_name, group_biomarkers
     )
     from backend_v2.services.vault_helper import get_vault_helper
+    from backend_v2.services import report_cache
+    from backend_v2.services.health_events import list_events
+    from backend_v2.services.biomarker_trends import (
+        load_user_series, compute_trends, trends_to_records
+    )
+    from backend_v2.services import data_version, encrypted_records
 except ImportError:
     from database import get_db
     from models import User, Document, TestResult, HealthReport
@@ -20,6 +27,12 @@ except ImportError:
         normalize_biomarker_name, get_canonical_name, group_biomarkers
     )
     from services.vault_helper import get_vault_helper
+    from services import report_cache
+    from services.health_events import list_events
+    from services.biomarker_trends import (
+        load_user_series, compute_trends, trends_to_records
+    )
+    from services import data_version, encrypted_records
 
 
 class VaultRequiredError(Exception):
@@ -41,7 +54,7 @@ def get_biomarker_value(result: TestResult, user_id: int = None, raise_on_vault_
     numeric_value = None
 
     # Check if data is encrypted and we need vault
-    has_encrypted_data = result.value_enc is not None or result.numeric_value_enc is not None
+    has_encrypted_data = encrypted_records.has_encrypted_values(result)
     has_plaintext_data = result.value is not None or result.numeric_value is not None
 
     # Use per-user vault if user_id provided
@@ -49,10 +62,7 @@ def get_biomarker_value(result: TestResult, user_id: int = None, raise_on_vault_
         vault_helper = get_vault_helper(user_id)
         if vault_helper.is_available:
             try:
-                if result.value_enc:
-                    value = vault_helper.decrypt_data(result.value_enc)
-                if result.numeric_value_enc:
-                    numeric_value = vault_helper.decrypt_number(result.numeric_value_enc)
+                value, numeric_value = encrypted_records.read_result(result, vault_helper)
             except Exception:
                 # Decryption failed - check if we should raise or fall back
                 if raise_on_vault_required and not has_plaintext_data:
@@ -71,7 +81,10 @@ def get_biomarker_value(result: TestResult, user_id: int = None, raise_on_vault_
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
-@router.get("/stats")
+# ETag / 304 from the user's data version (services/data_version)
+_unchanged = data_version.conditional_get(get_current_user)
+
+@router.get("/stats", dependencies=[Depends(_unchanged)])
 def get_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     doc_count = len(current_user.documents)
 
@@ -95,63 +108,50 @@ def get_stats(db: Session = Depends(get_db), current_user: User = Depends(get_cu
         "biomarkers_count": len(unique_biomarkers),
     }
 
-@router.get("/evolution/{biomarker_name}")
+@router.get("/evolution/{biomarker_name}", dependencies=[Depends(_unchanged)])
 def get_evolution(biomarker_name: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Get evolution data for a biomarker.
     Uses normalized names to group related test variants together.
     """
-    # Get the canonical name for the requested biomarker
-    canonical_name = get_canonical_name(biomarker_name)
-
-    # Get all results for this user (eager load document to prevent N+1 queries)
-    all_results = db.query(TestResult).join(Document)\
+    # Match rows on the lightweight columnar series (canonical name, exact original
+    # name, or stored canonical name), then load and decrypt only the matches
+    series = load_user_series(db, current_user.id)
+    matched_ids = series.result_ids[series.match_mask(biomarker_name)]
+    if not len(matched_ids):
+        return []
+
+    matched_results = db.query(TestResult).join(Document)\
         .options(joinedload(TestResult.document))\
-        .filter(Document.user_id == current_user.id)\
+        .filter(Document.user_id == current_user.id, TestResult.id.in_(matched_ids.tolist()))\
         .order_by(Document.document_date)\
         .all()
 
-    # Filter to results that match the canonical name
-    # Use strict matching to avoid grouping unrelated biomarkers
     data_points = []
-    search_lower = biomarker_name.lower().strip()
-
-    for r in all_results:
-        result_canonical = get_canonical_name(r.test_name)
-        test_name_lower = r.test_name.lower().strip()
-
-        # Match criteria (strict):
-        # 1. Canonical names match exactly
-        # 2. Original test name matches the search term exactly (case-insensitive)
-        # 3. Stored canonical_name matches the search canonical name
-        is_match = (
-            result_canonical == canonical_name or
-            test_name_lower == search_lower or
-            (r.canonical_name and r.canonical_name.lower() == canonical_name.lower())
-        )
-
-        if is_match:
-            date_label = r.document.document_date.strftime("%Y-%m-%d") if r.document.document_date else "Unknown Date"
-            try:
-                value, numeric_value = get_biomarker_value(r, current_user.id, raise_on_vault_required=True)
-            except VaultRequiredError:
-                raise HTTPException(
-                    status_code=503,
-                    detail="Your vault is locked. Please log out and log back in to view your data."
-                )
-            data_points.append({
-                "date": date_label,
-                "value": numeric_value,
-                "unit": r.unit,
-                "ref_range": r.reference_range,
-                "flags": r.flags,
-                "original_name": r.test_name,
-                "provider": r.document.provider
-            })
+    for r in matched_results:
+        date_label = r.document.document_date.strftime("%Y-%m-%d") if r.document.document_date else "Unknown Date"
+        try:
+            value, numeric_value = get_biomarker_value(r, current_user.id, raise_on_vault_required=True)
+        except VaultRequiredError:
+            raise HTTPException(
+                status_code=503,
+                detail="Your vault is locked. Please log out and log back in to view your data."
+            )
+        data_points.append({
+            "date": date_label,
+            "value": numeric_value,
+            "unit": r.unit,
+            "ref_range": r.reference_range,
+            "ref_low": r.ref_low,
+            "ref_high": r.ref_high,
+            "flags": r.flags,
+            "original_name": r.test_name,
+            "provider": r.document.provider
+        })
 
     return data_points
 
-@router.get("/biomarkers")
+@router.get("/biomarkers", dependencies=[Depends(_unchanged)])
 def get_all_biomarkers(db: Session = Depends(get_db), current_user: User = Depends(get_current_user), filter_out_of_range: bool = False):
     query = db.query(TestResult).join(Document)\
         .options(joinedload(TestResult.document))\
@@ -183,6 +183,8 @@ def get_all_biomarkers(db: Session = Depends(get_db), current_user: User = Depen
             "value": numeric_value if numeric_value is not None else value,
             "unit": r.unit,
             "range": r.reference_range,
+            "ref_low": r.ref_low,
+            "ref_high": r.ref_high,
             "date": r.document.document_date.strftime("%Y-%m-%d") if r.document.document_date else "Unknown",
             "provider": r.document.provider,
             "status": "normal" if r.flags == "NORMAL" else ("low" if r.flags == "LOW" else "high"),
@@ -192,7 +194,7 @@ def get_all_biomarkers(db: Session = Depends(get_db), current_user: User = Depen
     return biomarkers
 
 
-@router.get("/biomarkers-grouped")
+@router.get("/biomarkers-grouped", dependencies=[Depends(_unchanged)])
 def get_grouped_biomarkers(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -233,6 +235,8 @@ def get_grouped_biomarkers(
             "value": numeric_value if numeric_value is not None else value,
             "unit": r.unit,
             "range": r.reference_range,
+            "ref_low": r.ref_low,
+            "ref_high": r.ref_high,
             "date": r.document.document_date.strftime("%Y-%m-%d") if r.document.document_date else "Unknown",
             "provider": r.document.provider,
             "status": "normal" if r.flags == "NORMAL" else ("low" if r.flags == "LOW" else "high"),
@@ -272,7 +276,7 @@ def get_grouped_biomarkers(
     return result
 
 
-@router.get("/recent-biomarkers")
+@router.get("/recent-biomarkers", dependencies=[Depends(_unchanged)])
 def get_recent_biomarkers(db: Session = Depends(get_db), current_user: User = Depends(get_current_user), limit: int = 5):
     """Get most recent unique biomarkers for dashboard display (using normalized names)."""
     # Get distinct test names with their most recent result (eager load document to prevent N+1 queries)
@@ -308,7 +312,7 @@ def get_recent_biomarkers(db: Session = Depends(get_db), current_user: User = De
     return recent
 
 
-@router.get("/alerts-count")
+@router.get("/alerts-count", dependencies=[Depends(_unchanged)])
 def get_alerts_count(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Count biomarkers that are out of normal range."""
     count = db.query(TestResult).join(Document)\
@@ -318,7 +322,7 @@ def get_alerts_count(db: Session = Depends(get_db), current_user: User = Depends
     return {"alerts_count": count}
 
 
-@router.get("/patient-info")
+@router.get("/patient-info", dependencies=[Depends(_unchanged)])
 def get_patient_info(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Get information about patients found in user's documents.
 
@@ -390,7 +394,7 @@ def get_patient_info(db: Session = Depends(get_db), current_user: User = Depends
     }
 
 
-@router.get("/health-overview")
+@router.get("/health-overview", dependencies=[Depends(_unchanged)])
 def get_health_overview(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Get a comprehensive health overview for the dashboard.
@@ -496,18 +500,21 @@ def get_health_overview(db: Session = Depends(get_db), current_user: User = Depe
         .order_by(HealthReport.created_at.desc())\
         .first()
 
+    # Decrypted once and reused for risk level and AI summary
+    latest_content = None
+    if latest_report and vault_helper.is_available and latest_report.content_enc:
+        try:
+            latest_content = report_cache.get_report_json(latest_report, current_user.id, vault_helper)
+        except (json.JSONDecodeError, TypeError, ValueError):
+            latest_content = None
+
     if latest_report:
         health_status["has_analysis"] = True
         health_status["last_analysis_date"] = latest_report.created_at.isoformat()
 
         # Decrypt report content for risk level
-        if vault_helper.is_available and latest_report.content_enc:
-            try:
-                import json
-                content = json.loads(vault_helper.decrypt_data(latest_report.content_enc))
-                health_status["risk_level"] = content.get("risk_level", "unknown")
-            except (json.JSONDecodeError, TypeError, ValueError):
-                health_status["risk_level"] = "unknown"
+        if latest_content:
+            health_status["risk_level"] = latest_content.get("risk_level", "unknown")
         else:
             health_status["risk_level"] = "unknown"
 
@@ -550,8 +557,7 @@ def get_health_overview(db: Session = Depends(get_db), current_user: User = Depe
 
     if gap_analysis and vault_helper.is_available and gap_analysis.content_enc:
         try:
-            import json
-            content = json.loads(vault_helper.decrypt_data(gap_analysis.content_enc))
+            content = report_cache.get_report_json(gap_analysis, current_user.id, vault_helper)
             recommended = content.get("recommended_tests", [])
             for test in recommended:
                 if test.get("is_overdue"):
@@ -566,13 +572,8 @@ def get_health_overview(db: Session = Depends(get_db), current_user: User = Depe
 
     # --- Latest AI Summary ---
     ai_summary = None
-    if latest_report and vault_helper.is_available and latest_report.content_enc:
-        try:
-            import json
-            content = json.loads(vault_helper.decrypt_data(latest_report.content_enc))
-            ai_summary = content.get("summary", "")
-        except (json.JSONDecodeError, TypeError, ValueError):
-            pass  # AI summary content parsing failed
+    if latest_content:
+        ai_summary = latest_content.get("summary", "")
     # Fallback to legacy unencrypted field
     if not ai_summary and latest_report and latest_report.summary:
         ai_summary = latest_report.summary
@@ -588,7 +589,7 @@ def get_health_overview(db: Session = Depends(get_db), current_user: User = Depe
     }
 
 
-@router.get("/health-score")
+@router.get("/health-score", dependencies=[Depends(_unchanged)])
 def get_health_score(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Calculate and return the user's health score (0-100)."""
     try:
@@ -600,94 +601,50 @@ def get_health_score(db: Session = Depends(get_db), current_user: User = Depends
     return calculate_health_score(current_user, db, vault_helper)
 
 
-@router.get("/timeline")
-def get_health_timeline(
-    limit: int = 20,
+@router.get("/trends", dependencies=[Depends(_unchanged)])
+def get_biomarker_trends(
+    biomarker: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Get a chronological timeline of health events for the dashboard.
-    Events include: document syncs, AI analyses, biomarker changes, screenings.
+    Get per-biomarker trend statistics: slope, percent change, rolling baseline,
+    out-of-range streaks and reference-range crossings.
+    Optionally restricted to a single biomarker (by canonical name).
     """
-    from collections import defaultdict
-
-    events = []
-
-    # --- Documents synced/uploaded ---
-    docs = db.query(Document)\
-        .filter(Document.user_id == current_user.id)\
-        .order_by(Document.upload_date.desc())\
-        .limit(20)\
-        .all()
-
-    for doc in docs:
-        events.append({
-            "type": "document",
-            "icon": "file",
-            "title": doc.filename or "Document",
-            "subtitle": doc.provider or "Upload",
-            "date": doc.upload_date.isoformat() if doc.upload_date else None,
-            "link": "/documents"
-        })
+    vault_helper = get_vault_helper(current_user.id)
+    series = load_user_series(db, current_user.id, vault_helper)
+    if len(series) and not vault_helper.is_available:
+        raise HTTPException(
+            status_code=503,
+            detail="Your vault is locked. Please log out and log back in to view your data."
+        )
 
-    # --- AI Analyses completed ---
-    reports = db.query(HealthReport)\
-        .filter(HealthReport.user_id == current_user.id, HealthReport.report_type == "general")\
-        .order_by(HealthReport.created_at.desc())\
-        .limit(10)\
-        .all()
+    trends = compute_trends(series)
+    canonical_name = get_canonical_name(biomarker) if biomarker else None
+    return trends_to_records(trends, canonical_name)
 
-    for report in reports:
-        events.append({
-            "type": "analysis",
-            "icon": "brain",
-            "title": "AI Health Analysis",
-            "subtitle": f"{report.biomarkers_analyzed} biomarkers analyzed" if report.biomarkers_analyzed else "Analysis complete",
-            "date": report.created_at.isoformat() if report.created_at else None,
-            "link": "/health",
-            "risk_level": report.risk_level
-        })
 
-    # --- Biomarker improvements (abnormal -> normal) ---
-    # Get biomarkers with multiple readings
-    results = db.query(TestResult).join(Document)\
-        .filter(Document.user_id == current_user.id)\
-        .order_by(Document.document_date.asc())\
-        .all()
+@router.get("/timeline", dependencies=[Depends(_unchanged)])
+def get_health_timeline(
+    response: Response,
+    limit: int = 20,
+    before: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get a chronological timeline of health events for the dashboard.
+    Events include: document syncs, AI analyses, biomarker range crossings.
 
-    history = defaultdict(list)
-    for r in results:
-        key = r.canonical_name or r.test_name
-        history[key].append({
-            "flags": r.flags,
-            "date": r.document.document_date.isoformat() if r.document.document_date else None
-        })
+    Newest first. For the next page pass the X-Next-Cursor response header
+    as `before`; the header is absent on the last page.
+    """
+    try:
+        events, next_cursor = list_events(db, current_user.id, limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    for name, readings in history.items():
-        if len(readings) >= 2:
-            prev = readings[-2]
-            current = readings[-1]
-            if prev["flags"] != "NORMAL" and current["flags"] == "NORMAL":
-                events.append({
-                    "type": "improvement",
-                    "icon": "trending_up",
-                    "title": f"{name} returned to normal",
-                    "subtitle": f"Was {prev['flags'].lower()}, now normal",
-                    "date": current["date"],
-                    "link": f"/evolution/{name}"
-                })
-            elif prev["flags"] == "NORMAL" and current["flags"] != "NORMAL":
-                events.append({
-                    "type": "alert",
-                    "icon": "alert",
-                    "title": f"{name} went out of range",
-                    "subtitle": f"Now {current['flags'].lower()}",
-                    "date": current["date"],
-                    "link": f"/evolution/{name}"
-                })
-
-    # Sort all events by date descending
-    events.sort(key=lambda e: e.get("date") or "0000", reverse=True)
-
-    return events[:limit]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return events
@@ -16,22 +16,30 @@ try:
     from backend_v2.routers.auth import oauth2_scheme
     from backend_v2.services.ai_parser import AIParser
     from backend_v2.services.biomarker_normalizer import get_canonical_name
+    from backend_v2.services.reference_ranges import apply_reference_range
+    from backend_v2.services.health_events import safe_record_document_events, delete_document_events, delete_analysis_events
     from backend_v2.services.vault_helper import get_vault_helper
     from backend_v2.services.vault import VaultLockedError
     from backend_v2.services.subscription_service import SubscriptionService
     from backend_v2.services.audit_service import AuditService
+    from backend_v2.services import sync_status
     from backend_v2.services.biomarker_categories import get_category_keywords, get_all_categories
+    from backend_v2.services import data_version, encrypted_records
 except ImportError:
     from database import get_db
     from models import User, Document, TestResult, HealthReport
     from routers.auth import oauth2_scheme
     from services.ai_parser import AIParser
     from services.biomarker_normalizer import get_canonical_name
+    from services.reference_ranges import apply_reference_range
+    from services.health_events import safe_record_document_events, delete_document_events, delete_analysis_events
     from services.vault_helper import get_vault_helper
     from services.vault import VaultLockedError
     from services.subscription_service import SubscriptionService
     from services.audit_service import AuditService
+    from services import sync_status
     from services.biomarker_categories import get_category_keywords, get_all_categories
+    from services import data_version, encrypted_records
 
 
 def get_encrypted_storage_path() -> Path:
@@ -126,7 +134,10 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
-@router.get("/stats")
+# ETag / 304 from the user's data version (services/data_version)
+_unchanged = data_version.conditional_get(get_current_user)
+
+@router.get("/stats", dependencies=[Depends(_unchanged)])
 def get_document_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -158,7 +169,7 @@ def get_document_stats(
     }
 
 
-@router.get("/")
+@router.get("/", dependencies=[Depends(_unchanged)])
 def list_documents(
     limit: int = None,
     offset: int = 0,
@@ -433,7 +444,7 @@ def download_document(doc_id: int, db: Session = Depends(get_db), current_user:
     )
 
 
-@router.get("/{doc_id}/biomarkers")
+@router.get("/{doc_id}/biomarkers", dependencies=[Depends(_unchanged)])
 def get_document_biomarkers(doc_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Get all biomarkers from a specific document."""
     doc = db.query(Document).filter(
@@ -457,10 +468,7 @@ def get_document_biomarkers(doc_id: int, db: Session = Depends(get_db), current_
 
         if vault_helper.is_available:
             try:
-                if r.value_enc:
-                    value = vault_helper.decrypt_data(r.value_enc)
-                if r.numeric_value_enc:
-                    numeric_value = vault_helper.decrypt_number(r.numeric_value_enc)
+                value, numeric_value = encrypted_records.read_result(r, vault_helper)
             except Exception:
                 pass
 
@@ -613,6 +621,7 @@ def process_document(doc_id: int, db: Session):
 
     # Get user's vault helper
     vault_helper = get_vault_helper(doc.user_id)
+    sync_status.set_status(doc.user_id, sync_status.UPLOAD_CHANNEL, "reading", f"Reading {doc.filename}...")
 
     # Read PDF content - handle both encrypted and unencrypted
     import pdfplumber
@@ -626,6 +635,7 @@ def process_document(doc_id: int, db: Session):
             pdf_file = doc.file_path
         else:
             logging.error(f"No valid file path for document {doc.id}")
+            sync_status.status_error(doc.user_id, sync_status.UPLOAD_CHANNEL, "Document file not found")
             return
 
         with pdfplumber.open(pdf_file) as pdf:
@@ -633,9 +643,11 @@ def process_document(doc_id: int, db: Session):
                 full_text += (page.extract_text() or "") + "\n"
     except Exception as e:
         logging.error(f"Error reading PDF for document {doc.id}: {e}")
+        sync_status.status_error(doc.user_id, sync_status.UPLOAD_CHANNEL, "Could not read the PDF")
         return
 
     # AI Parse
+    sync_status.set_status(doc.user_id, sync_status.UPLOAD_CHANNEL, "processing", f"Extracting results from {doc.filename}...")
     parser = AIParser() # Ensure API Key is set in ENV
     result = parser.parse_text(full_text)
 
@@ -653,12 +665,11 @@ def process_document(doc_id: int, db: Session):
                  reference_range=r.get("reference_range"),
                  flags=r.get("flags", "NORMAL"),
              )
+             apply_reference_range(tr)
 
              # Encrypt values if user's vault is unlocked
              if vault_helper.is_available:
-                 tr.value_enc = vault_helper.encrypt_data(value_str)
-                 if numeric_val is not None:
-                     tr.numeric_value_enc = vault_helper.encrypt_number(numeric_val)
+                 tr.record_enc = encrypted_records.encrypt_result(vault_helper, value_str, numeric_val)
              else:
                  # Fall back to unencrypted storage
                  tr.value = value_str
@@ -698,7 +709,12 @@ def process_document(doc_id: int, db: Session):
                 if user and not user.blood_type:
                     user.blood_type = blood_type
 
+        safe_record_document_events(db, doc)
         db.commit()
+        sync_status.set_status(doc.user_id, sync_status.UPLOAD_CHANNEL, "complete",
+                               f"Processed {doc.filename}", 1, 1, is_complete=True)
+    else:
+        sync_status.status_error(doc.user_id, sync_status.UPLOAD_CHANNEL, "No results could be extracted", "sync_error")
 
 def _safe_float(val):
     """Safely convert a value to float, returning None on failure."""
@@ -798,7 +814,8 @@ def delete_document(
     # Store document info for audit log before deletion
     doc_filename = doc.filename
 
-    # Delete associated test results
+    # Delete timeline events (while its results still show which neighbours to fix) and test results
+    delete_document_events(db, [doc_id])
     db.query(TestResult).filter(TestResult.document_id == doc_id).delete()
 
     # Delete the file from disk if it exists
@@ -821,6 +838,7 @@ def delete_document(
     # Delete existing health reports (they're now outdated)
     if regenerate_reports:
         db.query(HealthReport).filter(HealthReport.user_id == current_user.id).delete()
+        delete_analysis_events(db, current_user.id)
 
     db.commit()
 
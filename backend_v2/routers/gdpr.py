@@ -22,9 +22,10 @@ try:
         User, Document, TestResult, HealthReport, LinkedAccount,
         Subscription, UsageTracker, FamilyGroup, FamilyMember,
         AuditLog, UserSession, SyncJob, Notification, NotificationPreference,
-        PushSubscription, AbuseFlag, UsageMetrics, OpenAIUsageLog
+        PushSubscription, AbuseFlag, UsageMetrics, OpenAIUsageLog, HealthEvent
     )
-    from backend_v2.services.user_vault import get_user_vault
+    from backend_v2.services.user_vault import get_user_vault, clear_user_vault_session
+    from backend_v2.services import encrypted_records
 except ImportError:
     from database import get_db
     from routers.documents import get_current_user
@@ -32,9 +33,10 @@ except ImportError:
         User, Document, TestResult, HealthReport, LinkedAccount,
         Subscription, UsageTracker, FamilyGroup, FamilyMember,
         AuditLog, UserSession, SyncJob, Notification, NotificationPreference,
-        PushSubscription, AbuseFlag, UsageMetrics, OpenAIUsageLog
+        PushSubscription, AbuseFlag, UsageMetrics, OpenAIUsageLog, HealthEvent
     )
-    from services.user_vault import get_user_vault
+    from services.user_vault import get_user_vault, clear_user_vault_session
+    from services import encrypted_records
 
 logger = logging.getLogger(__name__)
 
@@ -174,15 +176,15 @@ async def export_user_data(
                 "category": result.category,
             }
             # Decrypt values if available
-            if user_vault and user_vault.is_unlocked:
-                if result.value_enc and not result.value:
-                    bio_data["value"] = decrypt_if_possible(
-                        result.value_enc, user_vault, user_vault.decrypt_data
-                    )
-                if result.numeric_value_enc and result.numeric_value is None:
-                    bio_data["numeric_value"] = decrypt_if_possible(
-                        result.numeric_value_enc, user_vault, user_vault.decrypt_number
-                    )
+            if user_vault and user_vault.is_unlocked and encrypted_records.has_encrypted_values(result):
+                try:
+                    value, numeric_value = encrypted_records.read_result(result, user_vault)
+                except Exception:
+                    value = numeric_value = "[decryption failed]"
+                if value is not None and not result.value:
+                    bio_data["value"] = value
+                if numeric_value is not None and result.numeric_value is None:
+                    bio_data["numeric_value"] = numeric_value
             biomarkers.append(bio_data)
     export_data["biomarkers"] = biomarkers
 
@@ -200,7 +202,9 @@ async def export_user_data(
         }
         # Decrypt if needed
         if report.content_enc and not report.summary and user_vault and user_vault.is_unlocked:
-            content = decrypt_if_possible(report.content_enc, user_vault, user_vault.decrypt_json)
+            content = decrypt_if_possible(
+                report.content_enc, user_vault, lambda blob: encrypted_records.read_report(user_vault, blob)
+            )
             if isinstance(content, dict):
                 report_data["summary"] = content.get("summary")
                 report_data["findings"] = content.get("findings")
@@ -338,6 +342,7 @@ async def delete_user_account(
     try:
         # 1. Delete health reports
         db.query(HealthReport).filter(HealthReport.user_id == user_id).delete()
+        db.query(HealthEvent).filter(HealthEvent.user_id == user_id).delete()
 
         # 2. Get document IDs and delete biomarkers
         documents = db.query(Document).filter(Document.user_id == user_id).all()
@@ -409,6 +414,7 @@ async def delete_user_account(
         db.query(User).filter(User.id == user_id).delete()
 
         db.commit()
+        clear_user_vault_session(user_id)
 
         logger.info(f"Account deletion completed for user {user_id}")
 
@@ -13,18 +13,24 @@ try:
     from backend_v2.routers.documents import get_current_user
     from backend_v2.services.health_agents import HealthAnalysisService, SpecialistAgent
     from backend_v2.services.vault_helper import get_vault_helper
+    from backend_v2.services import report_cache
+    from backend_v2.services.health_events import record_analysis_event
     from backend_v2.services.notification_service import notify_analysis_complete
     from backend_v2.services.subscription_service import SubscriptionService
     from backend_v2.services.audit_service import AuditService
+    from backend_v2.services import data_version, encrypted_records
 except ImportError:
     from database import get_db
     from models import User, Document, TestResult, HealthReport
     from routers.documents import get_current_user
     from services.health_agents import HealthAnalysisService, SpecialistAgent
     from services.vault_helper import get_vault_helper
+    from services import report_cache
+    from services.health_events import record_analysis_event
     from services.notification_service import notify_analysis_complete
     from services.subscription_service import SubscriptionService
     from services.audit_service import AuditService
+    from services import data_version, encrypted_records
 
 
 def get_report_content(report: HealthReport, user_id: int = None) -> dict:
@@ -38,7 +44,7 @@ def get_report_content(report: HealthReport, user_id: int = None) -> dict:
         vault_helper = get_vault_helper(user_id)
         if vault_helper.is_available:
             try:
-                content = vault_helper.decrypt_json(report.content_enc)
+                content = report_cache.get_report_json(report, user_id, vault_helper)
                 summary = content.get("summary", "")
                 findings = content.get("findings", [])
                 recommendations = content.get("recommendations", [])
@@ -91,7 +97,9 @@ def save_report_content(report: HealthReport, summary: str, findings: list, reco
                 "findings": findings,
                 "recommendations": recommendations
             }
-            report.content_enc = vault_helper.encrypt_json(content)
+            report.content_enc = encrypted_records.encrypt_report(vault_helper, content)
+            if report.id is not None:
+                report_cache.invalidate_report(report.id)
             # Clear legacy fields
             report.summary = None
             report.findings = None
@@ -104,8 +112,97 @@ def save_report_content(report: HealthReport, summary: str, findings: list, reco
         report.findings = json.dumps(findings)
         report.recommendations = json.dumps(recommendations)
 
+
+# Report types that are not part of a general/specialist analysis session
+NON_SESSION_REPORT_TYPES = ("general", "gap_analysis", "nutrition", "exercise")
+
+
+def encrypt_analysis_state(state: dict, user_id: int) -> Optional[bytes]:
+    """Vault-encrypt a report's analysis state, or None when the vault is locked (the next analysis runs in full)."""
+    vault_helper = get_vault_helper(user_id)
+    if not vault_helper.is_available:
+        return None
+    return encrypted_records.encrypt_report(vault_helper, state)
+
+
+def read_analysis_state(report: HealthReport, user_id: int) -> Optional[dict]:
+    """Decrypted analysis state of a report, or None if it has none or it cannot be read."""
+    if not report.analysis_state_enc:
+        return None
+    try:
+        state = encrypted_records.read_report(get_vault_helper(user_id), report.analysis_state_enc)
+    except Exception:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def load_previous_analysis(db: Session, user_id: int) -> Optional[dict]:
+    """Load the latest analysis session in the shape used for incremental analysis.
+
+    Returns None when there is no session with stored state, or its content
+    cannot be decrypted right now (a full analysis is run instead).
+    """
+    from datetime import timedelta
+
+    general = db.query(HealthReport)\
+        .filter(HealthReport.user_id == user_id)\
+        .filter(HealthReport.report_type == "general")\
+        .order_by(desc(HealthReport.created_at))\
+        .first()
+
+    if not general or not general.analysis_state_enc:
+        return None
+    if not get_vault_helper(user_id).is_available:
+        return None
+
+    state = read_analysis_state(general, user_id)
+    if state is None:
+        return None
+
+    content = get_report_content(general, user_id)
+    previous = {
+        "general": dict(content, risk_level=general.risk_level),
+        "context_fingerprint": state.get("context_fingerprint"),
+        "marker_digests": state.get("marker_digests", {}),
+        "specialists": {}
+    }
+
+    # Same session window as /health/history
+    specialist_reports = db.query(HealthReport)\
+        .filter(HealthReport.user_id == user_id)\
+        .filter(HealthReport.report_type.notin_(NON_SESSION_REPORT_TYPES))\
+        .filter(HealthReport.created_at >= general.created_at - timedelta(minutes=1))\
+        .filter(HealthReport.created_at <= general.created_at + timedelta(minutes=5))\
+        .filter(HealthReport.analysis_state_enc.isnot(None))\
+        .all()
+
+    for r in specialist_reports:
+        spec_state = read_analysis_state(r, user_id)
+        if spec_state is None:
+            continue
+        config = spec_state.get("config") or {}
+        r_content = get_report_content(r, user_id)
+        previous["specialists"][r.report_type] = {
+            "fingerprint": spec_state.get("fingerprint"),
+            "config": config,
+            "content": {
+                "specialty": r.report_type,
+                "summary": r_content["summary"],
+                "risk_level": r.risk_level,
+                "key_findings": r_content["findings"],
+                "recommendations": r_content["recommendations"],
+                "referral_reasoning": config.get("reasoning", "")
+            }
+        }
+
+    return previous
+
+
 router = APIRouter(prefix="/health", tags=["health"])
 
+# ETag / 304 from the user's data version (services/data_version)
+_unchanged = data_version.conditional_get(get_current_user)
+
 
 def get_user_biomarkers(db: Session, user_id: int) -> list:
     """Get all biomarkers for a user in analysis-ready format."""
@@ -125,10 +222,7 @@ def get_user_biomarkers(db: Session, user_id: int) -> list:
 
         if vault_helper.is_available:
             try:
-                if r.value_enc:
-                    value = vault_helper.decrypt_data(r.value_enc)
-                if r.numeric_value_enc:
-                    numeric_value = vault_helper.decrypt_number(r.numeric_value_enc)
+                value, numeric_value = encrypted_records.read_result(r, vault_helper)
             except Exception:
                 pass
 
@@ -143,6 +237,8 @@ def get_user_biomarkers(db: Session, user_id: int) -> list:
             "value": numeric_value if numeric_value is not None else value,
             "unit": r.unit,
             "range": r.reference_range,
+            "ref_low": r.ref_low,
+            "ref_high": r.ref_high,
             "date": r.document.document_date.strftime("%Y-%m-%d") if r.document.document_date else "Unknown",
             "status": "normal" if r.flags == "NORMAL" else "abnormal",
             "flags": r.flags
@@ -276,10 +372,16 @@ def get_user_profile(user: User, user_id: int = None) -> dict:
 @router.post("/analyze")
 def run_health_analysis(
     request: Request,
+    incremental: bool = True,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Run a full health analysis and save the report."""
+    """Run a health analysis and save the report.
+
+    By default the analysis is incremental: only markers that changed since the
+    previous session are sent to the generalist, and specialists whose markers
+    did not change are carried forward. Pass incremental=false for a full run.
+    """
     audit = AuditService(db)
     ip_address = request.client.host if request.client else None
     user_agent = request.headers.get("user-agent")
@@ -310,12 +412,26 @@ def run_health_analysis(
     # Get user's profile for context
     user_profile = get_user_profile(current_user)
 
+    previous = load_previous_analysis(db, current_user.id) if incremental else None
+
     try:
         service = HealthAnalysisService(language=user_language, profile=user_profile)
-        analysis = service.run_full_analysis(biomarkers)
+        analysis = service.run_incremental_analysis(biomarkers, previous)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+    # Nothing changed since the previous session: no new reports, no quota used
+    if analysis["delta"]["mode"] == "unchanged":
+        return {
+            "status": "unchanged",
+            "general": analysis.get("general"),
+            "specialists": analysis.get("specialists"),
+            "analyzed_at": analysis.get("analyzed_at"),
+            "delta": analysis.get("delta")
+        }
+
+    state = analysis.get("state", {})
+
     # Save general report
     general = analysis.get("general", {})
     report = HealthReport(
@@ -323,7 +439,13 @@ def run_health_analysis(
         report_type="general",
         title="Comprehensive Health Analysis",
         risk_level=general.get("risk_level", "normal"),
-        biomarkers_analyzed=len(biomarkers)
+        biomarkers_analyzed=len(biomarkers),
+        analysis_state_enc=encrypt_analysis_state({
+            "mode": analysis["delta"]["mode"],
+            "fingerprint": state.get("fingerprint"),
+            "context_fingerprint": state.get("context_fingerprint"),
+            "marker_digests": state.get("marker_digests", {})
+        }, current_user.id)
     )
     save_report_content(
         report,
@@ -336,12 +458,18 @@ def run_health_analysis(
 
     # Save specialist reports
     for specialty, specialist_data in analysis.get("specialists", {}).items():
+        specialist_state = state.get("specialists", {}).get(specialty, {})
         specialist_report = HealthReport(
             user_id=current_user.id,
             report_type=specialty,
             title=f"{specialty.title()} Analysis",
             risk_level=specialist_data.get("risk_level", "normal"),
-            biomarkers_analyzed=len(specialist_data.get("key_findings", []))
+            biomarkers_analyzed=len(specialist_data.get("key_findings", [])),
+            analysis_state_enc=encrypt_analysis_state({
+                "mode": specialist_state.get("mode"),
+                "fingerprint": specialist_state.get("fingerprint"),
+                "config": specialist_state.get("config", {})
+            }, current_user.id) if specialist_state else None
         )
         save_report_content(
             specialist_report,
@@ -358,6 +486,12 @@ def run_health_analysis(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save reports: {str(e)}")
 
+    try:
+        record_analysis_event(db, report)
+        db.commit()
+    except Exception:
+        db.rollback()  # Timeline event is best-effort; the report is saved
+
     # Increment AI usage counter
     subscription_service.increment_ai_usage(current_user.id)
 
@@ -370,7 +504,9 @@ def run_health_analysis(
         details={
             "biomarkers_analyzed": len(biomarkers),
             "risk_level": general.get("risk_level", "normal"),
-            "specialists_count": len(analysis.get("specialists", {}))
+            "specialists_count": len(analysis.get("specialists", {})),
+            "mode": analysis["delta"]["mode"],
+            "changed_markers": analysis["delta"].get("changed_markers")
         },
         ip_address=ip_address,
         user_agent=user_agent,
@@ -398,11 +534,12 @@ def run_health_analysis(
         "status": "success",
         "general": analysis.get("general"),
         "specialists": analysis.get("specialists"),
-        "analyzed_at": analysis.get("analyzed_at")
+        "analyzed_at": analysis.get("analyzed_at"),
+        "delta": analysis.get("delta")
     }
 
 
-@router.get("/reports")
+@router.get("/reports", dependencies=[Depends(_unchanged)])
 def get_reports(
     report_type: Optional[str] = None,
     limit: int = 10,
@@ -436,7 +573,7 @@ def get_reports(
     return result
 
 
-@router.get("/reports/{report_id}")
+@router.get("/reports/{report_id}", dependencies=[Depends(_unchanged)])
 def get_report(
     report_id: int,
     db: Session = Depends(get_db),
@@ -465,7 +602,7 @@ def get_report(
     }
 
 
-@router.get("/latest")
+@router.get("/latest", dependencies=[Depends(_unchanged)])
 def get_latest_report(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -795,7 +932,7 @@ def run_gap_analysis(
     }
 
 
-@router.get("/gap-analysis/latest")
+@router.get("/gap-analysis/latest", dependencies=[Depends(_unchanged)])
 def get_latest_gap_analysis(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -825,7 +962,7 @@ def get_latest_gap_analysis(
     }
 
 
-@router.get("/history")
+@router.get("/history", dependencies=[Depends(_unchanged)])
 def get_report_history(
     limit: int = 20,
     db: Session = Depends(get_db),
@@ -894,7 +1031,7 @@ def get_report_history(
     return {"sessions": sessions, "total": len(sessions)}
 
 
-@router.get("/compare/{report_id_1}/{report_id_2}")
+@router.get("/compare/{report_id_1}/{report_id_2}", dependencies=[Depends(_unchanged)])
 def compare_reports(
     report_id_1: int,
     report_id_2: int,
@@ -20,6 +20,8 @@ try:
     )
     from backend_v2.services.health_agents import LifestyleAnalysisService, NutritionAgent, format_profile_context
     from backend_v2.services.vault_helper import get_vault_helper
+    from backend_v2.services import report_cache
+    from backend_v2.services import encrypted_records
     from backend_v2.services.subscription_service import SubscriptionService
     from backend_v2.services.audit_service import AuditService
 except ImportError:
@@ -32,6 +34,8 @@ except ImportError:
     )
     from services.health_agents import LifestyleAnalysisService, NutritionAgent, format_profile_context
     from services.vault_helper import get_vault_helper
+    from services import report_cache
+    from services import encrypted_records
     from services.subscription_service import SubscriptionService
     from services.audit_service import AuditService
 
@@ -223,7 +227,7 @@ def run_lifestyle_analysis(
     vault_helper = get_vault_helper(current_user.id)
     if vault_helper.is_available:
         # Store full data encrypted
-        nutrition_report.content_enc = vault_helper.encrypt_json(nutrition_data)
+        nutrition_report.content_enc = encrypted_records.encrypt_report(vault_helper, nutrition_data)
     else:
         # No vault - store full JSON in summary field so we can parse it back
         nutrition_report.summary = json.dumps(nutrition_data)
@@ -239,7 +243,7 @@ def run_lifestyle_analysis(
         biomarkers_analyzed=len(biomarkers)
     )
     if vault_helper.is_available:
-        exercise_report.content_enc = vault_helper.encrypt_json(exercise_data)
+        exercise_report.content_enc = encrypted_records.encrypt_report(vault_helper, exercise_data)
     else:
         exercise_report.summary = json.dumps(exercise_data)
     db.add(exercise_report)
@@ -340,7 +344,7 @@ def regenerate_menu(
     )
     vault_helper = get_vault_helper(current_user.id)
     if vault_helper.is_available:
-        nutrition_report.content_enc = vault_helper.encrypt_json(nutrition_data)
+        nutrition_report.content_enc = encrypted_records.encrypt_report(vault_helper, nutrition_data)
     else:
         nutrition_report.summary = json.dumps(nutrition_data)
     db.add(nutrition_report)
@@ -408,7 +412,7 @@ def _get_lifestyle_report_content(report: HealthReport, user_id: int) -> dict:
         vault_helper = get_vault_helper(user_id)
         if vault_helper.is_available:
             try:
-                data = vault_helper.decrypt_json(report.content_enc)
+                data = report_cache.get_report_json(report, user_id, vault_helper)
                 return _unwrap_lifestyle_data(data)
             except Exception:
                 pass
@@ -13,15 +13,20 @@ try:
     from backend_v2.models import User, Notification, NotificationPreference
     from backend_v2.services.notification_service import NotificationService
     from backend_v2.services.push_service import PushNotificationService, get_vapid_public_key
+    from backend_v2.services import data_version
 except ImportError:
     from database import get_db
     from routers.documents import get_current_user
     from models import User, Notification, NotificationPreference
     from services.notification_service import NotificationService
     from services.push_service import PushNotificationService, get_vapid_public_key
+    from services import data_version
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+# ETag / 304 from the user's data version (services/data_version)
+_unchanged = data_version.conditional_get(get_current_user)
+
 
 class NotificationPreferencesUpdate(BaseModel):
     email_new_documents: Optional[bool] = None
@@ -86,7 +91,7 @@ class NotificationResponse(BaseModel):
     created_at: datetime
 
 
-@router.get("/preferences", response_model=NotificationPreferencesResponse)
+@router.get("/preferences", response_model=NotificationPreferencesResponse, dependencies=[Depends(_unchanged)])
 def get_notification_preferences(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -178,7 +183,7 @@ def update_notification_preferences(
     )
 
 
-@router.get("/", response_model=List[NotificationResponse])
+@router.get("/", response_model=List[NotificationResponse], dependencies=[Depends(_unchanged)])
 def list_notifications(
     limit: int = 50,
     unread_only: bool = False,
@@ -206,7 +211,7 @@ def list_notifications(
     ]
 
 
-@router.get("/unread-count")
+@router.get("/unread-count", dependencies=[Depends(_unchanged)])
 def get_unread_count(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -4,23 +4,32 @@ Google recommends "dynamic rendering" for SPAs: detect bot user-agents and
 serve HTML with real meta tags + content snippets so the page is indexable
 without waiting for JS execution.
 
-This router handles requests from Nginx for bot user-agents, reads the
-frontend index.html, and injects route-specific meta tags + visible content.
+This router handles requests from Nginx for bot user-agents and fills the
+compiled frontend index.html with route-specific meta tags + visible content.
+Rendered pages are cached per path (see services/prerender_cache) and
+answered with 304 when the crawler already has them.
 """
 import os
-import re
 import json
 import logging
-from fastapi import APIRouter, Depends, Request
+import time
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi.responses import HTMLResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 try:
     from backend_v2.database import get_db
     from backend_v2.models import BlogArticle
+    from backend_v2.services import prerender_cache
+    from backend_v2.services.prerender_cache import CompiledTemplate, RenderedPage
 except ImportError:
     from database import get_db
     from models import BlogArticle
+    from services import prerender_cache
+    from services.prerender_cache import CompiledTemplate, RenderedPage
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["seo"])
@@ -111,74 +120,83 @@ STATIC_META = {
 }
 
 
-def _get_index_html() -> str:
-    """Read the built frontend index.html."""
-    paths = [
-        os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend_v2", "dist", "index.html")),
-        "/opt/healthy/frontend_v2/dist/index.html",
-    ]
-    for p in paths:
-        if os.path.exists(p):
-            with open(p, "r", encoding="utf-8") as f:
-                return f.read()
-    return ""
+# Seconds between checks for blog articles published by other processes
+BLOG_VERSION_SECONDS = 60
+_blog_version: Optional[tuple] = None
+_blog_checked = 0.0
 
 
-def _inject_meta(html: str, title: str, description: str, url: str, extra_head: str = "", body_content: str = "", og_image: str = "") -> str:
-    """Replace meta tags in the HTML template."""
-    # Replace title
-    html = re.sub(r"<title>[^<]*</title>", f"<title>{_escape(title)}</title>", html)
+def _inject_meta(template: CompiledTemplate, title: str, description: str, url: str, extra_head: str = "", body_content: str = "", og_image: str = "") -> str:
+    """Fill the template's meta slots."""
+    return template.render(title=title, description=description, url=url, og_image=og_image,
+                           extra_head=extra_head, body=body_content)
 
-    # Replace meta description
-    html = re.sub(
-        r'<meta name="description" content="[^"]*"',
-        f'<meta name="description" content="{_escape(description)}"',
-        html,
-    )
 
-    # Replace OG tags
-    html = re.sub(r'<meta property="og:title" content="[^"]*"', f'<meta property="og:title" content="{_escape(title)}"', html)
-    html = re.sub(r'<meta property="og:description" content="[^"]*"', f'<meta property="og:description" content="{_escape(description)}"', html)
-    html = re.sub(r'<meta property="og:url" content="[^"]*"', f'<meta property="og:url" content="{_escape(url)}"', html)
+_escape = prerender_cache.escape
 
-    if og_image:
-        html = re.sub(r'<meta property="og:image" content="[^"]*"', f'<meta property="og:image" content="{_escape(og_image)}"', html)
-        html = re.sub(r'<meta name="twitter:image" content="[^"]*"', f'<meta name="twitter:image" content="{_escape(og_image)}"', html)
 
-    # Replace Twitter tags
-    html = re.sub(r'<meta name="twitter:title" content="[^"]*"', f'<meta name="twitter:title" content="{_escape(title)}"', html)
-    html = re.sub(r'<meta name="twitter:description" content="[^"]*"', f'<meta name="twitter:description" content="{_escape(description)}"', html)
+def _check_blog_version(db: Session):
+    """Drop cached blog pages when the published articles changed (at most every BLOG_VERSION_SECONDS)."""
+    global _blog_version, _blog_checked
+    now = time.monotonic()
+    if now - _blog_checked < BLOG_VERSION_SECONDS:
+        return
+    _blog_checked = now
+    version = tuple(db.query(func.count(BlogArticle.id), func.max(BlogArticle.updated_at)).filter(
+        BlogArticle.status == "published"
+    ).one())
+    if _blog_version is not None and version != _blog_version:
+        prerender_cache.invalidate("/blog")
+    _blog_version = version
 
-    # Replace canonical
-    html = re.sub(r'<link rel="canonical" href="[^"]*"', f'<link rel="canonical" href="{_escape(url)}"', html)
 
-    # Inject extra head content (JSON-LD, etc.)
-    if extra_head:
-        html = html.replace("</head>", f"{extra_head}\n</head>")
-
-    # Inject visible content for crawlers (inside root div)
-    if body_content:
-        html = html.replace('<div id="root"></div>', f'<div id="root">{body_content}</div>')
-
-    return html
-
-
-def _escape(s: str) -> str:
-    """Escape HTML special chars for attribute values."""
-    return s.replace("&", "&amp;").replace('"', "&quot;").replace("<", "&lt;").replace(">", "&gt;")
+def _not_modified(request: Request, page: RenderedPage) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or page.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return page.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
 
 
 @router.get("/prerender/{path:path}", include_in_schema=False)
-def prerender_page(path: str, db: Session = Depends(get_db)):
+def prerender_page(path: str, request: Request, db: Session = Depends(get_db)):
     """Serve pre-rendered HTML with proper meta tags for search engine crawlers.
 
     Called by Nginx when it detects a bot user-agent.
     """
-    html = _get_index_html()
-    if not html:
+    template = prerender_cache.get_template()
+    if template is None:
         return HTMLResponse(content="<html><body>Page not found</body></html>", status_code=404)
 
-    clean_path = f"/{path}".rstrip("/") if path else "/"
+    clean_path = _page_path(f"/{path}".rstrip("/") if path else "/")
+    if clean_path.startswith("/blog"):
+        _check_blog_version(db)
+    page = prerender_cache.get_page(clean_path, lambda: _render_page(template, clean_path, db))
+
+    headers = {"ETag": page.etag, "Last-Modified": format_datetime(page.last_modified, usegmt=True)}
+    if _not_modified(request, page):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=page.html, headers=headers)
+
+
+def _page_path(clean_path: str) -> str:
+    """The path to render: unknown paths all share the "/" page (and its cache entry)."""
+    if clean_path in STATIC_META or clean_path.startswith("/blog/"):
+        return clean_path
+    if clean_path.startswith("/biomarker/") and clean_path[11:] in _biomarkers:
+        return clean_path
+    if clean_path.startswith("/analize-pentru/") and clean_path[16:] in _conditions:
+        return clean_path
+    return "/"
+
+
+def _render_page(template: CompiledTemplate, clean_path: str, db: Session) -> RenderedPage:
     url = f"{BASE_URL}{clean_path}" if clean_path != "/" else BASE_URL
 
     # Blog article
@@ -204,8 +222,8 @@ def prerender_page(path: str, db: Session = Depends(get_db)):
             extra = f'<script type="application/ld+json">{json_ld}</script>'
             # Inject article content for crawlers
             body = f'<article><h1>{_escape(article.title)}</h1><p>{_escape(desc)}</p>{article.content_html or ""}</article>'
-            result = _inject_meta(html, title, desc, url, extra, body)
-            return HTMLResponse(content=result)
+            result = _inject_meta(template, title, desc, url, extra, body)
+            return prerender_cache.make_page(result, article.updated_at or article.published_at)
 
     # Biomarker page
     if clean_path.startswith("/biomarker/") and len(clean_path) > 11:
@@ -292,8 +310,8 @@ def prerender_page(path: str, db: Session = Depends(get_db)):
                 f'<p>Verifică-ți valorile gratuit cu <a href="{BASE_URL}/analyzer">Analizatorul Gratuit Analize.Online</a>.</p>'
                 f'</article>'
             )
-            result = _inject_meta(html, title, desc, url, extra, body)
-            return HTMLResponse(content=result)
+            result = _inject_meta(template, title, desc, url, extra, body)
+            return prerender_cache.make_page(result)
 
     # Condition landing page
     if clean_path.startswith("/analize-pentru/") and len(clean_path) > 16:
@@ -320,13 +338,28 @@ def prerender_page(path: str, db: Session = Depends(get_db)):
             description = cond.get("description_ro", "")
             biomarker_names = [_biomarkers.get(s, {}).get("name_ro", s) for s in cond.get("biomarkers", [])]
             body = f'<article><h1>{_escape(name)}</h1><p>{_escape(description)}</p><h2>Biomarkeri verificați</h2><p>{", ".join(_escape(n) for n in biomarker_names)}</p></article>'
-            result = _inject_meta(html, title, desc, url, extra, body)
-            return HTMLResponse(content=result)
+            result = _inject_meta(template, title, desc, url, extra, body)
+            return prerender_cache.make_page(result)
 
     # Static pages
     meta = STATIC_META.get(clean_path, STATIC_META.get("/"))
     title = meta["title"]
     desc = meta["description"]
     og_image = meta.get("og_image", "")
-    result = _inject_meta(html, title, desc, url, og_image=og_image)
-    return HTMLResponse(content=result)
+    result = _inject_meta(template, title, desc, url, og_image=og_image)
+    return prerender_cache.make_page(result)
+
+
+def warm_up(db: Session) -> int:
+    """Render every known page into the cache; returns how many were rendered."""
+    template = prerender_cache.get_template()
+    if template is None:
+        return 0
+    paths = list(STATIC_META)
+    paths += [f"/biomarker/{slug}" for slug in _biomarkers]
+    paths += [f"/analize-pentru/{slug}" for slug in _conditions]
+    paths += [f"/blog/{slug}" for (slug,) in db.query(BlogArticle.slug).filter(BlogArticle.status == "published")]
+    for path in paths:
+        prerender_cache.get_page(path, lambda path=path: _render_page(template, path, db))
+    logger.info(f"SEO prerender: warmed {len(paths)} pages")
+    return len(paths)
@@ -11,11 +11,13 @@ try:
     from backend_v2.models import User, HealthReport, SharedReport
     from backend_v2.routers.documents import get_current_user
     from backend_v2.services.vault_helper import get_vault_helper
+    from backend_v2.services import report_cache
 except ImportError:
     from database import get_db
     from models import User, HealthReport, SharedReport
     from routers.documents import get_current_user
     from services.vault_helper import get_vault_helper
+    from services import report_cache
 
 
 router = APIRouter(prefix="/sharing", tags=["sharing"])
@@ -187,7 +189,7 @@ def view_shared_report(
         content = {}
         if vault_helper.is_available and report.content_enc:
             try:
-                content = json.loads(vault_helper.decrypt_data(report.content_enc))
+                content = report_cache.get_report_json(report, shared.user_id, vault_helper)
             except Exception:
                 content = {"summary": "Content unavailable", "findings": "", "recommendations": ""}
         else:
@@ -17,6 +17,7 @@ try:
     from backend_v2.services.subscription_service import SubscriptionService, TIER_LIMITS, PRICING
     from backend_v2.services.netopia_service import get_netopia_service
     from backend_v2.services.user_vault import get_user_vault
+    from backend_v2.services import encrypted_records
 except ImportError:
     from database import get_db
     from routers.documents import get_current_user
@@ -24,6 +25,7 @@ except ImportError:
     from services.subscription_service import SubscriptionService, TIER_LIMITS, PRICING
     from services.netopia_service import get_netopia_service
     from services.user_vault import get_user_vault
+    from services import encrypted_records
 
 router = APIRouter(prefix="/subscription", tags=["subscription"])
 
@@ -733,16 +735,12 @@ def get_biomarker_value_for_family(result: TestResult, target_user_id: int) -> d
         values_available = True
 
     # If no plaintext, try decrypting with owner's vault
-    if not values_available and (result.value_enc or result.numeric_value_enc):
+    if not values_available and encrypted_records.has_encrypted_values(result):
         user_vault = get_user_vault(target_user_id)
         if user_vault and user_vault.is_unlocked:
             try:
-                if result.value_enc:
-                    value = user_vault.decrypt_data(result.value_enc)
-                    values_available = True
-                if result.numeric_value_enc:
-                    numeric_value = user_vault.decrypt_number(result.numeric_value_enc)
-                    values_available = True
+                value, numeric_value = encrypted_records.read_result(result, user_vault)
+                values_available = value is not None or numeric_value is not None
             except Exception:
                 pass
 
@@ -1032,7 +1030,7 @@ def get_family_member_reports(
             user_vault = get_user_vault(user_id)
             if user_vault and user_vault.is_unlocked:
                 try:
-                    content = user_vault.decrypt_json(report.content_enc)
+                    content = encrypted_records.read_report(user_vault, report.content_enc)
                     summary = content.get("summary")
                     findings = content.get("findings")
                     recommendations = content.get("recommendations")
@@ -1,46 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, date, timezone
 import json
-import hashlib
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def calculate_file_hash(file_path: str) -> str:
-    """Calculate MD5 hash of a file for duplicate detection."""
-    hash_md5 = hashlib.md5()
-    try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    except Exception:
-        return None
-
 try:
-    from backend_v2.database import get_db
+    from backend_v2.database import get_db, SessionLocal
     from backend_v2.models import User, LinkedAccount
+    from backend_v2.routers.auth import oauth2_scheme
     from backend_v2.routers.documents import get_current_user
-    from backend_v2.services import sync_status
+    from backend_v2.services import sync_status, progress_bus, sync_watermark, sync_queue, encrypted_records
     from backend_v2.auth.crypto import encrypt_password, decrypt_password
     from backend_v2.services.vault_helper import get_vault_helper, VaultHelper
-    from backend_v2.services.user_vault import get_user_vault, is_user_vault_unlocked
+    from backend_v2.services.user_vault import get_user_vault, is_user_vault_unlocked, clear_user_vault_session, has_service_vault
     from backend_v2.services.vault import VaultLockedError
     from backend_v2.services.subscription_service import SubscriptionService
     from backend_v2.auth.rate_limiter import check_profile_scan_rate_limit
 except ImportError:
-    from database import get_db
+    from database import get_db, SessionLocal
     from models import User, LinkedAccount
+    from routers.auth import oauth2_scheme
     from routers.documents import get_current_user
-    from services import sync_status
+    from services import sync_status, progress_bus, sync_watermark, sync_queue, encrypted_records
     from auth.crypto import encrypt_password, decrypt_password
     from services.vault_helper import get_vault_helper, VaultHelper
-    from services.user_vault import get_user_vault, is_user_vault_unlocked
+    from services.user_vault import get_user_vault, is_user_vault_unlocked, clear_user_vault_session, has_service_vault
     from services.vault import VaultLockedError
     from services.subscription_service import SubscriptionService
     from auth.rate_limiter import check_profile_scan_rate_limit
@@ -696,12 +687,7 @@ def link_account(
 
         # Auto-trigger sync if credentials were updated after an error
         if was_in_error:
-            background_tasks.add_task(
-                run_sync_task,
-                current_user.id,
-                account.provider_name,
-                existing.id
-            )
+            start_sync(background_tasks, db, existing)
             return {"message": "Account updated", "sync_triggered": True}
 
         return {"message": "Account updated", "sync_triggered": False}
@@ -718,13 +704,46 @@ def link_account(
 
 @router.get("/sync-status/{provider_name}")
 def get_sync_status(provider_name: str, current_user: User = Depends(get_current_user)):
-    """Get current sync status for a provider."""
+    """Get current sync status for a provider. Clients should prefer /sync-events over polling this."""
     status = sync_status.get_status(current_user.id, provider_name)
     if status:
         return status
     return {"stage": "idle", "message": "No sync in progress"}
 
 
+def get_stream_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    """Authenticate a long-lived stream without holding a DB session open for its lifetime."""
+    db = SessionLocal()
+    try:
+        return get_current_user(token, db).id
+    finally:
+        db.close()
+
+
+@router.get("/sync-events")
+async def stream_sync_events(request: Request, user_id: int = Depends(get_stream_user_id)):
+    """
+    Server-sent events stream of sync and upload progress for all providers.
+    Sends the current state of each provider on connect, then one "progress"
+    event per update (coalesced when the client is slow).
+    """
+    async def events():
+        async for update in progress_bus.subscribe(user_id):
+            if await request.is_disconnected():
+                break
+            if update is None:
+                yield ": keepalive\n\n"
+                continue
+            provider_name, status = update
+            payload = dict(status, provider=provider_name)
+            yield f"event: progress\nid: {status['version']}\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # don't let a proxy buffer the stream
+    })
+
+
 @router.post("/sync/{provider_name}")
 async def sync_provider(
     provider_name: str,
@@ -753,19 +772,69 @@ async def sync_provider(
     # Check if sync already in progress
     current_status = sync_status.get_status(current_user.id, provider_name)
     if current_status and not current_status.get("is_complete", True):
-        return {"status": "in_progress", "message": "Sync already in progress"}
+        return {"status": "in_progress", "message": "Sync already in progress",
+                "version": current_status.get("version", 0)}
 
-    # Start sync in background
-    sync_status.status_starting(current_user.id, provider_name)
+    # Start sync in background (refused while a scheduled or worker sync runs the account)
+    if not start_sync(background_tasks, db, link):
+        return {"status": "in_progress", "message": "Sync already in progress",
+                "version": (sync_status.get_status(current_user.id, provider_name) or {}).get("version", 0)}
+    started = sync_status.status_starting(current_user.id, provider_name)
 
-    background_tasks.add_task(
-        run_sync_task,
-        current_user.id,
-        provider_name,
-        link.id
-    )
+    # Statuses on /sync-events with a lower version belong to earlier syncs
+    return {"status": "started", "message": "Sync started. Follow /sync-events for progress.",
+            "version": started["version"]}
+
+
+def start_sync(background_tasks: BackgroundTasks, db: Session, account: LinkedAccount) -> bool:
+    """
+    Queue a manual sync for a crawler worker, or claim its job and run it in
+    this process (SYNC_EXECUTION=inline). False if the account's job is
+    already running elsewhere.
+
+    Workers can only open vaults with the service key, so users without a
+    service-encrypted key sync inline here, where their vault is unlocked.
+    """
+    if sync_queue.use_worker() and has_service_vault(db.get(User, account.user_id)):
+        sync_queue.enqueue(db, account, source="manual")
+        return True
+    job = sync_queue.enqueue_claimed(db, account, sync_queue.INLINE_WORKER_ID, source="manual")
+    if not job:
+        return False
+    background_tasks.add_task(run_sync_job, job.id)
+    return True
+
+
+def run_sync_job(job_id: int):
+    """Run a claimed manual sync job under its lease and record the outcome on the job."""
+    try:
+        from backend_v2.models import SyncJob
+    except ImportError:
+        from models import SyncJob
+
+    db = SessionLocal()
+    try:
+        job = db.get(SyncJob, job_id)
+        with sync_queue.hold_lease(job) as lease:
+            run_sync_task(job.user_id, job.provider_name, job.linked_account_id)
+            # run_sync_task reports through the sync status only
+            status = sync_status.get_status(job.user_id, job.provider_name) or {}
+            error = status.get("message", "Sync failed") if status.get("is_error") else None
+            if lease.lost and not error:
+                error = "Sync lost its lease"
+            sync_queue.finish(db, job, error=error)
+    finally:
+        db.close()
 
-    return {"status": "started", "message": "Sync started. Check /sync-status for progress."}
+
+def _lease_lost(db: Session, user_id: int, provider_name: str) -> bool:
+    """True (and nothing written) once the sync's job was reclaimed or its lease given up."""
+    if sync_queue.holds_lease(db, user_id, provider_name):
+        return False
+    db.rollback()
+    logger.warning(f"Sync of {provider_name} for user {user_id} lost its lease - discarding this run's outcome")
+    sync_status.status_error(user_id, provider_name, "Sync was stopped: it ran too long or was taken over")
+    return True
 
 
 def run_sync_task(user_id: int, provider_name: str, account_id: int):
@@ -816,19 +885,20 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
     try:
         sync_status.status_logging_in(user_id, provider_name)
 
-        # Run crawler
+        # Run crawler (incremental: documents synced before are skipped)
+        watermark = sync_watermark.load(account)
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
         try:
             if provider_name == "Regina Maria":
-                res = loop.run_until_complete(run_regina_async(username, password, user_id=user_id))
+                res = loop.run_until_complete(run_regina_async(username, password, user_id=user_id, watermark=watermark))
             elif provider_name == "Synevo":
-                res = loop.run_until_complete(run_synevo_async(username, password, user_id=user_id))
+                res = loop.run_until_complete(run_synevo_async(username, password, user_id=user_id, watermark=watermark))
             elif provider_name == "MedLife":
-                res = loop.run_until_complete(run_medlife_async(username, password, user_id=user_id))
+                res = loop.run_until_complete(run_medlife_async(username, password, user_id=user_id, watermark=watermark))
             elif provider_name == "Sanador":
-                res = loop.run_until_complete(run_sanador_async(username, password, user_id=user_id))
+                res = loop.run_until_complete(run_sanador_async(username, password, user_id=user_id, watermark=watermark))
             else:
                 sync_status.status_error(user_id, provider_name, "Unknown provider")
                 return
@@ -841,6 +911,10 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
 
         docs = res.get("documents", [])
         if not docs:
+            if _lease_lost(db, user_id, provider_name):
+                return
+            sync_watermark.record(account, watermark)
+            db.commit()
             sync_status.status_complete(user_id, provider_name, 0)
             return
 
@@ -849,10 +923,16 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
             from backend_v2.models import Document, TestResult
             from backend_v2.services.ai_service import AIService
             from backend_v2.services.biomarker_normalizer import get_canonical_name
+            from backend_v2.services.reference_ranges import apply_reference_range
+            from backend_v2.services.health_events import safe_record_document_events
+            from backend_v2.services.sync_ingest import select_new_documents, insert_documents
         except ImportError:
             from models import Document, TestResult
             from services.ai_service import AIService
             from services.biomarker_normalizer import get_canonical_name
+            from services.reference_ranges import apply_reference_range
+            from services.health_events import safe_record_document_events
+            from services.sync_ingest import select_new_documents, insert_documents
 
         try:
             ai_service = AIService()
@@ -861,77 +941,48 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
             return
 
         count_processed = 0
-        total_docs = len(docs)
-
-        for i, doc_info in enumerate(docs):
-            sync_status.status_processing(user_id, provider_name, i + 1, total_docs)
-
-            # Calculate file hash for robust duplicate detection
-            file_hash = calculate_file_hash(doc_info["local_path"])
-
-            # Check for duplicate by file hash (most reliable)
-            if file_hash:
-                existing_by_hash = db.query(Document).filter(
-                    Document.user_id == user_id,
-                    Document.file_hash == file_hash
-                ).first()
-
-                if existing_by_hash:
-                    # Same file already imported, skip
-                    continue
 
-            # Fallback: check by filename
-            existing_doc = db.query(Document).filter(
-                Document.user_id == user_id,
-                Document.filename == doc_info["filename"]
-            ).first()
-
-            if existing_doc:
-                continue
-
-            # Create Document with file_hash and encrypt with user vault
+        # Hash everything once, drop known files with set-based lookups, and
+        # create the remaining documents in a single transaction
+        from pathlib import Path
+        new_docs = select_new_documents(db, user_id, docs)
+        documents = insert_documents(db, [
+            Document(
+                user_id=user_id,
+                filename=doc_info["filename"],
+                file_hash=doc_info["file_hash"],
+                provider=provider_name,
+                document_date=doc_info["date"],
+                upload_date=datetime.now(),
+                is_processed=False,
+                is_encrypted=True
+            )
+            for doc_info in new_docs
+        ])
+        local_paths = {doc_info["filename"]: doc_info["local_path"] for doc_info in new_docs}
+        keys = {doc_info["filename"]: doc_info.get("key") for doc_info in new_docs}
+
+        # Encrypt with user vault, saved under the document ID
+        encrypted_dir = Path("data/encrypted") / str(user_id)
+        encrypted_dir.mkdir(parents=True, exist_ok=True)
+        for new_doc in documents:
             try:
-                # Read the downloaded file
-                from pathlib import Path
-                pdf_content = Path(doc_info["local_path"]).read_bytes()
-
-                # Encrypt with user vault
-                encrypted_content = vault_helper.encrypt_document(pdf_content)
-
-                # Save encrypted file
-                encrypted_dir = Path("data/encrypted") / str(user_id)
-                encrypted_dir.mkdir(parents=True, exist_ok=True)
-
-                # Create document first to get ID
-                new_doc = Document(
-                    user_id=user_id,
-                    filename=doc_info["filename"],
-                    file_hash=file_hash,
-                    provider=provider_name,
-                    document_date=doc_info["date"],
-                    upload_date=datetime.now(),
-                    is_processed=False,
-                    is_encrypted=True
-                )
-                db.add(new_doc)
-                db.commit()
-                db.refresh(new_doc)
-
-                # Save encrypted content with document ID
+                pdf_content = Path(local_paths[new_doc.filename]).read_bytes()
                 encrypted_path = encrypted_dir / f"{new_doc.id}.enc"
-                encrypted_path.write_bytes(encrypted_content)
+                encrypted_path.write_bytes(vault_helper.encrypt_document(pdf_content))
                 new_doc.encrypted_path = str(encrypted_path)
-                db.commit()
-
-                # Delete unencrypted file
-                try:
-                    os.remove(doc_info["local_path"])
-                except Exception:
-                    pass  # Ignore if delete fails
-
             except Exception as e:
-                logger.warning(f"Failed to create document {doc_info['filename']}: {e}")
-                continue
+                logger.warning(f"Failed to store document {new_doc.filename}: {e}")
+                db.delete(new_doc)
+                watermark.forget(keys[new_doc.filename])
+        db.commit()
+        documents = [new_doc for new_doc in documents if new_doc.encrypted_path]
+        total_docs = len(documents)
+
+        for i, new_doc in enumerate(documents):
+            sync_queue.heartbeat(user_id, provider_name)  # Stops here once the lease is lost
+            sync_status.status_processing(user_id, provider_name, i + 1, total_docs)
+            doc_info = {"filename": new_doc.filename, "local_path": local_paths[new_doc.filename]}
 
             # AI Parse
             try:
@@ -958,6 +1009,7 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
                             reference_range=r.get("reference_range"),
                             flags=r.get("flags", "NORMAL")
                         )
+                        apply_reference_range(tr)
                         db.add(tr)
 
                     # Update document date from AI-extracted metadata
@@ -974,7 +1026,11 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
                     if "patient_info" in parsed_data and parsed_data["patient_info"].get("full_name"):
                         new_doc.patient_name = parsed_data["patient_info"]["full_name"]
 
-                    new_doc.is_processed = True
+                    # Part of the document failed to parse: left for the pending-document processor
+                    new_doc.is_processed = not parsed_data.get("partial")
+                    if parsed_data.get("partial"):
+                        logger.warning(f"Partly parsed {doc_info['filename']}: {len(parsed_data['errors'])} chunks failed")
+                    safe_record_document_events(db, new_doc)
                     db.commit()
                     count_processed += 1
                 elif "error" in parsed_data:
@@ -988,11 +1044,20 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
                 new_doc.is_processed = True
                 db.commit()
 
+            # Delete the unencrypted download now that it has been parsed
+            try:
+                os.remove(doc_info["local_path"])
+            except Exception:
+                pass  # Ignore if delete fails
+
         # Update linked account status to success
+        if _lease_lost(db, user_id, provider_name):
+            return
         account.status = "ACTIVE"
         account.last_sync = datetime.now()
         account.last_sync_error = None
         account.consecutive_failures = 0
+        sync_watermark.record(account, watermark)
         db.commit()
 
         sync_status.status_complete(user_id, provider_name, count_processed)
@@ -1000,6 +1065,9 @@ def run_sync_task(user_id: int, provider_name: str, account_id: int):
     except Exception as e:
         # Update linked account status to error
         try:
+            db.rollback()
+            if _lease_lost(db, user_id, provider_name):
+                return
             account.status = "ERROR"
             account.last_sync_error = str(e)[:500]  # Truncate long errors
             account.consecutive_failures += 1
@@ -1121,7 +1189,7 @@ def export_user_data(
         content = None
         if vault_available and report.content_enc:
             try:
-                content = vault_helper.decrypt_data(report.content_enc)
+                content = json.dumps(encrypted_records.read_report(vault_helper, report.content_enc), ensure_ascii=False)
             except Exception:
                 pass
         if content is None:
@@ -1254,6 +1322,7 @@ def delete_user_account(
 
         # Commit all deletions
         db.commit()
+        clear_user_vault_session(user_id)
 
         return {
             "status": "success",
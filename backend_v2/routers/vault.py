@@ -16,6 +16,7 @@ try:
     from backend_v2.services.vault import vault, VaultError, VaultNotInitializedError, VaultLockedError
     from backend_v2.services.user_vault import get_user_vault
     from backend_v2.services.reencryption_service import reencrypt_all_user_data
+    from backend_v2.services import report_cache
     from backend_v2.routers.documents import get_current_user
     from backend_v2.models import User
     from backend_v2.database import get_db
@@ -24,6 +25,7 @@ except ImportError:
     from services.vault import vault, VaultError, VaultNotInitializedError, VaultLockedError
     from services.user_vault import get_user_vault
     from services.reencryption_service import reencrypt_all_user_data
+    from services import report_cache
     from routers.documents import get_current_user
     from models import User
     from database import get_db
@@ -189,6 +191,7 @@ async def lock_vault(current_user: User = Depends(require_admin)):
     Use this for maintenance or security purposes.
     """
     vault.lock()
+    report_cache.clear()
     return VaultInitResponse(
         success=True,
         message="Vault locked. All encryption keys cleared from memory."
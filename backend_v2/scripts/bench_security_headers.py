@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Security Headers Benchmark
+
+Compares requests/sec on a trivial endpoint with the previous
+@app.middleware("http") security headers implementation and with
+SecurityHeadersMiddleware (services/security_headers.py). Requests go through
+httpx's in-process ASGI transport, so only the app and middleware are measured.
+
+Usage:
+    python -m backend_v2.scripts.bench_security_headers
+    python -m backend_v2.scripts.bench_security_headers --requests 20000 --concurrency 50
+
+Arguments:
+    --requests: Requests per run (default 5000)
+    --concurrency: Concurrent in-flight requests (default 20)
+    --runs: Runs per variant; the best one is reported (default 3)
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+from fastapi import FastAPI, Request
+
+from backend_v2.services.security_headers import CONTENT_SECURITY_POLICY, SecurityHeadersMiddleware
+
+ORIGINS = ["http://localhost:5173", "https://analize.online", "https://www.analize.online"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the security headers middleware")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent in-flight requests")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per variant (best is reported)")
+    return parser.parse_args()
+
+
+def trivial_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    return app
+
+
+def before_app() -> FastAPI:
+    """The previous implementation: a BaseHTTPMiddleware recomputing everything per response."""
+    app = trivial_app()
+    origins = ORIGINS
+
+    @app.middleware("http")
+    async def add_security_headers(request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
+        excluded_paths = ("/", "/health", "/metrics", "/api/health", "/api/metrics", "/sitemap.xml", "/blog/feed.xml")
+        seo_prefixes = ("/prerender/", "/public/stats", "/blog/articles", "/analyzer/", "/sitemaps/")
+        is_seo_path = any(request.url.path.startswith(p) for p in seo_prefixes)
+        if is_seo_path:
+            response.headers["Cache-Control"] = "public, max-age=3600, s-maxage=3600"
+        elif request.url.path not in excluded_paths:
+            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate"
+            response.headers["Pragma"] = "no-cache"
+        if any("https://" in o for o in origins):
+            response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        response.headers["Content-Security-Policy"] = CONTENT_SECURITY_POLICY
+        return response
+
+    return app
+
+
+def after_app() -> FastAPI:
+    app = trivial_app()
+    app.add_middleware(SecurityHeadersMiddleware, origins=ORIGINS)
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> float:
+    """Requests/sec for `requests` GET /ping calls, `concurrency` at a time."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/ping")  # Warm up routing and middleware stack
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/ping")
+                assert response.headers["x-frame-options"] == "DENY"
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+def main():
+    args = parse_args()
+    results = {}
+    for name, factory in (("before (BaseHTTPMiddleware)", before_app), ("after (pure ASGI)", after_app)):
+        app = factory()
+        results[name] = max(asyncio.run(run(app, args.requests, args.concurrency)) for _ in range(args.runs))
+        print(f"{name:<30} {results[name]:>10.0f} req/s")
+
+    before, after = results.values()
+    print(f"{'speedup':<30} {after / before:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 import os
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 from pypdf import PdfReader
 from openai import OpenAI
 
 try:
     from backend_v2.services.openai_tracker import track_openai_response, log_openai_call
+    from backend_v2.services.prompt_budget import chunk_pages
 except ImportError:
     from services.openai_tracker import track_openai_response, log_openai_call
+    from services.prompt_budget import chunk_pages
+
+logger = logging.getLogger(__name__)
+
+# Concurrent parser calls for documents split into several chunks
+PARSE_MAX_WORKERS = int(os.getenv("PARSE_MAX_WORKERS", "4"))
 
 class AIService:
     def __init__(self):
@@ -15,28 +24,74 @@ class AIService:
         if not self.api_key:
             print("WARNING: No OPENAI_API_KEY found. AI Parsing will fail.")
             
-    def extract_text_from_pdf(self, file_path: str) -> str:
+    def extract_pages_from_pdf(self, file_path: str) -> List[str]:
         try:
             reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return [page.extract_text() or "" for page in reader.pages]
         except Exception as e:
             print(f"Error reading PDF {file_path}: {e}")
-            return ""
+            return []
+
+    def extract_text_from_pdf(self, file_path: str) -> str:
+        return "".join(page + "\n" for page in self.extract_pages_from_pdf(file_path))
 
     def process_document(self, file_path: str) -> Dict[str, Any]:
         if not self.api_key:
             return {"error": "Missing API Key", "results": [], "metadata": {}}
 
-        text = self.extract_text_from_pdf(file_path)
-        if not text:
+        pages = self.extract_pages_from_pdf(file_path)
+        if not any(page.strip() for page in pages):
             return {"error": "Empty or unreadable PDF", "results": [], "metadata": {}}
-            
-        return self.parse_text_with_ai(text)
+
+        return self._parse_chunks(chunk_pages(pages))
 
     def parse_text_with_ai(self, text: str) -> Dict[str, Any]:
+        """Parse report text, splitting it into budget-sized chunks when it is long."""
+        return self._parse_chunks(chunk_pages([text]))
+
+    def _parse_chunks(self, chunks: List[str]) -> Dict[str, Any]:
+        """Parse chunks in parallel and merge them in document order."""
+        if len(chunks) <= 1:
+            return self._parse_chunk(chunks[0] if chunks else "")
+
+        with ThreadPoolExecutor(max_workers=min(PARSE_MAX_WORKERS, len(chunks))) as executor:
+            parsed = list(executor.map(self._parse_chunk, chunks))
+        return self._merge_parsed(parsed)
+
+    @staticmethod
+    def _merge_parsed(parsed: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge per-chunk results: first known metadata, results de-duplicated.
+        Chunk errors are listed in "errors"; when other chunks still produced
+        results, "partial" is set so callers don't treat the document as fully parsed.
+        """
+        merged = {"metadata": {}, "results": []}
+        seen = set()
+        errors = []
+        for index, data in enumerate(parsed):
+            if data.get("error"):
+                logger.warning(f"Chunk {index + 1}/{len(parsed)} failed to parse: {data['error']}")
+                errors.append(data["error"])
+            for key, value in (data.get("metadata") or {}).items():
+                if merged["metadata"].get(key) in (None, "", "Unknown") and value not in (None, ""):
+                    merged["metadata"][key] = value
+            for result in data.get("results") or []:
+                # Chunks split on page boundaries, but a table header may repeat
+                key = (result.get("test_name"), str(result.get("value")), result.get("unit"))
+                if key not in seen:
+                    seen.add(key)
+                    merged["results"].append(result)
+
+        # Only fail when nothing could be parsed; partial results beat none
+        if errors:
+            merged["errors"] = errors
+            if merged["results"]:
+                merged["partial"] = True
+            else:
+                merged["error"] = errors[0]
+        return merged
+
+    def _parse_chunk(self, text: str) -> Dict[str, Any]:
         try:
             client = OpenAI(api_key=self.api_key)
 
@@ -94,5 +149,5 @@ class AIService:
         }}
         
         Text content:
-        {text[:15000]} 
+        {text}
         """
@@ -0,0 +1,105 @@
+"""
+Incremental Analysis Delta
+Fingerprints the biomarker set behind each health report and computes what
+changed since the previous analysis session.
+
+Each session stores per-marker digests on its general report. The next run
+diffs the current biomarkers against them, so the generalist only sees the
+previous summary plus new and changed markers, and specialists whose markers
+are unchanged are carried forward instead of re-run.
+
+Digests are keyed by a hash of the marker name and store only hashes of the
+readings. The hashes are unsalted and lab names and values are low-entropy,
+so they could be brute-forced: the state is only stored encrypted with the
+user's vault (HealthReport.analysis_state_enc).
+"""
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+# Most recent readings sent per changed marker (new value plus trend context)
+DELTA_READINGS_PER_MARKER = 3
+
+
+class MarkerDelta(NamedTuple):
+    """Difference between the previous session's markers and the current set."""
+    changed: List[str]      # marker keys that are new or have new/edited readings
+    unchanged: List[str]
+    removed_count: int
+
+
+def _digest(parts) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(repr(part).encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+
+def marker_key(biomarker: Dict) -> str:
+    """Stable key for a biomarker across sessions."""
+    return " ".join(str(biomarker.get("name") or "").lower().split())
+
+
+def _reading(biomarker: Dict) -> tuple:
+    return (
+        biomarker.get("date"), biomarker.get("value"), biomarker.get("unit"),
+        biomarker.get("range"), biomarker.get("flags"),
+    )
+
+
+def group_by_marker(biomarkers: List[Dict]) -> Dict[str, List[Dict]]:
+    grouped = defaultdict(list)
+    for bio in biomarkers:
+        grouped[marker_key(bio)].append(bio)
+    return grouped
+
+
+def fingerprint_biomarkers(biomarkers: List[Dict]) -> str:
+    """Order-independent fingerprint of a biomarker set."""
+    return _digest(sorted((marker_key(b),) + tuple(map(str, _reading(b))) for b in biomarkers))
+
+
+def _marker_entries(biomarkers: List[Dict]):
+    """Yield (marker key, hashed key, readings digest) per marker."""
+    for key, readings in group_by_marker(biomarkers).items():
+        yield key, _digest([key]), _digest(sorted(tuple(map(str, _reading(b))) for b in readings))
+
+
+def marker_digests(biomarkers: List[Dict]) -> Dict[str, str]:
+    """Map hashed marker name -> hash of all its readings."""
+    return {hashed_key: digest for _, hashed_key, digest in _marker_entries(biomarkers)}
+
+
+def context_fingerprint(profile_context: str, language: str) -> str:
+    """Fingerprint of the non-biomarker inputs; a change forces a full analysis."""
+    return _digest([language, profile_context or ""])
+
+
+def compute_delta(previous_digests: Dict[str, str], biomarkers: List[Dict]) -> MarkerDelta:
+    """Split current markers into changed and unchanged against a previous session."""
+    changed, unchanged, seen = [], [], set()
+    for key, hashed_key, digest in _marker_entries(biomarkers):
+        seen.add(hashed_key)
+        if previous_digests.get(hashed_key) == digest:
+            unchanged.append(key)
+        else:
+            changed.append(key)
+    removed_count = len(set(previous_digests) - seen)
+    return MarkerDelta(changed=sorted(changed), unchanged=sorted(unchanged), removed_count=removed_count)
+
+
+def recent_readings(biomarkers: List[Dict], keys: List[str],
+                    per_marker: int = DELTA_READINGS_PER_MARKER) -> List[Dict]:
+    """Most recent readings for the given markers, newest first per marker."""
+    wanted = set(keys)
+    selected = []
+    for key, readings in group_by_marker(biomarkers).items():
+        if key in wanted:
+            ordered = sorted(readings, key=lambda b: b.get("date") or "", reverse=True)
+            selected.extend(ordered[:per_marker])
+    return selected
+
+
+def is_delta_empty(delta: MarkerDelta) -> bool:
+    return not delta.changed and not delta.removed_count
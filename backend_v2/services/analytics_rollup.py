@@ -0,0 +1,400 @@
+"""
+Analytics Rollup
+Pre-aggregated page-view analytics for the admin dashboard.
+
+page_view_rollups holds, per hour and per day, the page views and a
+HyperLogLog sketch of the unique visitors for each dimension:
+- all: every view
+- page: per page path
+- funnel: visitors who reached each FUNNEL_PAGES step
+- source: per referrer domain ("direct" for none or our own site)
+- device: mobile visitors
+- visitor_type: logged in, or arriving with UTM tags
+- all_time (daily only): every visitor up to the end of that day, for
+  counting returning visitors
+
+refresh() (scheduler, every minute) re-aggregates the raw page views from the
+last rolled hour onward - views that land late are picked up on the next
+pass - and rebuilds the affected days from their hours. Hourly rows are kept
+for HOUR_RETENTION_DAYS, daily rows for good.
+
+The dashboard reads a period as the hourly rows of its first, partial day
+and the daily rows after it: a few hundred rows and sketch merges instead of
+scans of page_views. Unique counts are estimates (about 1.6% error).
+"""
+import hashlib
+import logging
+import math
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+
+try:
+    from backend_v2.models import PageView, PageViewRollup
+except ImportError:
+    from models import PageView, PageViewRollup
+
+logger = logging.getLogger(__name__)
+
+HOUR_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOUR_RETENTION_DAYS", "7"))
+# Hours before the last rolled one that are re-aggregated for late views
+LATE_HOURS = 1
+
+# Funnel page sequence — order matters
+FUNNEL_PAGES = [
+    ("/", "home"),
+    ("/pricing", "pricing"),
+    ("/login", "login_page"),
+    ("/register", "registered"),
+    ("/dashboard", "dashboard"),
+    ("/accounts", "linked_accounts"),
+    ("/documents", "documents"),
+    ("/health-reports", "health_reports"),
+]
+
+OWN_DOMAINS = ("analize.online", "localhost", "127.0.0.1")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _hour(value: datetime) -> datetime:
+    return _utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+def _day(value: datetime) -> datetime:
+    return _utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def extract_domain(referrer: Optional[str]) -> str:
+    """Pull the bare domain from a referrer URL; empty → 'direct'."""
+    if not referrer:
+        return "direct"
+    # Strip protocol, then path
+    ref = referrer.split("//", 1)[-1]
+    domain = ref.split("/", 1)[0].split("?", 1)[0].lower()
+    if domain.startswith("www."):
+        domain = domain[4:]
+    # Our own domain counts as direct
+    if domain in OWN_DOMAINS:
+        return "direct"
+    return domain or "direct"
+
+
+# --- HyperLogLog -----------------------------------------------------------------
+
+class HyperLogLog:
+    """
+    Mergeable unique-count sketch. Registers are kept sparse (index -> rank),
+    so a page seen by a handful of visitors stores a handful of bytes.
+    """
+
+    PRECISION = 12
+    M = 1 << PRECISION
+    ALPHA = 0.7213 / (1 + 1.079 / M)
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Dict[int, int] = None):
+        self.registers = registers or {}
+
+    def add(self, value: str):
+        x = int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+        index = x >> (64 - self.PRECISION)
+        rest = x & ((1 << (64 - self.PRECISION)) - 1)
+        rank = (64 - self.PRECISION) - rest.bit_length() + 1
+        if rank > self.registers.get(index, 0):
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        registers = self.registers
+        for index, rank in other.registers.items():
+            if rank > registers.get(index, 0):
+                registers[index] = rank
+
+    def count(self) -> int:
+        zeros = self.M - len(self.registers)
+        estimate = self.ALPHA * self.M * self.M / (zeros + sum(2.0 ** -r for r in self.registers.values()))
+        if estimate <= 2.5 * self.M and zeros:
+            estimate = self.M * math.log(self.M / zeros)  # Linear counting for small sets
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        if len(self.registers) * 3 < self.M:
+            return b"S" + b"".join(struct.pack(">HB", i, r) for i, r in sorted(self.registers.items()))
+        dense = bytearray(self.M)
+        for index, rank in self.registers.items():
+            dense[index] = rank
+        return b"D" + bytes(dense)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "HyperLogLog":
+        if not data:
+            return cls()
+        data = bytes(data)
+        if data[:1] == b"S":
+            return cls({i: r for i, r in struct.iter_unpack(">HB", data[1:])})
+        return cls({i: r for i, r in enumerate(data[1:]) if r})
+
+
+# --- Aggregation -------------------------------------------------------------------
+
+class _Bucket:
+    __slots__ = ("pageviews", "sketch")
+
+    def __init__(self):
+        self.pageviews = 0
+        self.sketch = HyperLogLog()
+
+
+def _dimensions(view) -> Iterable[Tuple[str, str]]:
+    """(dimension, key) pairs a raw page view counts toward."""
+    yield "all", ""
+    yield "page", view.page
+    for path, step in FUNNEL_PAGES:
+        if view.page.startswith(path):
+            yield "funnel", step
+    yield "source", extract_domain(view.referrer)
+    if view.is_mobile:
+        yield "device", "mobile"
+    if view.user_id is not None:
+        yield "visitor_type", "logged_in"
+    elif view.utm_source or view.utm_medium:
+        yield "visitor_type", "refcode"
+
+
+def _aggregate(db, start: datetime, end: datetime, floor) -> Dict[datetime, Dict[Tuple[str, str], _Bucket]]:
+    """Raw page views in [start, end) grouped into floor(created_at) buckets."""
+    views = db.query(
+        PageView.created_at, PageView.page, PageView.referrer, PageView.ip_hash, PageView.session_id,
+        PageView.is_mobile, PageView.user_id, PageView.utm_source, PageView.utm_medium
+    ).filter(PageView.created_at >= start, PageView.created_at < end).yield_per(5000)
+
+    buckets: Dict[datetime, Dict[Tuple[str, str], _Bucket]] = {}
+    for view in views:
+        # ip_hash is stable across sessions; fall back to the session for views without one
+        visitor = view.ip_hash or f"s:{view.session_id}"
+        period = buckets.setdefault(floor(view.created_at), {})
+        for dimension in _dimensions(view):
+            bucket = period.get(dimension)
+            if bucket is None:
+                bucket = period[dimension] = _Bucket()
+            bucket.pageviews += 1
+            bucket.sketch.add(visitor)
+    return buckets
+
+
+def _from_rows(rows) -> Dict[Tuple[str, str], _Bucket]:
+    merged: Dict[Tuple[str, str], _Bucket] = {}
+    for row in rows:
+        bucket = merged.get((row.dimension, row.key))
+        if bucket is None:
+            bucket = merged[(row.dimension, row.key)] = _Bucket()
+        bucket.pageviews += row.pageviews or 0
+        bucket.sketch.merge(HyperLogLog.from_bytes(row.sketch))
+    return merged
+
+
+def _replace(db, granularity: str, start: datetime, buckets: Dict[Tuple[str, str], _Bucket]):
+    """Swap in the rows of one hour or day (all_time rows are kept)."""
+    db.query(PageViewRollup).filter(
+        PageViewRollup.granularity == granularity,
+        PageViewRollup.bucket_start == start,
+        PageViewRollup.dimension != "all_time"
+    ).delete(synchronize_session=False)
+    db.add_all([
+        PageViewRollup(granularity=granularity, bucket_start=start, dimension=dimension, key=key[:500],
+                       pageviews=bucket.pageviews, visitors=bucket.sketch.count(),
+                       sketch=bucket.sketch.to_bytes())
+        for (dimension, key), bucket in buckets.items()
+    ])
+
+
+def _rebuild_all_time(db, since: datetime):
+    """Recompute the all_time rows of every day from since onward."""
+    previous = db.query(PageViewRollup).filter(
+        PageViewRollup.granularity == "day", PageViewRollup.dimension == "all_time",
+        PageViewRollup.bucket_start < since
+    ).order_by(PageViewRollup.bucket_start.desc()).first()
+    running = HyperLogLog.from_bytes(previous.sketch if previous else None)
+
+    days = db.query(PageViewRollup).filter(
+        PageViewRollup.granularity == "day", PageViewRollup.dimension == "all",
+        PageViewRollup.bucket_start >= since
+    ).order_by(PageViewRollup.bucket_start).all()
+    for day in days:
+        running.merge(HyperLogLog.from_bytes(day.sketch))
+        db.query(PageViewRollup).filter(
+            PageViewRollup.granularity == "day", PageViewRollup.dimension == "all_time",
+            PageViewRollup.bucket_start == day.bucket_start
+        ).delete(synchronize_session=False)
+        db.add(PageViewRollup(granularity="day", bucket_start=day.bucket_start, dimension="all_time", key="",
+                              pageviews=0, visitors=running.count(), sketch=running.to_bytes()))
+
+
+def backfill(db, now: datetime = None) -> int:
+    """Rebuild every rollup from page_views; returns the number of days rolled."""
+    now = now or _now()
+    first = db.query(func.min(PageView.created_at)).scalar()
+    db.query(PageViewRollup).delete(synchronize_session=False)
+    if first is None:
+        db.commit()
+        return 0
+
+    days = _aggregate(db, _day(first), now, _day)
+    for day, buckets in days.items():
+        _replace(db, "day", day, buckets)
+    hours_since = _day(now) - timedelta(days=HOUR_RETENTION_DAYS)
+    for hour, buckets in _aggregate(db, hours_since, now, _hour).items():
+        _replace(db, "hour", hour, buckets)
+    db.flush()
+    _rebuild_all_time(db, _day(first))
+    db.commit()
+    logger.info(f"Backfilled page view rollups for {len(days)} days")
+    return len(days)
+
+
+def refresh(db, now: datetime = None) -> int:
+    """Roll up page views recorded since the last rolled hour; returns hours rolled."""
+    now = now or _now()
+    oldest_hour = _day(now) - timedelta(days=HOUR_RETENTION_DAYS)
+    last = db.query(func.max(PageViewRollup.bucket_start)).filter(PageViewRollup.granularity == "hour").scalar()
+    if last is None and not db.query(PageViewRollup.id).first():
+        backfill(db, now)
+        return 0
+    # Older hours are pruned, and their days are final
+    start = max(_hour(last) - timedelta(hours=LATE_HOURS), oldest_hour) if last else oldest_hour
+
+    hours = _aggregate(db, start, now, _hour)
+    for hour, buckets in hours.items():
+        _replace(db, "hour", hour, buckets)
+    db.flush()
+
+    days = sorted({_day(hour) for hour in hours})
+    for day in days:
+        rows = db.query(PageViewRollup).filter(
+            PageViewRollup.granularity == "hour",
+            PageViewRollup.bucket_start >= day,
+            PageViewRollup.bucket_start < day + timedelta(days=1)
+        ).all()
+        _replace(db, "day", day, _from_rows(rows))
+    if days:
+        db.flush()
+        _rebuild_all_time(db, days[0])
+    db.query(PageViewRollup).filter(
+        PageViewRollup.granularity == "hour", PageViewRollup.bucket_start < oldest_hour
+    ).delete(synchronize_session=False)
+    db.commit()
+    return len(hours)
+
+
+# --- Dashboard reads ---------------------------------------------------------------
+
+def _window(cutoff: datetime, now: datetime = None):
+    """Rows covering [cutoff, now]: hours of the partial first day, then whole days."""
+    now = now or _now()
+    first_day = _day(cutoff)
+    if cutoff == first_day or cutoff < _day(now) - timedelta(days=HOUR_RETENTION_DAYS):
+        return and_(PageViewRollup.granularity == "day", PageViewRollup.bucket_start >= first_day)
+    next_day = first_day + timedelta(days=1)
+    return or_(
+        and_(PageViewRollup.granularity == "hour",
+             PageViewRollup.bucket_start >= _hour(cutoff), PageViewRollup.bucket_start < next_day),
+        and_(PageViewRollup.granularity == "day", PageViewRollup.bucket_start >= next_day),
+    )
+
+
+def pageviews(db, dimension: str, cutoff: datetime, prefix: str = None, limit: int = None) -> List[Tuple[str, int]]:
+    """(key, views) of a dimension since cutoff, most viewed first."""
+    total = func.sum(PageViewRollup.pageviews)
+    query = db.query(PageViewRollup.key, total).filter(
+        PageViewRollup.dimension == dimension, _window(cutoff))
+    if prefix is not None:
+        query = query.filter(PageViewRollup.key.like(f"{prefix}%"))
+    query = query.group_by(PageViewRollup.key).order_by(total.desc(), PageViewRollup.key)
+    if limit:
+        query = query.limit(limit)
+    return [(key, int(views or 0)) for key, views in query.all()]
+
+
+def total_pageviews(db, cutoff: datetime, prefix: str = None) -> int:
+    if prefix is None:
+        return sum(views for _, views in pageviews(db, "all", cutoff))
+    return sum(views for _, views in pageviews(db, "page", cutoff, prefix))
+
+
+def unique_visitors(db, dimension: str, cutoff: datetime, keys: List[str] = None) -> Dict[str, int]:
+    """Estimated unique visitors per key of a dimension since cutoff."""
+    query = db.query(PageViewRollup.key, PageViewRollup.sketch).filter(
+        PageViewRollup.dimension == dimension, _window(cutoff))
+    if keys is not None:
+        if not keys:
+            return {}
+        query = query.filter(PageViewRollup.key.in_(keys))
+    sketches: Dict[str, HyperLogLog] = {}
+    for key, data in query.all():
+        sketch = HyperLogLog.from_bytes(data)
+        if key in sketches:
+            sketches[key].merge(sketch)
+        else:
+            sketches[key] = sketch
+    return {key: sketch.count() for key, sketch in sketches.items()}
+
+
+def _sketch(db, condition) -> HyperLogLog:
+    merged = HyperLogLog()
+    for (data,) in db.query(PageViewRollup.sketch).filter(condition).all():
+        merged.merge(HyperLogLog.from_bytes(data))
+    return merged
+
+
+def returning_visitors(db, cutoff: datetime) -> int:
+    """Visitors since cutoff who had also visited before it (|A| + |B| - |A ∪ B|)."""
+    recent = _sketch(db, and_(PageViewRollup.dimension == "all", _window(cutoff)))
+    if not recent.registers:
+        return 0
+    first_day = _day(cutoff)
+    before = _sketch(db, and_(
+        PageViewRollup.dimension == "all_time", PageViewRollup.granularity == "day",
+        PageViewRollup.bucket_start == db.query(func.max(PageViewRollup.bucket_start)).filter(
+            PageViewRollup.dimension == "all_time", PageViewRollup.bucket_start < first_day
+        ).scalar_subquery()
+    ))
+    # Hours of the cutoff day before the cutoff (kept only for recent days)
+    before.merge(_sketch(db, and_(
+        PageViewRollup.dimension == "all", PageViewRollup.granularity == "hour",
+        PageViewRollup.bucket_start >= first_day, PageViewRollup.bucket_start < _hour(cutoff)
+    )))
+    if not before.registers:
+        return 0
+    union = HyperLogLog(dict(before.registers))
+    union.merge(recent)
+    return max(0, recent.count() + before.count() - union.count())
+
+
+def by_day(db, dimension: str, cutoff: datetime, prefix: str = None) -> List[Dict]:
+    """Daily views (and unique visitors, for a single key) since cutoff's day."""
+    query = db.query(
+        PageViewRollup.bucket_start,
+        func.sum(PageViewRollup.pageviews).label("pageviews"),
+        func.sum(PageViewRollup.visitors).label("visitors"),
+    ).filter(
+        PageViewRollup.granularity == "day",
+        PageViewRollup.dimension == dimension,
+        PageViewRollup.bucket_start >= _day(cutoff)
+    )
+    if prefix is not None:
+        query = query.filter(PageViewRollup.key.like(f"{prefix}%"))
+    rows = query.group_by(PageViewRollup.bucket_start).order_by(PageViewRollup.bucket_start).all()
+    return [{"date": _utc(row.bucket_start).date().isoformat(), "pageviews": int(row.pageviews or 0),
+             "visitors": int(row.visitors or 0)} for row in rows]
@@ -11,13 +11,15 @@ from sqlalchemy import func, and_
 try:
     from backend_v2.models import (
         User, AuditLog, UserSession, AbuseFlag,
-        RateLimitCounter, UsageMetrics
+        UsageMetrics
     )
+    from backend_v2.services.rate_limiter import RateLimiter, Rule, get_database_limiter
 except ImportError:
     from models import (
         User, AuditLog, UserSession, AbuseFlag,
-        RateLimitCounter, UsageMetrics
+        UsageMetrics
     )
+    from services.rate_limiter import RateLimiter, Rule, get_database_limiter
 
 
 # =============================================================================
@@ -248,6 +250,17 @@ class AuditService:
     # Rate Limiting
     # =========================================================================
 
+    def _rate_limiter(self) -> RateLimiter:
+        # Counters live in rate_limit_counters, in this session's database
+        return get_database_limiter(self.db.get_bind())
+
+    def _rate_rule(self, action: str, custom_limit: Optional[int] = None,
+                   custom_window: Optional[int] = None) -> Rule:
+        config = RATE_LIMITS.get(action, {"limit": 100, "window_minutes": 60})
+        limit = custom_limit or config["limit"]
+        window_minutes = custom_window or config["window_minutes"]
+        return Rule(limit, window_minutes * 60)
+
     def check_rate_limit(
         self,
         identifier: str,
@@ -256,59 +269,17 @@ class AuditService:
         custom_window: Optional[int] = None
     ) -> tuple[bool, int]:
         """
-        Check if rate limit is exceeded.
+        Check if rate limit is exceeded (sliding window, see services/rate_limiter).
         Returns (is_allowed, remaining_requests).
         """
-        config = RATE_LIMITS.get(action, {"limit": 100, "window_minutes": 60})
-        limit = custom_limit or config["limit"]
-        window_minutes = custom_window or config["window_minutes"]
-
-        now = datetime.now(timezone.utc)
-        window_start = now - timedelta(minutes=window_minutes)
-
-        # Get or create counter
-        counter = self.db.query(RateLimitCounter).filter(
-            RateLimitCounter.identifier == identifier,
-            RateLimitCounter.action == action
-        ).first()
-
-        if not counter:
-            counter = RateLimitCounter(
-                identifier=identifier,
-                action=action,
-                count=0,
-                window_start=now,
-                window_minutes=window_minutes
-            )
-            self.db.add(counter)
-            self.db.commit()
-
-        # Reset if window expired
-        if counter.window_start < window_start:
-            counter.count = 0
-            counter.window_start = now
-            self.db.commit()
-
-        # Check limit
-        remaining = limit - counter.count
-        is_allowed = counter.count < limit
-
-        if is_allowed:
-            counter.count += 1
-            self.db.commit()
-
-        return is_allowed, max(0, remaining - 1)
+        decision = self._rate_limiter().hit(
+            f"{action}:{identifier}", self._rate_rule(action, custom_limit, custom_window)
+        )
+        return decision.allowed, decision.remaining
 
     def increment_rate_limit(self, identifier: str, action: str):
         """Manually increment rate limit counter."""
-        counter = self.db.query(RateLimitCounter).filter(
-            RateLimitCounter.identifier == identifier,
-            RateLimitCounter.action == action
-        ).first()
-
-        if counter:
-            counter.count += 1
-            self.db.commit()
+        self._rate_limiter().hit(f"{action}:{identifier}", self._rate_rule(action))
 
     # =========================================================================
     # Abuse Detection
@@ -1,14 +1,46 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
-from playwright.sync_api import sync_playwright, Page, Browser
+from typing import List, Dict, Any, Callable, Optional, Sequence, Union
+from playwright.sync_api import sync_playwright, Page, Browser, Locator, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 from playwright.async_api import async_playwright, Page as AsyncPage
 import os
+import re
+import time
 import asyncio
 import datetime
 from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+import httpx
+
+try:
+    from backend_v2.services import sync_status, crawler_timing
+    from backend_v2.services.sync_watermark import SyncWatermark
+except ImportError:
+    from services import sync_status, crawler_timing
+    from services.sync_watermark import SyncWatermark
 
 # Thread pool for running sync playwright
 _executor = ThreadPoolExecutor(max_workers=2)
+# Event loops of the download engine (sync Playwright keeps its own loop on the crawler thread)
+_download_executor = ThreadPoolExecutor(max_workers=2)
+# Progress updates from the download loop (status callbacks write to the database)
+_status_executor = ThreadPoolExecutor(max_workers=1)
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+_DISPOSITION_FILENAME = re.compile(r"""filename\*?=(?:UTF-8'')?"?([^";]+)"?""", re.IGNORECASE)
+
+
+def download_filename(suggested: Optional[str], url: str, index: int) -> str:
+    """Numbered filename for the index-th document of a sync (suggested name, else the URL's)."""
+    name = suggested or os.path.basename(urlparse(url).path) or "document"
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_{index + 1:03d}{ext or '.pdf'}"
+
+
+def _disposition_filename(response: httpx.Response) -> Optional[str]:
+    match = _DISPOSITION_FILENAME.search(response.headers.get("content-disposition", ""))
+    return os.path.basename(unquote(match.group(1))) if match else None
+
 
 class BaseCrawler(ABC):
     def __init__(self, provider_name: str, headless: bool = True, user_id: int = None):
@@ -23,15 +55,31 @@ class BaseCrawler(ABC):
             self.download_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), f"../../data/raw/_unknown/{provider_name}"))
         os.makedirs(self.download_dir, exist_ok=True)
         self._status_callback = None
+        # Bounds for readiness waits; see crawler_timing
+        self.timing = crawler_timing.get_profile(provider_name)
+        self.timings = crawler_timing.TimingRecorder(provider_name)
+        # Installed Chrome by default; empty means Playwright's bundled Chromium
+        self.browser_channel = os.getenv("CRAWLER_BROWSER_CHANNEL", "chrome") or None
+        # Called with the browser context before the first page opens (e.g. replay routes)
+        self.context_hooks: List[Callable] = []
+        # httpx transport for the download engine; None means the network (replay swaps it)
+        self.download_transport = None
+        # Documents already synced for this account; empty means a full sync
+        self.watermark = SyncWatermark()
+
+    # Max parallel document downloads against this provider's servers
+    download_concurrency = int(os.getenv("CRAWLER_DOWNLOAD_CONCURRENCY", "4"))
 
     def set_status_callback(self, callback):
         """Set callback for status updates. Callback signature: (stage: str, message: str, progress: int, total: int)"""
         self._status_callback = callback
 
     def update_status(self, stage: str, message: str, progress: int = 0, total: int = 0):
-        """Update status via callback if set."""
+        """Update status via callback if set, else publish it directly for this user."""
         if self._status_callback:
             self._status_callback(stage, message, progress, total)
+        elif self.user_id:
+            sync_status.set_status(self.user_id, self.provider_name, stage, message, progress, total)
 
     def log(self, msg: str):
         """Log message to console and file."""
@@ -52,8 +100,8 @@ class BaseCrawler(ABC):
             # For providers with bot detection (Regina Maria), we use visible browser mode
             browser = p.chromium.launch(
                 headless=self.headless,
-                channel="chrome",  # Use installed Chrome for consistency
-                slow_mo=100,  # Small delay for more reliable automation
+                channel=self.browser_channel,
+                slow_mo=self.timing["slow_mo"],  # Waits are condition-based, no per-action delay needed
                 timeout=60000,  # 60 second timeout for browser launch
                 args=[
                     "--no-sandbox",
@@ -64,6 +112,10 @@ class BaseCrawler(ABC):
                 accept_downloads=True,
                 viewport={"width": 1920, "height": 1080}
             )
+            context.set_default_timeout(self.timing["element"])
+            context.set_default_navigation_timeout(self.timing["navigation"])
+            for hook in self.context_hooks:
+                hook(context)
             page = context.new_page()
 
             try:
@@ -84,26 +136,47 @@ class BaseCrawler(ABC):
                 expected_count = -1
                 if hasattr(self, 'get_expected_document_count'):
                     expected_count = self.get_expected_document_count(page)
+                self.watermark.reported_count = expected_count
+
+                # Same count as the last complete sync: nothing new to fetch
+                if self.watermark.is_unchanged(expected_count):
+                    self.log(f"No new documents ({expected_count} listed, all synced before)")
+                    return {
+                        "documents": [],
+                        "downloaded_count": 0,
+                        "expected_count": expected_count,
+                        "verification_status": "ok"
+                    }
 
-                documents = self.extract_documents_sync(page)
+                # Crawlers that can list document URLs only use the browser to enumerate;
+                # the files are then fetched concurrently over HTTP
+                jobs = self.enumerate_documents_sync(page)
+                if jobs is None:
+                    documents = self.extract_documents_sync(page)
+                else:
+                    documents = self.download_documents(page, self.watermark.filter_jobs(jobs))
                 downloaded_count = len(documents)
-                self.log(f"Downloaded {downloaded_count} documents.")
+                for doc in documents:
+                    self.watermark.mark_seen(doc.get("key"))
+                self.log(f"Downloaded {downloaded_count} documents"
+                         + (f", skipped {self.watermark.skipped} already synced." if self.watermark.skipped else "."))
 
-                # Verification: compare expected vs downloaded
+                # Verification: compare expected vs downloaded plus already synced
+                found_count = downloaded_count + self.watermark.skipped
                 if expected_count > 0:
-                    if downloaded_count == expected_count:
-                        self.log(f"✓ Verification PASSED: Downloaded {downloaded_count} = Expected {expected_count}")
-                    elif downloaded_count < expected_count:
-                        self.log(f"⚠ Verification WARNING: Downloaded {downloaded_count} < Expected {expected_count} (missing {expected_count - downloaded_count})")
+                    if found_count == expected_count:
+                        self.log(f"✓ Verification PASSED: Found {found_count} = Expected {expected_count}")
+                    elif found_count < expected_count:
+                        self.log(f"⚠ Verification WARNING: Found {found_count} < Expected {expected_count} (missing {expected_count - found_count})")
                     else:
-                        self.log(f"✓ Downloaded {downloaded_count} >= Expected {expected_count}")
+                        self.log(f"✓ Found {found_count} >= Expected {expected_count}")
 
                 # Return documents with metadata
                 return {
                     "documents": documents,
                     "downloaded_count": downloaded_count,
                     "expected_count": expected_count,
-                    "verification_status": "ok" if expected_count <= 0 or downloaded_count >= expected_count else "warning"
+                    "verification_status": "ok" if expected_count <= 0 or found_count >= expected_count else "warning"
                 }
 
             except Exception as e:
@@ -115,8 +188,109 @@ class BaseCrawler(ABC):
                     pass
                 raise e
             finally:
+                self.log(f"Timing: {self.timings.summary()}")
+                self.timings.save()
                 browser.close()
 
+    # --- Readiness waits -------------------------------------------------
+    # Each wait returns as soon as its condition holds, is bounded by the
+    # provider's timing profile and is recorded for profile building.
+    # Timeouts return False/None instead of raising so crawlers can fall back.
+
+    def wait_for(self, page: Page, target: Union[str, Locator], label: str = None,
+                 state: str = "visible", kind: str = "element", timeout: int = None) -> bool:
+        """Wait until a selector (or locator) reaches state."""
+        locator = page.locator(target) if isinstance(target, str) else target
+        timeout = self.timing[kind] if timeout is None else timeout
+        start = time.monotonic()
+        try:
+            if state == "visible":
+                # Any visible match, not only the first match in DOM order
+                locator.filter(visible=True).first.wait_for(state="attached", timeout=timeout)
+            else:
+                locator.first.wait_for(state=state, timeout=timeout)
+            ok = True
+        except PlaywrightTimeoutError:
+            ok = False
+        self.timings.record(kind, label or str(target), start, ok)
+        return ok
+
+    def wait_for_any(self, page: Page, selectors: Sequence[str], label: str,
+                     state: str = "visible", kind: str = "element", timeout: int = None) -> Optional[str]:
+        """Wait until any of several selectors matches; return the first that does."""
+        combined = page.locator(selectors[0])
+        for selector in selectors[1:]:
+            combined = combined.or_(page.locator(selector))
+        if not self.wait_for(page, combined, label, state=state, kind=kind, timeout=timeout):
+            return None
+        for selector in selectors:
+            try:
+                candidate = page.locator(selector).first
+                if candidate.count() > 0 and (state != "visible" or candidate.is_visible()):
+                    return selector
+            except Exception:
+                continue
+        return selectors[0]
+
+    def wait_until(self, page: Page, condition: Callable[[], bool], label: str,
+                   kind: str = "element", timeout: int = None) -> bool:
+        """Poll a Python-side condition (e.g. an auth check) at the profile's poll interval."""
+        start = time.monotonic()
+        deadline = start + (self.timing[kind] if timeout is None else timeout) / 1000
+        while True:
+            try:
+                if condition():
+                    self.timings.record(kind, label, start, True)
+                    return True
+            except Exception:
+                pass
+            if time.monotonic() >= deadline:
+                self.timings.record(kind, label, start, False)
+                return False
+            page.wait_for_timeout(self.timing["poll"])
+
+    def wait_for_url(self, page: Page, predicate: Callable[[str], bool], label: str,
+                     kind: str = "navigation", timeout: int = None) -> bool:
+        """Wait until the page URL satisfies predicate."""
+        start = time.monotonic()
+        try:
+            page.wait_for_url(predicate, wait_until="commit",
+                              timeout=self.timing[kind] if timeout is None else timeout)
+            ok = True
+        except PlaywrightTimeoutError:
+            ok = False
+        self.timings.record(kind, label, start, ok)
+        return ok
+
+    def wait_for_network_idle(self, page: Page, label: str = "network idle", timeout: int = None) -> bool:
+        """Wait for no network activity; portals with long polling never idle, so a timeout is fine."""
+        start = time.monotonic()
+        try:
+            page.wait_for_load_state("networkidle", timeout=self.timing["network_idle"] if timeout is None else timeout)
+            ok = True
+        except PlaywrightTimeoutError:
+            ok = False
+        self.timings.record("network_idle", label, start, ok)
+        return ok
+
+    def settle(self, page: Page):
+        """Short fixed pause, only where the page exposes no condition to wait on."""
+        page.wait_for_timeout(self.timing["settle"])
+
+    def scroll_to_end(self, page: Page, max_rounds: int = 10):
+        """Scroll until the page stops growing, to trigger lazy-loaded lists."""
+        for _ in range(max_rounds):
+            height = page.evaluate("document.body.scrollHeight")
+            page.mouse.wheel(0, height)
+            start = time.monotonic()
+            try:
+                page.wait_for_function("h => document.body.scrollHeight > h", arg=height,
+                                       timeout=self.timing["lazy_load"])
+                self.timings.record("lazy_load", "scroll", start, True)
+            except PlaywrightTimeoutError:
+                # Nothing more to load
+                break
+
     async def run(self, credentials: Dict[str, str]):
         """Main execution flow - runs sync playwright in thread pool."""
         loop = asyncio.get_event_loop()
@@ -137,6 +311,125 @@ class BaseCrawler(ABC):
         """Find and download documents (sync version)."""
         pass
 
+    def enumerate_documents_sync(self, page: Page) -> Optional[List[Dict[str, Any]]]:
+        """
+        List the documents to download as jobs for the download engine:
+        {"url", "filename" (None to name from the response), "category"}, plus
+        "local_path" for files the browser already saved and "key" where the
+        URL is not a stable identifier (see sync_watermark). Return None to
+        download through extract_documents_sync instead.
+        """
+        return None
+
+    # --- Post-login download engine ----------------------------------------
+
+    def export_session(self, page: Page) -> Dict[str, Any]:
+        """Cookies and headers of the logged-in browser session, for the HTTP client."""
+        return {
+            "cookies": page.context.cookies(),
+            "headers": {"User-Agent": page.evaluate("navigator.userAgent"), "Referer": page.url},
+        }
+
+    def download_documents(self, page: Page, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Download enumerated documents over HTTP with the browser's session,
+        download_concurrency at a time, streaming each to disk. Documents the
+        HTTP client could not fetch are retried through the browser.
+        """
+        if not jobs:
+            return []
+        start = time.monotonic()
+        session = self.export_session(page)
+        results = _download_executor.submit(asyncio.run, self._fetch_documents(jobs, session)).result()
+
+        documents = []
+        for index, (job, document) in enumerate(zip(jobs, results)):
+            if document is None:
+                document = self.download_in_browser(page, index, job)
+            if document:
+                documents.append(document)
+        self.log(f"Downloaded {len(documents)}/{len(jobs)} documents in {time.monotonic() - start:.1f}s "
+                 f"({self.download_concurrency} parallel)")
+        return documents
+
+    async def _fetch_documents(self, jobs: List[Dict[str, Any]], session: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+        cookies = httpx.Cookies()
+        for cookie in session["cookies"]:
+            cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
+        limits = httpx.Limits(max_connections=self.download_concurrency,
+                              max_keepalive_connections=self.download_concurrency)
+        timeout = httpx.Timeout(self.timing["download"] / 1000, connect=10)
+        semaphore = asyncio.Semaphore(self.download_concurrency)
+        total = len(jobs)
+        done = 0
+
+        async with httpx.AsyncClient(cookies=cookies, headers=session["headers"], limits=limits, timeout=timeout,
+                                     follow_redirects=True, transport=self.download_transport) as client:
+            async def fetch(index: int, job: Dict[str, Any]):
+                nonlocal done
+                if job.get("local_path"):
+                    document = self._document(job, job["filename"], job["local_path"])
+                else:
+                    async with semaphore:
+                        document = await self._stream_to_disk(client, index, job)
+                done += 1
+                await asyncio.get_running_loop().run_in_executor(
+                    _status_executor, self.update_status, "downloading", f"Downloading {done}/{total}", done, total)
+                return document
+
+            return await asyncio.gather(*(fetch(index, job) for index, job in enumerate(jobs)))
+
+    async def _stream_to_disk(self, client: httpx.AsyncClient, index: int, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        partial = None
+        try:
+            async with client.stream("GET", job["url"]) as response:
+                content_type = response.headers.get("content-type", "")
+                # An HTML answer means the session was not accepted (login page)
+                if response.status_code != 200 or "text/html" in content_type:
+                    self.log(f"HTTP download failed ({response.status_code}, {content_type or 'no type'}): {job['url']}")
+                    return None
+                filename = job.get("filename") or download_filename(_disposition_filename(response), job["url"], index)
+                target_path = os.path.join(self.download_dir, filename)
+                partial = target_path + ".part"
+                with open(partial, "wb") as f:
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(partial, target_path)
+        except (httpx.HTTPError, OSError) as e:
+            self.log(f"HTTP download failed: {job['url']}: {e}")
+            if partial and os.path.exists(partial):
+                os.remove(partial)
+            return None
+        return self._document(job, filename, target_path)
+
+    def download_in_browser(self, page: Page, index: int, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fetch one document by navigating the logged-in page to it."""
+        try:
+            with page.expect_download(timeout=self.timing["download"]) as download_info:
+                try:
+                    page.goto(job["url"])
+                except PlaywrightError:
+                    pass  # The navigation is aborted once the download starts
+            download = download_info.value
+            filename = job.get("filename") or download_filename(download.suggested_filename, job["url"], index)
+            target_path = os.path.join(self.download_dir, filename)
+            download.save_as(target_path)
+            self.log(f"Downloaded via browser: {filename}")
+            return self._document(job, filename, target_path)
+        except Exception as e:
+            self.log(f"Browser download failed: {job['url']}: {e}")
+            return None
+
+    @staticmethod
+    def _document(job: Dict[str, Any], filename: str, local_path: str) -> Dict[str, Any]:
+        return {
+            "filename": filename,
+            "local_path": local_path,
+            "date": job.get("date") or datetime.datetime.now(),
+            "category": job.get("category"),
+            "key": job.get("key") or job.get("url"),
+        }
+
     def download_file(self, download_obj, filename: str):
         """Helper to save downloaded file."""
         path = os.path.join(self.download_dir, filename)
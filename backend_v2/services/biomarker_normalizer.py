@@ -269,14 +269,19 @@ BIOMARKER_MAPPINGS = {
 }
 
 
-def _normalize_text(text: str) -> str:
-    """Normalize text for comparison - lowercase, remove special chars."""
-    # Lowercase
+def fold_diacritics(text: str) -> str:
+    """Lowercase and strip Romanian diacritics (also used by the search index)."""
     text = text.lower()
-    # Remove accents (Romanian diacritics)
     text = text.replace('ă', 'a').replace('â', 'a').replace('î', 'i')
     text = text.replace('ș', 's').replace('ş', 's')
     text = text.replace('ț', 't').replace('ţ', 't')
+    return text
+
+
+def _normalize_text(text: str) -> str:
+    """Normalize text for comparison - lowercase, remove special chars."""
+    # Lowercase, remove accents (Romanian diacritics)
+    text = fold_diacritics(text)
     # Remove parentheses content for matching
     text = re.sub(r'\s*\([^)]*\)\s*', ' ', text)
     # Remove extra whitespace
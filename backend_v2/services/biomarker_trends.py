@@ -0,0 +1,367 @@
+"""
+Biomarker Trends Engine
+Vectorized time-series analytics over a user's biomarker history.
+
+A user's results are loaded once into columnar NumPy arrays (one lightweight
+column query, no ORM objects) and every canonical biomarker is analyzed in a
+single pass: slope, percent change, rolling baseline, out-of-range streaks and
+reference-range crossings (abnormal <-> normal transitions).
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from backend_v2.services.biomarker_normalizer import get_canonical_name
+except ImportError:
+    from services.biomarker_normalizer import get_canonical_name
+
+NORMAL_FLAG = "NORMAL"
+
+# Number of previous readings averaged into the rolling baseline
+BASELINE_WINDOW = 3
+
+# Deviation from baseline (percent) above which a biomarker is trending up/down
+DIRECTION_THRESHOLD_PCT = 10.0
+
+_NS_PER_YEAR = 365.25 * 24 * 3600 * 1e9
+
+
+@lru_cache(maxsize=4096)
+def _resolve_canonical(test_name: str) -> str:
+    """Cached runtime normalization (test names repeat across every document)."""
+    return get_canonical_name(test_name) if test_name else test_name
+
+
+class BiomarkerSeries:
+    """
+    Columnar view of a user's biomarker results.
+
+    All arrays share the same length and row order (as loaded from the DB):
+        result_ids, document_ids: int64
+        test_names, canonical_names, flags: object (str / None)
+        dates: datetime64[ns] (NaT when the document has no date)
+        values: float64 (NaN when no numeric value is available)
+        ref_low, ref_high: float64 parsed reference bounds (NaN when unbounded)
+    """
+
+    __slots__ = ("result_ids", "document_ids", "test_names", "canonical_names",
+                 "flags", "dates", "values", "ref_low", "ref_high")
+
+    def __init__(self, result_ids, document_ids, test_names, canonical_names, flags, dates, values,
+                 ref_low=None, ref_high=None):
+        self.result_ids = np.asarray(result_ids, dtype=np.int64)
+        self.document_ids = np.asarray(document_ids, dtype=np.int64)
+        self.test_names = np.asarray(test_names, dtype=object)
+        self.canonical_names = np.asarray(canonical_names, dtype=object)
+        self.flags = np.asarray(flags, dtype=object)
+        self.dates = np.asarray(dates, dtype="datetime64[ns]")
+        self.values = np.asarray(values, dtype=np.float64)
+        n = len(self.result_ids)
+        self.ref_low = np.full(n, np.nan) if ref_low is None else np.asarray(ref_low, dtype=np.float64)
+        self.ref_high = np.full(n, np.nan) if ref_high is None else np.asarray(ref_high, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.result_ids)
+
+    @property
+    def abnormal(self) -> np.ndarray:
+        """Boolean mask of results flagged out of range (HIGH, LOW, ...)."""
+        return (self.flags != NORMAL_FLAG) & (self.flags != None)  # noqa: E711 - elementwise
+
+    def match_mask(self, biomarker_name: str) -> np.ndarray:
+        """
+        Rows belonging to a biomarker, using the same strict matching as the
+        evolution chart: canonical name, exact original name, or stored canonical.
+        """
+        canonical = _resolve_canonical(biomarker_name)
+        search_lower = biomarker_name.lower().strip()
+        canonical_lower = canonical.lower()
+
+        # Evaluate the predicate once per distinct test name, then broadcast
+        codes, unique_names = pd.factorize(self.test_names, use_na_sentinel=False)
+        name_match = np.fromiter(
+            (
+                bool(name) and (_resolve_canonical(name) == canonical
+                                or name.lower().strip() == search_lower)
+                for name in unique_names
+            ),
+            dtype=bool,
+            count=len(unique_names),
+        )
+        stored_codes, unique_stored = pd.factorize(self.canonical_names, use_na_sentinel=False)
+        stored_match = np.fromiter(
+            (bool(name) and name.lower() == canonical_lower for name in unique_stored),
+            dtype=bool,
+            count=len(unique_stored),
+        )
+        if not len(codes):
+            return np.zeros(0, dtype=bool)
+        return name_match[codes] | stored_match[stored_codes]
+
+
+def _to_naive(dt):
+    """numpy can't take tz-aware datetimes; DB values are UTC either way."""
+    if dt is not None and dt.tzinfo is not None:
+        return dt.replace(tzinfo=None)
+    return dt
+
+
+def load_user_series(db, user_id: int, vault_helper=None) -> BiomarkerSeries:
+    """
+    Load all of a user's results as columnar arrays in one query.
+
+    Numeric values are only decrypted when a vault_helper is given and available;
+    flag-only consumers (health score, timeline) skip decryption entirely.
+    """
+    try:
+        from backend_v2.models import Document, TestResult
+        from backend_v2.services import encrypted_records
+    except ImportError:
+        from models import Document, TestResult
+        from services import encrypted_records
+
+    decrypt = vault_helper is not None and vault_helper.is_available
+
+    columns = [
+        TestResult.id, TestResult.document_id, TestResult.test_name,
+        TestResult.canonical_name, TestResult.flags, Document.document_date,
+        TestResult.numeric_value, TestResult.ref_low, TestResult.ref_high,
+    ]
+    if decrypt:
+        columns += [TestResult.record_enc, TestResult.numeric_value_enc]
+
+    rows = db.query(*columns).join(Document, TestResult.document_id == Document.id)\
+        .filter(Document.user_id == user_id)\
+        .order_by(Document.document_date.asc(), TestResult.id.asc())\
+        .all()
+
+    if not rows:
+        return BiomarkerSeries([], [], [], [], [], [], [])
+
+    cols = list(zip(*rows))
+    ids, doc_ids, test_names, stored_canonical, flags, dates, plain_values, ref_low, ref_high = cols[:9]
+
+    values = np.array([np.nan if v is None else v for v in plain_values], dtype=np.float64)
+    if decrypt:
+        for i, (record, enc) in enumerate(zip(cols[9], cols[10])):
+            if record or enc:
+                try:
+                    numeric = encrypted_records.read_values(vault_helper, record, numeric_value_enc=enc)[1]
+                    if numeric is not None:
+                        values[i] = numeric
+                except Exception:
+                    pass  # Keep plaintext fallback (or NaN)
+
+    canonical = [s or _resolve_canonical(t) for s, t in zip(stored_canonical, test_names)]
+
+    return BiomarkerSeries(
+        result_ids=ids,
+        document_ids=[d or 0 for d in doc_ids],
+        test_names=test_names,
+        canonical_names=canonical,
+        flags=flags,
+        dates=[_to_naive(d) for d in dates],
+        values=values,
+        ref_low=[np.nan if v is None else v for v in ref_low],
+        ref_high=[np.nan if v is None else v for v in ref_high],
+    )
+
+
+TREND_COLUMNS = [
+    "count", "first_date", "last_date",
+    "latest_value", "previous_value", "pct_change", "slope_per_year",
+    "baseline", "baseline_deviation_pct", "direction",
+    "latest_flag", "previous_flag", "abnormal_streak",
+    "crossings", "latest_transition", "last_crossing_date",
+    "ref_low", "ref_high",
+]
+
+
+def compute_trends(series: BiomarkerSeries) -> pd.DataFrame:
+    """
+    Compute trend statistics for every canonical biomarker in one vectorized pass.
+
+    Returns a DataFrame indexed by canonical name with TREND_COLUMNS:
+        count: number of readings
+        first_date / last_date: date range covered (NaT if undated)
+        latest_value / previous_value: last two numeric readings
+        pct_change: latest vs previous numeric reading (%)
+        slope_per_year: least-squares slope of numeric values over time (units/year)
+        baseline: mean of up to BASELINE_WINDOW numeric readings before the latest
+        baseline_deviation_pct: latest vs baseline (%)
+        direction: "up" / "down" / "stable" (vs baseline), None with < 2 values
+        latest_flag / previous_flag: flags of the last two readings
+        abnormal_streak: consecutive out-of-range readings at the end of the series
+        crossings: number of normal <-> abnormal transitions
+        latest_transition: "improved" / "worsened" between the last two readings
+        last_crossing_date: date of the most recent transition
+        ref_low / ref_high: parsed reference bounds of the latest reading
+    """
+    n = len(series)
+    if n == 0:
+        return pd.DataFrame(columns=TREND_COLUMNS, index=pd.Index([], name="canonical_name"))
+
+    codes, uniques = pd.factorize(series.canonical_names, use_na_sentinel=False)
+    date_ns = series.dates.view(np.int64)  # NaT -> int64 min, sorts first like SQL NULLs
+
+    # Sort by biomarker, then date, then insertion order
+    order = np.lexsort((series.result_ids, date_ns, codes))
+    g = codes[order]
+    d_ns = date_ns[order]
+    dates = series.dates[order]
+    values = series.values[order]
+    flags = series.flags[order]
+    abnormal = series.abnormal[order]
+    pos = np.arange(n)
+
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    ends = np.r_[starts[1:], n]
+    counts = ends - starts
+    last_idx = ends - 1
+    has_prev = counts >= 2
+    prev_idx = np.where(has_prev, last_idx - 1, last_idx)
+
+    # --- Dates ---
+    has_date = ~np.isnat(dates)
+    first_dated = np.minimum.reduceat(np.where(has_date, pos, n), starts)
+    first_date = np.where(first_dated < ends, dates[np.minimum(first_dated, n - 1)], np.datetime64("NaT"))
+    last_date = dates[last_idx]
+
+    # --- Flags: streaks and crossings ---
+    latest_flag = flags[last_idx]
+    previous_flag = np.where(has_prev, flags[prev_idx], None)
+
+    last_normal = np.maximum.reduceat(np.where(~abnormal, pos, -1), starts)
+    abnormal_streak = last_idx - np.maximum(last_normal, starts - 1)
+
+    changed = np.r_[False, abnormal[1:] != abnormal[:-1]]
+    changed[starts] = False
+    crossings = np.add.reduceat(changed.astype(np.int64), starts)
+    last_change = np.maximum.reduceat(np.where(changed, pos, -1), starts)
+    last_crossing_date = np.where(last_change >= starts, dates[np.maximum(last_change, 0)], np.datetime64("NaT"))
+
+    transition = np.full(len(starts), None, dtype=object)
+    latest_changed = has_prev & changed[last_idx]
+    transition[latest_changed & ~abnormal[last_idx]] = "improved"
+    transition[latest_changed & abnormal[last_idx]] = "worsened"
+
+    # --- Numeric values ---
+    valid = ~np.isnan(values)
+
+    last_valid = np.maximum.reduceat(np.where(valid, pos, -1), starts)
+    has_latest = last_valid >= starts
+    last_valid_row = np.repeat(last_valid, counts)
+    prev_valid = np.maximum.reduceat(np.where(valid & (pos < last_valid_row), pos, -1), starts)
+    has_previous = prev_valid >= starts
+
+    latest_value = np.where(has_latest, values[np.maximum(last_valid, 0)], np.nan)
+    previous_value = np.where(has_previous, values[np.maximum(prev_valid, 0)], np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change = np.where(
+            has_previous & (previous_value != 0),
+            (latest_value - previous_value) / np.abs(previous_value) * 100,
+            np.nan,
+        )
+
+        # Least-squares slope over dated numeric points (x centred per group for precision)
+        xy_valid = valid & has_date
+        x_origin = np.repeat(d_ns[np.minimum(first_dated, n - 1)], counts)
+        x = np.where(xy_valid, (d_ns - x_origin) / _NS_PER_YEAR, 0.0)
+        y = np.where(xy_valid, values, 0.0)
+        k = np.add.reduceat(xy_valid.astype(np.float64), starts)
+        sx = np.add.reduceat(x, starts)
+        sy = np.add.reduceat(y, starts)
+        sxx = np.add.reduceat(x * x, starts)
+        sxy = np.add.reduceat(x * y, starts)
+        denom = k * sxx - sx * sx
+        slope_per_year = np.where((k >= 2) & (denom > 1e-12), (k * sxy - sx * sy) / denom, np.nan)
+
+        # Rolling baseline: mean of up to BASELINE_WINDOW valid readings before the latest one
+        csum = np.r_[0.0, np.cumsum(np.where(valid, values, 0.0))]
+        ccount = np.r_[0, np.cumsum(valid.astype(np.int64))]
+        # Valid readings within the group strictly before the latest valid one
+        before_latest = ccount[np.maximum(last_valid, 0)] - ccount[starts]
+        window = np.minimum(before_latest, BASELINE_WINDOW)
+        # Locate the start of the window in the cumulative-count space
+        target = ccount[np.maximum(last_valid, 0)] - window
+        window_start = np.searchsorted(ccount, target, side="left")
+        window_start = np.clip(window_start, 0, n)
+        window_sum = csum[np.maximum(last_valid, 0)] - csum[window_start]
+        baseline = np.where(has_latest & (window > 0), window_sum / np.maximum(window, 1), np.nan)
+        baseline_dev = np.where(
+            ~np.isnan(baseline) & (baseline != 0),
+            (latest_value - baseline) / np.abs(baseline) * 100,
+            np.nan,
+        )
+
+    direction = np.full(len(starts), None, dtype=object)
+    has_baseline = ~np.isnan(baseline)
+    direction[has_baseline] = "stable"
+    direction[has_baseline & (baseline_dev > DIRECTION_THRESHOLD_PCT)] = "up"
+    direction[has_baseline & (baseline_dev < -DIRECTION_THRESHOLD_PCT)] = "down"
+
+    return pd.DataFrame(
+        {
+            "count": counts,
+            "first_date": first_date,
+            "last_date": last_date,
+            "latest_value": latest_value,
+            "previous_value": previous_value,
+            "pct_change": pct_change,
+            "slope_per_year": slope_per_year,
+            "baseline": baseline,
+            "baseline_deviation_pct": baseline_dev,
+            "direction": direction,
+            "latest_flag": latest_flag,
+            "previous_flag": previous_flag,
+            "abnormal_streak": abnormal_streak,
+            "crossings": crossings,
+            "latest_transition": transition,
+            "last_crossing_date": last_crossing_date,
+            "ref_low": series.ref_low[order][last_idx],
+            "ref_high": series.ref_high[order][last_idx],
+        },
+        index=pd.Index(np.asarray(uniques, dtype=object)[g[starts]], name="canonical_name"),
+    )
+
+
+def summarize_transitions(trends: pd.DataFrame) -> Dict[str, int]:
+    """Count improving / worsening / stable biomarkers (those with >= 2 readings)."""
+    tracked = trends[trends["count"] >= 2]
+    improving = int((tracked["latest_transition"] == "improved").sum())
+    worsening = int((tracked["latest_transition"] == "worsened").sum())
+    return {
+        "improving": improving,
+        "worsening": worsening,
+        "stable": len(tracked) - improving - worsening,
+    }
+
+
+def _clean(value):
+    """Convert NumPy / pandas scalars into JSON-friendly Python values."""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        ts = pd.Timestamp(value)
+        return None if pd.isna(ts) else ts.strftime("%Y-%m-%d")
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else round(float(value), 4)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def trends_to_records(trends: pd.DataFrame, canonical_name: Optional[str] = None) -> List[dict]:
+    """Serialize a trends frame for API responses (optionally a single biomarker)."""
+    if canonical_name is not None:
+        trends = trends[trends.index == canonical_name]
+    records = []
+    for name, row in zip(trends.index, trends[TREND_COLUMNS].itertuples(index=False)):
+        record = {"canonical_name": name}
+        record.update({col: _clean(val) for col, val in zip(TREND_COLUMNS, row)})
+        records.append(record)
+    return records
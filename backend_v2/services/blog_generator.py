@@ -8,12 +8,17 @@ from openai import OpenAI
 try:
     from backend_v2.models import BlogArticle
     from backend_v2.services.openai_tracker import track_openai_response, log_openai_call
+    from backend_v2.services import prerender_cache, search_index, sitemap_cache
 except ImportError:
     from models import BlogArticle
     from services.openai_tracker import track_openai_response, log_openai_call
+    from services import prerender_cache, search_index, sitemap_cache
 
 logger = logging.getLogger(__name__)
 
+# Generated articles are indexed for search as they are written
+search_index.register_listeners()
+
 SYSTEM_PROMPT = """You are the editorial voice of Analize.Online — Romania's first health data aggregation platform.
 
 ## WRITING STYLE
@@ -339,6 +344,9 @@ REMEMBER: Include 2-3 Unsplash images, info boxes, a key takeaway box, and make
     db.add(article)
     db.commit()
     db.refresh(article)
+    # The new slug may have been prerendered as a fallback page; blog listings changed too
+    prerender_cache.invalidate("/blog")
+    sitemap_cache.invalidate_blog()
 
     logger.info(f"Blog article generated: slug={article.slug}, title={article.title}")
     return article
@@ -0,0 +1,183 @@
+"""
+Change Feed
+Per-user feed of created, updated and deleted rows for delta sync clients.
+
+data_changes holds one row per synced entity - documents, test results,
+health reports, notifications, medications and medication logs - replaced
+whenever the entity changes, so its id is the entity's latest change
+sequence number and a delete leaves a tombstone (deleted = true). Rows are
+written by services/data_version in the same transaction as the change,
+right after the user's data_version bump: that UPDATE holds the user's row
+lock until commit, so one user's sequence numbers become visible in
+increasing order and a client never moves its cursor past a change still in
+flight.
+
+Clients keep an opaque cursor (last sequence number + when the catch-up it
+belongs to started) and ask for everything after it. Tombstones are kept
+for CHANGE_FEED_TOMBSTONE_DAYS; a missing, malformed or older cursor gets a
+reset - the full current state without tombstones - and the client replaces
+its local store with it.
+
+Test results deleted together with their document may have no tombstone of
+their own: a document tombstone also removes the document's test results.
+"""
+import os
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import exists, false, literal, select
+
+try:
+    from backend_v2.models import (
+        DataChange, Document, HealthReport, Medication, MedicationLog, Notification, TestResult, User, utc_now,
+    )
+except ImportError:
+    from models import (
+        DataChange, Document, HealthReport, Medication, MedicationLog, Notification, TestResult, User, utc_now,
+    )
+
+CHANGE_FEED_TOMBSTONE_DAYS = int(os.getenv("CHANGE_FEED_TOMBSTONE_DAYS", "90"))
+MAX_PAGE_SIZE = 1000
+
+# Synced models -> entity name, in the order rows of one transaction are numbered
+# (a document before its test results, a medication before its logs)
+ENTITIES = {
+    Document: "document",
+    TestResult: "test_result",
+    HealthReport: "health_report",
+    Notification: "notification",
+    Medication: "medication",
+    MedicationLog: "medication_log",
+}
+_ORDER = {name: i for i, name in enumerate(ENTITIES.values())}
+
+_CHUNK = 500  # Ids per IN (...) list
+
+# (entity, id) -> (user_id, document_id, deleted); user_id None = owner of document_id
+Changes = Dict[Tuple[str, int], Tuple[Optional[int], Optional[int], bool]]
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+
+# --- Recording (called by data_version) --------------------------------------------
+
+def record(connection, changes: Changes) -> int:
+    """Replace the data_changes rows of the changed entities; returns the number written."""
+    table, documents = DataChange.__table__, Document.__table__
+
+    unresolved = sorted({doc for user, doc, _ in changes.values() if user is None and doc is not None})
+    owners = {}
+    for chunk in _chunks(unresolved):
+        owners.update(connection.execute(
+            select(documents.c.id, documents.c.user_id).where(documents.c.id.in_(chunk))
+        ).all())
+
+    now = utc_now()
+    rows = []
+    for (entity, entity_id), (user_id, document_id, deleted) in changes.items():
+        if user_id is None:
+            user_id = owners.get(document_id)
+        if user_id is None:
+            continue  # Its document is already gone; the document's tombstone covers it
+        rows.append({"user_id": user_id, "entity": entity, "entity_id": entity_id,
+                     "deleted": deleted, "changed_at": now})
+    if not rows:
+        return 0
+    rows.sort(key=lambda row: (_ORDER[row["entity"]], row["entity_id"]))
+
+    by_entity: Dict[str, List[int]] = {}
+    for row in rows:
+        by_entity.setdefault(row["entity"], []).append(row["entity_id"])
+    for entity, ids in by_entity.items():
+        for chunk in _chunks(ids):
+            connection.execute(table.delete().where(table.c.entity == entity, table.c.entity_id.in_(chunk)))
+    connection.execute(table.insert(), rows)
+    return len(rows)
+
+
+def backfill(db) -> int:
+    """Add a row for every existing synced entity that has none (migration)."""
+    table = DataChange.__table__
+    connection = db.connection()
+    now = utc_now()
+    total = 0
+    for model, entity in ENTITIES.items():
+        source = model.__table__
+        if model is TestResult:
+            documents = Document.__table__
+            owner = documents.c.user_id
+            base = select(owner, literal(entity), source.c.id, false(), literal(now)).select_from(
+                source.join(documents, documents.c.id == source.c.document_id))
+        else:
+            owner = source.c.user_id
+            base = select(owner, literal(entity), source.c.id, false(), literal(now))
+        query = base.where(
+            owner.isnot(None),
+            ~exists().where(table.c.entity == entity, table.c.entity_id == source.c.id),
+        ).order_by(source.c.id)
+        result = connection.execute(table.insert().from_select(
+            ["user_id", "entity", "entity_id", "deleted", "changed_at"], query))
+        total += max(result.rowcount or 0, 0)
+    db.commit()
+    return total
+
+
+# --- Reading -----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Page:
+    changes: List[DataChange]  # In sequence order
+    cursor: str  # Pass back to get what follows
+    has_more: bool
+    reset: bool  # The client must replace its store with this (and following) pages
+
+
+def _encode(seq: int, started: int) -> str:
+    return f"{seq}.{started}"
+
+
+def _decode(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    try:
+        seq, started = cursor.split(".")
+        return int(seq), int(started)
+    except (AttributeError, ValueError):
+        return None
+
+
+def read(db, user_id: int, cursor: Optional[str] = None, limit: int = MAX_PAGE_SIZE) -> Page:
+    """The user's changes after cursor (everything current when the cursor cannot be served)."""
+    now = int(time.time())
+    position = _decode(cursor)
+    reset = position is None or position[1] < now - CHANGE_FEED_TOMBSTONE_DAYS * 86400
+    after, started = (0, now) if reset else position
+
+    query = db.query(DataChange).filter(DataChange.user_id == user_id, DataChange.id > after)
+    if reset:
+        query = query.filter(DataChange.deleted == False)
+    rows = query.order_by(DataChange.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1].id if rows else after
+
+    # Once caught up, tombstones older than now were all delivered; mid catch-up only
+    # those older than its start are guaranteed to be
+    return Page(rows, _encode(last, started if has_more else now), has_more, reset)
+
+
+def prune(db) -> int:
+    """Drop expired tombstones and rows of deleted accounts."""
+    cutoff = utc_now() - timedelta(days=CHANGE_FEED_TOMBSTONE_DAYS)
+    removed = db.query(DataChange).filter(
+        DataChange.deleted == True,
+        DataChange.changed_at < cutoff,
+    ).delete(synchronize_session=False)
+    removed += db.query(DataChange).filter(
+        ~DataChange.user_id.in_(select(User.id))
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
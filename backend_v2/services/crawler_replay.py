@@ -0,0 +1,180 @@
+"""
+Crawler Replay
+Runs the provider crawlers offline against saved copies of the portals.
+
+Each provider has a fixture directory ({CRAWLER_REPLAY_FIXTURES}/{provider})
+with the portal pages and a manifest.json:
+
+    {
+      "budget_seconds": 15,          # wall time a full replayed sync may take
+      "expected_documents": 2,
+      "routes": [
+        {"url": "https://portal.example.ro/login", "file": "login.html"},
+        {"url": "https://portal.example.ro/login", "method": "POST",
+         "status": 302, "headers": {"Location": "https://portal.example.ro/dashboard"}},
+        {"url": "https://portal.example.ro/files/*", "file": "result.pdf",
+         "headers": {"Content-Disposition": "attachment; filename=\\"result.pdf\\""}}
+      ]
+    }
+
+Every request - from the browser and from the HTTP download engine - is
+answered locally from the manifest (first matching route, fnmatch on the
+full URL); anything else gets a 404. The crawler runs its real login,
+navigation and download code, so the replay catches broken selectors and
+timing regressions - a fixed sleep creeping back in shows up as a blown
+budget or a wait that ran into its timeout.
+
+Run with:
+    python -m backend_v2.services.crawler_replay [provider ...]
+"""
+import fnmatch
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+try:
+    from backend_v2.services import crawler_timing
+    from backend_v2.services.regina_maria_crawler import ReginaMariaCrawler
+    from backend_v2.services.synevo_crawler import SynevoCrawler
+    from backend_v2.services.medlife_crawler import MedLifeCrawler
+    from backend_v2.services.sanador_crawler import SanadorCrawler
+except ImportError:
+    from services import crawler_timing
+    from services.regina_maria_crawler import ReginaMariaCrawler
+    from services.synevo_crawler import SynevoCrawler
+    from services.medlife_crawler import MedLifeCrawler
+    from services.sanador_crawler import SanadorCrawler
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.getenv(
+    "CRAWLER_REPLAY_FIXTURES",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../tests/fixtures/crawler_replay"))
+)
+
+CRAWLERS = {
+    "regina_maria": ReginaMariaCrawler,
+    "synevo": SynevoCrawler,
+    "medlife": MedLifeCrawler,
+    "sanador": SanadorCrawler,
+}
+
+REPLAY_CREDENTIALS = {"username": "1900101223344", "password": "replay-password"}
+
+# A timeout on these means the crawler waited for something the portal never showed
+STRICT_KINDS = ("element", "navigation", "download", "login_step")
+
+
+class ReplaySite:
+    """Serves one provider's fixtures to the browser and the download engine."""
+
+    def __init__(self, provider: str, fixtures_dir: str = FIXTURES_DIR):
+        self.root = os.path.join(fixtures_dir, provider)
+        with open(os.path.join(self.root, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.unmatched: List[str] = []
+
+    def match(self, method: str, url: str) -> Optional[Dict]:
+        for route in self.manifest["routes"]:
+            if route.get("method", "GET").upper() == method and fnmatch.fnmatchcase(url, route["url"]):
+                return route
+        return None
+
+    def _body(self, entry: Dict) -> Tuple[bytes, str]:
+        body = b""
+        content_type = entry.get("content_type")
+        if "file" in entry:
+            with open(os.path.join(self.root, entry["file"]), "rb") as f:
+                body = f.read()
+            content_type = content_type or mimetypes.guess_type(entry["file"])[0]
+        return body, content_type or "text/html; charset=utf-8"
+
+    def handle(self, route):
+        """Playwright route handler for the browser."""
+        request = route.request
+        entry = self.match(request.method, request.url)
+        if entry is None:
+            self.unmatched.append(f"{request.method} {request.url}")
+            route.fulfill(status=404, content_type="text/plain", body="")
+            return
+
+        body, content_type = self._body(entry)
+        route.fulfill(status=entry.get("status", 200), headers=entry.get("headers", {}),
+                      content_type=content_type, body=body)
+
+    def handle_http(self, request: httpx.Request) -> httpx.Response:
+        """httpx transport handler for the download engine."""
+        entry = self.match(request.method, str(request.url))
+        if entry is None:
+            self.unmatched.append(f"{request.method} {request.url}")
+            return httpx.Response(404)
+
+        body, content_type = self._body(entry)
+        headers = dict(entry.get("headers", {}), **{"Content-Type": content_type})
+        return httpx.Response(entry.get("status", 200), headers=headers, content=body)
+
+    def install(self, context):
+        context.route("**/*", self.handle)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle_http)
+
+
+def replay(provider: str, download_dir: str = None, headless: bool = True,
+           fixtures_dir: str = FIXTURES_DIR) -> Dict:
+    """Run a provider's crawler against its fixtures and report time and waits."""
+    site = ReplaySite(provider, fixtures_dir)
+    crawler = CRAWLERS[provider](headless=headless)
+    crawler.download_dir = download_dir or tempfile.mkdtemp(prefix=f"replay_{provider}_")
+    crawler.browser_channel = None  # Bundled Chromium
+    crawler.timings = crawler_timing.TimingRecorder(provider, persist=False)
+    crawler.context_hooks.append(site.install)
+    crawler.download_transport = site.transport()
+
+    start = time.monotonic()
+    result = crawler._run_sync(REPLAY_CREDENTIALS)
+    return {
+        "provider": provider,
+        "elapsed_seconds": time.monotonic() - start,
+        "budget_seconds": site.manifest["budget_seconds"],
+        "expected_documents": site.manifest["expected_documents"],
+        "documents": result["documents"],
+        "waits": crawler.timings.waits,
+        "unmatched": site.unmatched,
+    }
+
+
+def problems(report: Dict) -> List[str]:
+    """What makes a replay fail: missing documents, a blown budget, strict waits timing out."""
+    found = []
+    if len(report["documents"]) != report["expected_documents"]:
+        found.append(f"downloaded {len(report['documents'])} documents, expected {report['expected_documents']}")
+    if report["elapsed_seconds"] > report["budget_seconds"]:
+        found.append(f"took {report['elapsed_seconds']:.1f}s, budget {report['budget_seconds']}s")
+    for wait in report["waits"]:
+        if not wait["ok"] and wait["kind"] in STRICT_KINDS:
+            found.append(f"{wait['kind']} wait '{wait['label']}' timed out after {wait['ms']} ms")
+    return found
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    exit_code = 0
+    for name in sys.argv[1:] or list(CRAWLERS):
+        report = replay(name)
+        slowest = sorted(report["waits"], key=lambda w: w["ms"], reverse=True)[:5]
+        logger.info(f"{name}: {len(report['documents'])} documents in {report['elapsed_seconds']:.1f}s "
+                    f"(budget {report['budget_seconds']}s)")
+        for wait in slowest:
+            logger.info(f"  {wait['ms']:>6} ms  {wait['kind']:<12} {wait['label']}{'' if wait['ok'] else ' (timeout)'}")
+        for problem in problems(report):
+            logger.error(f"  {problem}")
+            exit_code = 1
+    sys.exit(exit_code)
@@ -0,0 +1,196 @@
+"""
+Crawler Timing
+Per-provider timing profiles and wait recording for the portal crawlers.
+
+Crawlers wait on conditions (a selector appearing, the network going idle,
+a download starting) rather than sleeping for fixed intervals. A timing
+profile only bounds those waits - how long to wait for each kind of
+condition before giving up - so a fast portal is never slowed down by it.
+
+Profiles are layered:
+1. DEFAULT_PROFILE
+2. PROVIDER_PROFILES (hand-tuned per portal)
+3. Recorded profiles in {CRAWLER_TIMINGS_DIR}/profiles.json, built from real
+   runs with build_profile() (p95 of observed waits x PROFILE_MARGIN)
+
+Every crawler run appends the waits it performed to
+{CRAWLER_TIMINGS_DIR}/{provider}.jsonl. Rebuild the profiles with:
+    python -m backend_v2.services.crawler_timing [provider ...]
+"""
+import datetime
+import json
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TIMINGS_DIR = os.getenv(
+    "CRAWLER_TIMINGS_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/crawler_timings"))
+)
+PROFILES_FILE = "profiles.json"
+
+# Multiplier for all timeouts (e.g. 2 on a slow network)
+TIMING_SCALE = float(os.getenv("CRAWLER_TIMING_SCALE", "1"))
+
+# All values in milliseconds
+DEFAULT_PROFILE = {
+    "slow_mo": 0,            # Delay added to every Playwright action
+    "poll": 250,             # Interval for Python-side condition polling
+    "settle": 300,           # Pause where no observable condition exists
+    "consent": 1500,         # Cookie banner appearing / going away
+    "element": 15000,        # Selector reaching the wanted state
+    "navigation": 30000,     # page.goto / URL change
+    "network_idle": 5000,    # No requests for 500 ms (tolerated on timeout)
+    "lazy_load": 1500,       # Page growing after a scroll
+    "download": 60000,       # Download event after a click
+    "login_step": 5000,      # One round of the login status loop
+    "login": 180000,         # Whole login, including manual CAPTCHA solving
+}
+
+PROVIDER_PROFILES = {
+    "regina_maria": {"element": 20000},  # Angular renders the login form late
+    "synevo": {},
+    "medlife": {"login": 120000},
+    "sanador": {"login": 120000},
+}
+
+# Kinds derived from recorded runs; the rest are policy, not observations
+RECORDED_KINDS = ("consent", "element", "navigation", "network_idle", "lazy_load", "download", "login_step")
+UNSCALED_KINDS = ("slow_mo", "poll", "settle")
+
+PROFILE_MARGIN = 3.0
+PROFILE_RUNS = 20
+MIN_SAMPLES = 5
+MIN_TIMEOUT_MS = 1000
+
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def load_recorded_profiles() -> Dict[str, Dict[str, int]]:
+    return _read_json(os.path.join(TIMINGS_DIR, PROFILES_FILE), {})
+
+
+def get_profile(provider: str) -> Dict[str, int]:
+    """Timing profile for a provider (defaults < provider tuning < recorded)."""
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(PROVIDER_PROFILES.get(provider, {}))
+    profile.update(load_recorded_profiles().get(provider, {}))
+    if TIMING_SCALE != 1:
+        for kind in profile:
+            if kind not in UNSCALED_KINDS:
+                profile[kind] = int(profile[kind] * TIMING_SCALE)
+    return profile
+
+
+class TimingRecorder:
+    """Collects the waits of one crawler run and appends them to the provider log."""
+
+    def __init__(self, provider: str, persist: bool = True):
+        self.provider = provider
+        self.persist = persist
+        self.waits: List[Dict] = []
+        self.started = time.monotonic()
+
+    def record(self, kind: str, label: str, start: float, ok: bool) -> int:
+        elapsed_ms = int((time.monotonic() - start) * 1000)
+        self.waits.append({"kind": kind, "label": label, "ms": elapsed_ms, "ok": ok})
+        return elapsed_ms
+
+    def total_ms(self) -> int:
+        return sum(wait["ms"] for wait in self.waits)
+
+    def summary(self) -> str:
+        failed = sum(1 for wait in self.waits if not wait["ok"])
+        return f"{len(self.waits)} waits, {self.total_ms()} ms waiting, {failed} timed out"
+
+    def save(self):
+        if not self.persist or not self.waits:
+            return
+        run = {
+            "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "duration_ms": int((time.monotonic() - self.started) * 1000),
+            "waits": self.waits,
+        }
+        try:
+            os.makedirs(TIMINGS_DIR, exist_ok=True)
+            with open(os.path.join(TIMINGS_DIR, f"{self.provider}.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(run) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not record crawler timings for {self.provider}: {e}")
+
+
+def load_runs(provider: str) -> List[Dict]:
+    runs = []
+    try:
+        with open(os.path.join(TIMINGS_DIR, f"{provider}.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return runs
+
+
+def _percentile(values: List[int], pct: float) -> float:
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def build_profile(provider: str, runs: Optional[List[Dict]] = None) -> Dict[str, int]:
+    """
+    Derive timeouts from the last PROFILE_RUNS recorded runs: p95 of the
+    successful waits of each kind times PROFILE_MARGIN. Recorded profiles
+    only tighten the provider defaults, never loosen them.
+    """
+    runs = load_runs(provider) if runs is None else runs
+    samples = defaultdict(list)
+    for run in runs[-PROFILE_RUNS:]:
+        for wait in run.get("waits", []):
+            if wait.get("ok") and wait.get("kind") in RECORDED_KINDS:
+                samples[wait["kind"]].append(wait["ms"])
+
+    defaults = dict(DEFAULT_PROFILE, **PROVIDER_PROFILES.get(provider, {}))
+    profile = {}
+    for kind, values in samples.items():
+        if len(values) < MIN_SAMPLES:
+            continue
+        timeout = max(MIN_TIMEOUT_MS, int(_percentile(values, 95) * PROFILE_MARGIN))
+        profile[kind] = min(defaults[kind], timeout)
+    return profile
+
+
+def save_profiles(providers: List[str]) -> Dict[str, Dict[str, int]]:
+    """Rebuild the recorded profiles of the given providers."""
+    profiles = load_recorded_profiles()
+    for provider in providers:
+        profile = build_profile(provider)
+        if profile:
+            profiles[provider] = profile
+        else:
+            profiles.pop(provider, None)
+    os.makedirs(TIMINGS_DIR, exist_ok=True)
+    with open(os.path.join(TIMINGS_DIR, PROFILES_FILE), "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+    return profiles
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    selected = sys.argv[1:] or list(PROVIDER_PROFILES)
+    for name, built in save_profiles(selected).items():
+        logger.info(f"{name}: {built}")
@@ -0,0 +1,239 @@
+"""
+Crawler Worker
+Runs queued provider syncs outside the API process.
+
+A worker claims pending SyncJobs (see sync_queue) and runs each in its own
+child process, so Chromium, a stuck CAPTCHA wait or a leaking crawler never
+shares memory or CPU with the API:
+- at most CRAWLER_WORKER_CONCURRENCY jobs at a time per worker
+- a job whose process tree (crawler + browser) grows past
+  CRAWLER_WORKER_MAX_RSS_MB, or runs longer than CRAWLER_WORKER_JOB_TIMEOUT
+  seconds, is killed and its SyncJob marked failed
+
+Scale by starting more workers, on this host or others sharing the database.
+Each job process renews its job's lease (see sync_queue); when a worker dies,
+its jobs are reclaimed by the other workers once the leases run out.
+SIGTERM/SIGINT stop claiming, give running jobs CRAWLER_WORKER_SHUTDOWN_GRACE
+seconds to finish, then kill them and put their jobs back in the queue.
+
+Run with:
+    SYNC_EXECUTION=worker python -m backend_v2.services.crawler_worker
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Dict, Tuple
+
+import psutil
+
+try:
+    from backend_v2.database import SessionLocal
+    from backend_v2.models import SyncJob, LinkedAccount
+    from backend_v2.services import sync_queue, sync_status, progress_bus, provider_health
+    from backend_v2.services.scheduler import classify_sync_error
+except ImportError:
+    from database import SessionLocal
+    from models import SyncJob, LinkedAccount
+    from services import sync_queue, sync_status, progress_bus, provider_health
+    from services.scheduler import classify_sync_error
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = int(os.getenv("CRAWLER_WORKER_CONCURRENCY", "2"))
+MAX_RSS_MB = int(os.getenv("CRAWLER_WORKER_MAX_RSS_MB", "1536"))  # Per job, browser included
+JOB_TIMEOUT = int(os.getenv("CRAWLER_WORKER_JOB_TIMEOUT", str(sync_queue.MAX_RUN_SECONDS)))  # Seconds
+POLL_SECONDS = float(os.getenv("CRAWLER_WORKER_POLL_SECONDS", "2"))
+SHUTDOWN_GRACE = int(os.getenv("CRAWLER_WORKER_SHUTDOWN_GRACE", "60"))  # Seconds
+
+# Fresh interpreter per job: no inherited threads, DB connections or browser state
+_mp = multiprocessing.get_context("spawn")
+
+
+def run_job(job_id: int):
+    """Child process: run one claimed sync job to completion."""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from backend_v2.services.user_vault import unlock_all_service_vaults
+        from backend_v2.services.scheduler import run_scheduled_sync
+        from backend_v2.routers.users import run_sync_job
+    except ImportError:
+        from services.user_vault import unlock_all_service_vaults
+        from services.scheduler import run_scheduled_sync
+        from routers.users import run_sync_job
+
+    db = SessionLocal()
+    try:
+        job = db.get(SyncJob, job_id)
+        # Background syncs decrypt credentials with the service-unlocked vault
+        unlock_all_service_vaults(user_ids=[job.user_id])
+        sync_status.status_starting(job.user_id, job.provider_name)
+
+        if job.source == "manual":
+            # Holds the lease and records the outcome itself
+            run_sync_job(job.id)
+        else:
+            # Holds the lease itself
+            run_scheduled_sync(job.user_id, job.linked_account_id, job.provider_name,
+                               f"{job.user_id}:{job.provider_name}", sync_job_id=job.id)
+    finally:
+        db.close()
+        progress_bus.flush()
+
+
+def _tree_rss_mb(process: psutil.Process) -> float:
+    """Resident memory of a process and all its children (Chromium), in MB."""
+    total = 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def _kill_tree(process: multiprocessing.Process):
+    """Kill a job process and everything it started (the browser)."""
+    try:
+        children = psutil.Process(process.pid).children(recursive=True)
+    except psutil.Error:
+        children = []
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(children, timeout=10)
+    process.kill()
+    process.join()
+
+
+class CrawlerWorker:
+    """Claims sync jobs and supervises one child process per running job."""
+
+    def __init__(self, concurrency: int = CONCURRENCY, worker_id: str = None,
+                 max_rss_mb: int = MAX_RSS_MB, job_timeout: int = JOB_TIMEOUT):
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.max_rss_mb = max_rss_mb
+        self.job_timeout = job_timeout
+        self.running: Dict[int, Tuple[multiprocessing.Process, float]] = {}  # job id -> (process, start)
+        self.stopping = False
+
+    def stop(self, *args):
+        if not self.stopping:
+            logger.info(f"Worker {self.worker_id} stopping: no new jobs, {len(self.running)} running")
+        self.stopping = True
+
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info(f"Crawler worker {self.worker_id} started ({self.concurrency} slots, "
+                    f"{self.max_rss_mb} MB / {self.job_timeout}s per job)")
+
+        while not self.stopping:
+            self.tick()
+            time.sleep(POLL_SECONDS)
+        self.shutdown()
+
+    def tick(self):
+        """Reap finished jobs, enforce limits, fill free slots."""
+        self.reap()
+        self.enforce_limits()
+        while not self.stopping and len(self.running) < self.concurrency:
+            if not self.start_next():
+                break
+
+    def start_next(self) -> bool:
+        db = SessionLocal()
+        try:
+            # Jobs of providers with an open circuit breaker wait for it to close
+            job = sync_queue.claim(db, self.worker_id, skip_providers=provider_health.blocked_providers(db))
+        finally:
+            db.close()
+        if job is None:
+            return False
+        process = _mp.Process(target=run_job, args=(job.id,), name=f"sync-job-{job.id}", daemon=False)
+        process.start()
+        self.running[job.id] = (process, time.monotonic())
+        logger.info(f"Started sync job {job.id} ({job.provider_name}, user {job.user_id}) in pid {process.pid}")
+        return True
+
+    def reap(self):
+        for job_id, (process, started) in list(self.running.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self.running[job_id]
+            logger.info(f"Sync job {job_id} exited with {process.exitcode} after {time.monotonic() - started:.0f}s")
+            if process.exitcode != 0:
+                self.fail(job_id, f"Crawler worker process died (exit code {process.exitcode})")
+
+    def enforce_limits(self):
+        for job_id, (process, started) in list(self.running.items()):
+            reason = None
+            if time.monotonic() - started > self.job_timeout:
+                reason = f"Sync timed out after {self.job_timeout}s"
+            else:
+                try:
+                    rss = _tree_rss_mb(psutil.Process(process.pid))
+                except psutil.Error:
+                    continue
+                if rss > self.max_rss_mb:
+                    reason = f"Sync killed: crawler used {rss:.0f} MB (limit {self.max_rss_mb} MB)"
+            if reason:
+                logger.warning(f"Sync job {job_id}: {reason}")
+                _kill_tree(process)
+                del self.running[job_id]
+                self.fail(job_id, reason)
+
+    def fail(self, job_id: int, error: str):
+        """Record a job the child could not finish itself."""
+        db = SessionLocal()
+        try:
+            job = db.get(SyncJob, job_id)
+            if job is None or job.status != "running" or job.worker_id != self.worker_id:
+                return  # Finished, or reclaimed by another worker
+            sync_queue.finish(db, job, error=error)
+            error_type = classify_sync_error(error)
+            account = db.get(LinkedAccount, job.linked_account_id)
+            if account:
+                account.status = "ERROR"
+                account.last_sync_error = error
+                account.error_type = error_type
+                if not provider_health.is_outage(error_type):
+                    account.consecutive_failures = (account.consecutive_failures or 0) + 1
+                db.commit()
+            sync_status.status_error(job.user_id, job.provider_name, error, error_type)
+        finally:
+            db.close()
+
+    def shutdown(self):
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        while self.running and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(1)
+
+        db = SessionLocal()
+        try:
+            for job_id, (process, _) in list(self.running.items()):
+                logger.warning(f"Sync job {job_id} still running at shutdown - requeueing")
+                _kill_tree(process)
+                sync_queue.requeue(db, job_id)
+                job = db.get(SyncJob, job_id)
+                account = db.get(LinkedAccount, job.linked_account_id) if job else None
+                if account and account.status == "SYNCING":
+                    account.status = "ACTIVE"
+                    db.commit()
+            self.running.clear()
+        finally:
+            db.close()
+        progress_bus.flush()
+        logger.info(f"Crawler worker {self.worker_id} stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    CrawlerWorker().run_forever()
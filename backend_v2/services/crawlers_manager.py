@@ -6,15 +6,15 @@ try:
     from backend_v2.services.synevo_crawler import SynevoCrawler
     from backend_v2.services.medlife_crawler import MedLifeCrawler, CaptchaRequiredError as MedLifeCaptchaError
     from backend_v2.services.sanador_crawler import SanadorCrawler, CaptchaRequiredError as SanadorCaptchaError
-    from backend_v2.services import sync_status
+    from backend_v2.services import sync_status, sync_queue
 except ImportError:
     from services.regina_maria_crawler import ReginaMariaCrawler, CaptchaRequiredError
     from services.synevo_crawler import SynevoCrawler
     from services.medlife_crawler import MedLifeCrawler, CaptchaRequiredError as MedLifeCaptchaError
     from services.sanador_crawler import SanadorCrawler, CaptchaRequiredError as SanadorCaptchaError
-    from services import sync_status
+    from services import sync_status, sync_queue
 
-async def run_regina_async(username, password, headless=True, user_id=None):
+async def run_regina_async(username, password, headless=True, user_id=None, watermark=None):
     """
     Run Regina Maria crawler with status updates.
     Auto-retries with visible browser if CAPTCHA is detected.
@@ -24,9 +24,12 @@ async def run_regina_async(username, password, headless=True, user_id=None):
         password: Regina Maria account password
         headless: If True (default), browser window will be hidden
         user_id: User ID for status tracking and file isolation (required for production)
+        watermark: SyncWatermark of the linked account, to skip documents synced before (None syncs everything)
     """
     provider = "Regina Maria"
     crawler = ReginaMariaCrawler(headless=headless, user_id=user_id)
+    if watermark:
+        crawler.watermark = watermark
 
     # Set up status callback
     if user_id:
@@ -60,6 +63,8 @@ async def run_regina_async(username, password, headless=True, user_id=None):
 
             # Retry with visible browser
             crawler = ReginaMariaCrawler(headless=False, user_id=user_id)
+            if watermark:
+                crawler.watermark = watermark
             if user_id:
                 crawler.set_status_callback(lambda stage, msg, progress=0, total=0: _update_status(user_id, provider, stage, msg, progress, total))
 
@@ -84,7 +89,7 @@ async def run_regina_async(username, password, headless=True, user_id=None):
         print(f"Crawler Error: {err}")
         return {"status": "error", "message": f"Regina Failed: {str(e)}"}
 
-async def run_synevo_async(username, password, headless=True, user_id=None):
+async def run_synevo_async(username, password, headless=True, user_id=None, watermark=None):
     """
     Run Synevo crawler with status updates.
 
@@ -93,9 +98,12 @@ async def run_synevo_async(username, password, headless=True, user_id=None):
         password: Synevo account password
         headless: If True (default), browser window will be hidden
         user_id: User ID for status tracking and file isolation (required for production)
+        watermark: SyncWatermark of the linked account, to skip documents synced before (None syncs everything)
     """
     provider = "Synevo"
     crawler = SynevoCrawler(headless=headless, user_id=user_id)
+    if watermark:
+        crawler.watermark = watermark
 
     # Set up status callback
     if user_id:
@@ -121,7 +129,7 @@ async def run_synevo_async(username, password, headless=True, user_id=None):
         return {"status": "error", "message": f"Synevo Failed: {type(e).__name__} - {str(e)}"}
 
 
-async def run_medlife_async(username, password, headless=True, user_id=None):
+async def run_medlife_async(username, password, headless=True, user_id=None, watermark=None):
     """
     Run MedLife crawler with status updates.
     Auto-retries with visible browser if CAPTCHA is detected.
@@ -131,9 +139,12 @@ async def run_medlife_async(username, password, headless=True, user_id=None):
         password: MedLife account password
         headless: If True (default), browser window will be hidden
         user_id: User ID for status tracking and file isolation (required for production)
+        watermark: SyncWatermark of the linked account, to skip documents synced before (None syncs everything)
     """
     provider = "MedLife"
     crawler = MedLifeCrawler(headless=headless, user_id=user_id)
+    if watermark:
+        crawler.watermark = watermark
 
     # Set up status callback
     if user_id:
@@ -163,6 +174,8 @@ async def run_medlife_async(username, password, headless=True, user_id=None):
 
             # Retry with visible browser
             crawler = MedLifeCrawler(headless=False, user_id=user_id)
+            if watermark:
+                crawler.watermark = watermark
             if user_id:
                 crawler.set_status_callback(lambda stage, msg, progress=0, total=0: _update_status(user_id, provider, stage, msg, progress, total))
 
@@ -188,7 +201,7 @@ async def run_medlife_async(username, password, headless=True, user_id=None):
         return {"status": "error", "message": f"MedLife Failed: {str(e)}"}
 
 
-async def run_sanador_async(username, password, headless=True, user_id=None):
+async def run_sanador_async(username, password, headless=True, user_id=None, watermark=None):
     """
     Run Sanador crawler with status updates.
     Auto-retries with visible browser if CAPTCHA is detected.
@@ -198,9 +211,12 @@ async def run_sanador_async(username, password, headless=True, user_id=None):
         password: Sanador account password
         headless: If True (default), browser window will be hidden
         user_id: User ID for status tracking and file isolation (required for production)
+        watermark: SyncWatermark of the linked account, to skip documents synced before (None syncs everything)
     """
     provider = "Sanador"
     crawler = SanadorCrawler(headless=headless, user_id=user_id)
+    if watermark:
+        crawler.watermark = watermark
 
     # Set up status callback
     if user_id:
@@ -230,6 +246,8 @@ async def run_sanador_async(username, password, headless=True, user_id=None):
 
             # Retry with visible browser
             crawler = SanadorCrawler(headless=False, user_id=user_id)
+            if watermark:
+                crawler.watermark = watermark
             if user_id:
                 crawler.set_status_callback(lambda stage, msg, progress=0, total=0: _update_status(user_id, provider, stage, msg, progress, total))
 
@@ -256,7 +274,8 @@ async def run_sanador_async(username, password, headless=True, user_id=None):
 
 
 def _update_status(user_id: int, provider: str, stage: str, message: str, progress: int = 0, total: int = 0):
-    """Helper to update sync status with optional progress tracking."""
+    """Helper to update sync status with optional progress tracking. Also heartbeats the sync job's lease."""
+    sync_queue.heartbeat(user_id, provider)
     if stage == "login":
         sync_status.status_logging_in(user_id, provider)
     elif stage == "logged_in":
@@ -0,0 +1,203 @@
+"""
+Data Version
+Per-user data version counter and conditional GET for authenticated reads.
+
+users.data_version is bumped in the same transaction as any change to what a
+user's dashboard, health, document or notification pages show: documents
+and their test results, health reports and events, medications, notifications,
+the profile itself, and the subscription and linked accounts that gate or
+label what those pages return. ORM events collect the affected users during a flush
+and one UPDATE ... SET data_version = data_version + 1 runs after it, so the
+counter is correct across workers. Bulk query().update()/delete() on those
+tables skips ORM events, so the rows it is about to touch are selected and
+bumped before it runs. Changed documents, test results, reports,
+notifications and medications are also written to the change feed
+(services/change_feed) right after the bump.
+
+Read endpoints add Depends(conditional_get(get_current_user)): it derives a
+private ETag from the version (already loaded with the user, so no extra
+query) plus everything else the response depends on - vault availability,
+the UTC date for "days ago" style values, and the deployed build - and
+answers a matching If-None-Match with 304 before the endpoint runs.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Set
+
+from fastapi import Depends, Request, Response
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session, object_session
+
+try:
+    from backend_v2.models import (
+        Document, HealthEvent, HealthReport, LinkedAccount, Medication, MedicationLog,
+        Notification, NotificationPreference, Subscription, TestResult, User,
+    )
+    from backend_v2.services import change_feed
+    from backend_v2.services.vault_helper import get_vault_helper
+except ImportError:
+    from models import (
+        Document, HealthEvent, HealthReport, LinkedAccount, Medication, MedicationLog,
+        Notification, NotificationPreference, Subscription, TestResult, User,
+    )
+    from services import change_feed
+    from services.vault_helper import get_vault_helper
+
+# Changes when a deploy may change response shapes (set by Render)
+BUILD_ID = os.getenv("RENDER_GIT_COMMIT", "")[:12]
+
+CACHE_CONTROL = "private, no-cache"  # Stored by the browser, revalidated on every use
+
+_OWNED_BY_USER = (Document, HealthEvent, HealthReport, Medication, MedicationLog, Notification, NotificationPreference,
+                  Subscription, LinkedAccount)
+
+
+class NotModified(Exception):
+    """Raised by conditional_get when the client's copy is current (handled as 304 in main)."""
+
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(status_code=304, headers={"ETag": exc.etag, "Cache-Control": CACHE_CONTROL})
+
+
+# --- Bumping -----------------------------------------------------------------------
+
+def _pending(session: Session) -> dict:
+    return session.info.setdefault("data_version", {"users": set(), "documents": set(), "changes": {}})
+
+
+def _note(pending: dict, model, row_id, user_id, document_id, deleted: bool):
+    entity = change_feed.ENTITIES.get(model)
+    if entity is not None and row_id is not None:
+        key = (entity, row_id)
+        deleted = deleted or pending["changes"].get(key, (None, None, False))[2]
+        pending["changes"][key] = (user_id, document_id, deleted)
+
+
+def _changed(deleted: bool):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is None:
+            return
+        pending = _pending(session)
+        if isinstance(target, TestResult):
+            # No user_id on test results: use the loaded document, else resolve after the flush
+            document = target.__dict__.get("document")
+            user_id = document.user_id if document is not None else None
+            if user_id is not None:
+                pending["users"].add(user_id)
+            elif target.document_id is not None:
+                pending["documents"].add(target.document_id)
+            _note(pending, TestResult, target.id, user_id, target.document_id, deleted)
+        elif target.user_id is not None:
+            pending["users"].add(target.user_id)
+            _note(pending, type(target), target.id, target.user_id, None, deleted)
+    return listener
+
+
+for _model in _OWNED_BY_USER + (TestResult,):
+    event.listen(_model, "after_insert", _changed(False))
+    event.listen(_model, "after_update", _changed(False))
+    event.listen(_model, "after_delete", _changed(True))
+
+
+@event.listens_for(User, "before_update")
+def _profile_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and session.is_modified(target, include_collections=False):
+        # Evaluated by the UPDATE itself, so concurrent bumps are not lost
+        target.data_version = User.data_version + 1
+
+
+def _bump_statement(user_ids: Set[int], document_ids: Set[int]):
+    users, documents = User.__table__, Document.__table__
+    condition = users.c.id.in_(user_ids) if user_ids else None
+    if document_ids:
+        by_document = users.c.id.in_(select(documents.c.user_id).where(documents.c.id.in_(document_ids)))
+        condition = by_document if condition is None else condition | by_document
+    return update(users).where(condition).values(data_version=users.c.data_version + 1)
+
+
+def _write(connection, pending: dict):
+    if pending["users"] or pending["documents"]:
+        connection.execute(_bump_statement(pending["users"], pending["documents"]))
+    if pending["changes"]:
+        change_feed.record(connection, pending["changes"])
+
+
+@event.listens_for(Session, "after_flush")
+def _flushed(session, flush_context):
+    pending = session.info.pop("data_version", None)
+    if pending:
+        _write(session.connection(), pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _rolled_back(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("data_version", None)
+
+
+_BULK_TRACKED = {model.__table__.name: model for model in _OWNED_BY_USER + (TestResult,)}
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_change(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    model = _BULK_TRACKED.get(mapper.local_table.name) if mapper is not None else None
+    if model is None:
+        return
+    # Select the rows the statement is about to touch and bump their users first
+    table = model.__table__
+    owner = table.c.document_id if model is TestResult else table.c.user_id
+    query = select(table.c.id, owner)
+    if orm_execute_state.statement.whereclause is not None:
+        query = query.where(orm_execute_state.statement.whereclause)
+    connection = orm_execute_state.session.connection()
+    pending = {"users": set(), "documents": set(), "changes": {}}
+    for row_id, owner_id in connection.execute(query):
+        if owner_id is None:
+            continue
+        if model is TestResult:
+            pending["documents"].add(owner_id)
+            _note(pending, model, row_id, None, owner_id, orm_execute_state.is_delete)
+        else:
+            pending["users"].add(owner_id)
+            _note(pending, model, row_id, owner_id, None, orm_execute_state.is_delete)
+    _write(connection, pending)
+
+
+# --- Conditional GET ---------------------------------------------------------------
+
+def etag_for(user: User) -> str:
+    vault = "v" if get_vault_helper(user.id).is_available else "l"
+    day = datetime.now(timezone.utc).strftime("%Y%m%d")
+    return f'W/"u{user.id}.{user.data_version or 0}.{vault}.{day}.{BUILD_ID}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def conditional_get(get_current_user):
+    """Dependency answering If-None-Match from the user's data version; sets ETag otherwise."""
+
+    def dependency(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+        etag = etag_for(current_user)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise NotModified(etag)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+
+    return dependency
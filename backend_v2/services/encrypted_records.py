@@ -0,0 +1,241 @@
+"""
+Encrypted Records
+Compact, versioned encrypted formats for test result values and report bodies.
+
+Test results used to keep value_enc and numeric_value_enc: two AES-GCM
+ciphertexts (28 bytes of nonce + tag each), usually holding the same number
+twice, and two decrypts per read. A compact record is a single ciphertext in
+TestResult.record_enc whose plaintext is
+
+    format (1 byte) | flags (1 byte) | [numeric: float64 LE] | [value: UTF-8]
+
+where the value is left out when it is just str() of the number.
+
+Report bodies (HealthReport.content_enc) are JSON compressed with zlib
+behind a format byte before they are encrypted. Old bodies decrypt to JSON
+text, which never starts with that byte, so one decrypt tells them apart.
+
+Readers accept both formats (read_values / read_result / read_report) and
+writers produce the compact ones. Old rows are converted in the background
+for users whose vault is unlocked (scheduler, and
+migrations/compact_encrypted_records.py with the service key). The
+conversion writes with plain UPDATEs, so it does not bump data versions or
+the change feed: the decrypted data is the same. Each UPDATE only applies
+while the row still holds what was read, so a concurrent rewrite is never
+overwritten with stale data.
+
+Rollback: the conversion keeps value_enc / numeric_value_enc next to
+record_enc, so code from before record_enc still reads converted results.
+migrations/drop_legacy_result_values.py clears them once no rollback is
+needed. Compressed report bodies, and results written by the new code, can
+only be read by code that has this module.
+
+Works with any vault that has encrypt_bytes / decrypt_bytes (VaultHelper,
+UserVault).
+"""
+import json
+import logging
+import struct
+import zlib
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import bindparam, select
+
+try:
+    from backend_v2.models import Document, HealthReport, TestResult
+    from backend_v2.services.vault_helper import get_vault_helper
+except ImportError:
+    from models import Document, HealthReport, TestResult
+    from services.vault_helper import get_vault_helper
+
+logger = logging.getLogger(__name__)
+
+RESULT_FORMAT = 1
+REPORT_FORMAT = 1
+COMPACT_BATCH_SIZE = 500  # Rows per UPDATE batch when converting old rows
+
+_HAS_NUMERIC = 0x01
+_HAS_VALUE = 0x02
+_VALUE_IS_NUMERIC = 0x04  # value == str(numeric); not stored
+_NUMERIC = struct.Struct("<d")
+
+
+# --- Test results ------------------------------------------------------------------
+
+def pack_result(value: Optional[str], numeric: Optional[float]) -> bytes:
+    flags, body = 0, b""
+    if numeric is not None:
+        flags |= _HAS_NUMERIC
+        body += _NUMERIC.pack(numeric)
+    if value is not None:
+        if numeric is not None and value == str(float(numeric)):
+            flags |= _VALUE_IS_NUMERIC
+        else:
+            flags |= _HAS_VALUE
+            body += value.encode("utf-8")
+    return bytes((RESULT_FORMAT, flags)) + body
+
+
+def unpack_result(payload: bytes) -> Tuple[Optional[str], Optional[float]]:
+    if not payload or payload[0] != RESULT_FORMAT:
+        raise ValueError(f"Unknown test result record format: {payload[:1]!r}")
+    flags, offset = payload[1], 2
+    numeric = value = None
+    if flags & _HAS_NUMERIC:
+        numeric = _NUMERIC.unpack_from(payload, offset)[0]
+        offset += _NUMERIC.size
+    if flags & _HAS_VALUE:
+        value = payload[offset:].decode("utf-8")
+    elif flags & _VALUE_IS_NUMERIC:
+        value = str(numeric)
+    return value, numeric
+
+
+def encrypt_result(vault, value: Optional[str], numeric: Optional[float]) -> bytes:
+    return vault.encrypt_bytes(pack_result(value, numeric))
+
+
+def read_values(vault, record_enc: Optional[bytes], value_enc: Optional[bytes] = None,
+                numeric_value_enc: Optional[bytes] = None) -> Tuple[Optional[str], Optional[float]]:
+    """Decrypted (value, numeric) from either format; (None, None) when nothing is encrypted."""
+    if record_enc:
+        return unpack_result(vault.decrypt_bytes(record_enc))
+    value = vault.decrypt_data(value_enc) if value_enc else None
+    numeric = vault.decrypt_number(numeric_value_enc) if numeric_value_enc else None
+    return value, numeric
+
+
+def read_result(result: TestResult, vault) -> Tuple[Optional[str], Optional[float]]:
+    return read_values(vault, result.record_enc, result.value_enc, result.numeric_value_enc)
+
+
+def has_encrypted_values(result: TestResult) -> bool:
+    return result.record_enc is not None or result.value_enc is not None or result.numeric_value_enc is not None
+
+
+# --- Reports -----------------------------------------------------------------------
+
+def pack_report(content: Any) -> bytes:
+    body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+    return bytes((REPORT_FORMAT,)) + zlib.compress(body)
+
+
+def unpack_report(plaintext: bytes) -> Any:
+    if plaintext[:1] == bytes((REPORT_FORMAT,)):
+        return json.loads(zlib.decompress(plaintext[1:]))
+    return json.loads(plaintext.decode("utf-8"))  # Uncompressed JSON (old format)
+
+
+def encrypt_report(vault, content: Any) -> bytes:
+    return vault.encrypt_bytes(pack_report(content))
+
+
+def read_report(vault, content_enc: bytes) -> Any:
+    return unpack_report(vault.decrypt_bytes(content_enc))
+
+
+# --- Converting old rows -----------------------------------------------------------
+
+def _updated(connection, result, attempted: int) -> int:
+    """Rows an UPDATE changed; drivers without batch rowcounts report the rows attempted."""
+    return result.rowcount if connection.dialect.supports_sane_multi_rowcount else attempted
+
+
+def _compact_results(connection, user_id: int, vault) -> Tuple[int, int]:
+    """Write record_enc for old rows, keeping the legacy columns. Returns (converted, skipped)."""
+    table, documents = TestResult.__table__, Document.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.value_enc, table.c.numeric_value_enc)
+        .where(table.c.record_enc.is_(None))
+        .where((table.c.value_enc.isnot(None)) | (table.c.numeric_value_enc.isnot(None)))
+        .where(table.c.document_id.in_(select(documents.c.id).where(documents.c.user_id == user_id)))
+    ).all()
+
+    statement = table.update()\
+        .where(table.c.id == bindparam("row_id"), table.c.record_enc.is_(None))\
+        .values(record_enc=bindparam("record"))
+    converted = skipped = 0
+    batch = []
+    for row_id, value_enc, numeric_value_enc in rows:
+        try:
+            value, numeric = read_values(vault, None, value_enc, numeric_value_enc)
+        except Exception as e:
+            logger.warning(f"Compact records: cannot decrypt test result {row_id}: {e}")
+            skipped += 1
+            continue
+        batch.append({"row_id": row_id, "record": encrypt_result(vault, value, numeric)})
+        if len(batch) >= COMPACT_BATCH_SIZE:
+            converted += _updated(connection, connection.execute(statement, batch), len(batch))
+            batch = []
+    if batch:
+        converted += _updated(connection, connection.execute(statement, batch), len(batch))
+    return converted, skipped
+
+
+def _compact_reports(connection, user_id: int, vault) -> Tuple[int, int]:
+    """Re-encrypt JSON report bodies compressed. Returns (converted, skipped)."""
+    table = HealthReport.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.content_enc)
+        .where(table.c.user_id == user_id, table.c.content_enc.isnot(None))
+    ).all()
+
+    statement = table.update()\
+        .where(table.c.id == bindparam("row_id"), table.c.content_enc == bindparam("old"))\
+        .values(content_enc=bindparam("content"))
+    converted = skipped = 0
+    for row_id, content_enc in rows:
+        try:
+            plaintext = vault.decrypt_bytes(content_enc)
+            if plaintext[:1] == bytes((REPORT_FORMAT,)):
+                continue  # Already compact
+            content = unpack_report(plaintext)
+        except Exception as e:
+            logger.warning(f"Compact records: cannot read report {row_id}: {e}")
+            skipped += 1
+            continue
+        result = connection.execute(statement, {"row_id": row_id, "old": content_enc,
+                                                "content": encrypt_report(vault, content)})
+        converted += result.rowcount
+    return converted, skipped
+
+
+def compact_user(db, user_id: int, vault) -> dict:
+    """
+    Rewrite a user's old-format test results and reports in the compact formats.
+    "skipped" counts rows that could not be decrypted and are still in the old format.
+    """
+    connection = db.connection()
+    results, results_skipped = _compact_results(connection, user_id, vault)
+    reports, reports_skipped = _compact_reports(connection, user_id, vault)
+    db.commit()
+    return {"test_results": results, "reports": reports, "skipped": results_skipped + reports_skipped}
+
+
+_compacted = set()  # Users fully converted by this process
+
+
+def compact_unlocked_users(db, user_ids) -> dict:
+    """
+    Convert the rows of users whose own vault is unlocked. A user is done once
+    nothing was skipped; users with unreadable rows are retried on later passes.
+    """
+    totals = {"users": 0, "test_results": 0, "reports": 0}
+    for user_id in user_ids:
+        if user_id in _compacted:
+            continue
+        vault = get_vault_helper(user_id)
+        if not vault.uses_user_vault:
+            continue  # Never re-encrypt a user's data with the global vault
+        try:
+            stats = compact_user(db, user_id, vault)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Compact records: user {user_id} failed: {e}")
+            continue
+        if not stats["skipped"]:
+            _compacted.add(user_id)
+        totals["users"] += 1
+        totals["test_results"] += stats["test_results"]
+        totals["reports"] += stats["reports"]
+    return totals
@@ -0,0 +1,237 @@
+"""
+Entitlements Cache
+Per-user snapshot of effective tier, limits and usage for quota checks.
+
+Quota checks (upload, analysis, lifestyle runs, account links) used to
+resolve the tier - subscription, family membership, family owner's
+subscription - and COUNT(*) documents or linked accounts on every call.
+SubscriptionService now builds one Entitlements snapshot per user, keeps it
+here for ENTITLEMENTS_TTL_SECONDS and answers checks from memory.
+
+Snapshots are kept current by ORM events, applied when the session commits
+(and dropped on rollback):
+- Document / LinkedAccount insert and delete adjust the usage counters
+- UsageTracker updates carry the new monthly AI analysis count
+- Subscription and FamilyMember changes invalidate the user, and a
+  subscription change also invalidates the members of that owner's family
+  (payments, IPN, admin set-subscription, trials, expiry, family changes)
+- bulk DELETE/UPDATE on those tables (account deletion) clears the cache
+
+The cache is per process, so another worker may hold a snapshot that is up
+to the TTL old. SubscriptionService never denies from a cached snapshot: a
+check that would fail is re-run against a fresh one.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+try:
+    from backend_v2.models import Document, FamilyMember, LinkedAccount, Subscription, UsageTracker
+except ImportError:
+    from models import Document, FamilyMember, LinkedAccount, Subscription, UsageTracker
+
+ENTITLEMENTS_TTL_SECONDS = int(os.getenv("ENTITLEMENTS_TTL_SECONDS", "300"))
+ENTITLEMENTS_CACHE_MAX_ENTRIES = int(os.getenv("ENTITLEMENTS_CACHE_MAX_ENTRIES", "10000"))
+
+
+def _month_start(now: datetime) -> datetime:
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    user_id: int
+    tier: str
+    limits: Dict[str, Any]
+    documents: int
+    providers: int
+    ai_analyses: int  # In the month starting at month_start
+    month_start: datetime
+    family_owner_id: Optional[int] = None  # Owner of the family plan the tier comes from
+    expires_at: float = field(default=0.0, compare=False)
+
+    @property
+    def ai_analyses_this_month(self) -> int:
+        month_start = self.month_start
+        if month_start.tzinfo is None:
+            month_start = month_start.replace(tzinfo=timezone.utc)
+        if month_start < _month_start(datetime.now(timezone.utc)):
+            return 0
+        return self.ai_analyses
+
+
+# user_id -> Entitlements
+_cache: "OrderedDict[int, Entitlements]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_changes = 0  # Bumped on every change, so a snapshot computed across one is not stored
+
+
+def lookup(user_id: int) -> Optional[Entitlements]:
+    with _cache_lock:
+        snapshot = _cache.get(user_id)
+        if snapshot is None or snapshot.expires_at <= time.monotonic():
+            _stats["misses"] += 1
+            return None
+        _cache.move_to_end(user_id)
+        _stats["hits"] += 1
+        return snapshot
+
+
+def begin() -> int:
+    """Token to pass to store() for a snapshot about to be computed."""
+    return _changes
+
+
+def store(snapshot: Entitlements, token: int) -> Entitlements:
+    snapshot = replace(snapshot, expires_at=time.monotonic() + ENTITLEMENTS_TTL_SECONDS)
+    with _cache_lock:
+        if token != _changes:
+            return snapshot  # Something changed while it was computed; next check recomputes
+        _cache[snapshot.user_id] = snapshot
+        _cache.move_to_end(snapshot.user_id)
+        while len(_cache) > ENTITLEMENTS_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return snapshot
+
+
+def invalidate(user_id: Optional[int] = None):
+    """Drop one user's snapshot, and any snapshot whose family plan they own; all when user_id is None."""
+    global _changes
+    with _cache_lock:
+        _changes += 1
+        _stats["invalidations"] += 1
+        if user_id is None:
+            _cache.clear()
+            return
+        _cache.pop(user_id, None)
+        for member_id in [uid for uid, s in _cache.items() if s.family_owner_id == user_id]:
+            del _cache[member_id]
+
+
+def _apply(deltas: Dict[int, Dict[str, Any]]):
+    global _changes
+    with _cache_lock:
+        _changes += 1
+        for user_id, delta in deltas.items():
+            snapshot = _cache.get(user_id)
+            if snapshot is None:
+                continue
+            _cache[user_id] = replace(
+                snapshot,
+                documents=max(0, snapshot.documents + delta.get("documents", 0)),
+                providers=max(0, snapshot.providers + delta.get("providers", 0)),
+                ai_analyses=delta.get("ai_analyses", snapshot.ai_analyses),
+                month_start=delta.get("month_start", snapshot.month_start),
+            )
+
+
+def stats() -> dict:
+    with _cache_lock:
+        return {**_stats, "entries": len(_cache)}
+
+
+def reset():
+    global _changes
+    with _cache_lock:
+        _cache.clear()
+        _changes += 1
+        for key in _stats:
+            _stats[key] = 0
+
+
+# --- Keeping snapshots current -----------------------------------------------------
+
+def _pending(session: Session) -> Dict[str, Any]:
+    return session.info.setdefault("entitlements", {"deltas": {}, "invalidate": set(), "clear": False})
+
+
+def _count(target, counter: str, step: int):
+    session = object_session(target)
+    if session is None or target.user_id is None:
+        return
+    delta = _pending(session)["deltas"].setdefault(target.user_id, {})
+    delta[counter] = delta.get(counter, 0) + step
+
+
+@event.listens_for(Document, "after_insert")
+def _document_added(mapper, connection, target):
+    _count(target, "documents", 1)
+
+
+@event.listens_for(Document, "after_delete")
+def _document_removed(mapper, connection, target):
+    _count(target, "documents", -1)
+
+
+@event.listens_for(LinkedAccount, "after_insert")
+def _provider_added(mapper, connection, target):
+    _count(target, "providers", 1)
+
+
+@event.listens_for(LinkedAccount, "after_delete")
+def _provider_removed(mapper, connection, target):
+    _count(target, "providers", -1)
+
+
+@event.listens_for(UsageTracker, "after_insert")
+@event.listens_for(UsageTracker, "after_update")
+def _usage_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is None or target.user_id is None:
+        return
+    delta = _pending(session)["deltas"].setdefault(target.user_id, {})
+    delta["ai_analyses"] = target.ai_analyses_this_month or 0
+    if target.month_start is not None:
+        delta["month_start"] = target.month_start
+
+
+@event.listens_for(Subscription, "after_insert")
+@event.listens_for(Subscription, "after_update")
+@event.listens_for(Subscription, "after_delete")
+@event.listens_for(FamilyMember, "after_insert")
+@event.listens_for(FamilyMember, "after_delete")
+def _tier_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.user_id is not None:
+        _pending(session)["invalidate"].add(target.user_id)
+
+
+_TRACKED_TABLES = {"documents", "linked_accounts", "subscriptions", "family_members", "family_groups", "usage_trackers"}
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_change(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.local_table.name in _TRACKED_TABLES:
+        _pending(orm_execute_state.session)["clear"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _session_committed(session):
+    pending = session.info.pop("entitlements", None)
+    if not pending:
+        return
+    if pending["clear"]:
+        invalidate()
+        return
+    for user_id in pending["invalidate"]:
+        invalidate(user_id)
+    deltas = {uid: d for uid, d in pending["deltas"].items() if uid not in pending["invalidate"]}
+    if deltas:
+        _apply(deltas)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _session_rolled_back(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("entitlements", None)
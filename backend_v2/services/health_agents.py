@@ -10,8 +10,24 @@ from datetime import datetime
 
 try:
     from backend_v2.services.openai_tracker import track_openai_response, log_openai_call
+    from backend_v2.services import analysis_delta
+    from backend_v2.services.prompt_budget import format_biomarker_context
 except ImportError:
     from services.openai_tracker import track_openai_response, log_openai_call
+    from services import analysis_delta
+    from services.prompt_budget import format_biomarker_context
+
+
+def filter_relevant_markers(biomarkers: List[Dict], markers: List[str]) -> List[Dict]:
+    """Filter biomarkers to those whose name contains any of the marker keywords.
+
+    With no keywords, all biomarkers are relevant.
+    """
+    if not markers:
+        return biomarkers
+
+    keywords = [marker.lower() for marker in markers]
+    return [bio for bio in biomarkers if any(kw in bio.get('name', '').lower() for kw in keywords)]
 
 
 class HealthAgent:
@@ -168,8 +184,59 @@ Consider the patient's profile when analyzing results. Age, gender, BMI, lifesty
 Provide your analysis in JSON format as specified."""
 
         response = self._call_ai(self.SYSTEM_PROMPT, user_prompt)
+        return self._parse_response(response)
+
+    def analyze_delta(self, changed_biomarkers: List[Dict], previous_report: Dict[str, Any],
+                      profile_context: str = "", unchanged_count: int = 0,
+                      removed_count: int = 0) -> Dict[str, Any]:
+        """Update a previous assessment with new and changed results only.
+
+        Args:
+            changed_biomarkers: Recent readings of markers that changed since the previous analysis
+            previous_report: Previous general report (summary, risk_level, findings, recommendations)
+            profile_context: Patient profile information
+            unchanged_count: Number of markers with no new results
+            removed_count: Number of markers no longer present
+        """
+        profile_section = ""
+        if profile_context:
+            profile_section = f"""
+{profile_context}
+
+Consider the patient's profile when analyzing results.
+
+"""
+
+        previous = {
+            "summary": previous_report.get("summary", ""),
+            "risk_level": previous_report.get("risk_level", "normal"),
+            "findings": previous_report.get("findings", []),
+            "recommendations": previous_report.get("recommendations", []),
+        }
+
+        removed_note = ""
+        if removed_count:
+            removed_note = f"\n{removed_count} previously analyzed markers are no longer in the record; drop findings that relied only on them."
+
+        user_prompt = f"""{profile_section}This is an UPDATE to a previous health assessment. Only the results below are new or changed
+since that assessment. {unchanged_count} other markers are unchanged and were already covered.{removed_note}
+
+PREVIOUS ASSESSMENT:
+{json.dumps(previous, ensure_ascii=False)}
+
+NEW AND CHANGED RESULTS (most recent readings per marker):
+{self._format_biomarkers(changed_biomarkers)}
+
+Produce the complete, updated assessment: keep previous findings that still apply, revise those affected
+by the new results, and refer specialists only where the new results warrant it.
+
+Provide your analysis in JSON format as specified."""
+
+        response = self._call_ai(self.SYSTEM_PROMPT, user_prompt)
+        return self._parse_response(response)
 
-        # Parse JSON response
+    def _parse_response(self, response: str) -> Dict[str, Any]:
+        """Parse the JSON report from a model response."""
         try:
             # Extract JSON from response (handle markdown code blocks)
             json_str = response
@@ -220,31 +287,8 @@ Provide your analysis in JSON format as specified."""
         return summary
 
     def _format_biomarkers(self, biomarkers: List[Dict]) -> str:
-        """Format biomarkers into a readable string for the AI."""
-        lines = []
-
-        # Add data age summary at the top
-        lines.append(self._get_data_age_summary(biomarkers))
-        lines.append("")
-
-        current_date = None
-
-        for bio in sorted(biomarkers, key=lambda x: x.get('date', '')):
-            date = bio.get('date', 'Unknown')
-            if date != current_date:
-                if current_date is not None:
-                    lines.append("")
-                lines.append(f"=== Test Date: {date} ===")
-                current_date = date
-
-            status = "⚠️" if bio.get('status') != 'normal' else "✓"
-            value = bio.get('value', 'N/A')
-            unit = bio.get('unit', '')
-            ref_range = bio.get('range', 'N/A')
-
-            lines.append(f"{status} {bio.get('name', 'Unknown')}: {value} {unit} (ref: {ref_range})")
-
-        return "\n".join(lines)
+        """Format biomarkers as a compact, token-budgeted series per biomarker."""
+        return f"{self._get_data_age_summary(biomarkers)}\n\n{format_biomarker_context(biomarkers)}"
 
 
 class SpecialistAgent(HealthAgent):
@@ -401,40 +445,11 @@ Focus on {self.config['focus']}. Provide your specialist analysis in JSON format
         If no markers are specified in config, returns all biomarkers
         (specialist will focus on what's relevant based on their expertise).
         """
-        # If no specific markers defined, return all biomarkers
-        if not self.config.get('markers'):
-            return biomarkers
-
-        relevant = []
-        for bio in biomarkers:
-            name = bio.get('name', '').lower()
-            for marker in self.config['markers']:
-                if marker.lower() in name:
-                    relevant.append(bio)
-                    break
-        return relevant
+        return filter_relevant_markers(biomarkers, self.config.get('markers'))
 
     def _format_biomarkers(self, biomarkers: List[Dict]) -> str:
         """Format biomarkers into readable text with dates prominently displayed."""
-        # Group by date for clearer timeline
-        from collections import defaultdict
-        by_date = defaultdict(list)
-
-        for bio in biomarkers:
-            date = bio.get('date', 'Unknown')
-            by_date[date].append(bio)
-
-        lines = []
-        for date in sorted(by_date.keys(), reverse=True):  # Most recent first
-            lines.append(f"\n=== {date} ===")
-            for bio in by_date[date]:
-                status = "⚠️" if bio.get('status') != 'normal' else "✓"
-                value = bio.get('value', 'N/A')
-                unit = bio.get('unit', '')
-                ref_range = bio.get('range', 'N/A')
-                lines.append(f"  {status} {bio.get('name', 'Unknown')}: {value} {unit} (ref: {ref_range})")
-
-        return "\n".join(lines)
+        return format_biomarker_context(biomarkers)
 
 
 class GapAnalysisAgent(HealthAgent):
@@ -770,22 +785,7 @@ Every meal must name exact foods with gram portions. Provide your complete plan
 
     def _format_biomarkers(self, biomarkers: List[Dict]) -> str:
         """Format biomarkers for nutrition analysis."""
-        from collections import defaultdict
-        by_date = defaultdict(list)
-        for bio in biomarkers:
-            date = bio.get('date', 'Unknown')
-            by_date[date].append(bio)
-
-        lines = []
-        for date in sorted(by_date.keys(), reverse=True):
-            lines.append(f"\n=== {date} ===")
-            for bio in by_date[date]:
-                status = "⚠️" if bio.get('status') != 'normal' else "✓"
-                value = bio.get('value', 'N/A')
-                unit = bio.get('unit', '')
-                ref_range = bio.get('range', 'N/A')
-                lines.append(f"  {status} {bio.get('name', 'Unknown')}: {value} {unit} (ref: {ref_range})")
-        return "\n".join(lines)
+        return format_biomarker_context(biomarkers)
 
 
 class ExerciseAgent(HealthAgent):
@@ -944,22 +944,7 @@ Every exercise must have exact parameters (sets, reps, duration, rest). Include
 
     def _format_biomarkers(self, biomarkers: List[Dict]) -> str:
         """Format biomarkers for exercise analysis."""
-        from collections import defaultdict
-        by_date = defaultdict(list)
-        for bio in biomarkers:
-            date = bio.get('date', 'Unknown')
-            by_date[date].append(bio)
-
-        lines = []
-        for date in sorted(by_date.keys(), reverse=True):
-            lines.append(f"\n=== {date} ===")
-            for bio in by_date[date]:
-                status = "⚠️" if bio.get('status') != 'normal' else "✓"
-                value = bio.get('value', 'N/A')
-                unit = bio.get('unit', '')
-                ref_range = bio.get('range', 'N/A')
-                lines.append(f"  {status} {bio.get('name', 'Unknown')}: {value} {unit} (ref: {ref_range})")
-        return "\n".join(lines)
+        return format_biomarker_context(biomarkers)
 
 
 class LifestyleAnalysisService:
@@ -1071,29 +1056,8 @@ class HealthAnalysisService:
 
         return "\n\n".join(context_parts) if context_parts else ""
 
-    def run_full_analysis(self, biomarkers: List[Dict]) -> Dict[str, Any]:
-        """Run general analysis and determine if specialist analyses are needed.
-
-        The generalist AI dynamically determines which specialists should be consulted
-        based on its analysis. Specialists are created on-the-fly based on the
-        generalist recommendations - there is no predefined specialist list.
-        """
-        # Get profile context
-        profile_context = self._format_profile_context()
-
-        # Run general analysis first
-        general_report = self.generalist.analyze(biomarkers, profile_context)
-
-        result = {
-            "general": general_report,
-            "specialists": {},
-            "analyzed_at": datetime.now().isoformat(),
-            "language": self.language,
-            "profile_used": bool(profile_context)
-        }
-
-        # Get specialist referrals from generalist
-        # New format: list of specialist objects with full configuration
+    def _specialist_configs(self, general_report: Dict) -> List[Dict]:
+        """Normalize the generalist's specialist referrals into config dicts."""
         raw_referrals = general_report.get("specialist_referrals", [])
 
         # Handle different response formats for backwards compatibility
@@ -1124,38 +1088,192 @@ class HealthAnalysisService:
                     "relevant_markers": [],
                     "reasoning": reasoning.get(spec, "Recommended by generalist")
                 })
+        return specialist_configs
+
+    def _run_specialist(self, spec_config: Dict, general_report: Dict, biomarkers: List[Dict],
+                        profile_context: str, extra_context: str = "") -> Dict[str, Any]:
+        """Create a specialist from a referral config and run its analysis."""
+        specialty = spec_config.get("specialty", "unknown")
+        reasoning = spec_config.get("reasoning", "")
+
+        # Create specialist agent with dynamic configuration
+        specialist = SpecialistAgent(
+            specialty=specialty,
+            specialist_name=spec_config.get("specialist_name", specialty.title()),
+            focus_area=spec_config.get("focus_area", ""),
+            relevant_markers=spec_config.get("relevant_markers", []),
+            language=self.language
+        )
+
+        # Build generalist context for this specialist
+        generalist_context = f"Referral reason: {reasoning}"
+        additional_context = self._extract_generalist_context_for_specialty(general_report, specialty)
+        if additional_context:
+            generalist_context += f"\n\n{additional_context}"
+        if extra_context:
+            generalist_context += f"\n\n{extra_context}"
+
+        specialist_result = specialist.analyze(biomarkers, profile_context, generalist_context)
+        specialist_result["triggered_by"] = "generalist_referral"
+        specialist_result["referral_reasoning"] = reasoning
+        return specialist_result
+
+    def run_full_analysis(self, biomarkers: List[Dict]) -> Dict[str, Any]:
+        """Run general analysis and determine if specialist analyses are needed.
+
+        The generalist AI dynamically determines which specialists should be consulted
+        based on its analysis. Specialists are created on-the-fly based on the
+        generalist recommendations - there is no predefined specialist list.
+
+        The result carries a "state" entry (fingerprints and specialist configs)
+        that lets the next run be incremental; it is meant for storage, not display.
+        """
+        # Get profile context
+        profile_context = self._format_profile_context()
+
+        # Run general analysis first
+        general_report = self.generalist.analyze(biomarkers, profile_context)
+
+        result = {
+            "general": general_report,
+            "specialists": {},
+            "analyzed_at": datetime.now().isoformat(),
+            "language": self.language,
+            "profile_used": bool(profile_context),
+            "delta": {"mode": "full", "changed_markers": len(analysis_delta.group_by_marker(biomarkers))},
+            "state": self._session_state(biomarkers, profile_context)
+        }
 
-        # Run specialist analyses dynamically
-        for spec_config in specialist_configs:
+        # Run specialist analyses dynamically, as referred by the generalist
+        for spec_config in self._specialist_configs(general_report):
             specialty = spec_config.get("specialty", "unknown")
-            specialist_name = spec_config.get("specialist_name", specialty.title())
-            focus_area = spec_config.get("focus_area", "")
-            relevant_markers = spec_config.get("relevant_markers", [])
-            reasoning = spec_config.get("reasoning", "")
-
-            # Create specialist agent with dynamic configuration
-            specialist = SpecialistAgent(
-                specialty=specialty,
-                specialist_name=specialist_name,
-                focus_area=focus_area,
-                relevant_markers=relevant_markers,
-                language=self.language
+            result["specialists"][specialty] = self._run_specialist(
+                spec_config, general_report, biomarkers, profile_context
+            )
+            result["state"]["specialists"][specialty] = self._specialist_state(spec_config, biomarkers, "full")
+
+        return result
+
+    def run_incremental_analysis(self, biomarkers: List[Dict],
+                                 previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Update the previous analysis session with only what changed since.
+
+        Args:
+            biomarkers: Full current biomarker list
+            previous: Previous session as returned by load_previous_analysis
+                (general content, marker digests, context fingerprint and
+                specialist fingerprints/configs/content), or None
+
+        Falls back to a full analysis when there is no previous session or the
+        profile/language changed. When nothing changed, returns the previous
+        session with delta mode "unchanged" and makes no model calls.
+        """
+        profile_context = self._format_profile_context()
+        if not previous or previous.get("context_fingerprint") != analysis_delta.context_fingerprint(profile_context, self.language):
+            return self.run_full_analysis(biomarkers)
+
+        delta = analysis_delta.compute_delta(previous.get("marker_digests") or {}, biomarkers)
+        state = self._session_state(biomarkers, profile_context)
+        previous_specialists = previous.get("specialists", {})
+
+        if analysis_delta.is_delta_empty(delta):
+            general_report = previous["general"]
+        else:
+            changed = analysis_delta.recent_readings(biomarkers, delta.changed)
+            general_report = self.generalist.analyze_delta(
+                changed, previous["general"], profile_context,
+                unchanged_count=len(delta.unchanged), removed_count=delta.removed_count
             )
 
-            # Build generalist context for this specialist
-            generalist_context = f"Referral reason: {reasoning}"
-            additional_context = self._extract_generalist_context_for_specialty(general_report, specialty)
-            if additional_context:
-                generalist_context += f"\n\n{additional_context}"
+        result = {
+            "general": general_report,
+            "specialists": {},
+            "analyzed_at": datetime.now().isoformat(),
+            "language": self.language,
+            "profile_used": bool(profile_context),
+            "delta": {
+                "mode": "unchanged" if analysis_delta.is_delta_empty(delta) else "incremental",
+                "changed_markers": len(delta.changed),
+                "unchanged_markers": len(delta.unchanged),
+                "removed_markers": delta.removed_count,
+                "specialists_run": [],
+                "specialists_carried_forward": [],
+                "specialists_dropped": []
+            },
+            "state": state
+        }
 
-            # Run specialist analysis
-            specialist_result = specialist.analyze(biomarkers, profile_context, generalist_context)
-            specialist_result["triggered_by"] = "generalist_referral"
-            specialist_result["referral_reasoning"] = reasoning
-            result["specialists"][specialty] = specialist_result
+        # Referred specialists plus previous ones whose markers are exactly as they
+        # analyzed them (carried forward). A previous specialist whose markers
+        # changed or are gone no longer applies unless the generalist, having
+        # seen the changes, refers it again - then it is updated with just its
+        # changed markers.
+        configs = {c.get("specialty", "unknown"): c for c in self._specialist_configs(general_report)}
+        for specialty, prev in previous_specialists.items():
+            if specialty in configs:
+                continue
+            relevant = filter_relevant_markers(biomarkers, prev["config"].get("relevant_markers"))
+            if relevant and prev.get("fingerprint") == analysis_delta.fingerprint_biomarkers(relevant):
+                configs[specialty] = prev["config"]
+            else:
+                result["delta"]["specialists_dropped"].append(specialty)
+
+        changed_keys = set(delta.changed)
+        for specialty, spec_config in configs.items():
+            relevant = filter_relevant_markers(biomarkers, spec_config.get("relevant_markers"))
+            prev = previous_specialists.get(specialty)
+
+            if prev and prev.get("fingerprint") == analysis_delta.fingerprint_biomarkers(relevant):
+                result["specialists"][specialty] = dict(prev["content"], triggered_by="carried_forward")
+                state["specialists"][specialty] = dict(prev, mode="carried_forward")
+                state["specialists"][specialty].pop("content", None)
+                result["delta"]["specialists_carried_forward"].append(specialty)
+                continue
+
+            extra_context = ""
+            specialist_input = relevant
+            relevant_changed = sorted(changed_keys & set(analysis_delta.group_by_marker(relevant)))
+            if prev and relevant_changed:
+                # Send the previous impression plus only this specialty's changed markers
+                specialist_input = analysis_delta.recent_readings(relevant, relevant_changed)
+                extra_context = (
+                    "PREVIOUS SPECIALIST ASSESSMENT (update it with the new results below; "
+                    "markers not listed are unchanged):\n"
+                    + json.dumps({
+                        "summary": prev["content"].get("summary", ""),
+                        "risk_level": prev["content"].get("risk_level", "normal"),
+                        "key_findings": prev["content"].get("key_findings", []),
+                    }, ensure_ascii=False)
+                )
+
+            result["specialists"][specialty] = self._run_specialist(
+                spec_config, general_report, specialist_input, profile_context, extra_context
+            )
+            mode = "incremental" if extra_context else "full"
+            state["specialists"][specialty] = self._specialist_state(spec_config, biomarkers, mode)
+            result["delta"]["specialists_run"].append(specialty)
 
         return result
 
+    def _session_state(self, biomarkers: List[Dict], profile_context: str) -> Dict[str, Any]:
+        """Fingerprints stored with the general report of an analysis session."""
+        return {
+            "fingerprint": analysis_delta.fingerprint_biomarkers(biomarkers),
+            "context_fingerprint": analysis_delta.context_fingerprint(profile_context, self.language),
+            "marker_digests": analysis_delta.marker_digests(biomarkers),
+            "specialists": {}
+        }
+
+    def _specialist_state(self, spec_config: Dict, biomarkers: List[Dict], mode: str) -> Dict[str, Any]:
+        """Fingerprint and config stored with a specialist report."""
+        relevant = filter_relevant_markers(biomarkers, spec_config.get("relevant_markers"))
+        return {
+            "fingerprint": analysis_delta.fingerprint_biomarkers(relevant),
+            "config": {k: spec_config.get(k) for k in
+                       ("specialty", "specialist_name", "focus_area", "relevant_markers", "reasoning")},
+            "mode": mode
+        }
+
     def run_specialist_analysis(self, specialty: str, biomarkers: List[Dict],
                                 specialist_name: str = None, focus_area: str = None,
                                 relevant_markers: List[str] = None,
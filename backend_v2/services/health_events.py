@@ -0,0 +1,364 @@
+"""
+Health Events
+Append-only timeline of a user's health events.
+
+Events are written when they happen instead of being rebuilt on every
+timeline request:
+- document: a lab document was ingested
+- analysis: a general AI analysis completed
+- improvement / alert: a biomarker crossed its reference range
+  (abnormal -> normal or normal -> abnormal) in a newly ingested document
+
+Range crossings are detected incrementally: only the latest prior result of
+each biomarker in the new document is read, and the next later result of
+each is re-checked, so a back-dated upload, an out-of-order sync or a
+deleted document corrects its neighbours' crossings. The timeline is then a
+single keyset-paginated read on (user_id, occurred_at, id).
+
+Each event has a per-user dedupe key, so re-processing a document or
+re-running the backfill never duplicates events.
+"""
+import base64
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+
+try:
+    from backend_v2.models import Document, HealthEvent, HealthReport, TestResult
+except ImportError:
+    from models import Document, HealthEvent, HealthReport, TestResult
+
+logger = logging.getLogger(__name__)
+
+NORMAL_FLAG = "NORMAL"
+MAX_PAGE_SIZE = 100
+
+EVENT_ICONS = {
+    "document": "file",
+    "analysis": "brain",
+    "improvement": "trending_up",
+    "alert": "alert",
+}
+
+
+def _is_abnormal(flag: Optional[str]) -> Optional[bool]:
+    """True/False for known flags, None when the flag is missing."""
+    if flag is None:
+        return None
+    return flag != NORMAL_FLAG
+
+
+def _existing_keys(db, user_id: int, keys: List[str], batch_size: int = 500) -> set:
+    existing = set()
+    for start in range(0, len(keys), batch_size):
+        rows = db.query(HealthEvent.dedupe_key)\
+            .filter(HealthEvent.user_id == user_id, HealthEvent.dedupe_key.in_(keys[start:start + batch_size]))\
+            .all()
+        existing.update(row[0] for row in rows)
+    return existing
+
+
+def _add_events(db, user_id: int, events: List[Dict]) -> int:
+    """Add events not already recorded. Does not commit."""
+    existing = _existing_keys(db, user_id, [e["dedupe_key"] for e in events])
+    added = 0
+    for event in events:
+        if event["dedupe_key"] in existing:
+            continue
+        existing.add(event["dedupe_key"])
+        db.add(HealthEvent(user_id=user_id, **event))
+        added += 1
+    return added
+
+
+def _document_event(doc) -> Dict:
+    return {
+        "event_type": "document",
+        "occurred_at": doc.upload_date or doc.document_date or datetime.now(),
+        "title": doc.filename or "Document",
+        "subtitle": doc.provider or "Upload",
+        "link": "/documents",
+        "document_id": doc.id,
+        "dedupe_key": f"document:{doc.id}",
+    }
+
+
+def _transition_key(document_id: int, name: str) -> str:
+    return f"transition:{document_id}:{name}"[:120]
+
+
+def _transition_event(name: str, previous_flag: str, current_flag: str,
+                      occurred_at: datetime, document_id: int) -> Optional[Dict]:
+    was_abnormal, is_abnormal = _is_abnormal(previous_flag), _is_abnormal(current_flag)
+    if was_abnormal is None or is_abnormal is None or was_abnormal == is_abnormal:
+        return None
+
+    event = {
+        "occurred_at": occurred_at,
+        "link": f"/evolution/{name}",
+        "biomarker": name,
+        "document_id": document_id,
+        "dedupe_key": _transition_key(document_id, name),
+    }
+    if was_abnormal:
+        event.update(event_type="improvement", title=f"{name} returned to normal",
+                     subtitle=f"Was {previous_flag.lower()}, now normal")
+    else:
+        event.update(event_type="alert", title=f"{name} went out of range",
+                     subtitle=f"Now {current_flag.lower()}")
+    return event
+
+
+def _document_flags(db, document_id: int, names: List[str] = None) -> Dict[str, Optional[str]]:
+    """Flag per biomarker in a document: abnormal wins if a marker repeats, None if it has none."""
+    name_col = func.coalesce(TestResult.canonical_name, TestResult.test_name)
+    query = db.query(name_col, TestResult.flags).filter(TestResult.document_id == document_id)
+    if names is not None:
+        query = query.filter(name_col.in_(names))
+
+    current: Dict[str, Optional[str]] = {}
+    for name, flags in query.all():
+        if not name:
+            continue
+        if name not in current or (flags and current[name] in (None, NORMAL_FLAG)):
+            current[name] = flags
+    return current
+
+
+def _crossing_events(db, user_id: int, document_id: int, occurred_at: datetime,
+                     current: Dict[str, Optional[str]], exclude_ids: List[int] = ()) -> List[Dict]:
+    """Range crossings of a document's results against each marker's latest earlier result."""
+    if not current:
+        return []
+
+    # Latest prior result per biomarker: one windowed query over just these markers
+    name_col = func.coalesce(TestResult.canonical_name, TestResult.test_name)
+    prior_date = func.coalesce(Document.document_date, Document.upload_date)
+    query = db.query(
+        name_col.label("name"),
+        TestResult.flags.label("flags"),
+        func.row_number().over(
+            partition_by=name_col,
+            order_by=(prior_date.desc(), TestResult.id.desc())
+        ).label("rn")
+    ).join(Document)\
+        .filter(Document.user_id == user_id)\
+        .filter(Document.id != document_id)\
+        .filter(name_col.in_(list(current)))\
+        .filter(prior_date <= occurred_at)
+    if exclude_ids:
+        query = query.filter(Document.id.notin_(exclude_ids))
+    ranked = query.subquery()
+
+    previous = dict(db.query(ranked.c.name, ranked.c.flags).filter(ranked.c.rn == 1).all())
+    events = []
+    for name, flag in current.items():
+        event = _transition_event(name, previous.get(name), flag, occurred_at, document_id)
+        if event:
+            events.append(event)
+    return events
+
+
+def _refresh_following(db, user_id: int, occurred_at: Optional[datetime], names: List[str],
+                       exclude_ids: List[int] = ()) -> int:
+    """
+    Recompute the crossings of the next later result of each marker, whose
+    previous result changed. Stale events are deleted. Does not commit.
+    """
+    if occurred_at is None or not names:
+        return 0
+
+    name_col = func.coalesce(TestResult.canonical_name, TestResult.test_name)
+    event_date = func.coalesce(Document.document_date, Document.upload_date)
+    query = db.query(
+        name_col.label("name"),
+        Document.id.label("document_id"),
+        event_date.label("occurred_at"),
+        func.row_number().over(
+            partition_by=name_col,
+            order_by=(event_date, TestResult.id)
+        ).label("rn")
+    ).join(Document)\
+        .filter(Document.user_id == user_id)\
+        .filter(name_col.in_(names))\
+        .filter(event_date > occurred_at)
+    if exclude_ids:
+        query = query.filter(Document.id.notin_(exclude_ids))
+    ranked = query.subquery()
+
+    following: Dict[Tuple[int, datetime], List[str]] = {}
+    for name, document_id, next_date in db.query(ranked.c.name, ranked.c.document_id, ranked.c.occurred_at)\
+            .filter(ranked.c.rn == 1).all():
+        following.setdefault((document_id, next_date), []).append(name)
+
+    added = 0
+    for (document_id, next_date), marker_names in following.items():
+        current = _document_flags(db, document_id, marker_names)
+        wanted = {e["dedupe_key"]: e for e in
+                  _crossing_events(db, user_id, document_id, next_date, current, exclude_ids)}
+        keys = [_transition_key(document_id, name) for name in marker_names]
+        for event in db.query(HealthEvent).filter(HealthEvent.user_id == user_id,
+                                                  HealthEvent.dedupe_key.in_(keys)).all():
+            match = wanted.get(event.dedupe_key)
+            if not match or (match["event_type"], match["subtitle"]) != (event.event_type, event.subtitle):
+                db.delete(event)
+        db.flush()
+        added += _add_events(db, user_id, list(wanted.values()))
+    return added
+
+
+def record_document_events(db, doc) -> int:
+    """
+    Record the ingest event for a document and any range crossings its results
+    introduce, and correct the crossings of later results it now precedes.
+    Call after the document's results are added, before commit.
+    """
+    db.flush()
+    occurred_at = doc.document_date or doc.upload_date or datetime.now()
+    current = _document_flags(db, doc.id)
+
+    events = [_document_event(doc)] + _crossing_events(db, doc.user_id, doc.id, occurred_at, current)
+    added = _add_events(db, doc.user_id, events)
+    return added + _refresh_following(db, doc.user_id, occurred_at, list(current))
+
+
+def safe_record_document_events(db, doc) -> int:
+    """
+    record_document_events as a best-effort side write: it runs in a savepoint,
+    so a failure is logged and leaves the document and its results to commit.
+    """
+    db.flush()
+    try:
+        with db.begin_nested():
+            return record_document_events(db, doc)
+    except Exception as e:
+        logger.warning(f"Could not record timeline events for document {doc.id}: {e}")
+        return 0
+
+
+def record_analysis_event(db, report) -> int:
+    """Record a completed general analysis. Call after the report has an id."""
+    return _add_events(db, report.user_id, [{
+        "event_type": "analysis",
+        "occurred_at": report.created_at or datetime.now(),
+        "title": "AI Health Analysis",
+        "subtitle": f"{report.biomarkers_analyzed} biomarkers analyzed" if report.biomarkers_analyzed else "Analysis complete",
+        "link": "/health",
+        "risk_level": report.risk_level,
+        "report_id": report.id,
+        "dedupe_key": f"report:{report.id}",
+    }])
+
+
+def delete_document_events(db, document_ids: List[int]):
+    """
+    Remove events sourced from deleted documents and correct the crossings of
+    the results that followed them. Call before the documents' results are
+    deleted. Does not commit.
+    """
+    if not document_ids:
+        return
+    for doc in db.query(Document).filter(Document.id.in_(document_ids)).all():
+        _refresh_following(db, doc.user_id, doc.document_date or doc.upload_date,
+                           list(_document_flags(db, doc.id)), exclude_ids=document_ids)
+    db.query(HealthEvent).filter(HealthEvent.document_id.in_(document_ids))\
+        .delete(synchronize_session=False)
+
+
+def delete_analysis_events(db, user_id: int):
+    """Remove analysis events when a user's reports are deleted. Does not commit."""
+    db.query(HealthEvent).filter(
+        HealthEvent.user_id == user_id, HealthEvent.event_type == "analysis"
+    ).delete(synchronize_session=False)
+
+
+def encode_cursor(event) -> str:
+    raw = f"{event.occurred_at.isoformat()}|{event.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a pagination cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        occurred_at, event_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(occurred_at), int(event_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def list_events(db, user_id: int, limit: int = 20, before: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Return one page of timeline events, newest first, and the cursor for the
+    next page (None on the last page).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(HealthEvent).filter(HealthEvent.user_id == user_id)
+
+    if before:
+        occurred_at, event_id = decode_cursor(before)
+        query = query.filter(or_(
+            HealthEvent.occurred_at < occurred_at,
+            and_(HealthEvent.occurred_at == occurred_at, HealthEvent.id < event_id)
+        ))
+
+    rows = query.order_by(HealthEvent.occurred_at.desc(), HealthEvent.id.desc())\
+        .limit(limit + 1).all()
+
+    events = []
+    for event in rows[:limit]:
+        item = {
+            "id": event.id,
+            "type": event.event_type,
+            "icon": EVENT_ICONS.get(event.event_type, "file"),
+            "title": event.title,
+            "subtitle": event.subtitle,
+            "date": event.occurred_at.isoformat() if event.occurred_at else None,
+            "link": event.link,
+        }
+        if event.event_type == "analysis":
+            item["risk_level"] = event.risk_level
+        events.append(item)
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return events, next_cursor
+
+
+def backfill_user_events(db, user_id: int) -> int:
+    """
+    Build events for history ingested before the events table existed.
+    Reads the user's results once as columns; safe to re-run.
+    """
+    events = []
+
+    documents = db.query(Document)\
+        .filter(Document.user_id == user_id, Document.is_processed == True)\
+        .all()
+    events.extend(_document_event(doc) for doc in documents)
+
+    reports = db.query(HealthReport)\
+        .filter(HealthReport.user_id == user_id, HealthReport.report_type == "general")\
+        .all()
+
+    name_col = func.coalesce(TestResult.canonical_name, TestResult.test_name)
+    event_date = func.coalesce(Document.document_date, Document.upload_date)
+    rows = db.query(name_col, TestResult.flags, event_date, Document.id)\
+        .join(Document)\
+        .filter(Document.user_id == user_id)\
+        .order_by(name_col, event_date, TestResult.id)\
+        .all()
+
+    previous_name, previous_flag = None, None
+    for name, flag, occurred_at, document_id in rows:
+        if name == previous_name and occurred_at is not None:
+            event = _transition_event(name, previous_flag, flag, occurred_at, document_id)
+            if event:
+                events.append(event)
+        previous_name, previous_flag = name, flag
+
+    added = _add_events(db, user_id, events)
+    for report in reports:
+        added += record_analysis_event(db, report)
+    return added
@@ -24,21 +24,24 @@ def calculate_health_score(user, db, vault_helper=None) -> dict:
     Returns dict with total score, component scores, and insights.
     """
     try:
-        from models import Document, TestResult, HealthReport
+        from models import HealthReport
+        from services.biomarker_trends import load_user_series, compute_trends, summarize_transitions
+        from services import report_cache
     except ImportError:
-        from backend_v2.models import Document, TestResult, HealthReport
+        from backend_v2.models import HealthReport
+        from backend_v2.services.biomarker_trends import load_user_series, compute_trends, summarize_transitions
+        from backend_v2.services import report_cache
 
     components = {}
     insights = []
 
-    # --- 1. Biomarkers in Range (40%) ---
-    results = db.query(TestResult).join(Document)\
-        .filter(Document.user_id == user.id)\
-        .all()
+    # Flags-only columnar series (no decryption needed for scoring)
+    series = load_user_series(db, user.id)
 
-    if results:
-        total = len(results)
-        normal = sum(1 for r in results if r.flags == "NORMAL")
+    # --- 1. Biomarkers in Range (40%) ---
+    if len(series):
+        total = len(series)
+        normal = int((series.flags == "NORMAL").sum())
         pct = (normal / total) * 100 if total > 0 else 0
         components["biomarkers"] = {
             "score": round(pct),
@@ -122,7 +125,7 @@ def calculate_health_score(user, db, vault_helper=None) -> dict:
         content = None
         if vault_helper and vault_helper.is_available and gap_report.content_enc:
             try:
-                content = json.loads(vault_helper.decrypt_data(gap_report.content_enc))
+                content = report_cache.get_report_json(gap_report, user.id, vault_helper)
             except Exception:
                 pass
 
@@ -180,35 +183,13 @@ def calculate_health_score(user, db, vault_helper=None) -> dict:
     }
 
     # --- 5. Trend Direction (15%) ---
-    # Compare latest biomarkers with previous ones
     trend_score = 50  # Neutral
 
-    # Get unique biomarkers with at least 2 data points
-    from collections import defaultdict
-    biomarker_history = defaultdict(list)
-
-    all_results = db.query(TestResult).join(Document)\
-        .filter(Document.user_id == user.id)\
-        .order_by(Document.document_date.asc())\
-        .all()
-
-    for r in all_results:
-        key = r.canonical_name or r.test_name
-        biomarker_history[key].append(r.flags)
-
-    improving = 0
-    worsening = 0
-    stable = 0
-    for key, flags in biomarker_history.items():
-        if len(flags) >= 2:
-            prev = flags[-2]
-            current = flags[-1]
-            if prev != "NORMAL" and current == "NORMAL":
-                improving += 1
-            elif prev == "NORMAL" and current != "NORMAL":
-                worsening += 1
-            else:
-                stable += 1
+    # Compare the latest reading of each biomarker with the previous one
+    transitions = summarize_transitions(compute_trends(series))
+    improving = transitions["improving"]
+    worsening = transitions["worsening"]
+    stable = transitions["stable"]
 
     total_tracked = improving + worsening + stable
     if total_tracked > 0:
@@ -250,5 +231,5 @@ def calculate_health_score(user, db, vault_helper=None) -> dict:
         "grade": grade,
         "components": components,
         "insights": insights,
-        "has_data": bool(results)
+        "has_data": bool(len(series))
     }
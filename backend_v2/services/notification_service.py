@@ -3,19 +3,28 @@ Notification service for sending email alerts to users.
 
 Notification types:
 - new_documents: New lab results available after sync
-- abnormal_biomarker: Biomarker outside normal range detected
+- abnormal_biomarker: Biomarker(s) outside normal range detected; a sync
+  raises one summary notification for all its abnormal results
 - analysis_complete: AI health analysis completed
 - sync_failed: Provider sync failed
 - reminder: Periodic health checkup reminder
 """
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
+# Abnormal results listed in one summary notification
+ABNORMAL_SUMMARY_MAX_ITEMS = 10
+
+# Single background worker for notification I/O (rows, email, push) raised
+# by ingestion, so syncs are not held up by SMTP or push fan-out
+_dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notify")
+
 
 class NotificationService:
     def __init__(self, db: Session):
@@ -219,6 +228,8 @@ class NotificationService:
     def _send_abnormal_biomarker_email(self, to_email: str, notification, language: str) -> bool:
         """Send email about abnormal biomarker."""
         data = json.loads(notification.data) if notification.data else {}
+        if data.get("biomarkers"):
+            return self._send_abnormal_summary_email(to_email, data, language)
         biomarker_name = data.get("biomarker_name", "")
         value = data.get("value", "")
         unit = data.get("unit", "")
@@ -265,6 +276,46 @@ class NotificationService:
 
         return self.email_service.send_email(to_email, subject, html_body)
 
+    def _send_abnormal_summary_email(self, to_email: str, data: dict, language: str) -> bool:
+        """Send one email listing the abnormal values found by a sync."""
+        count = data.get("count", len(data["biomarkers"]))
+        rows = "".join(
+            f"""<tr><td style="padding: 6px 0;"><strong>{b.get('biomarker_name', '')}</strong></td>
+                <td style="padding: 6px 0; color: {'#dc2626' if b.get('flag') == 'HIGH' else '#f59e0b'};">{b.get('value', '')} {b.get('unit') or ''}</td>
+                <td style="padding: 6px 0; color: #64748b;">{b.get('reference_range') or ''}</td></tr>"""
+            for b in data["biomarkers"]
+        )
+        more = count - len(data["biomarkers"])
+
+        if language == "ro":
+            subject = f"Atenție: {count} valori anormale în rezultatele noi"
+            html_body = self._email_template(
+                title="Valori anormale detectate",
+                content=f"""
+                <p>Am detectat <strong>{count} valori</strong> în afara intervalului normal în rezultatele noi:</p>
+                <table style="width: 100%; margin: 20px 0;">{rows}</table>
+                {f"<p>...și încă {more}.</p>" if more > 0 else ""}
+                <p>Te recomandăm să consulți un medic pentru interpretarea acestor rezultate.</p>
+                """,
+                button_text="Vezi Detalii",
+                button_url="https://analize.online/biomarkers"
+            )
+        else:
+            subject = f"Attention: {count} abnormal values in new results"
+            html_body = self._email_template(
+                title="Abnormal Values Detected",
+                content=f"""
+                <p>We detected <strong>{count} values</strong> outside the normal range in your new results:</p>
+                <table style="width: 100%; margin: 20px 0;">{rows}</table>
+                {f"<p>...and {more} more.</p>" if more > 0 else ""}
+                <p>We recommend consulting a doctor for interpretation of these results.</p>
+                """,
+                button_text="View Details",
+                button_url="https://analize.online/biomarkers"
+            )
+
+        return self.email_service.send_email(to_email, subject, html_body)
+
     def _send_analysis_complete_email(self, to_email: str, notification, language: str) -> bool:
         """Send email when AI analysis is complete."""
         data = json.loads(notification.data) if notification.data else {}
@@ -560,6 +611,35 @@ def notify_abnormal_biomarker(db: Session, user_id: int, biomarker_name: str, va
     )
 
 
+def notify_abnormal_results(db: Session, user_id: int, provider: str, abnormal: List[Dict[str, Any]]):
+    """
+    Helper to notify user once about all abnormal results from a sync.
+    Each item has biomarker_name, value, unit, flag and reference_range.
+    """
+    if not abnormal:
+        return
+    if len(abnormal) == 1:
+        item = abnormal[0]
+        notify_abnormal_biomarker(db, user_id, item["biomarker_name"], item["value"], item["unit"],
+                                  item["flag"], item["reference_range"])
+        return
+
+    names = [item["biomarker_name"] for item in abnormal]
+    listed = ", ".join(names[:3]) + (f" și încă {len(names) - 3}" if len(names) > 3 else "")
+    service = NotificationService(db)
+    service.create_notification(
+        user_id=user_id,
+        notification_type="abnormal_biomarker",
+        title=f"{len(abnormal)} valori anormale în rezultatele noi",
+        message=listed,
+        data={
+            "provider": provider,
+            "count": len(abnormal),
+            "biomarkers": abnormal[:ABNORMAL_SUMMARY_MAX_ITEMS]
+        }
+    )
+
+
 def notify_analysis_complete(db: Session, user_id: int, report_type: str, risk_level: str):
     """Helper to notify user about completed AI analysis."""
     service = NotificationService(db)
@@ -589,3 +669,25 @@ def notify_sync_failed(db: Session, user_id: int, provider: str, error_type: str
             "error_message": error_message
         }
     )
+
+
+def dispatch_notification(notify, user_id: int, *args, **kwargs):
+    """
+    Run a notify_* helper on the background dispatcher with its own session.
+    Returns a Future; failures are logged, never raised into the caller.
+    """
+    try:
+        from backend_v2.database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+
+    def run():
+        db = SessionLocal()
+        try:
+            notify(db, user_id, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Failed to send {notify.__name__} notification: {e}")
+        finally:
+            db.close()
+
+    return _dispatcher.submit(run)
@@ -0,0 +1,110 @@
+"""
+Page View Buffer
+Write-behind buffer for the public page-view tracking endpoint.
+
+POST /analytics/pageview only appends the view to an in-memory buffer and
+returns; a writer thread bulk-inserts the buffer into page_views every
+FLUSH_INTERVAL seconds (sooner once BATCH_SIZE views are waiting), so a
+tracking request never waits on a database commit.
+
+- views keep the time they were recorded, not the time they were flushed
+- the buffer is bounded: past MAX_BUFFERED views new ones are dropped and
+  counted, so a database outage can't grow the API process without limit
+- a failed insert puts its batch back for the next pass
+- the API flushes what is left on shutdown; views buffered in a process that
+  is killed outright are lost (analytics only - nothing else depends on them)
+"""
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import insert
+
+try:
+    from backend_v2.database import SessionLocal
+    from backend_v2.models import PageView
+except ImportError:
+    from database import SessionLocal
+    from models import PageView
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv("PAGEVIEW_FLUSH_SECONDS", "2"))
+BATCH_SIZE = int(os.getenv("PAGEVIEW_BATCH_SIZE", "500"))
+MAX_BUFFERED = int(os.getenv("PAGEVIEW_MAX_BUFFERED", "20000"))
+
+_lock = threading.Lock()
+_buffer: deque = deque()
+_dropped = 0
+_wake = threading.Event()
+_writer_thread: Optional[threading.Thread] = None
+
+
+def record(view: Dict) -> bool:
+    """Queue a page view (PageView column values) for the next flush; False if dropped."""
+    global _dropped
+    view.setdefault("created_at", datetime.now(timezone.utc))
+    with _lock:
+        if len(_buffer) >= MAX_BUFFERED:
+            _dropped += 1
+            return False
+        _buffer.append(view)
+        pending = len(_buffer)
+    _ensure_writer()
+    if pending >= BATCH_SIZE:
+        _wake.set()
+    return True
+
+
+def stats() -> Dict:
+    with _lock:
+        return {"buffered": len(_buffer), "dropped": _dropped}
+
+
+def flush() -> int:
+    """Insert buffered views in one batch; returns how many were written."""
+    with _lock:
+        if not _buffer:
+            return 0
+        batch = list(_buffer)
+        _buffer.clear()
+
+    db = None
+    try:
+        db = SessionLocal()
+        db.execute(insert(PageView), batch)
+        db.commit()
+        return len(batch)
+    except Exception as e:
+        if db is not None:
+            db.rollback()
+        logger.warning(f"Failed to write {len(batch)} page views, retrying next flush: {e}")
+        with _lock:
+            # Oldest first, still within the bound
+            room = max(0, MAX_BUFFERED - len(_buffer))
+            _buffer.extendleft(reversed(batch[-room:] if room else []))
+        return 0
+    finally:
+        if db is not None:
+            db.close()
+
+
+def _ensure_writer():
+    global _writer_thread
+    with _lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="pageview-writer", daemon=True)
+            _writer_thread.start()
+
+
+def _writer_loop():
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Page view writer error: {e}")
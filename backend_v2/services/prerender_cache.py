@@ -0,0 +1,230 @@
+"""
+Prerender Cache
+Compiled index.html template and rendered-page LRU for SEO prerendering.
+
+The frontend index.html is parsed once into literal chunks around the meta
+slots prerendering fills in (title, description, Open Graph / Twitter tags,
+canonical, extra head content, root div), so a render is a single join
+instead of a dozen regex passes over the document. The file is re-stat'ed at
+most every TEMPLATE_CHECK_SECONDS and recompiled when its mtime changes,
+which also empties the page cache.
+
+Rendered pages are kept per cache key (LRU, at most PRERENDER_CACHE_MAX_BYTES
+of HTML) with an ETag and Last-Modified for conditional GETs; a crawler burst
+is served from memory without touching disk or the database. Callers key
+every fallback page under one shared key so unknown paths don't each get an
+entry. Blog pages are dropped when an article is published (invalidate).
+
+Every recompile, reset and invalidation bumps a generation counter; a page
+rendered before the bump is returned but not cached, so a render that raced
+a template change never brings the old template back.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRERENDER_CACHE_MAX_BYTES = int(os.getenv("PRERENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TEMPLATE_CHECK_SECONDS = float(os.getenv("PRERENDER_TEMPLATE_CHECK_SECONDS", "5"))
+
+TEMPLATE_PATHS = [
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend_v2", "dist", "index.html")),
+    "/opt/healthy/frontend_v2/dist/index.html",
+]
+
+
+def escape(s: str) -> str:
+    """Escape HTML special chars for attribute values."""
+    return s.replace("&", "&amp;").replace('"', "&quot;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+# (pattern, value, replacement) - every match of pattern becomes a slot; the
+# replacement gets the escaped value (raw for extra_head/body). A slot keeps
+# the template's own text when its value is empty and optional.
+SLOTS: List[Tuple[str, str, str, bool]] = [
+    (r"<title>[^<]*</title>", "title", "<title>{}</title>", False),
+    (r'<meta name="description" content="[^"]*"', "description", '<meta name="description" content="{}"', False),
+    (r'<meta property="og:title" content="[^"]*"', "title", '<meta property="og:title" content="{}"', False),
+    (r'<meta property="og:description" content="[^"]*"', "description",
+     '<meta property="og:description" content="{}"', False),
+    (r'<meta property="og:url" content="[^"]*"', "url", '<meta property="og:url" content="{}"', False),
+    (r'<meta property="og:image" content="[^"]*"', "og_image", '<meta property="og:image" content="{}"', True),
+    (r'<meta name="twitter:image" content="[^"]*"', "og_image", '<meta name="twitter:image" content="{}"', True),
+    (r'<meta name="twitter:title" content="[^"]*"', "title", '<meta name="twitter:title" content="{}"', False),
+    (r'<meta name="twitter:description" content="[^"]*"', "description",
+     '<meta name="twitter:description" content="{}"', False),
+    (r'<link rel="canonical" href="[^"]*"', "url", '<link rel="canonical" href="{}"', False),
+    (r"</head>", "extra_head", "{}\n</head>", True),
+    (r'<div id="root"></div>', "body", '<div id="root">{}</div>', True),
+]
+
+_RAW_VALUES = ("extra_head", "body")
+
+
+class CompiledTemplate:
+    """index.html as literal chunks interleaved with meta slots."""
+
+    def __init__(self, html: str, mtime: float = 0.0):
+        self.mtime = mtime
+        spans = []
+        for pattern, value, replacement, optional in SLOTS:
+            for match in re.finditer(pattern, html):
+                spans.append((match.start(), match.end(), value, replacement, optional))
+        spans.sort()
+
+        # parts alternates literal text and (value, replacement, optional, original)
+        self.parts: List = []
+        position = 0
+        for start, end, value, replacement, optional in spans:
+            if start < position:
+                continue  # Overlapping match; the first slot wins
+            self.parts.append(html[position:start])
+            self.parts.append((value, replacement, optional, html[start:end]))
+            position = end
+        self.parts.append(html[position:])
+
+    def render(self, **values: str) -> str:
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            value, replacement, optional, original = part
+            text = values.get(value) or ""
+            if optional and not text:
+                out.append(original)
+            else:
+                out.append(replacement.format(text if value in _RAW_VALUES else escape(text)))
+        return "".join(out)
+
+
+@dataclass
+class RenderedPage:
+    html: str
+    etag: str
+    last_modified: datetime
+    size: int = 0  # Encoded HTML bytes, counted against PRERENDER_CACHE_MAX_BYTES
+
+
+_lock = threading.Lock()
+_template: Optional[CompiledTemplate] = None
+_template_path: Optional[str] = None
+_template_checked = 0.0
+_pages: "OrderedDict[str, RenderedPage]" = OrderedDict()
+_size = 0
+_generation = 0
+_stats = {"hits": 0, "misses": 0}
+
+
+def _clear():
+    """Drop every page (call with _lock held)."""
+    global _size, _generation
+    _pages.clear()
+    _size = 0
+    _generation += 1
+
+
+def _find_template() -> Tuple[Optional[str], float]:
+    for path in TEMPLATE_PATHS:
+        try:
+            return path, os.stat(path).st_mtime
+        except OSError:
+            continue
+    return None, 0.0
+
+
+def get_template() -> Optional[CompiledTemplate]:
+    """The compiled index.html (None if the frontend isn't built), recompiled when it changes."""
+    global _template, _template_path, _template_checked
+    now = time.monotonic()
+    with _lock:
+        if now - _template_checked < TEMPLATE_CHECK_SECONDS:
+            return _template
+        _template_checked = now
+
+    path, mtime = _find_template()
+    with _lock:
+        if _template is not None and path == _template_path and mtime == _template.mtime:
+            return _template
+    if path is None:
+        compiled = None
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            compiled = CompiledTemplate(f.read(), mtime)
+    with _lock:
+        _template, _template_path = compiled, path
+        _clear()
+    logger.info(f"SEO prerender: compiled template {path} ({len(compiled.parts) // 2 if compiled else 0} slots)")
+    return compiled
+
+
+def reset():
+    """Forget the template and every rendered page."""
+    global _template, _template_path, _template_checked
+    with _lock:
+        _template, _template_path, _template_checked = None, None, 0.0
+        _clear()
+
+
+def make_page(html: str, last_modified: datetime = None) -> RenderedPage:
+    """A rendered page with its validators; last_modified defaults to the template's mtime."""
+    encoded = html.encode()
+    etag = '"' + hashlib.blake2b(encoded, digest_size=12).hexdigest() + '"'
+    if last_modified is None:
+        last_modified = datetime.fromtimestamp(_template.mtime if _template else time.time(), timezone.utc)
+    elif last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return RenderedPage(html, etag, last_modified.replace(microsecond=0), len(encoded))
+
+
+def get_page(key: str, render: Callable[[], Optional[RenderedPage]]) -> Optional[RenderedPage]:
+    """The rendered page for key, rendering (and caching) it on a miss."""
+    global _size
+    with _lock:
+        page = _pages.get(key)
+        if page is not None:
+            _pages.move_to_end(key)
+            _stats["hits"] += 1
+            return page
+        _stats["misses"] += 1
+        generation = _generation
+
+    page = render()
+    if page is None or page.size > PRERENDER_CACHE_MAX_BYTES:
+        return page
+    with _lock:
+        if generation != _generation:
+            return page  # Rendered before a recompile or invalidation; don't cache it
+        previous = _pages.pop(key, None)
+        if previous is not None:
+            _size -= previous.size
+        _pages[key] = page
+        _size += page.size
+        while _size > PRERENDER_CACHE_MAX_BYTES:
+            _, evicted = _pages.popitem(last=False)
+            _size -= evicted.size
+    return page
+
+
+def invalidate(prefix: str = "") -> int:
+    """Drop cached pages whose key starts with prefix (all pages by default)."""
+    global _size, _generation
+    with _lock:
+        keys = [key for key in _pages if key.startswith(prefix)]
+        for key in keys:
+            _size -= _pages.pop(key).size
+        _generation += 1
+    return len(keys)
+
+
+def stats() -> Dict:
+    with _lock:
+        return dict(_stats, entries=len(_pages), bytes=_size)
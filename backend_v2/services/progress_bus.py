@@ -0,0 +1,447 @@
+"""
+Progress Bus
+Push-based delivery of sync and ingestion progress.
+
+Producers (crawler status callbacks, manual and scheduled syncs, document
+ingestion) publish status snapshots through sync_status. Subscribers (the
+/users/sync-events stream) receive them as they happen instead of polling.
+
+- Delivery is coalesced: a subscriber that falls behind receives only the
+  latest snapshot per channel, never a backlog.
+- Snapshots are persisted to sync_progress by a single writer thread, at most
+  once per PERSIST_INTERVAL per channel; terminal states are written at once.
+- Snapshots from other workers are picked up by one watcher thread per
+  process, only while someone is subscribed: LISTEN/NOTIFY on PostgreSQL,
+  an indexed poll of sync_progress.version on SQLite. The watcher decides to
+  stop under the same lock subscribers take to start it, so a new subscriber
+  never relies on a watcher that is about to exit.
+- clear() drops a channel's snapshot here and, through the writer, from the
+  shared store.
+
+A channel is a provider name for syncs, or "upload" for manual uploads.
+"""
+import asyncio
+import logging
+import select
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Max seconds between persisted snapshots of an in-progress channel
+PERSIST_INTERVAL = 0.5
+
+# Seconds between checks for snapshots published by other workers
+WATCH_INTERVAL = 1.0
+
+# A snapshot can be committed after later versions were already seen
+# (writer batching, commit latency); re-read this far back and dedupe by version
+WATCH_OVERLAP_MS = 5000
+
+# Seconds between keepalives on an idle stream
+HEARTBEAT_SECONDS = 15
+
+NOTIFY_CHANNEL = "sync_progress"
+
+STATUS_FIELDS = ("stage", "message", "progress", "total", "is_complete", "is_error", "error_type")
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class DatabaseProgressStore:
+    """Shared store backed by the sync_progress table."""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+
+    def _session(self):
+        if self._session_factory is None:
+            try:
+                from backend_v2.database import SessionLocal
+            except ImportError:
+                from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    @staticmethod
+    def _model():
+        try:
+            from backend_v2.models import SyncProgress
+        except ImportError:
+            from models import SyncProgress
+        return SyncProgress
+
+    @staticmethod
+    def _to_status(row) -> Dict:
+        status = {field: getattr(row, field) for field in STATUS_FIELDS}
+        status["version"] = row.version
+        status["updated_at"] = datetime.fromtimestamp(row.version / 1000).isoformat()
+        return status
+
+    def is_postgres(self) -> bool:
+        db = self._session()
+        try:
+            return db.get_bind().dialect.name == "postgresql"
+        finally:
+            db.close()
+
+    def save(self, snapshots: Dict[Tuple[int, str], Optional[Dict]]):
+        """Upsert the latest snapshot per (user_id, channel); None deletes the channel's row."""
+        SyncProgress = self._model()
+        db = self._session()
+        try:
+            for (user_id, channel), status in snapshots.items():
+                row = db.query(SyncProgress).filter(
+                    SyncProgress.user_id == user_id, SyncProgress.channel == channel
+                ).first()
+                if status is None:
+                    if row is not None:
+                        db.delete(row)
+                    continue
+                if row is None:
+                    row = SyncProgress(user_id=user_id, channel=channel)
+                    db.add(row)
+                elif row.version >= status["version"]:
+                    continue  # another worker already stored something newer
+                for field in STATUS_FIELDS:
+                    setattr(row, field, status.get(field))
+                row.version = status["version"]
+
+            if db.get_bind().dialect.name == "postgresql":
+                from sqlalchemy import text
+                # Delivered to listeners on commit
+                for user_id in {user_id for user_id, _ in snapshots}:
+                    db.execute(text("SELECT pg_notify(:channel, :payload)"),
+                               {"channel": NOTIFY_CHANNEL, "payload": str(user_id)})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def load(self, user_id: int, channel: Optional[str] = None) -> Dict[str, Dict]:
+        """Latest snapshot per channel for a user."""
+        SyncProgress = self._model()
+        db = self._session()
+        try:
+            query = db.query(SyncProgress).filter(SyncProgress.user_id == user_id)
+            if channel is not None:
+                query = query.filter(SyncProgress.channel == channel)
+            return {row.channel: self._to_status(row) for row in query.all()}
+        finally:
+            db.close()
+
+    def changed_since(self, version: int, user_ids) -> list:
+        """(user_id, channel, status) for snapshots newer than version."""
+        SyncProgress = self._model()
+        db = self._session()
+        try:
+            rows = db.query(SyncProgress).filter(
+                SyncProgress.version > version, SyncProgress.user_id.in_(list(user_ids))
+            ).all()
+            return [(row.user_id, row.channel, self._to_status(row)) for row in rows]
+        finally:
+            db.close()
+
+    def prune(self, complete_before_ms: int, stale_before_ms: int) -> int:
+        """Delete finished snapshots and ones abandoned mid-sync."""
+        from sqlalchemy import and_, or_
+        SyncProgress = self._model()
+        db = self._session()
+        try:
+            deleted = db.query(SyncProgress).filter(or_(
+                and_(SyncProgress.is_complete == True, SyncProgress.version < complete_before_ms),
+                SyncProgress.version < stale_before_ms,
+            )).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def listen_connection(self):
+        """Raw DBAPI connection with LISTEN registered (PostgreSQL only)."""
+        db = self._session()
+        try:
+            raw = db.get_bind().raw_connection()
+        finally:
+            db.close()
+        conn = raw.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return raw, conn
+
+
+class _Subscriber:
+    """One open stream: the latest undelivered snapshot per channel."""
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.loop = loop
+        self.ready = asyncio.Event()
+        self.pending: Dict[str, Dict] = {}
+        self.versions: Dict[str, int] = {}
+
+    def offer(self, channel: str, status: Dict):
+        """Queue a snapshot, replacing any undelivered one. Caller holds _lock."""
+        if status.get("version", 0) <= self.versions.get(channel, -1):
+            return
+        self.versions[channel] = status["version"]
+        self.pending[channel] = status
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            pass  # loop closed; the stream is going away
+
+
+_lock = threading.Lock()
+_subscribers: Dict[int, set] = {}
+_versions: Dict[Tuple[int, str], int] = {}
+
+_store = DatabaseProgressStore()
+
+# Writer state: latest unsaved snapshot per key (None: cleared), and when each key was last saved
+_unsaved: Dict[Tuple[int, str], Optional[Dict]] = {}
+_last_saved: Dict[Tuple[int, str], float] = {}
+_writer_wake = threading.Event()
+# Keeps store writes in queue order when flush() is also called outside the writer
+_flush_lock = threading.Lock()
+_writer_thread: Optional[threading.Thread] = None
+_watcher_thread: Optional[threading.Thread] = None
+
+
+def set_store(store):
+    """Replace the shared store (e.g. with one bound to another database)."""
+    global _store
+    _store = store
+
+
+def _dispatch(user_id: int, channel: str, status: Dict):
+    with _lock:
+        for subscriber in _subscribers.get(user_id, ()):
+            subscriber.offer(channel, status)
+
+
+def publish(user_id: int, channel: str, status: Dict) -> Dict:
+    """
+    Publish a status snapshot. Delivers it to local subscribers and queues it
+    for the shared store. Returns the snapshot stamped with its version.
+    """
+    key = (user_id, channel)
+    with _lock:
+        version = max(_now_ms(), _versions.get(key, 0) + 1)
+        _versions[key] = version
+        status = dict(status, version=version)
+        _unsaved[key] = status
+        for subscriber in _subscribers.get(user_id, ()):
+            subscriber.offer(channel, status)
+    _ensure_writer()
+    if status.get("is_complete"):
+        _writer_wake.set()
+    return status
+
+
+def clear(user_id: int, channel: str):
+    """Forget a channel's snapshot, locally and in the shared store."""
+    with _lock:
+        _unsaved[(user_id, channel)] = None
+    _ensure_writer()
+    _writer_wake.set()
+
+
+def load_status(user_id: int, channel: str) -> Optional[Dict]:
+    """Read a snapshot published by any worker, or None."""
+    key = (user_id, channel)
+    with _lock:
+        if key in _unsaved:
+            unsaved = _unsaved[key]
+            return dict(unsaved) if unsaved is not None else None
+    try:
+        return _store.load(user_id, channel).get(channel)
+    except Exception as e:
+        logger.debug(f"Progress store read failed: {e}")
+        return None
+
+
+def _ensure_writer():
+    global _writer_thread
+    with _lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="progress-writer", daemon=True)
+            _writer_thread.start()
+
+
+def flush(force: bool = True) -> int:
+    """
+    Persist queued snapshots. Unless force, in-progress snapshots of a channel
+    saved less than PERSIST_INTERVAL ago wait for the next pass.
+    """
+    with _flush_lock:
+        now = time.monotonic()
+        with _lock:
+            due = {
+                key: status for key, status in _unsaved.items()
+                if force or status is None or status.get("is_complete")
+                or now - _last_saved.get(key, 0) >= PERSIST_INTERVAL
+            }
+            for key in due:
+                del _unsaved[key]
+        if not due:
+            return 0
+
+        try:
+            _store.save(due)
+        except Exception as e:
+            logger.warning(f"Failed to persist sync progress: {e}")
+            return 0
+        with _lock:
+            for key in due:
+                _last_saved[key] = now
+        return len(due)
+
+
+def _writer_loop():
+    while True:
+        _writer_wake.wait(PERSIST_INTERVAL)
+        _writer_wake.clear()
+        flush(force=False)
+
+
+def _ensure_watcher():
+    global _watcher_thread
+    with _lock:
+        if _watcher_thread is None or not _watcher_thread.is_alive():
+            _watcher_thread = threading.Thread(target=_watcher_loop, name="progress-watcher", daemon=True)
+            _watcher_thread.start()
+
+
+def _subscribed_users() -> set:
+    with _lock:
+        return {user_id for user_id, subscribers in _subscribers.items() if subscribers}
+
+
+def _keep_watching() -> bool:
+    """
+    True while someone is subscribed. Otherwise the calling watcher retires in
+    the same critical section, so _ensure_watcher starts a new one from then on.
+    """
+    global _watcher_thread
+    with _lock:
+        if any(_subscribers.values()):
+            return True
+        if _watcher_thread is threading.current_thread():
+            _watcher_thread = None
+        return False
+
+
+def poll_store(since_version: int) -> int:
+    """Deliver snapshots stored since since_version; returns the new watermark."""
+    user_ids = _subscribed_users()
+    if not user_ids:
+        return since_version
+    watermark = since_version
+    for user_id, channel, status in _store.changed_since(since_version - WATCH_OVERLAP_MS, user_ids):
+        _dispatch(user_id, channel, status)
+        watermark = max(watermark, status["version"])
+    return watermark
+
+
+def _listen_postgres():
+    raw, conn = _store.listen_connection()
+    try:
+        while _keep_watching():
+            if select.select([conn], [], [], WATCH_INTERVAL) == ([], [], []):
+                continue
+            conn.poll()
+            user_ids = set()
+            while conn.notifies:
+                user_ids.add(int(conn.notifies.pop(0).payload))
+            for user_id in user_ids & _subscribed_users():
+                for channel, status in _store.load(user_id).items():
+                    _dispatch(user_id, channel, status)
+    finally:
+        # Don't hand a LISTENing connection back to the pool
+        raw.invalidate()
+
+
+def _watcher_loop():
+    global _watcher_thread
+    try:
+        if _store.is_postgres():
+            _listen_postgres()
+        else:
+            watermark = _now_ms()
+            while _keep_watching():
+                time.sleep(WATCH_INTERVAL)
+                watermark = poll_store(watermark)
+    except Exception as e:
+        logger.warning(f"Progress watcher stopped: {e}")
+    finally:
+        with _lock:
+            if _watcher_thread is threading.current_thread():
+                _watcher_thread = None
+
+
+async def subscribe(user_id: int, heartbeat: float = HEARTBEAT_SECONDS) -> AsyncIterator[Optional[Tuple[str, Dict]]]:
+    """
+    Yield (channel, status) for a user's progress as it is published, starting
+    with the current snapshot of every channel. Yields None as a keepalive
+    after heartbeat seconds without updates.
+    """
+    subscriber = _Subscriber(user_id, asyncio.get_running_loop())
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(subscriber)
+        local = {channel: status for (uid, channel), status in _unsaved.items()
+                 if uid == user_id and status is not None}
+    _ensure_watcher()
+
+    try:
+        try:
+            current = await asyncio.to_thread(_store.load, user_id)
+        except Exception as e:
+            logger.debug(f"Progress store read failed: {e}")
+            current = {}
+        with _lock:
+            # offer() keeps whichever snapshot is newer; skip channels cleared but not yet flushed
+            for snapshots in (current, local):
+                for channel, status in snapshots.items():
+                    if _unsaved.get((user_id, channel), status) is not None:
+                        subscriber.offer(channel, status)
+
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.ready.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            with _lock:
+                subscriber.ready.clear()
+                pending, subscriber.pending = subscriber.pending, {}
+            for channel, status in pending.items():
+                yield channel, status
+    finally:
+        with _lock:
+            _subscribers.get(user_id, set()).discard(subscriber)
+            if not _subscribers.get(user_id):
+                _subscribers.pop(user_id, None)
+
+
+def prune(complete_minutes: int, stale_hours: int = 6) -> int:
+    """Janitor: drop old snapshots from the shared store and writer bookkeeping."""
+    now = datetime.now(timezone.utc)
+    complete_before = int((now - timedelta(minutes=complete_minutes)).timestamp() * 1000)
+    stale_before = int((now - timedelta(hours=stale_hours)).timestamp() * 1000)
+    with _lock:
+        for key in [key for key, version in _versions.items() if version < stale_before]:
+            _versions.pop(key, None)
+            _last_saved.pop(key, None)
+    try:
+        return _store.prune(complete_before, stale_before)
+    except Exception as e:
+        logger.warning(f"Failed to prune sync progress: {e}")
+        return 0
@@ -0,0 +1,236 @@
+"""
+Prompt Budget
+Token-aware context building for the LLM agents and document parser.
+
+Biomarker histories are compacted into one line per canonical biomarker
+(latest value, previous value, min/max, trend) instead of one line per
+measurement, ordered so out-of-range and recent markers come first. When the
+rendered context still exceeds its token budget, the lowest-priority markers
+are shortened and finally listed by name only, so no marker disappears from
+the prompt.
+
+Long lab documents are split into page chunks that each fit the parsing
+budget, instead of being cut off at a fixed character count.
+"""
+import os
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+try:
+    from backend_v2.services.biomarker_normalizer import get_canonical_name
+except ImportError:
+    from services.biomarker_normalizer import get_canonical_name
+
+# Token budget for the biomarker section of agent prompts
+BIOMARKER_CONTEXT_TOKENS = int(os.getenv("BIOMARKER_CONTEXT_TOKENS", "6000"))
+
+# Token budget for one chunk of document text sent to the parser
+DOCUMENT_CHUNK_TOKENS = int(os.getenv("DOCUMENT_CHUNK_TOKENS", "6000"))
+
+# Relative change between first and latest value reported as a trend
+TREND_THRESHOLD = 0.10
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally (tiktoken when installed, else a UTF-8 byte estimate)."""
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_encoding().encode(text, disallowed_special=()))
+    # ~4 bytes per token for Latin text; diacritics cost more bytes, as they do tokens
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+@lru_cache(maxsize=4096)
+def _canonical(name: str) -> str:
+    return get_canonical_name(name) if name else "Unknown"
+
+
+def _to_float(value) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value) if value is not None else "N/A"
+
+
+def _is_abnormal(bio: Dict) -> bool:
+    return bio.get("status", "normal") != "normal"
+
+
+def compact_biomarkers(biomarkers: List[Dict]) -> List[Dict]:
+    """
+    Collapse repeated measurements into one series per canonical biomarker.
+
+    Returns series dicts ordered by priority: out of range now, then previously
+    out of range, then the rest; most recently tested first within each group.
+    """
+    grouped = defaultdict(list)
+    for bio in biomarkers:
+        grouped[_canonical(bio.get("name", ""))].append(bio)
+
+    series = []
+    for name, readings in grouped.items():
+        readings = sorted(readings, key=lambda b: b.get("date") or "")
+        latest = readings[-1]
+        numeric = [v for v in (_to_float(b.get("value")) for b in readings) if v is not None]
+
+        trend = None
+        if len(numeric) >= 2 and numeric[0]:
+            change = (numeric[-1] - numeric[0]) / abs(numeric[0])
+            trend = "up" if change > TREND_THRESHOLD else "down" if change < -TREND_THRESHOLD else "stable"
+
+        abnormal_now = _is_abnormal(latest)
+        abnormal_count = sum(1 for b in readings if _is_abnormal(b))
+        series.append({
+            "name": name,
+            "unit": latest.get("unit") or "",
+            "range": latest.get("range") or "N/A",
+            "latest": latest,
+            "previous": readings[-2] if len(readings) > 1 else None,
+            "count": len(readings),
+            "first_date": readings[0].get("date"),
+            "min": min(numeric) if len(numeric) > 1 else None,
+            "max": max(numeric) if len(numeric) > 1 else None,
+            "trend": trend,
+            "abnormal_now": abnormal_now,
+            "abnormal_count": abnormal_count,
+            "priority": 0 if abnormal_now else 1 if abnormal_count else 2,
+        })
+
+    # Newest first, then stable sort by priority group
+    series.sort(key=lambda s: s["latest"].get("date") or "", reverse=True)
+    series.sort(key=lambda s: s["priority"])
+    return series
+
+
+def _full_line(s: Dict) -> str:
+    latest = s["latest"]
+    status = "⚠️" if s["abnormal_now"] else "✓"
+    flag = f", {latest.get('flags')}" if s["abnormal_now"] and latest.get("flags") else ""
+    line = (f"{status} {s['name']}: {_fmt(latest.get('value'))} {s['unit']}".rstrip()
+            + f" ({latest.get('date', 'Unknown')}{flag}; ref: {s['range']})")
+    if s["previous"]:
+        line += f"; prev {_fmt(s['previous'].get('value'))} ({s['previous'].get('date', 'Unknown')})"
+    if s["count"] > 2 and s["min"] is not None:
+        line += f"; {s['count']} tests since {s['first_date']}, min {_fmt(s['min'])}, max {_fmt(s['max'])}"
+    if s["trend"]:
+        line += f"; trend {s['trend']}"
+    if s["abnormal_count"] and not s["abnormal_now"]:
+        line += f"; out of range in {s['abnormal_count']} earlier test(s)"
+    return line
+
+
+def _short_line(s: Dict) -> str:
+    latest = s["latest"]
+    status = "⚠️" if s["abnormal_now"] else "✓"
+    return f"{status} {s['name']}: {_fmt(latest.get('value'))} {s['unit']}".rstrip() + f" ({latest.get('date', 'Unknown')})"
+
+
+_SECTION_TITLES = {
+    0: "Out of range in latest test:",
+    1: "Previously out of range, now normal:",
+    2: "Within range:",
+}
+
+
+def format_biomarker_context(biomarkers: List[Dict], token_budget: int = None) -> str:
+    """
+    Render biomarkers as a compact, budgeted prompt section.
+
+    Every biomarker is represented: lower-priority ones are shortened, then
+    listed by name only, until the text fits token_budget.
+    """
+    token_budget = token_budget or BIOMARKER_CONTEXT_TOKENS
+    series = compact_biomarkers(biomarkers)
+    if not series:
+        return "No biomarker data."
+
+    lines = [_full_line(s) for s in series]
+    costs = [count_tokens(line) + 1 for line in lines]
+    total = sum(costs)
+
+    # Shorten from the lowest priority upwards
+    for i in range(len(series) - 1, -1, -1):
+        if total <= token_budget:
+            break
+        short = _short_line(series[i])
+        total += count_tokens(short) + 1 - costs[i]
+        lines[i], costs[i] = short, count_tokens(short) + 1
+
+    # Still over: list the tail by name only
+    names_only = []
+    while total > token_budget and len(lines) > 1 and series[len(lines) - 1]["priority"] > 0:
+        names_only.insert(0, series[len(lines) - 1]["name"])
+        total -= costs.pop()
+        lines.pop()
+        total += 2 + count_tokens(names_only[0])
+
+    output, section = [], None
+    for s, line in zip(series, lines):
+        if s["priority"] != section:
+            section = s["priority"]
+            if output:
+                output.append("")
+            output.append(_SECTION_TITLES[section])
+        output.append(f"  {line}")
+    if names_only:
+        output.append("")
+        output.append(f"Also tested (latest within range): {', '.join(names_only)}")
+    return "\n".join(output)
+
+
+def chunk_pages(pages: List[str], token_budget: int = None) -> List[str]:
+    """
+    Group page texts into chunks that each fit token_budget.
+
+    Pages are never reordered or dropped; a single page larger than the budget
+    is split on line boundaries.
+    """
+    token_budget = token_budget or DOCUMENT_CHUNK_TOKENS
+    chunks, current, current_tokens = [], [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current, current_tokens = [], 0
+
+    for page in pages:
+        page_tokens = count_tokens(page)
+        if page_tokens > token_budget:
+            flush()
+            for line in page.splitlines():
+                line_tokens = count_tokens(line) + 1
+                if current and current_tokens + line_tokens > token_budget:
+                    flush()
+                current.append(line)
+                current_tokens += line_tokens
+            flush()
+            continue
+        if current and current_tokens + page_tokens > token_budget:
+            flush()
+        current.append(page)
+        current_tokens += page_tokens + 1
+    flush()
+    return chunks
+
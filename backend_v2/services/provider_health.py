@@ -0,0 +1,164 @@
+"""
+Provider Health
+Per-provider circuit breaker and sync health, derived from sync job outcomes.
+
+The state of each provider is read from its recent finished SyncJobs, so
+every API process and crawler worker sees the same breaker without extra
+shared state:
+- closed: syncs run normally
+- open: the last FAILURE_THRESHOLD syncs all failed with an outage error
+  (site_down, timeout); no syncs start until the cooldown has passed
+- half_open: cooldown over; PROBE_SYNCS syncs may run as probes. A probe
+  that succeeds closes the breaker, one that fails reopens it with twice
+  the cooldown (up to MAX_COOLDOWN_SECONDS)
+
+While a provider is open the scheduler defers its due accounts and workers
+leave its queued jobs alone, so crawler slots go to healthy providers.
+Outage errors don't count toward an account's consecutive_failures - the
+portal being down is not the user's fault.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+try:
+    from backend_v2.models import SyncJob
+except ImportError:
+    from models import SyncJob
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = int(os.getenv("PROVIDER_BREAKER_THRESHOLD", "3"))
+BASE_COOLDOWN_SECONDS = int(os.getenv("PROVIDER_BREAKER_COOLDOWN", "300"))
+MAX_COOLDOWN_SECONDS = int(os.getenv("PROVIDER_BREAKER_MAX_COOLDOWN", "3600"))
+PROBE_SYNCS = int(os.getenv("PROVIDER_BREAKER_PROBES", "1"))
+
+# Finished jobs per provider the breaker and the stats look at
+HISTORY_SIZE = 50
+STATS_WINDOW = timedelta(hours=24)
+# Seconds an evaluated provider state is reused within a process
+CACHE_SECONDS = 10
+
+# classify_sync_error categories that mean the provider, not the account, is failing
+OUTAGE_ERRORS = ("site_down", "timeout")
+
+_cache: Dict[str, tuple] = {}  # provider -> (expires, health)
+_cache_lock = threading.Lock()
+
+
+def is_outage(error_type: Optional[str]) -> bool:
+    return error_type in OUTAGE_ERRORS
+
+
+def _classify(error_message: Optional[str]) -> str:
+    try:
+        from backend_v2.services.scheduler import classify_sync_error
+    except ImportError:
+        from services.scheduler import classify_sync_error
+    return classify_sync_error(error_message or "")
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def evaluate(provider_name: str, jobs: List[SyncJob], now: datetime = None) -> Dict:
+    """Breaker state and stats from a provider's finished jobs, newest first."""
+    now = now or datetime.now(timezone.utc)
+
+    streak = 0
+    for job in jobs:
+        if job.status != "failed" or not is_outage(_classify(job.error_message)):
+            break
+        streak += 1
+
+    state, retry_at = "closed", None
+    if streak >= FAILURE_THRESHOLD:
+        cooldown = min(MAX_COOLDOWN_SECONDS, BASE_COOLDOWN_SECONDS * 2 ** (streak - FAILURE_THRESHOLD))
+        retry_at = _utc(jobs[0].completed_at) + timedelta(seconds=cooldown)
+        state = "open" if now < retry_at else "half_open"
+
+    recent = [job for job in jobs if job.completed_at and _utc(job.completed_at) >= now - STATS_WINDOW]
+    completed = [job for job in recent if job.status == "completed"]
+    durations = [(_utc(job.completed_at) - _utc(job.started_at)).total_seconds()
+                 for job in completed if job.started_at]
+    return {
+        "provider": provider_name,
+        "state": state,
+        "retry_at": retry_at.isoformat() if retry_at else None,
+        "outage_streak": streak,
+        "syncs_24h": len(recent),
+        "success_rate": round(len(completed) / len(recent), 3) if recent else None,
+        "p95_duration_seconds": round(_percentile(durations, 95), 1) if durations else None,
+    }
+
+
+def get_health(db, provider_name: str) -> Dict:
+    """Current health of a provider (cached for CACHE_SECONDS)."""
+    with _cache_lock:
+        cached = _cache.get(provider_name)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+    jobs = db.query(SyncJob).filter(
+        SyncJob.provider_name == provider_name,
+        SyncJob.status.in_(("completed", "failed")),
+        SyncJob.completed_at.isnot(None)
+    ).order_by(SyncJob.completed_at.desc()).limit(HISTORY_SIZE).all()
+    health = evaluate(provider_name, jobs)
+
+    with _cache_lock:
+        previous = _cache.get(provider_name)
+        if previous and previous[1]["state"] != health["state"]:
+            logger.warning(f"Provider {provider_name} breaker {previous[1]['state']} -> {health['state']}")
+        _cache[provider_name] = (time.monotonic() + CACHE_SECONDS, health)
+    return health
+
+
+def _active_count(db, provider_name: str, statuses) -> int:
+    return db.query(SyncJob).filter(
+        SyncJob.provider_name == provider_name,
+        SyncJob.status.in_(statuses)
+    ).count()
+
+
+def allow_sync(db, provider_name: str) -> bool:
+    """Whether a new sync of this provider may be queued now."""
+    state = get_health(db, provider_name)["state"]
+    if state == "closed":
+        return True
+    if state == "open":
+        return False
+    return _active_count(db, provider_name, ("pending", "running")) < PROBE_SYNCS
+
+
+def blocked_providers(db) -> List[str]:
+    """Providers whose queued jobs must not be claimed now (open, or half-open with probes running)."""
+    providers = [name for (name,) in db.query(SyncJob.provider_name).filter(
+        SyncJob.status == "pending").distinct()]
+    blocked = []
+    for provider_name in providers:
+        state = get_health(db, provider_name)["state"]
+        if state == "open" or (state == "half_open" and
+                               _active_count(db, provider_name, ("running",)) >= PROBE_SYNCS):
+            blocked.append(provider_name)
+    return blocked
+
+
+def snapshot(db) -> List[Dict]:
+    """Health of every provider synced in the stats window."""
+    since = datetime.now(timezone.utc) - STATS_WINDOW
+    providers = [name for (name,) in db.query(SyncJob.provider_name).filter(
+        SyncJob.created_at >= since).distinct()]
+    return [get_health(db, name) for name in sorted(p for p in providers if p)]
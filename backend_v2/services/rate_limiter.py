@@ -0,0 +1,353 @@
+"""
+Rate Limiter
+One sliding-window rate limiter for every limit in the app.
+
+Each key keeps a constant-size state - the start of its current window, the
+hits counted in it and in the previous window, and an optional lockout
+deadline - instead of a list of timestamps. A hit is allowed while
+
+    previous * (1 - elapsed / window) + current + 1 <= limit
+
+i.e. the previous window's hits are assumed to be spread evenly, which
+approximates a true sliding window without storing individual hits. States
+expire two windows after their last window started (or when their lockout
+ends), so idle keys are evicted.
+
+Where the state lives is pluggable (RATE_LIMIT_STORAGE):
+- memory:   per-process dict with TTL sweep and an LRU cap (single worker)
+- shared:   fixed-size slot table in a memory-mapped file, locked with flock,
+            shared by every worker on the host (default when WEB_CONCURRENCY > 1)
+- database: rows in rate_limit_counters, shared by every host
+
+Every storage applies an update as one atomic read-modify-write, so limits
+hold under concurrent workers.
+"""
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+try:
+    from backend_v2.database import SessionLocal
+    from backend_v2.models import RateLimitCounter
+except ImportError:
+    from database import SessionLocal
+    from models import RateLimitCounter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE") or (
+    "shared" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "memory"
+)
+MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # Memory storage LRU cap
+SWEEP_SECONDS = 60  # How often expired keys are dropped (memory / database storage)
+SHARED_PATH = os.getenv("RATE_LIMIT_SHM_PATH") or os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "analize-rate-limits"
+)
+SHARED_SLOTS = int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536"))
+
+# (window start, hits in current window, hits in previous window, locked until)
+State = Tuple[float, int, int, float]
+
+
+@dataclass(frozen=True)
+class Rule:
+    limit: int  # Hits allowed per window
+    window: int  # Seconds
+    lockout: int = 0  # If > 0, block the key this many seconds once the limit is hit
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    remaining: int  # Hits left in the window after this one
+    retry_after: int  # Seconds until the next hit would be allowed (0 when allowed)
+    locked: bool = False  # Denied because of (or by starting) a lockout
+
+
+def _apply(state: Optional[State], rule: Rule, now: float) -> Tuple[State, float, Decision]:
+    """Count one hit against state; returns (new state, expires at, decision)."""
+    start, current, previous, locked_until = state or (0.0, 0, 0, 0.0)
+    if locked_until > now:
+        return state, locked_until, Decision(False, 0, math.ceil(locked_until - now), locked=True)
+
+    window_start = now - now % rule.window
+    if window_start != start:
+        previous = current if window_start - start == rule.window else 0
+        current, start = 0, window_start
+    elapsed = now - start
+    used = previous * (1 - elapsed / rule.window) + current
+    expires = start + 2 * rule.window
+
+    if used + 1 > rule.limit:
+        if rule.lockout > 0:
+            locked_until = now + rule.lockout
+            new_state = (start, current, previous, locked_until)
+            return new_state, max(expires, locked_until), Decision(False, 0, rule.lockout, locked=True)
+        if current + 1 <= rule.limit:
+            # Wait for enough of the previous window to slide out
+            wait = rule.window * (1 - (rule.limit - 1 - current) / previous) - elapsed
+        else:
+            wait = rule.window - elapsed + rule.window * max(0.0, 1 - (rule.limit - 1) / current)
+        return (start, current, previous, 0.0), expires, Decision(False, 0, max(1, math.ceil(wait)))
+
+    current += 1
+    return (start, current, previous, 0.0), expires, Decision(True, int(rule.limit - used - 1), 0)
+
+
+# --- Storage -----------------------------------------------------------------------
+
+Update = Callable[[Optional[State]], Tuple[State, float, Decision]]
+
+
+class MemoryStorage:
+    """States in a per-process dict; expired keys swept, least recently used evicted past max_keys."""
+
+    def __init__(self, max_keys: int = MAX_KEYS):
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Tuple[State, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def update(self, key: str, fn: Update, now: float) -> Decision:
+        with self._lock:
+            if now >= self._next_sweep:
+                for stale in [k for k, (_, expires) in self._entries.items() if expires <= now]:
+                    del self._entries[stale]
+                self._next_sweep = now + SWEEP_SECONDS
+            entry = self._entries.get(key)
+            state = entry[0] if entry and entry[1] > now else None
+            new_state, expires, decision = fn(state)
+            self._entries[key] = (new_state, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+            return decision
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedMemoryStorage:
+    """
+    States in a fixed-size, memory-mapped slot table shared by all local
+    workers. A key hashes to PROBES candidate slots; when none holds it, an
+    empty or expired one is reused, so memory never grows past SHARED_SLOTS
+    entries. Live states (an active lockout among them) are never evicted:
+    when all of a new key's slots are live, its hit is denied until one of
+    them expires.
+    """
+    SLOT = struct.Struct("<Qdiidd")  # key hash, window start, current, previous, locked until, expires
+    PROBES = 8
+
+    def __init__(self, path: str = SHARED_PATH, slots: int = SHARED_SLOTS):
+        if fcntl is None:
+            raise RuntimeError("shared rate-limit storage needs fcntl (POSIX)")
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()  # flock does not exclude threads of one process
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1  # 0 marks an empty slot
+
+    def _find(self, key_hash: int, now: float) -> Tuple[Optional[int], Optional[State], float]:
+        """(slot, live state) of a key, else a free slot (None if all are live) and the earliest expiry."""
+        free, earliest = None, math.inf
+        for i in range(self.PROBES):
+            slot = (key_hash + i) % self.slots
+            fields = self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+            if fields[0] == key_hash:
+                return slot, (fields[1:5] if fields[5] > now else None), fields[5]
+            if fields[5] <= now:
+                if free is None:
+                    free = slot
+            else:
+                earliest = min(earliest, fields[5])
+        return free, None, earliest
+
+    def update(self, key: str, fn: Update, now: float) -> Decision:
+        key_hash = self._hash(key)
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                slot, state, earliest = self._find(key_hash, now)
+                if slot is None:
+                    # Fail closed rather than drop another key's live limit
+                    logger.warning("Shared rate-limit table full for a key; denying until a slot expires")
+                    return Decision(False, 0, max(1, math.ceil(earliest - now)))
+                new_state, expires, decision = fn(state)
+                self.SLOT.pack_into(self._map, slot * self.SLOT.size, key_hash, *new_state, expires)
+                return decision
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def delete(self, key: str):
+        key_hash = self._hash(key)
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                slot, _, _ = self._find(key_hash, math.inf)
+                fields = self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+                if fields[0] == key_hash:
+                    self.SLOT.pack_into(self._map, slot * self.SLOT.size, 0, 0.0, 0, 0, 0.0, 0.0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def _to_datetime(ts: float) -> Optional[datetime]:
+    return datetime.fromtimestamp(ts, timezone.utc) if ts else None
+
+
+def _to_timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class DatabaseStorage:
+    """States in rate_limit_counters (one row per action / identifier), locked with SELECT ... FOR UPDATE."""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        self._next_sweep = 0.0
+
+    def _session(self):
+        return (self._session_factory or SessionLocal)()
+
+    @staticmethod
+    def _split(key: str) -> Tuple[str, str]:
+        action, _, identifier = key.partition(":")
+        return action, identifier
+
+    def update(self, key: str, fn: Update, now: float) -> Decision:
+        action, identifier = self._split(key)
+        for attempt in range(2):
+            db = self._session()
+            try:
+                if now >= self._next_sweep:
+                    self._next_sweep = now + SWEEP_SECONDS
+                    db.query(RateLimitCounter).filter(
+                        RateLimitCounter.expires_at < _to_datetime(now)
+                    ).delete(synchronize_session=False)
+
+                counter = db.query(RateLimitCounter).filter(
+                    RateLimitCounter.action == action,
+                    RateLimitCounter.identifier == identifier,
+                ).with_for_update().first()
+                state = None
+                if counter is not None and _to_timestamp(counter.expires_at) > now:
+                    state = (_to_timestamp(counter.window_start), counter.count or 0,
+                             counter.previous_count or 0, _to_timestamp(counter.blocked_until))
+                new_state, expires, decision = fn(state)
+
+                if counter is None:
+                    counter = RateLimitCounter(action=action, identifier=identifier)
+                    db.add(counter)
+                start, current, previous, locked_until = new_state
+                counter.window_start = _to_datetime(start)
+                counter.count = current
+                counter.previous_count = previous
+                counter.blocked_until = _to_datetime(locked_until)
+                counter.expires_at = _to_datetime(expires)
+                db.commit()
+                return decision
+            except IntegrityError:
+                # Another worker inserted the row first; retry against it
+                db.rollback()
+                if attempt:
+                    raise
+            finally:
+                db.close()
+
+    def delete(self, key: str):
+        action, identifier = self._split(key)
+        db = self._session()
+        try:
+            db.query(RateLimitCounter).filter(
+                RateLimitCounter.action == action,
+                RateLimitCounter.identifier == identifier,
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+# --- Limiter -----------------------------------------------------------------------
+
+class RateLimiter:
+    """Counts hits per key ("action:identifier") against a Rule."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def hit(self, key: str, rule: Rule, now: Optional[float] = None) -> Decision:
+        now = time.time() if now is None else now
+        return self.storage.update(key, lambda state: _apply(state, rule, now), now)
+
+    def reset(self, key: str):
+        self.storage.delete(key)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+# Database limiters by engine / connection (AuditService counts in its session's database)
+_bind_limiters: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _create_storage(kind: str):
+    if kind == "database":
+        return DatabaseStorage()
+    if kind == "shared":
+        try:
+            return SharedMemoryStorage()
+        except Exception as e:
+            logger.warning(f"Shared rate-limit storage unavailable ({e}); limits are per process")
+    return MemoryStorage()
+
+
+def get_limiter(kind: Optional[str] = None) -> RateLimiter:
+    """The process-wide limiter for a storage kind (default: RATE_LIMIT_STORAGE)."""
+    kind = kind or RATE_LIMIT_STORAGE
+    with _limiters_lock:
+        if kind not in _limiters:
+            _limiters[kind] = RateLimiter(_create_storage(kind))
+        return _limiters[kind]
+
+
+def get_database_limiter(bind) -> RateLimiter:
+    """The process-wide database limiter for a bind, so its expired-row sweep runs every SWEEP_SECONDS."""
+    with _limiters_lock:
+        limiter = _bind_limiters.get(bind)
+        if limiter is None:
+            limiter = _bind_limiters[bind] = RateLimiter(DatabaseStorage(sessionmaker(bind=bind)))
+        return limiter
@@ -22,9 +22,13 @@ from sqlalchemy.orm import Session
 try:
     from backend_v2.models import User, LinkedAccount, Document, TestResult, HealthReport
     from backend_v2.services.user_vault import UserVault, get_user_vault
+    from backend_v2.services import report_cache
+    from backend_v2.services import encrypted_records
 except ImportError:
     from models import User, LinkedAccount, Document, TestResult, HealthReport
     from services.user_vault import UserVault, get_user_vault
+    from services import report_cache
+    from services import encrypted_records
 
 logger = logging.getLogger(__name__)
 
@@ -146,17 +150,12 @@ def reencrypt_user_biomarkers(
 
     for result in results:
         try:
-            # Encrypt value if plaintext exists
-            if result.value:
-                result.value_enc = user_vault.encrypt_data(result.value)
-                if clear_plaintext:
-                    result.value = None
-
-            # Encrypt numeric value if it exists
-            if result.numeric_value is not None:
-                result.numeric_value_enc = user_vault.encrypt_number(result.numeric_value)
-                if clear_plaintext:
-                    result.numeric_value = None
+            # Encrypt value and numeric value into one compact record
+            result.record_enc = encrypted_records.encrypt_result(user_vault, result.value, result.numeric_value)
+            result.value_enc = result.numeric_value_enc = None
+            if clear_plaintext:
+                result.value = None
+                result.numeric_value = None
 
             stats["biomarkers_reencrypted"] += 1
             batch_count += 1
@@ -289,7 +288,8 @@ def reencrypt_user_health_reports(
                 "findings": report.findings,
                 "recommendations": report.recommendations
             }
-            report.content_enc = user_vault.encrypt_json(content)
+            report.content_enc = encrypted_records.encrypt_report(user_vault, content)
+            report_cache.invalidate_report(report.id)
 
             if clear_plaintext:
                 report.summary = None
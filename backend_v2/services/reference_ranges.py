@@ -0,0 +1,182 @@
+"""
+Reference Range Parser
+Parses free-text lab reference ranges into structured numeric bounds.
+
+Lab reports express ranges as "12 - 16", "[3.5 - 5.1]", "< 200", ">= 40",
+"sub 5,7" or qualitatively ("Negativ", "Absent"). Ranges are parsed once at
+ingest and stored on TestResult (ref_low / ref_high / inclusivity /
+ref_qualitative), so consumers can filter and shade bands without
+re-parsing strings: biomarker_trends carries them per reading and the
+evolution chart draws its reference band from them.
+"""
+import re
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ParsedRange(NamedTuple):
+    """Structured reference range. Unbounded sides are None."""
+    low: Optional[float] = None
+    high: Optional[float] = None
+    low_inclusive: Optional[bool] = None
+    high_inclusive: Optional[bool] = None
+    qualitative: Optional[str] = None  # "negative" / "positive" for qualitative tests
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.low is not None or self.high is not None
+
+
+# Qualitative keywords (Romanian and English) mapped to the expected result
+QUALITATIVE_KEYWORDS = {
+    "negative": [
+        "negativ", "negative", "absent", "absenta", "nedetectabil", "nedecelabil",
+        "not detected", "nonreactiv", "non reactiv", "nereactiv", "non-reactive",
+    ],
+    "positive": ["pozitiv", "positive", "prezent", "reactiv", "reactive", "detectabil"],
+}
+
+_NUMBER = r"-?\d+(?:[.,]\d+)?"
+
+# "12 - 16", "[12 - 16]", "12,5–16,0", "-2 - 2"
+_INTERVAL_RE = re.compile(rf"({_NUMBER})\s*(?:-|–|—|\.\.\.?|÷)\s*({_NUMBER})")
+
+# "< 200", "<= 5.7", "≤5,7", "sub 200", "max 200", "pana la 200"
+_UPPER_RE = re.compile(
+    rf"(<=|≤|=<|<|\bsub\b|\bmax(?:im)?\.?|\bpana la\b|\bpână la\b|\bup to\b|\bbelow\b)\s*({_NUMBER})"
+)
+
+# "> 40", ">= 40", "≥40", "peste 40", "min 40"
+_LOWER_RE = re.compile(
+    rf"(>=|≥|=>|>|\bpeste\b|\bmin(?:im)?\.?|\bover\b|\babove\b)\s*({_NUMBER})"
+)
+
+_TITER_RE = re.compile(r"\d+\s*:\s*\d+")
+
+_INCLUSIVE_UPPER = {"<=", "≤", "=<", "max", "max.", "maxim", "pana la", "până la", "up to"}
+_INCLUSIVE_LOWER = {">=", "≥", "=>", "min", "min.", "minim"}
+
+
+def _to_float(token: str) -> float:
+    """Parse a number that may use a Romanian decimal comma."""
+    return float(token.replace(",", "."))
+
+
+def _qualitative(text: str) -> Optional[str]:
+    """Return the expected qualitative result if the range is qualitative."""
+    # Check negative first: "nonreactiv" contains "reactiv"
+    for expected in ("negative", "positive"):
+        if any(keyword in text for keyword in QUALITATIVE_KEYWORDS[expected]):
+            return expected
+    return None
+
+
+def parse_reference_range(reference_range: Optional[str]) -> Optional[ParsedRange]:
+    """
+    Parse a free-text reference range.
+
+    Returns a ParsedRange, or None when the text holds no usable bound
+    (e.g. "vezi comentariu", empty strings).
+    """
+    if not reference_range:
+        return None
+
+    text = reference_range.strip().lower()
+    if not text:
+        return None
+
+    # Titers ("< 1:160") are not numeric bounds
+    if _TITER_RE.search(text):
+        qualitative = _qualitative(text)
+        return ParsedRange(qualitative=qualitative) if qualitative else None
+
+    interval = _INTERVAL_RE.search(text)
+    if interval:
+        low, high = _to_float(interval.group(1)), _to_float(interval.group(2))
+        if low > high:
+            low, high = high, low
+        return ParsedRange(low=low, high=high, low_inclusive=True, high_inclusive=True)
+
+    upper = _UPPER_RE.search(text)
+    lower = _LOWER_RE.search(text)
+    if upper or lower:
+        parsed = ParsedRange()
+        if lower:
+            op = lower.group(1).strip()
+            parsed = parsed._replace(low=_to_float(lower.group(2)), low_inclusive=op in _INCLUSIVE_LOWER)
+        if upper:
+            op = upper.group(1).strip()
+            parsed = parsed._replace(high=_to_float(upper.group(2)), high_inclusive=op in _INCLUSIVE_UPPER)
+        return parsed
+
+    qualitative = _qualitative(text)
+    if qualitative:
+        return ParsedRange(qualitative=qualitative)
+
+    return None
+
+
+def apply_reference_range(test_result) -> Optional[ParsedRange]:
+    """
+    Populate the structured range columns of a TestResult from its
+    reference_range text. Call once when the result is created.
+    """
+    try:
+        parsed = parse_reference_range(test_result.reference_range)
+    except (ValueError, TypeError) as e:
+        logger.debug(f"Could not parse reference range {test_result.reference_range!r}: {e}")
+        parsed = None
+
+    parsed = parsed or ParsedRange()
+    test_result.ref_low = parsed.low
+    test_result.ref_high = parsed.high
+    test_result.ref_low_inclusive = parsed.low_inclusive
+    test_result.ref_high_inclusive = parsed.high_inclusive
+    test_result.ref_qualitative = parsed.qualitative
+    return parsed if parsed.is_numeric or parsed.qualitative else None
+
+
+def backfill_reference_ranges(db) -> int:
+    """
+    Populate structured range columns for rows ingested before parsing existed.
+
+    Ranges repeat heavily across results, so each distinct reference_range text
+    is parsed once and written with a single set-based UPDATE. Returns the number
+    of rows updated. Safe to re-run.
+    """
+    try:
+        from backend_v2.models import TestResult
+    except ImportError:
+        from models import TestResult
+
+    pending = (
+        TestResult.reference_range.isnot(None),
+        TestResult.ref_low.is_(None),
+        TestResult.ref_high.is_(None),
+        TestResult.ref_qualitative.is_(None),
+    )
+
+    distinct_ranges = [
+        row[0] for row in db.query(TestResult.reference_range).filter(*pending).distinct().all()
+    ]
+
+    updated = 0
+    for reference_range in distinct_ranges:
+        parsed = parse_reference_range(reference_range)
+        if parsed is None:
+            continue
+        updated += db.query(TestResult)\
+            .filter(TestResult.reference_range == reference_range, *pending)\
+            .update({
+                TestResult.ref_low: parsed.low,
+                TestResult.ref_high: parsed.high,
+                TestResult.ref_low_inclusive: parsed.low_inclusive,
+                TestResult.ref_high_inclusive: parsed.high_inclusive,
+                TestResult.ref_qualitative: parsed.qualitative,
+            }, synchronize_session=False)
+        db.commit()
+
+    logger.info(f"Reference range backfill: {updated} rows from {len(distinct_ranges)} distinct ranges")
+    return updated
@@ -1,15 +1,18 @@
 import os
+import time
 import datetime
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from playwright.sync_api import Page
 
 try:
-    from backend_v2.services.base import BaseCrawler
+    from backend_v2.services.base import BaseCrawler, download_filename
     from backend_v2.services.captcha_solver import CaptchaSolver, extract_recaptcha_sitekey, inject_captcha_token
+    from backend_v2.services.sync_watermark import KNOWN_STREAK_LIMIT
 except ImportError:
-    from services.base import BaseCrawler
+    from services.base import BaseCrawler, download_filename
     from services.captcha_solver import CaptchaSolver, extract_recaptcha_sitekey, inject_captcha_token
+    from services.sync_watermark import KNOWN_STREAK_LIMIT
 
 logger = logging.getLogger(__name__)
 
@@ -19,8 +22,28 @@ class CaptchaRequiredError(Exception):
     pass
 
 
+CONSENT_TEXTS = ["Accept toate", "Accept toate cookie-urile", "De acord", "Accept"]
+
+# Elements that only exist once the analize list has rendered
+RECORDS_SELECTORS = [
+    "button:has-text('Descarca')",
+    "a:has-text('Descarca')",
+    "button:has-text('Vezi detalii')",
+    "button:has-text('Vezi raport')",
+]
+
+# Text of the result row around a download button (date, clinic, analyses)
+ROW_TEXT_SCRIPT = """el => {
+    const row = el.closest('tr, li, [class*="row"], [class*="card"], [class*="item"]') || el.parentElement;
+    return row ? row.innerText : '';
+}"""
+
+
 class ReginaMariaCrawler(BaseCrawler):
 
+    # The portal throttles bursts of report downloads
+    download_concurrency = 2
+
     def __init__(self, headless: bool = True, user_id: int = None):  # Headless by default
         super().__init__("regina_maria", headless, user_id)
         # Main page has the login form
@@ -31,16 +54,21 @@ class ReginaMariaCrawler(BaseCrawler):
     def _dismiss_cookie_consent(self, page: Page):
         """Aggressively dismiss cookie consent dialog."""
         self.log("Handling cookie consent...")
-        page.wait_for_timeout(2000)
+        banner = self.wait_for_any(
+            page,
+            [f"text={text}" for text in CONSENT_TEXTS] + ["#onetrust-accept-btn-handler", "#usercentrics-cmp-ui"],
+            label="cookie banner",
+            kind="consent",
+        )
 
         # Method 1: Try clicking the accept button
-        for text in ["Accept toate", "Accept toate cookie-urile", "De acord", "Accept"]:
+        for text in CONSENT_TEXTS if banner else []:
             try:
                 btn = page.get_by_text(text, exact=False)
                 if btn.count() > 0:
                     btn.first.click(timeout=3000)
                     self.log(f"Clicked cookie button: {text}")
-                    page.wait_for_timeout(1000)
+                    self.wait_for(page, btn, "cookie banner closed", state="hidden", kind="consent")
                     return
             except:
                 pass
@@ -48,10 +76,10 @@ class ReginaMariaCrawler(BaseCrawler):
         # Method 2: Click by ID (OneTrust specific)
         try:
             accept_btn = page.locator("#onetrust-accept-btn-handler")
-            if accept_btn.count() > 0:
+            if banner and accept_btn.count() > 0:
                 accept_btn.click(timeout=3000)
                 self.log("Clicked OneTrust accept button by ID")
-                page.wait_for_timeout(1000)
+                self.wait_for(page, accept_btn, "cookie banner closed", state="hidden", kind="consent")
                 return
         except:
             pass
@@ -127,16 +155,12 @@ class ReginaMariaCrawler(BaseCrawler):
         self.log("Filling credentials...")
 
         # Wait for Angular to render the login form inputs (domcontentloaded fires too early)
-        try:
-            page.wait_for_selector("#input-username", state="attached", timeout=15000)
+        if self.wait_for(page, "#input-username", "login form", state="attached"):
             self.log("Login form inputs detected")
-        except Exception:
-            self.log("Login form not found after 15s, retrying page load...")
+        else:
+            self.log("Login form not found, retrying page load...")
             page.reload(wait_until="domcontentloaded")
-            page.wait_for_timeout(3000)
-            page.wait_for_selector("#input-username", state="attached", timeout=15000)
-
-        page.wait_for_timeout(500)
+            page.wait_for_selector("#input-username", state="attached", timeout=self.timing["element"])
 
         # Remove all overlays that block interaction
         self._force_remove_overlays(page)
@@ -161,7 +185,6 @@ class ReginaMariaCrawler(BaseCrawler):
         page.screenshot(path=f"{self.download_dir}/pre_login_filled.png")
 
         self.log("Clicking login...")
-        page.wait_for_timeout(500)
 
         # Remove overlay before clicking submit
         self._force_remove_overlays(page)
@@ -197,8 +220,11 @@ class ReginaMariaCrawler(BaseCrawler):
         max_captcha_attempts = 3  # Limit to 3 auto-solve attempts
 
         # Check for reCAPTCHA/Error/Success loop
-        # Wait up to 3 minutes for manual reCAPTCHA solving (36 * 5s = 180s)
-        for i in range(36):
+        # Wait up to the login budget (3 minutes) for manual reCAPTCHA solving
+        deadline = time.monotonic() + self.timing["login"] / 1000
+        i = 0
+        while time.monotonic() < deadline:
+            i += 1
             current_url = page.url
             content = page.content()
 
@@ -221,7 +247,7 @@ class ReginaMariaCrawler(BaseCrawler):
                         solved = self._solve_recaptcha(page)
                         if solved:
                             self.log("reCAPTCHA solved! Waiting for token processing...")
-                            page.wait_for_timeout(3000)  # Wait for callback to process
+                            self.wait_for_network_idle(page, "captcha callback")
 
                             # Check if the page auto-submitted after CAPTCHA solve
                             current_after_captcha = page.url
@@ -253,7 +279,9 @@ class ReginaMariaCrawler(BaseCrawler):
                                 self.log(f"JS submit failed: {submit_err}")
                                 page.keyboard.press("Enter")
 
-                            page.wait_for_timeout(5000)  # Wait for login to process
+                            # Wait for login to process
+                            self.wait_until(page, lambda: self._check_authenticated(page, wait_for_spa=False),
+                                            "login after captcha", kind="login_step")
                             page.screenshot(path=f"{self.download_dir}/after_captcha_submit.png")
 
                             # Check if we're now authenticated
@@ -293,13 +321,19 @@ class ReginaMariaCrawler(BaseCrawler):
                 try:
                     page.goto("https://contulmeu.reginamaria.ro/#/")
                     page.wait_for_load_state("domcontentloaded")
-                    page.wait_for_timeout(3000)
+                    self.wait_for_network_idle(page, "main page")
                 except:
                     pass
 
-            if i % 6 == 0:  # Log every 30 seconds
-                self.log(f"Waiting for login... (Attempt {i+1}/36) URL: {current_url}")
-            page.wait_for_timeout(5000)
+            if i % 6 == 1:  # Log every ~30 seconds
+                self.log(f"Waiting for login... (Attempt {i}) URL: {current_url}")
+            # Returns as soon as the session is authenticated or the page moves on
+            self.wait_until(
+                page,
+                lambda: page.url != current_url or self._check_authenticated(page, wait_for_spa=False),
+                "login status",
+                kind="login_step",
+            )
 
         # Final check
         if self._check_authenticated(page):
@@ -433,7 +467,7 @@ class ReginaMariaCrawler(BaseCrawler):
         try:
             # Wait for SPA to render if requested
             if wait_for_spa:
-                page.wait_for_timeout(2000)
+                self.wait_for_network_idle(page, "spa render")
 
             # Check URL first - certain URLs definitively mean we're authenticated
             url = page.url.lower()
@@ -479,9 +513,6 @@ class ReginaMariaCrawler(BaseCrawler):
             if any(x in url for x in ["pacient", "dashboard", "contulmeu"]) and "login" not in url and "autentificare" not in url:
                 # Check for user menu or profile indicators via selectors
                 try:
-                    # Wait for any dynamic content to load
-                    page.wait_for_timeout(1000)
-
                     # Check for user avatar/menu (common in authenticated SPAs)
                     user_elements = page.locator("[class*='user'], [class*='avatar'], [class*='profile'], [data-testid*='user']")
                     if user_elements.count() > 0:
@@ -507,7 +538,8 @@ class ReginaMariaCrawler(BaseCrawler):
         page.goto(self.analize_url, wait_until="domcontentloaded")
 
         self.log("Waiting for SPA to render...")
-        page.wait_for_timeout(5000)
+        if not self.wait_for_any(page, RECORDS_SELECTORS, "records list"):
+            self.log("Records list did not render, continuing with what is on the page")
 
         # Dismiss cookie consent if it reappeared
         self._dismiss_cookie_consent(page)
@@ -555,6 +587,69 @@ class ReginaMariaCrawler(BaseCrawler):
             self.log(f"Error getting expected count: {e}")
             return -1
 
+    def enumerate_documents_sync(self, page: Page) -> Optional[List[Dict[str, Any]]]:
+        """
+        Download each "Descarca" button through the browser. The buttons have
+        no links and their URLs may be single use, so the download a click
+        starts is saved as is and handed to the download engine as a local file.
+
+        The download URLs are not stable, so documents are keyed by their row
+        text. The list is newest first: rows synced before are skipped without
+        clicking, and the scan stops after a few of them in a row.
+        """
+        self.log("Scanning for documents...")
+        page.screenshot(path=f"{self.download_dir}/analize_page_load_top.png")
+        self.scroll_to_end(page)
+
+        download_btns = page.locator("button:has-text('Descarca')").all() or page.locator("a:has-text('Descarca')").all()
+        if not download_btns:
+            return None
+
+        total_docs = len(download_btns)
+        self.log(f"Downloading {total_docs} documents through the browser...")
+        jobs = []
+        known_streak = 0
+        for i, btn in enumerate(download_btns):
+            self.update_status("downloading", f"Downloading {i + 1}/{total_docs}", i + 1, total_docs)
+            key = self._row_key(btn)
+            if self.watermark.is_known(key):
+                self.watermark.mark_seen(key)
+                self.watermark.skipped += 1
+                known_streak += 1
+                if known_streak >= KNOWN_STREAK_LIMIT:
+                    self.log(f"Reached documents synced before after {i + 1}/{total_docs}")
+                    break
+                continue
+            known_streak = 0
+            try:
+                btn.scroll_into_view_if_needed()
+                with page.expect_download(timeout=self.timing["download"]) as download_info:
+                    btn.click()
+                download = download_info.value
+            except Exception as e:
+                self.log(f"Could not download document {i}: {e}")
+                continue
+
+            filename = download_filename(download.suggested_filename, download.url, i)
+            target_path = os.path.join(self.download_dir, filename)
+            try:
+                download.save_as(target_path)
+            except Exception as e:
+                self.log(f"Could not save document {i}: {e}")
+                continue
+            jobs.append({"url": download.url, "filename": filename, "local_path": target_path,
+                         "category": "Analize", "key": key})
+        return jobs
+
+    @staticmethod
+    def _row_key(btn) -> Optional[str]:
+        """Identifier of a result row, or None if its text can't be read."""
+        try:
+            text = " ".join(btn.evaluate(ROW_TEXT_SCRIPT).split())
+        except Exception:
+            return None
+        return f"row:{text}" if text else None
+
     def extract_documents_sync(self, page: Page) -> List[Dict[str, Any]]:
         extracted = []
         self.log("Scanning for documents...")
@@ -564,9 +659,7 @@ class ReginaMariaCrawler(BaseCrawler):
 
         # Scroll to bottom to trigger any lazy loading
         self.log("Scrolling to trigger lazy loading...")
-        for _ in range(5):
-            page.mouse.wheel(0, 3000)
-            page.wait_for_timeout(1500)
+        self.scroll_to_end(page)
 
         page.screenshot(path=f"{self.download_dir}/analize_page_load_bottom.png")
 
@@ -602,9 +695,8 @@ class ReginaMariaCrawler(BaseCrawler):
                 self.log(f"Processing document {current}/{total_docs}...")
                 self.update_status("downloading", f"Downloading {current}/{total_docs}", current, total_docs)
 
-                # Scroll to the button
+                # Scroll to the button (waits for it to be stable)
                 btn.scroll_into_view_if_needed()
-                page.wait_for_timeout(500)
 
                 if not btn.is_visible():
                     self.log(f"Button {i} not visible, skipping.")
@@ -617,7 +709,7 @@ class ReginaMariaCrawler(BaseCrawler):
 
                 # Method 1: expect_download
                 try:
-                    with page.expect_download(timeout=60000) as download_info:
+                    with page.expect_download(timeout=self.timing["download"]) as download_info:
                         btn.click()
                     download = download_info.value
                     if download.suggested_filename:
@@ -662,9 +754,6 @@ class ReginaMariaCrawler(BaseCrawler):
                         "category": "Analize"
                     })
 
-                # Delay between downloads
-                page.wait_for_timeout(2000)
-
             except Exception as e:
                 self.log(f"Failed to download document {i}: {e}")
                 continue
@@ -710,14 +799,9 @@ class ReginaMariaCrawler(BaseCrawler):
                 self.update_status("downloading", f"Downloading {current}/{total_docs}", current, total_docs)
 
                 btn.scroll_into_view_if_needed()
-                page.wait_for_timeout(500)
 
                 # Click to navigate to detail page
                 btn.click()
-                page.wait_for_timeout(3000)
-
-                # Take screenshot of detail page
-                page.screenshot(path=f"{self.download_dir}/detail_page_{i}.png")
 
                 # Look for download buttons on detail page
                 download_selectors = [
@@ -727,6 +811,10 @@ class ReginaMariaCrawler(BaseCrawler):
                     "a[href*='.pdf']",
                     "[class*='download']",
                 ]
+                self.wait_for_any(page, download_selectors, "detail page")
+
+                # Take screenshot of detail page
+                page.screenshot(path=f"{self.download_dir}/detail_page_{i}.png")
 
                 for selector in download_selectors:
                     download_btn = page.locator(selector).first
@@ -735,7 +823,7 @@ class ReginaMariaCrawler(BaseCrawler):
                             filename = f"rezultat_{i}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
                             target_path = os.path.join(self.download_dir, filename)
 
-                            with page.expect_download(timeout=60000) as download_info:
+                            with page.expect_download(timeout=self.timing["download"]) as download_info:
                                 download_btn.click()
                             download = download_info.value
                             if download.suggested_filename:
@@ -758,13 +846,13 @@ class ReginaMariaCrawler(BaseCrawler):
 
                 # Navigate back to the list
                 page.go_back()
-                page.wait_for_timeout(2000)
+                self.wait_for_any(page, detail_selectors, "records list")
 
             except Exception as e:
                 self.log(f"Failed to process detail page {i}: {e}")
                 try:
                     page.goto(self.analize_url)
-                    page.wait_for_timeout(3000)
+                    self.wait_for_any(page, detail_selectors, "records list")
                 except:
                     pass
                 continue
@@ -0,0 +1,116 @@
+"""
+Report Content Cache
+Read-through LRU cache of decrypted, JSON-parsed HealthReport bodies.
+
+Reports are immutable once written, yet every report page, the dashboard
+overview and shared views decrypt and parse the same content_enc blob again.
+This cache keeps a bounded number of parsed bodies in memory, keyed by
+(user_id, report_id) and checked against a fingerprint of the ciphertext, so
+a re-encrypted report never serves stale plaintext.
+
+Plaintext is only handed out while the user's vault is available, and a
+user's entries are purged when their vault session is cleared (logout, forced
+logout, account disable/deletion) or the global vault is locked. Each caller
+gets its own deep copy, so callers that enrich the content in place never
+change the cached body or another request's copy.
+"""
+import os
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    from backend_v2.services.vault_helper import get_vault_helper
+    from backend_v2.services import encrypted_records
+except ImportError:
+    from services.vault_helper import get_vault_helper
+    from services import encrypted_records
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "512"))
+
+# (user_id, report_id) -> (fingerprint, content)
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _fingerprint(ciphertext: bytes) -> bytes:
+    """Identify a ciphertext. Any re-encryption yields a new nonce and tag."""
+    return hashlib.blake2b(bytes(ciphertext), digest_size=16).digest()
+
+
+def _lookup(key: tuple, fingerprint: bytes) -> Optional[dict]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != fingerprint:
+            _stats["misses"] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def _store(key: tuple, fingerprint: bytes, content: dict):
+    with _cache_lock:
+        _cache[key] = (fingerprint, content)
+        _cache.move_to_end(key)
+        while len(_cache) > REPORT_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def get_report_json(report, user_id: int, vault_helper=None) -> Optional[dict]:
+    """
+    Return the decrypted JSON body of a report's content_enc.
+
+    Returns None when the report has no encrypted content or the vault is
+    unavailable. Decryption and parse errors propagate so callers keep their
+    existing fallbacks.
+    """
+    if not report.content_enc or not user_id:
+        return None
+
+    vault_helper = vault_helper or get_vault_helper(user_id)
+    if not vault_helper.is_available:
+        return None
+
+    key = (user_id, report.id)
+    fingerprint = _fingerprint(report.content_enc)
+    content = _lookup(key, fingerprint)
+    if content is not None:
+        return copy.deepcopy(content)
+
+    content = encrypted_records.read_report(vault_helper, report.content_enc)
+    if report.id is not None and isinstance(content, dict):
+        _store(key, fingerprint, copy.deepcopy(content))
+    return content
+
+
+def invalidate_report(report_id: int):
+    """Drop a report's cached body (e.g. after its content is rewritten)."""
+    with _cache_lock:
+        for key in [k for k in _cache if k[1] == report_id]:
+            del _cache[key]
+
+
+def purge_user(user_id: int):
+    """Drop every cached body for a user (vault lock / logout)."""
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == user_id]:
+            del _cache[key]
+
+
+def clear():
+    """Drop all cached bodies (global vault lock)."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_cache_stats() -> dict:
+    """Entry count and hit/miss counters for monitoring."""
+    with _cache_lock:
+        return {"entries": len(_cache), "max_entries": REPORT_CACHE_MAX_ENTRIES, **_stats}
@@ -1,8 +1,9 @@
 import os
+import time
 import datetime
-import requests
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from urllib.parse import urljoin
 from playwright.sync_api import Page
 
 try:
@@ -15,6 +16,25 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+# Download buttons/links on the results page
+DOWNLOAD_SELECTORS = [
+    "a[href*='.pdf']",
+    "a[href*='download']",
+    "a[href*='descarca']",
+    "button:has-text('Descarca')",
+    "button:has-text('Download')",
+    "a:has-text('Descarca')",
+    "a:has-text('PDF')",
+    "[class*='download']",
+    "[data-action='download']",
+    ".pdf-link",
+    ".download-btn",
+]
+
+# Results are capped per sync
+MAX_DOCUMENTS = 50
+
+
 class CaptchaRequiredError(Exception):
     """Raised when CAPTCHA is detected and visible browser is needed."""
     pass
@@ -45,7 +65,6 @@ class SanadorCrawler(BaseCrawler):
     def _dismiss_cookie_consent(self, page: Page):
         """Dismiss cookie consent dialog if present."""
         self.log("Checking for cookie consent...")
-        page.wait_for_timeout(2000)
 
         consent_selectors = [
             "text=Accept toate",
@@ -60,13 +79,16 @@ class SanadorCrawler(BaseCrawler):
             "#accept-cookies",
         ]
 
+        if not self.wait_for_any(page, consent_selectors, "cookie banner", kind="consent"):
+            return
+
         for selector in consent_selectors:
             try:
                 btn = page.locator(selector).first
                 if btn.count() > 0 and btn.is_visible():
                     btn.click(timeout=3000)
                     self.log(f"Clicked cookie consent: {selector}")
-                    page.wait_for_timeout(1000)
+                    self.wait_for(page, btn, "cookie banner closed", state="hidden", kind="consent")
                     return
             except Exception:
                 pass
@@ -142,7 +164,8 @@ class SanadorCrawler(BaseCrawler):
             login_link = page.locator("a:has-text('Cont'), a:has-text('Login'), a:has-text('Autentificare'), a:has-text('Pacient')").first
             if login_link.count() > 0:
                 login_link.click()
-                page.wait_for_timeout(3000)
+                page.wait_for_load_state("domcontentloaded")
+                self.wait_for_network_idle(page, "login page")
                 self.login_url = page.url
                 self.log(f"Found login via main site: {self.login_url}")
                 return self.login_url
@@ -161,7 +184,6 @@ class SanadorCrawler(BaseCrawler):
         self._dismiss_cookie_consent(page)
 
         self.log("Looking for login form...")
-        page.wait_for_timeout(2000)
 
         # Try to find username/email input
         username_selectors = [
@@ -181,6 +203,8 @@ class SanadorCrawler(BaseCrawler):
             "input[autocomplete='username']",
         ]
 
+        self.wait_for_any(page, username_selectors + ["input[type='password']"], "login form")
+
         username_input = None
         for selector in username_selectors:
             try:
@@ -257,16 +281,19 @@ class SanadorCrawler(BaseCrawler):
         # Wait and check for CAPTCHA/success
         self._wait_for_login(page)
 
-    def _wait_for_login(self, page: Page, max_attempts: int = 24):
-        """Wait for login to complete, handling CAPTCHA if needed."""
+    def _wait_for_login(self, page: Page):
+        """Wait for login to complete (within the login budget), handling CAPTCHA if needed."""
         captcha_solve_attempts = 0
         max_captcha_attempts = 3
 
-        for i in range(max_attempts):
-            page.wait_for_timeout(5000)
+        started = time.monotonic()
+        deadline = started + self.timing["login"] / 1000
+        i = 0
+        while time.monotonic() < deadline:
+            i += 1
 
-            # Check if authenticated
-            if self._check_authenticated(page):
+            # Returns as soon as the session is authenticated
+            if self.wait_until(page, lambda: self._check_authenticated(page), "login status", kind="login_step"):
                 self.log("Login Successful!")
                 return
 
@@ -280,15 +307,15 @@ class SanadorCrawler(BaseCrawler):
 
                     try:
                         if self._solve_recaptcha(page):
-                            page.wait_for_timeout(2000)
+                            self.wait_for_network_idle(page, "captcha callback")
                             # Re-submit after CAPTCHA
                             try:
                                 page.locator("button[type='submit']").first.click(force=True)
                             except Exception:
                                 page.keyboard.press("Enter")
-                            page.wait_for_timeout(5000)
 
-                            if self._check_authenticated(page):
+                            if self.wait_until(page, lambda: self._check_authenticated(page),
+                                               "login after captcha", kind="login_step"):
                                 self.log("Login successful after CAPTCHA!")
                                 return
                     except Exception as e:
@@ -312,8 +339,8 @@ class SanadorCrawler(BaseCrawler):
                 if error in content.lower():
                     raise Exception(f"Login failed: {error}")
 
-            if i % 4 == 0:
-                self.log(f"Waiting for login... ({i+1}/{max_attempts})")
+            if i % 4 == 1:
+                self.log(f"Waiting for login... ({int(time.monotonic() - started)}s)")
 
         # Final check
         if not self._check_authenticated(page):
@@ -356,7 +383,7 @@ class SanadorCrawler(BaseCrawler):
         # Try direct navigation first
         try:
             page.goto(self.results_url, wait_until="domcontentloaded", timeout=30000)
-            page.wait_for_timeout(3000)
+            self.wait_for_network_idle(page, "results page")
             self._dismiss_cookie_consent(page)
         except Exception as e:
             self.log(f"Direct navigation failed: {e}")
@@ -380,7 +407,8 @@ class SanadorCrawler(BaseCrawler):
                 if link.count() > 0 and link.is_visible():
                     link.click()
                     self.log(f"Clicked results link: {selector}")
-                    page.wait_for_timeout(3000)
+                    page.wait_for_load_state("domcontentloaded")
+                    self.wait_for_network_idle(page, "results page")
                     break
             except Exception:
                 pass
@@ -413,39 +441,41 @@ class SanadorCrawler(BaseCrawler):
         except Exception:
             return -1
 
-    def extract_documents_sync(self, page: Page) -> List[Dict[str, Any]]:
-        """Extract and download documents."""
-        extracted = []
+    def enumerate_documents_sync(self, page: Page) -> Optional[List[Dict[str, Any]]]:
+        """Collect direct document links for the download engine; None if results are buttons only."""
         self.log("Scanning for documents...")
 
         page.screenshot(path=f"{self.download_dir}/extract_start.png")
 
         # Scroll to load lazy content
-        for _ in range(5):
-            page.mouse.wheel(0, 2000)
-            page.wait_for_timeout(1500)
-
-        # Get session cookies for authenticated requests
-        cookies = page.context.cookies()
-        cookie_header = "; ".join([f"{c['name']}={c['value']}" for c in cookies])
-
-        # Look for download buttons/links
-        download_selectors = [
-            "a[href*='.pdf']",
-            "a[href*='download']",
-            "a[href*='descarca']",
-            "button:has-text('Descarca')",
-            "button:has-text('Download')",
-            "a:has-text('Descarca')",
-            "a:has-text('PDF')",
-            "[class*='download']",
-            "[data-action='download']",
-            ".pdf-link",
-            ".download-btn",
-        ]
+        self.scroll_to_end(page)
+
+        urls = []
+        for selector in DOWNLOAD_SELECTORS:
+            try:
+                for elem in page.locator(selector).all():
+                    href = elem.get_attribute("href")
+                    if not href or href.startswith(("#", "javascript:")):
+                        continue
+                    url = urljoin(page.url, href)
+                    if url not in urls:
+                        urls.append(url)
+            except Exception:
+                pass
+
+        if not urls:
+            self.log("No direct document links, downloading through the browser")
+            return None
+
+        self.log(f"Found {len(urls)} document links (limit: {MAX_DOCUMENTS})")
+        return [{"url": url, "filename": None, "category": "Analize Sanador"} for url in urls[:MAX_DOCUMENTS]]
+
+    def extract_documents_sync(self, page: Page) -> List[Dict[str, Any]]:
+        """Download documents by clicking them in the browser (buttons without links)."""
+        extracted = []
 
         download_elements = []
-        for selector in download_selectors:
+        for selector in DOWNLOAD_SELECTORS:
             try:
                 elements = page.locator(selector).all()
                 if elements:
@@ -458,12 +488,12 @@ class SanadorCrawler(BaseCrawler):
             self.log("No download elements found. Trying detail page approach...")
             return self._extract_from_detail_pages(page)
 
-        total_docs = min(len(download_elements), 50)
+        total_docs = min(len(download_elements), MAX_DOCUMENTS)
         self.log(f"Processing {len(download_elements)} download elements (limit: {total_docs})...")
 
         # Process unique elements
         processed_urls = set()
-        for i, elem in enumerate(download_elements[:50]):  # Limit to 50
+        for i, elem in enumerate(download_elements[:MAX_DOCUMENTS]):
             try:
                 # Get href if available
                 href = elem.get_attribute("href")
@@ -484,9 +514,8 @@ class SanadorCrawler(BaseCrawler):
 
                 try:
                     elem.scroll_into_view_if_needed()
-                    page.wait_for_timeout(500)
 
-                    with page.expect_download(timeout=60000) as download_info:
+                    with page.expect_download(timeout=self.timing["download"]) as download_info:
                         elem.click()
 
                     download = download_info.value
@@ -500,13 +529,6 @@ class SanadorCrawler(BaseCrawler):
                 except Exception as e:
                     self.log(f"Browser download failed: {e}")
 
-                    # Try HTTP download
-                    if href:
-                        try:
-                            download_success = self._download_via_http(page, href, target_path, cookie_header)
-                        except Exception as e2:
-                            self.log(f"HTTP download also failed: {e2}")
-
                 if download_success and os.path.exists(target_path):
                     extracted.append({
                         "filename": filename,
@@ -515,36 +537,12 @@ class SanadorCrawler(BaseCrawler):
                         "category": "Analize Sanador"
                     })
 
-                page.wait_for_timeout(1000)
-
             except Exception as e:
                 self.log(f"Failed document {i}: {e}")
                 continue
 
         return extracted
 
-    def _download_via_http(self, page: Page, url: str, target_path: str, cookie_header: str) -> bool:
-        """Download file via HTTP request."""
-        # Make URL absolute if needed
-        if url.startswith("/"):
-            base_url = page.url.split("//")[0] + "//" + page.url.split("//")[1].split("/")[0]
-            url = base_url + url
-
-        try:
-            headers = {
-                "Cookie": cookie_header,
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=60)
-            if response.status_code == 200:
-                with open(target_path, "wb") as f:
-                    f.write(response.content)
-                self.log(f"Downloaded via HTTP: {os.path.basename(target_path)}")
-                return True
-        except Exception as e:
-            self.log(f"HTTP download failed: {e}")
-        return False
-
     def _extract_from_detail_pages(self, page: Page) -> List[Dict[str, Any]]:
         """Navigate to detail pages to find downloads."""
         extracted = []
@@ -579,6 +577,7 @@ class SanadorCrawler(BaseCrawler):
             return extracted
 
         results_url = page.url
+        detail_download_selectors = ["a[href*='.pdf']", "button:has-text('Descarca')", "a:has-text('Descarca')"]
         total_detail_docs = min(len(detail_elements), 30)
 
         for i, elem in enumerate(detail_elements[:30]):  # Limit to 30
@@ -588,21 +587,20 @@ class SanadorCrawler(BaseCrawler):
                 self.update_status("downloading", f"Downloading {current}/{total_detail_docs}", current, total_detail_docs)
 
                 elem.scroll_into_view_if_needed()
-                page.wait_for_timeout(500)
                 elem.click()
-                page.wait_for_timeout(3000)
+                self.wait_for_any(page, detail_download_selectors, "detail page")
 
                 page.screenshot(path=f"{self.download_dir}/detail_{i}.png")
 
                 # Look for download on detail page
-                for dl_selector in ["a[href*='.pdf']", "button:has-text('Descarca')", "a:has-text('Descarca')"]:
+                for dl_selector in detail_download_selectors:
                     try:
                         dl_btn = page.locator(dl_selector).first
                         if dl_btn.count() > 0 and dl_btn.is_visible():
                             filename = f"sanador_detail_{i}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
                             target_path = os.path.join(self.download_dir, filename)
 
-                            with page.expect_download(timeout=60000) as download_info:
+                            with page.expect_download(timeout=self.timing["download"]) as download_info:
                                 dl_btn.click()
 
                             download = download_info.value
@@ -625,13 +623,13 @@ class SanadorCrawler(BaseCrawler):
 
                 # Go back
                 page.go_back()
-                page.wait_for_timeout(2000)
+                self.wait_for_network_idle(page, "results page")
 
             except Exception as e:
                 self.log(f"Detail page {i} failed: {e}")
                 try:
                     page.goto(results_url)
-                    page.wait_for_timeout(3000)
+                    self.wait_for_network_idle(page, "results page")
                 except Exception:
                     pass
 
@@ -6,21 +6,9 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 import threading
 import logging
-import hashlib
 import os
 
 
-def calculate_file_hash(file_path: str) -> str:
-    """Calculate MD5 hash of a file for duplicate detection."""
-    hash_md5 = hashlib.md5()
-    try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    except Exception:
-        return None
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -28,7 +16,8 @@ logger = logging.getLogger(__name__)
 scheduler = None
 _lock = threading.Lock()
 
-# Track running syncs to avoid overlap
+# Syncs running in threads of this process (inline mode capacity; accounts are
+# locked by the SyncJob lease, see sync_queue)
 _running_syncs = set()
 MAX_CONCURRENT_SYNCS = 2
 
@@ -133,19 +122,43 @@ def init_scheduler():
                 replace_existing=True
             )
 
-            # Add cleanup job for stuck syncs
+            # Reclaim sync jobs whose worker stopped renewing its lease
             scheduler.add_job(
-                cleanup_stuck_syncs,
-                IntervalTrigger(hours=1),  # Run every hour
+                reclaim_expired_syncs,
+                IntervalTrigger(seconds=30),
                 id="sync_cleanup",
                 replace_existing=True
             )
 
-            # Add job to clean up duplicate documents
+            # Single janitor for sync progress (in memory and shared store)
             scheduler.add_job(
-                cleanup_duplicate_documents,
-                IntervalTrigger(hours=6),  # Run every 6 hours
-                id="duplicate_cleanup",
+                cleanup_sync_progress,
+                IntervalTrigger(minutes=5),
+                id="sync_progress_janitor",
+                replace_existing=True
+            )
+
+            # Roll page views up into the hourly/daily analytics aggregates
+            scheduler.add_job(
+                rollup_page_views,
+                IntervalTrigger(minutes=1),
+                id="analytics_rollup",
+                replace_existing=True
+            )
+
+            # Drop expired change feed tombstones and rows of deleted accounts
+            scheduler.add_job(
+                prune_change_feed,
+                CronTrigger(hour=3, minute=30),
+                id="change_feed_janitor",
+                replace_existing=True
+            )
+
+            # Rewrite old-format encrypted records of users with an unlocked vault
+            scheduler.add_job(
+                compact_encrypted_records,
+                IntervalTrigger(minutes=10),
+                id="encrypted_records_compactor",
                 replace_existing=True
             )
 
@@ -197,7 +210,7 @@ def init_scheduler():
                 replace_existing=True
             )
 
-            logger.info("Scheduler initialized with sync checker, cleanup, duplicate cleanup, document processor, blog generator, subscription expiry checker, email campaigns, and daily social post")
+            logger.info("Scheduler initialized with sync checker, cleanup, progress janitor, analytics rollup, change feed janitor, encrypted records compactor, document processor, blog generator, subscription expiry checker, email campaigns, and daily social post")
 
     return scheduler
 
@@ -217,9 +230,11 @@ def check_and_run_syncs():
     try:
         from backend_v2.database import SessionLocal
         from backend_v2.models import LinkedAccount
+        from backend_v2.services import sync_queue, provider_health
     except ImportError:
         from database import SessionLocal
         from models import LinkedAccount
+        from services import sync_queue, provider_health
 
     logger.info("Checking for accounts that need syncing...")
 
@@ -227,26 +242,40 @@ def check_and_run_syncs():
     try:
         now = datetime.now(timezone.utc)
 
-        # Find accounts that need syncing
+        # Find accounts that need syncing (one already syncing keeps its active job)
         accounts = db.query(LinkedAccount).filter(
             LinkedAccount.sync_enabled == True,
-            LinkedAccount.status != "SYNCING",
             LinkedAccount.consecutive_failures < 5  # Skip accounts with too many failures
         ).all()
 
         queued = 0
+        deferred = 0
         for account in accounts:
             if should_sync(account, now):
-                # Check if we can run more syncs
+                # Provider down (circuit breaker open): try again on a later check
+                if not provider_health.allow_sync(db, account.provider_name):
+                    deferred += 1
+                    continue
+
+                job = sync_queue.enqueue(db, account, source="scheduled")
+                queued += 1
+
+                # Crawler workers run the sync and apply their own concurrency limits
+                if sync_queue.use_worker():
+                    continue
+
+                # Check if we can run more syncs (the job stays queued for the next check)
                 if len(_running_syncs) >= MAX_CONCURRENT_SYNCS:
                     logger.info(f"Max concurrent syncs reached, skipping {account.provider_name}")
                     continue
 
-                # Queue the sync
-                queue_sync(account.user_id, account.id, account.provider_name)
-                queued += 1
+                claimed = sync_queue.claim(db, sync_queue.INLINE_WORKER_ID, job_id=job.id)
+                if claimed and not queue_sync(account.user_id, account.id, account.provider_name,
+                                              sync_job_id=claimed.id):
+                    # A thread of this process still runs the account: leave the job for the next check
+                    sync_queue.requeue(db, claimed.id, count_attempt=False)
 
-        logger.info(f"Queued {queued} syncs")
+        logger.info(f"Queued {queued} syncs" + (f", deferred {deferred} (provider unavailable)" if deferred else ""))
 
     except Exception as e:
         logger.error(f"Error in sync checker: {e}")
@@ -275,45 +304,61 @@ def should_sync(account, now):
         return time_since_sync > timedelta(hours=23)  # Default to daily
 
 
-def queue_sync(user_id: int, account_id: int, provider_name: str):
-    """Queue a sync job to run."""
+def queue_sync(user_id: int, account_id: int, provider_name: str, sync_job_id: int = None) -> bool:
+    """Run a sync in a thread of this process; False if one is already running for the account."""
     sync_key = f"{user_id}:{provider_name}"
 
     if sync_key in _running_syncs:
         logger.info(f"Sync already running for {sync_key}")
-        return
+        return False
 
     _running_syncs.add(sync_key)
 
     # Run in a thread to not block
     thread = threading.Thread(
         target=run_scheduled_sync,
-        args=(user_id, account_id, provider_name, sync_key),
+        args=(user_id, account_id, provider_name, sync_key, sync_job_id),
         daemon=True
     )
     thread.start()
+    return True
 
 
-def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_key: str):
-    """Run a scheduled sync for an account."""
+def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_key: str,
+                       sync_job_id: int = None):
+    """
+    Run a scheduled sync for an account. sync_job_id is a job already claimed
+    (by a crawler worker or check_and_run_syncs); without it the account's
+    job is queued and claimed here. The job's lease is renewed while it runs.
+    """
     try:
         from backend_v2.database import SessionLocal
         from backend_v2.models import LinkedAccount, SyncJob
         from backend_v2.auth.crypto import decrypt_password
         from backend_v2.services.crawlers_manager import run_regina_async, run_synevo_async
-        from backend_v2.services import sync_status
-        from backend_v2.services.notification_service import notify_new_documents, notify_sync_failed
+        from backend_v2.services import sync_status, sync_watermark, sync_queue, provider_health
+        from backend_v2.services.notification_service import notify_new_documents, notify_sync_failed, dispatch_notification
         from backend_v2.services.vault_helper import get_vault_helper
     except ImportError:
         from database import SessionLocal
         from models import LinkedAccount, SyncJob
         from auth.crypto import decrypt_password
         from services.crawlers_manager import run_regina_async, run_synevo_async
-        from services import sync_status
-        from services.notification_service import notify_new_documents, notify_sync_failed
+        from services import sync_status, sync_watermark, sync_queue, provider_health
+        from services.notification_service import notify_new_documents, notify_sync_failed, dispatch_notification
         from services.vault_helper import get_vault_helper
 
     db = SessionLocal()
+    sync_job = None
+    lease = None
+
+    def lease_lost():
+        """True (and nothing written) if the job was reclaimed or its lease given up while this sync ran."""
+        if lease is not None and lease.holds(db):
+            return False
+        db.rollback()
+        logger.warning(f"Sync job {sync_job.id} lost its lease - discarding this run's outcome")
+        return True
 
     try:
         # Get account
@@ -322,15 +367,15 @@ def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_k
             logger.error(f"Account {account_id} not found")
             return
 
-        # Create sync job record
-        sync_job = SyncJob(
-            user_id=user_id,
-            linked_account_id=account_id,
-            provider_name=provider_name,
-            status="running",
-            started_at=datetime.now(timezone.utc)
-        )
-        db.add(sync_job)
+        # Claim the account's sync job and hold its lease
+        if sync_job_id is None:
+            sync_job_id = sync_queue.enqueue(db, account, source="scheduled").id
+            if not sync_queue.claim(db, sync_queue.INLINE_WORKER_ID, job_id=sync_job_id):
+                logger.info(f"Sync of account {account_id} already running elsewhere")
+                return
+        sync_job = db.get(SyncJob, sync_job_id)
+        lease = sync_queue.Lease(sync_job)
+        lease.start()
         account.status = "SYNCING"
         db.commit()
 
@@ -355,6 +400,8 @@ def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_k
             password = decrypt_password(account.encrypted_password)
 
         if not username or not password:
+            if lease_lost():
+                return
             sync_job.status = "failed"
             sync_job.error_message = "Could not decrypt credentials (vault locked or no credentials stored)"
             sync_job.completed_at = datetime.now(timezone.utc)
@@ -369,21 +416,24 @@ def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_k
         sync_status.status_starting(user_id, provider_name)
         sync_status.status_logging_in(user_id, provider_name)
 
-        # Run crawler
+        # Run crawler (incremental: documents synced before are skipped)
+        watermark = sync_watermark.load(account)
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
         try:
             if provider_name == "Regina Maria":
-                res = loop.run_until_complete(run_regina_async(username, password, user_id=user_id))
+                res = loop.run_until_complete(run_regina_async(username, password, user_id=user_id, watermark=watermark))
             elif provider_name == "Synevo":
-                res = loop.run_until_complete(run_synevo_async(username, password, user_id=user_id))
+                res = loop.run_until_complete(run_synevo_async(username, password, user_id=user_id, watermark=watermark))
             else:
                 raise ValueError(f"Unknown provider: {provider_name}")
         finally:
             loop.close()
 
         if res.get("status") != "success":
+            if lease_lost():
+                return
             error_msg = res.get("message", "Sync failed")
             error_type = classify_sync_error(error_msg)
             sync_job.status = "failed"
@@ -393,7 +443,8 @@ def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_k
             account.last_sync_error = error_msg
             account.error_type = error_type
             account.error_acknowledged = False  # Reset acknowledgement for new errors
-            account.consecutive_failures += 1
+            if not provider_health.is_outage(error_type):  # Outages don't count against the account
+                account.consecutive_failures += 1
             db.commit()
             sync_status.status_error(user_id, provider_name, error_msg, error_type)
             logger.error(f"Sync failed for {provider_name}: {error_msg} (type: {error_type})")
@@ -409,16 +460,20 @@ def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_k
         sync_job.documents_found = len(docs)
 
         if docs:
-            processed = process_sync_documents(db, user_id, provider_name, docs, sync_job)
+            processed = process_sync_documents(db, user_id, provider_name, docs, sync_job, watermark)
             sync_job.documents_processed = processed
 
         # Success
+        if lease_lost():
+            return
         sync_job.status = "completed"
         sync_job.completed_at = datetime.now(timezone.utc)
+        sync_job.lease_expires_at = None
         account.status = "ACTIVE"
         account.last_sync = datetime.now(timezone.utc)
         account.last_sync_error = None
         account.consecutive_failures = 0
+        sync_watermark.record(account, watermark)
         db.commit()
 
         sync_status.status_complete(user_id, provider_name, sync_job.documents_processed)
@@ -439,7 +494,8 @@ def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_k
                     TestResult.document_id.in_(doc_ids)
                 ).count() if doc_ids else 0
 
-                notify_new_documents(db, user_id, provider_name, sync_job.documents_processed, biomarker_count)
+                dispatch_notification(notify_new_documents, user_id, provider_name,
+                                      sync_job.documents_processed, biomarker_count)
             except Exception as ne:
                 logger.error(f"Failed to send new documents notification: {ne}")
 
@@ -448,44 +504,55 @@ def run_scheduled_sync(user_id: int, account_id: int, provider_name: str, sync_k
         error_msg = str(e)
         error_type = classify_sync_error(error_msg)
         try:
-            account = db.query(LinkedAccount).filter(LinkedAccount.id == account_id).first()
-            if account:
-                account.status = "ERROR"
-                account.last_sync_error = error_msg
-                account.error_type = error_type
-                account.error_acknowledged = False
-                account.consecutive_failures += 1
-            sync_job = db.query(SyncJob).filter(
-                SyncJob.linked_account_id == account_id,
-                SyncJob.status == "running"
-            ).first()
-            if sync_job:
-                sync_job.status = "failed"
-                sync_job.error_message = error_msg
-                sync_job.completed_at = datetime.now(timezone.utc)
-            db.commit()
+            db.rollback()
+            if sync_job is None or not lease_lost():
+                account = db.query(LinkedAccount).filter(LinkedAccount.id == account_id).first()
+                if account:
+                    account.status = "ERROR"
+                    account.last_sync_error = error_msg
+                    account.error_type = error_type
+                    account.error_acknowledged = False
+                    if not provider_health.is_outage(error_type):
+                        account.consecutive_failures += 1
+                if sync_job:
+                    sync_job.status = "failed"
+                    sync_job.error_message = error_msg
+                    sync_job.completed_at = datetime.now(timezone.utc)
+                    sync_job.lease_expires_at = None
+                db.commit()
         except Exception as e:
             logger.warning(f"Failed to update sync job status in DB: {e}")
         sync_status.status_error(user_id, provider_name, error_msg, error_type)
     finally:
+        if lease:
+            lease.stop()
         db.close()
         _running_syncs.discard(sync_key)
 
 
-def process_sync_documents(db, user_id, provider_name, docs, sync_job):
-    """Process downloaded documents - extract biomarkers with AI."""
+def process_sync_documents(db, user_id, provider_name, docs, sync_job, watermark=None):
+    """
+    Process downloaded documents - extract biomarkers with AI. Documents that
+    cannot be stored are dropped from watermark, so the next sync retries them.
+    """
     try:
         from backend_v2.models import Document, TestResult
         from backend_v2.services.ai_service import AIService
-        from backend_v2.services import sync_status
+        from backend_v2.services import sync_status, sync_queue
         from backend_v2.services.biomarker_normalizer import get_canonical_name
-        from backend_v2.services.notification_service import notify_abnormal_biomarker
+        from backend_v2.services.reference_ranges import apply_reference_range
+        from backend_v2.services.health_events import safe_record_document_events
+        from backend_v2.services.notification_service import notify_abnormal_results, dispatch_notification
+        from backend_v2.services.sync_ingest import select_new_documents, insert_documents
     except ImportError:
         from models import Document, TestResult
         from services.ai_service import AIService
-        from services import sync_status
+        from services import sync_status, sync_queue
         from services.biomarker_normalizer import get_canonical_name
-        from services.notification_service import notify_abnormal_biomarker
+        from services.reference_ranges import apply_reference_range
+        from services.health_events import safe_record_document_events
+        from services.notification_service import notify_abnormal_results, dispatch_notification
+        from services.sync_ingest import select_new_documents, insert_documents
 
     import datetime as dt
 
@@ -496,59 +563,42 @@ def process_sync_documents(db, user_id, provider_name, docs, sync_job):
         return 0
 
     count_processed = 0
-    total_docs = len(docs)
+    abnormal = []  # abnormal results across the sync, notified once at the end
+
+    # Hash everything once, drop known files with set-based lookups, and
+    # create the remaining documents in a single transaction
+    new_docs = select_new_documents(db, user_id, docs)
+    unreadable = [doc_info for doc_info in new_docs if not doc_info["file_hash"]]
+    for doc_info in unreadable:
+        logger.warning(f"Failed to read downloaded document {doc_info['filename']}")
+        if watermark:
+            watermark.forget(doc_info.get("key"))
+    new_docs = [doc_info for doc_info in new_docs if doc_info["file_hash"]]
+    documents = insert_documents(db, [
+        Document(
+            user_id=user_id,
+            filename=doc_info["filename"],
+            file_path=doc_info["local_path"],
+            file_hash=doc_info["file_hash"],
+            provider=provider_name,
+            document_date=doc_info.get("date"),
+            upload_date=dt.datetime.now(),
+            is_processed=False
+        )
+        for doc_info in new_docs
+    ])
+    total_docs = len(documents)
 
-    for i, doc_info in enumerate(docs):
+    for i, new_doc in enumerate(documents):
+        sync_queue.heartbeat(user_id, provider_name)  # Stops here once the lease is lost
         sync_status.status_processing(user_id, provider_name, i + 1, total_docs)
 
-        # Calculate file hash for robust duplicate detection
-        file_hash = calculate_file_hash(doc_info["local_path"])
-
-        # Check for duplicate by file hash (most reliable - same content = same document)
-        if file_hash:
-            existing_by_hash = db.query(Document).filter(
-                Document.user_id == user_id,
-                Document.file_hash == file_hash
-            ).first()
-
-            if existing_by_hash:
-                logger.debug(f"Skipping duplicate by hash: {doc_info['filename']} matches {existing_by_hash.filename}")
-                continue
-
-        # Fallback: Check if document with same filename already exists
-        existing_doc = db.query(Document).filter(
-            Document.user_id == user_id,
-            Document.filename == doc_info["filename"]
-        ).first()
-
-        if existing_doc:
-            logger.debug(f"Skipping duplicate by filename: {doc_info['filename']}")
-            continue
-
-        # Create Document with file_hash
-        try:
-            new_doc = Document(
-                user_id=user_id,
-                filename=doc_info["filename"],
-                file_path=doc_info["local_path"],
-                file_hash=file_hash,
-                provider=provider_name,
-                document_date=doc_info.get("date"),
-                upload_date=dt.datetime.now(),
-                is_processed=False
-            )
-            db.add(new_doc)
-            db.commit()
-            db.refresh(new_doc)
-        except Exception as e:
-            logger.error(f"Failed to create document: {e}")
-            continue
-
         # AI Parse
         try:
-            parsed_data = ai_service.process_document(doc_info["local_path"])
+            parsed_data = ai_service.process_document(new_doc.file_path)
 
             if "results" in parsed_data and parsed_data["results"]:
+                results, doc_abnormal = [], []
                 for r in parsed_data["results"]:
                     numeric_val = r.get("numeric_value")
                     if numeric_val is None:
@@ -569,18 +619,20 @@ def process_sync_documents(db, user_id, provider_name, docs, sync_job):
                         reference_range=r.get("reference_range"),
                         flags=flags
                     )
-                    db.add(tr)
+                    apply_reference_range(tr)
+                    results.append(tr)
 
-                    # Notify about abnormal biomarkers
                     if flags in ("HIGH", "LOW") and test_name:
-                        try:
-                            notify_abnormal_biomarker(
-                                db, user_id, test_name,
-                                str(r.get("value")), r.get("unit", ""),
-                                flags, r.get("reference_range", "")
-                            )
-                        except Exception as ne:
-                            logger.error(f"Failed to send abnormal biomarker notification: {ne}")
+                        doc_abnormal.append({
+                            "biomarker_name": test_name,
+                            "value": str(r.get("value")),
+                            "unit": r.get("unit") or "",
+                            "flag": flags,
+                            "reference_range": r.get("reference_range") or "",
+                        })
+
+                # One batched insert per document
+                db.add_all(results)
 
                 # Update document date from metadata
                 if "metadata" in parsed_data and parsed_data["metadata"].get("date"):
@@ -597,140 +649,126 @@ def process_sync_documents(db, user_id, provider_name, docs, sync_job):
                 # the download date, not the actual test date.
                 # If AI didn't extract a date, leave document_date as None.
 
-                new_doc.is_processed = True
+                # Part of the document failed to parse: left for process_pending_documents
+                new_doc.is_processed = not parsed_data.get("partial")
+                if parsed_data.get("partial"):
+                    logger.warning(f"Partly parsed {new_doc.filename}: {len(parsed_data['errors'])} chunks failed")
+                safe_record_document_events(db, new_doc)
                 db.commit()
+                abnormal.extend(doc_abnormal)
                 count_processed += 1
             else:
                 new_doc.is_processed = True
                 db.commit()
         except Exception as e:
-            logger.error(f"Failed to parse {doc_info['filename']}: {e}")
+            logger.error(f"Failed to parse {new_doc.filename}: {e}")
+            db.rollback()
             new_doc.is_processed = True
             db.commit()
 
+    # One summary notification for the whole sync, sent off the sync thread
+    if abnormal:
+        dispatch_notification(notify_abnormal_results, user_id, provider_name, abnormal)
+
     return count_processed
 
 
-def cleanup_stuck_syncs():
-    """Clean up syncs that have been running too long (stuck)."""
+def reclaim_expired_syncs():
+    """Requeue or fail sync jobs whose worker stopped renewing their lease (crashed or killed)."""
     try:
         from backend_v2.database import SessionLocal
-        from backend_v2.models import LinkedAccount, SyncJob
+        from backend_v2.services import sync_queue
     except ImportError:
         from database import SessionLocal
-        from models import LinkedAccount, SyncJob
-
-    logger.info("Cleaning up stuck syncs...")
+        from services import sync_queue
 
     db = SessionLocal()
     try:
-        # 15 minutes is realistic max time for a sync - includes login, download, processing
-        cutoff = datetime.now(timezone.utc) - timedelta(minutes=15)
-
-        # Find stuck sync jobs
-        stuck_jobs = db.query(SyncJob).filter(
-            SyncJob.status == "running",
-            SyncJob.started_at < cutoff
-        ).all()
-
-        for job in stuck_jobs:
-            job.status = "failed"
-            job.error_message = "Sync timed out (stuck for >15 minutes)"
-            job.completed_at = datetime.now(timezone.utc)
-
-            # Reset account status
-            account = db.query(LinkedAccount).filter(
-                LinkedAccount.id == job.linked_account_id
-            ).first()
-            if account:
-                account.status = "ERROR"
-                account.last_sync_error = "Sync timed out"
-                account.error_type = "timeout"
-                account.consecutive_failures += 1
+        reclaimed = sync_queue.reclaim_expired(db)
+        if reclaimed:
+            logger.info(f"Reclaimed {reclaimed} sync jobs with expired leases")
+    except Exception as e:
+        logger.error(f"Error reclaiming sync jobs: {e}")
+    finally:
+        db.close()
 
-        if stuck_jobs:
-            db.commit()
-            logger.info(f"Cleaned up {len(stuck_jobs)} stuck syncs")
 
-        # Also reset accounts stuck in SYNCING state
-        stuck_accounts = db.query(LinkedAccount).filter(
-            LinkedAccount.status == "SYNCING"
-        ).all()
+def cleanup_sync_progress():
+    """Drop finished and abandoned sync progress snapshots."""
+    try:
+        from backend_v2.services import sync_status
+    except ImportError:
+        from services import sync_status
 
-        for account in stuck_accounts:
-            # Check if there's actually a running job
-            running_job = db.query(SyncJob).filter(
-                SyncJob.linked_account_id == account.id,
-                SyncJob.status == "running"
-            ).first()
+    try:
+        sync_status.cleanup_old_statuses()
+    except Exception as e:
+        logger.error(f"Error cleaning up sync progress: {e}")
 
-            if not running_job:
-                account.status = "ACTIVE"  # Reset if no running job
 
-        db.commit()
+def rollup_page_views():
+    """Refresh the analytics rollups with page views recorded since the last pass."""
+    try:
+        from backend_v2.database import SessionLocal
+        from backend_v2.services import analytics_rollup, pageview_buffer
+    except ImportError:
+        from database import SessionLocal
+        from services import analytics_rollup, pageview_buffer
 
+    # Views buffered in this process count in this pass
+    pageview_buffer.flush()
+    db = SessionLocal()
+    try:
+        analytics_rollup.refresh(db)
     except Exception as e:
-        logger.error(f"Error in cleanup: {e}")
+        logger.error(f"Error rolling up page views: {e}")
+        db.rollback()
     finally:
         db.close()
 
 
-def cleanup_duplicate_documents():
-    """Find and remove duplicate documents based on file_hash (same content = duplicate)."""
+def prune_change_feed():
+    """Drop change feed tombstones past their retention."""
     try:
         from backend_v2.database import SessionLocal
-        from backend_v2.models import Document, TestResult
+        from backend_v2.services import change_feed
     except ImportError:
         from database import SessionLocal
-        from models import Document, TestResult
-
-    from sqlalchemy import func
-
-    logger.info("Checking for duplicate documents by file hash...")
+        from services import change_feed
 
     db = SessionLocal()
     try:
-        # Find duplicates: same user_id and file_hash (same file content)
-        # Group by these fields and find groups with count > 1
-        duplicates = db.query(
-            Document.user_id,
-            Document.file_hash,
-            func.count(Document.id).label('count'),
-            func.min(Document.id).label('keep_id')  # Keep the oldest (lowest ID)
-        ).filter(
-            Document.file_hash.isnot(None)  # Only consider docs with hash
-        ).group_by(
-            Document.user_id,
-            Document.file_hash
-        ).having(
-            func.count(Document.id) > 1
-        ).all()
+        removed = change_feed.prune(db)
+        if removed:
+            logger.info(f"Pruned {removed} change feed rows")
+    except Exception as e:
+        logger.error(f"Error pruning change feed: {e}")
+        db.rollback()
+    finally:
+        db.close()
 
-        total_deleted = 0
-        for dup in duplicates:
-            # Find all documents in this duplicate group except the one to keep
-            docs_to_delete = db.query(Document).filter(
-                Document.user_id == dup.user_id,
-                Document.file_hash == dup.file_hash,
-                Document.id != dup.keep_id
-            ).all()
-
-            for doc in docs_to_delete:
-                # Delete associated test results first
-                db.query(TestResult).filter(TestResult.document_id == doc.id).delete()
-                # Delete the document
-                db.delete(doc)
-                total_deleted += 1
-                logger.info(f"Deleted duplicate document {doc.id}: {doc.filename} (hash={doc.file_hash[:8]}...)")
-
-        if total_deleted > 0:
-            db.commit()
-            logger.info(f"Cleaned up {total_deleted} duplicate documents")
-        else:
-            logger.debug("No duplicate documents found")
 
+def compact_encrypted_records():
+    """Convert old-format test results and reports of users whose vault is unlocked."""
+    try:
+        from backend_v2.database import SessionLocal
+        from backend_v2.services import encrypted_records
+        from backend_v2.services.user_vault import unlocked_user_ids
+    except ImportError:
+        from database import SessionLocal
+        from services import encrypted_records
+        from services.user_vault import unlocked_user_ids
+
+    db = SessionLocal()
+    try:
+        totals = encrypted_records.compact_unlocked_users(db, unlocked_user_ids())
+        if totals["test_results"] or totals["reports"]:
+            logger.info(
+                f"Compacted {totals['test_results']} test results and {totals['reports']} reports "
+                f"for {totals['users']} users"
+            )
     except Exception as e:
-        logger.error(f"Error in duplicate cleanup: {e}")
+        logger.error(f"Error compacting encrypted records: {e}")
         db.rollback()
     finally:
         db.close()
@@ -745,18 +783,22 @@ def process_pending_documents():
     """Process documents that haven't been processed yet."""
     try:
         from backend_v2.database import SessionLocal
-        from backend_v2.models import Document, TestResult
-        from backend_v2.services.ai_parser import AIParser
+        from backend_v2.models import Document
+        from backend_v2.services.user_vault import unlocked_user_ids
     except ImportError:
         from database import SessionLocal
-        from models import Document, TestResult
-        from services.ai_parser import AIParser
+        from models import Document
+        from services.user_vault import unlocked_user_ids
+
+    from sqlalchemy import or_
 
     db = SessionLocal()
     try:
-        # Find unprocessed documents (limit to avoid overload)
+        # Find unprocessed documents (limit to avoid overload); vault-encrypted
+        # ones only while their owner's vault is unlocked
         pending_docs = db.query(Document).filter(
-            Document.is_processed == False
+            Document.is_processed == False,
+            or_(Document.file_path.isnot(None), Document.user_id.in_(unlocked_user_ids()))
         ).limit(10).all()
 
         if not pending_docs:
@@ -792,92 +834,149 @@ def process_pending_documents():
         db.close()
 
 
+def _readable_pdf_path(doc):
+    """
+    Path of the document's PDF, decrypting the vault copy to a temporary file
+    when the plaintext is gone. Returns (path, is_temporary); path is None if
+    there is no file, or if the user's vault is locked.
+    """
+    import tempfile
+
+    if doc.file_path and os.path.exists(doc.file_path):
+        return doc.file_path, False
+    if not doc.encrypted_path or not os.path.exists(doc.encrypted_path):
+        return None, False
+
+    try:
+        from backend_v2.services.vault_helper import get_vault_helper
+    except ImportError:
+        from services.vault_helper import get_vault_helper
+    vault_helper = get_vault_helper(doc.user_id)
+    if not vault_helper.is_available:
+        return None, False
+    with open(doc.encrypted_path, "rb") as f:
+        content = vault_helper.decrypt_document(f.read())
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(content)
+    return tmp.name, True
+
+
 def process_single_document(db, doc):
-    """Process a single document with AI parsing."""
-    import pdfplumber
+    """
+    Process a single document with AI parsing.
+
+    Also retries documents a sync left partly parsed. Their results are only
+    replaced by a complete parse; a retry that is partial again keeps them
+    and stops retrying.
+    """
+    import os
     import datetime as dt
 
     try:
         from backend_v2.models import TestResult
-        from backend_v2.services.ai_parser import AIParser
+        from backend_v2.services.ai_service import AIService
         from backend_v2.services.biomarker_normalizer import get_canonical_name
+        from backend_v2.services.reference_ranges import apply_reference_range
+        from backend_v2.services.health_events import safe_record_document_events
     except ImportError:
         from models import TestResult
-        from services.ai_parser import AIParser
+        from services.ai_service import AIService
         from services.biomarker_normalizer import get_canonical_name
+        from services.reference_ranges import apply_reference_range
+        from services.health_events import safe_record_document_events
 
     logger.info(f"Processing document {doc.id}: {doc.filename}")
 
-    # Check if file exists
-    import os
-    if not doc.file_path or not os.path.exists(doc.file_path):
-        logger.error(f"Document {doc.id} file not found: {doc.file_path}")
-        doc.is_processed = True  # Mark as processed to avoid retrying
-        db.commit()
-        return False
-
-    # Extract text from PDF
-    full_text = ""
     try:
-        with pdfplumber.open(doc.file_path) as pdf:
-            for page in pdf.pages:
-                full_text += (page.extract_text() or "") + "\n"
+        pdf_path, is_temporary = _readable_pdf_path(doc)
     except Exception as e:
-        logger.error(f"Error reading PDF {doc.id}: {e}")
+        logger.error(f"Error decrypting document {doc.id}: {e}")
         doc.is_processed = True  # Mark as processed to avoid retrying
         db.commit()
         return False
 
-    if not full_text.strip():
-        logger.warning(f"Document {doc.id} has no extractable text")
-        doc.is_processed = True
+    if not pdf_path:
+        if doc.encrypted_path and os.path.exists(doc.encrypted_path):
+            # Vault locked: retried once the user's vault is unlocked
+            logger.info(f"Document {doc.id} waits for its owner's vault to be unlocked")
+            return False
+        logger.error(f"Document {doc.id} file not found: {doc.file_path or doc.encrypted_path}")
+        doc.is_processed = True  # Mark as processed to avoid retrying
         db.commit()
         return False
 
-    # AI Parse
+    # AI Parse, chunked like a sync
     try:
-        parser = AIParser()
-        result = parser.parse_text(full_text)
+        try:
+            result = AIService().process_document(pdf_path)
+        finally:
+            if is_temporary:
+                os.remove(pdf_path)
 
-        if "results" in result and result["results"]:
-            for r in result["results"]:
-                numeric_val = None
+        if not result.get("results"):
+            if result.get("error") == "Empty or unreadable PDF":
+                logger.warning(f"Document {doc.id} has no extractable text")
+                doc.is_processed = True
+                db.commit()
+                return False
+            logger.error(f"AI parsing failed for document {doc.id}: {result.get('error')}")
+            # Don't mark as processed so it can be retried
+            return False
+
+        has_results = db.query(TestResult.id).filter(TestResult.document_id == doc.id).first() is not None
+        if result.get("partial") and has_results:
+            # Retried and partial again: keep the earlier results rather than loop
+            logger.warning(f"Document {doc.id} still partly parsed ({len(result['errors'])} chunks failed) - "
+                           f"keeping its earlier results")
+            doc.is_processed = True
+            db.commit()
+            return False
+
+        # Replace results kept from an earlier, partial parse
+        db.query(TestResult).filter(TestResult.document_id == doc.id).delete(synchronize_session=False)
+        for r in result["results"]:
+            numeric_val = r.get("numeric_value")
+            if numeric_val is None:
                 try:
                     numeric_val = float(r.get("value"))
                 except (TypeError, ValueError):
                     pass
 
-                test_name = r.get("test_name")
-                tr = TestResult(
-                    document_id=doc.id,
-                    test_name=test_name,
-                    canonical_name=get_canonical_name(test_name) if test_name else None,
-                    value=str(r.get("value")),
-                    unit=r.get("unit"),
-                    reference_range=r.get("reference_range"),
-                    flags=r.get("flags", "NORMAL"),
-                    numeric_value=numeric_val
-                )
-                db.add(tr)
-
-            # Update metadata from AI parsing
-            meta = result.get("metadata", {})
-            if meta.get("provider"):
-                doc.provider = meta["provider"]
-            if meta.get("date"):
-                try:
-                    doc.document_date = dt.datetime.strptime(meta["date"], "%Y-%m-%d")
-                except:
-                    pass
+            test_name = r.get("test_name")
+            tr = TestResult(
+                document_id=doc.id,
+                test_name=test_name,
+                canonical_name=get_canonical_name(test_name) if test_name else None,
+                value=str(r.get("value")),
+                unit=r.get("unit"),
+                reference_range=r.get("reference_range"),
+                flags=r.get("flags", "NORMAL"),
+                numeric_value=numeric_val
+            )
+            apply_reference_range(tr)
+            db.add(tr)
+
+        # Update metadata from AI parsing
+        meta = result.get("metadata", {})
+        if meta.get("provider"):
+            doc.provider = meta["provider"]
+        if meta.get("date"):
+            try:
+                doc.document_date = dt.datetime.strptime(meta["date"], "%Y-%m-%d")
+            except:
+                pass
 
-            logger.info(f"Document {doc.id}: extracted {len(result['results'])} biomarkers")
+        logger.info(f"Document {doc.id}: extracted {len(result['results'])} biomarkers")
 
-        doc.is_processed = True
+        # A first parse that is partial gets one retry
+        doc.is_processed = not result.get("partial")
+        safe_record_document_events(db, doc)
         db.commit()
         return True
 
     except Exception as e:
         logger.error(f"AI parsing failed for document {doc.id}: {e}")
+        db.rollback()
         # Don't mark as processed so it can be retried
         return False
 
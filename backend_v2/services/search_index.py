@@ -0,0 +1,305 @@
+"""
+Search Index
+Full-text search over blog articles and the biomarker / condition reference pages.
+
+Every searchable page is a row in search_documents holding its title, tags
+and plain body text, folded like biomarker_normalizer (lowercase, no Romanian
+diacritics) so "glicemie", "Glicemie" and "glicémie"-style input all match.
+The full-text index behind it depends on the database:
+- SQLite (development): an FTS5 table over search_documents kept in sync by
+  triggers, ranked with bm25
+- PostgreSQL (production): a stored tsvector column (title weighted A, tags
+  B, body C) with a GIN index, ranked with ts_rank_cd
+
+Both are created by ensure_schema (idempotent; also run by the migration).
+matching() returns the same (ref, rank) subquery on either, so callers join
+it without knowing the backend. Query terms are prefix-matched and ANDed.
+
+Blog articles are (re)indexed by ORM events whenever a BlogArticle is
+inserted, updated or deleted, once register_listeners() has been called (app
+startup, blog_generator); the reference JSON is synced at startup
+(sync_reference_data). Until reindex_articles has run, or if a listener
+failed, the index can miss articles: articles_indexed() tells callers when
+to fall back to plain column filters.
+"""
+import html
+import json
+import logging
+import os
+import re
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Float, String, event, inspect, text
+
+try:
+    from backend_v2.models import BlogArticle, SearchDocument
+    from backend_v2.services.biomarker_normalizer import fold_diacritics
+except ImportError:
+    from models import BlogArticle, SearchDocument
+    from services.biomarker_normalizer import fold_diacritics
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_TERMS = 8
+
+_DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend_v2", "src", "data"))
+
+_SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5("
+    "title, tags, body, content='search_documents', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, tags, body) "
+    "VALUES ('delete', old.id, old.title, old.tags, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, tags, body) "
+    "VALUES ('delete', old.id, old.title, old.tags, old.body); "
+    "INSERT INTO search_documents_fts(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body); END",
+]
+
+_POSTGRES_SCHEMA = [
+    "ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(body, '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_vector ON search_documents USING GIN (search_vector)",
+]
+
+# Engines whose full-text schema is known to exist
+_ready = weakref.WeakSet()
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+def ensure_schema(connection):
+    """Create search_documents and its full-text index if missing."""
+    if connection.engine in _ready:
+        return
+    SearchDocument.__table__.create(bind=connection, checkfirst=True)
+    statements = _POSTGRES_SCHEMA if _dialect(connection) == "postgresql" else _SQLITE_SCHEMA
+    for statement in statements:
+        connection.execute(text(statement))
+    _ready.add(connection.engine)
+
+
+# --- Documents ---------------------------------------------------------------------
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def fold(value: Optional[str]) -> str:
+    """Diacritic-folded plain text (HTML tags removed)."""
+    if not value:
+        return ""
+    plain = html.unescape(_TAG_RE.sub(" ", value))
+    return " ".join(fold_diacritics(plain).split())
+
+
+def _join(*parts) -> str:
+    return " ".join(fold(part) for part in parts if part)
+
+
+def _article_document(article: BlogArticle) -> Dict:
+    return {
+        "kind": "blog",
+        "ref": article.slug,
+        "label": article.title,
+        "title": _join(article.title, article.title_en),
+        "tags": fold((article.tags or "").replace(",", " ")),
+        "body": _join(article.excerpt, article.meta_description, article.content_html,
+                      article.excerpt_en, article.content_html_en),
+        "published": article.status == "published",
+    }
+
+
+def _biomarker_document(entry: Dict) -> Dict:
+    faqs = " ".join(f"{f.get('q', '')} {f.get('a', '')}" for f in entry.get("faqs_ro", []))
+    return {
+        "kind": "biomarker",
+        "ref": entry["slug"],
+        "label": entry.get("name_ro") or entry["slug"],
+        "title": _join(entry.get("name_ro"), entry.get("name_en")),
+        "tags": _join(" ".join(entry.get("aliases_ro", [])), entry.get("category_ro"), entry.get("unit")),
+        "body": _join(entry.get("meta_ro"), entry.get("what_ro"), entry.get("high_ro"),
+                      entry.get("low_ro"), faqs),
+        "published": True,
+    }
+
+
+def _condition_document(entry: Dict, biomarker_names: Dict[str, str]) -> Dict:
+    faqs = " ".join(f"{f.get('q', '')} {f.get('a', '')}" for f in entry.get("faqs_ro", []))
+    biomarkers = " ".join(biomarker_names.get(slug, slug) for slug in entry.get("biomarkers", []))
+    return {
+        "kind": "condition",
+        "ref": entry["slug"],
+        "label": entry.get("name_ro") or entry["slug"],
+        "title": _join(entry.get("name_ro"), entry.get("name_en")),
+        "tags": fold(biomarkers),
+        "body": _join(entry.get("meta_ro"), entry.get("description_ro"),
+                      " ".join(entry.get("symptoms_ro", [])),
+                      entry.get("when_ro"), faqs),
+        "published": True,
+    }
+
+
+def _upsert(connection, document: Dict):
+    table = SearchDocument.__table__
+    existing = connection.execute(
+        table.select().where(table.c.kind == document["kind"], table.c.ref == document["ref"])
+    ).first()
+    if existing is None:
+        connection.execute(table.insert().values(**document))
+    elif any(getattr(existing, key) != value for key, value in document.items()):
+        connection.execute(table.update().where(table.c.id == existing.id).values(**document))
+
+
+def _delete(connection, kind: str, ref: str):
+    table = SearchDocument.__table__
+    connection.execute(table.delete().where(table.c.kind == kind, table.c.ref == ref))
+
+
+# Blog articles are indexed in the same transaction that writes them
+
+def _index_article(mapper, connection, article):
+    try:
+        with connection.begin_nested():
+            ensure_schema(connection)
+            for old_slug in inspect(article).attrs.slug.history.deleted:
+                if old_slug and old_slug != article.slug:
+                    _delete(connection, "blog", old_slug)
+            _upsert(connection, _article_document(article))
+    except Exception as e:
+        _ready.discard(connection.engine)  # The savepoint may have rolled the schema back
+        logger.warning(f"Search index: could not index article {article.slug}: {e}")
+
+
+def _unindex_article(mapper, connection, article):
+    try:
+        with connection.begin_nested():
+            ensure_schema(connection)
+            _delete(connection, "blog", article.slug)
+    except Exception as e:
+        _ready.discard(connection.engine)
+        logger.warning(f"Search index: could not remove article {article.slug}: {e}")
+
+
+_LISTENERS = (
+    ("after_insert", _index_article),
+    ("after_update", _index_article),
+    ("after_delete", _unindex_article),
+)
+
+
+def register_listeners():
+    """Keep the index in step with BlogArticle writes. Safe to call more than once."""
+    for name, listener in _LISTENERS:
+        if not event.contains(BlogArticle, name, listener):
+            event.listen(BlogArticle, name, listener)
+
+
+def _load(filename: str) -> List[Dict]:
+    try:
+        with open(os.path.join(_DATA_DIR, filename), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Search index: could not load {filename}: {e}")
+        return []
+
+
+def sync_reference_data(db) -> int:
+    """Index the biomarker and condition reference pages; drops entries no longer in the JSON."""
+    connection = db.connection()
+    ensure_schema(connection)
+    biomarkers = _load("biomarkers-reference.json")
+    conditions = _load("conditions-reference.json")
+    names = {b["slug"]: b.get("name_ro", b["slug"]) for b in biomarkers}
+
+    documents = [_biomarker_document(b) for b in biomarkers] + [_condition_document(c, names) for c in conditions]
+    for document in documents:
+        _upsert(connection, document)
+    for kind, entries in (("biomarker", biomarkers), ("condition", conditions)):
+        if not entries:
+            continue  # Missing file: keep what is indexed
+        keep = {entry["slug"] for entry in entries}
+        for (ref,) in db.query(SearchDocument.ref).filter(SearchDocument.kind == kind).all():
+            if ref not in keep:
+                _delete(connection, kind, ref)
+    db.commit()
+    return len(documents)
+
+
+def reindex_articles(db) -> int:
+    """Index every blog article from scratch (migration / repair)."""
+    connection = db.connection()
+    ensure_schema(connection)
+    connection.execute(SearchDocument.__table__.delete().where(SearchDocument.__table__.c.kind == "blog"))
+    articles = db.query(BlogArticle).all()
+    for article in articles:
+        _upsert(connection, _article_document(article))
+    db.commit()
+    return len(articles)
+
+
+# --- Queries -----------------------------------------------------------------------
+
+def terms(query: Optional[str]) -> List[str]:
+    return re.findall(r"\w+", fold(query))[:MAX_QUERY_TERMS]
+
+
+def articles_indexed(db) -> bool:
+    """True when every published blog article has its published index row."""
+    ensure_schema(db.connection())
+    articles = db.query(BlogArticle.id).filter(BlogArticle.status == "published").count()
+    indexed = db.query(SearchDocument.id)\
+        .filter(SearchDocument.kind == "blog", SearchDocument.published == True)\
+        .count()
+    return indexed == articles
+
+
+def matching(db, query: Optional[str] = None, kinds: Tuple[str, ...] = None, tag: Optional[str] = None):
+    """
+    Subquery (ref, kind, rank) of published documents matching every term of
+    query (anywhere) and of tag (in the tags only); lower rank is better.
+    None when there is nothing to search for.
+    """
+    words, tag_words = terms(query), terms(tag)
+    if not words and not tag_words:
+        return None
+    ensure_schema(db.connection())
+
+    params = {}
+    if _dialect(db.get_bind()) == "postgresql":
+        # Prefix match; tag terms only in the B-weighted (tags) part
+        parts = [f"{w}:*" for w in words] + [f"{w}:*B" for w in tag_words]
+        params["q"] = " & ".join(parts)
+        sql = ("SELECT d.ref AS ref, d.kind AS kind, -ts_rank_cd(d.search_vector, q.query) AS rank "
+               "FROM search_documents d, to_tsquery('simple', :q) AS q(query) "
+               "WHERE d.published AND d.search_vector @@ q.query")
+    else:
+        parts = [f'"{w}"*' for w in words] + [f'tags : "{w}"*' for w in tag_words]
+        params["q"] = " AND ".join(parts)
+        sql = ("SELECT d.ref AS ref, d.kind AS kind, bm25(search_documents_fts, 10.0, 5.0, 1.0) AS rank "
+               "FROM search_documents_fts JOIN search_documents d ON d.id = search_documents_fts.rowid "
+               "WHERE search_documents_fts MATCH :q AND d.published")
+    if kinds:
+        kind_params = {f"kind{i}": kind for i, kind in enumerate(kinds)}
+        sql += " AND d.kind IN (" + ", ".join(f":{name}" for name in kind_params) + ")"
+        params.update(kind_params)
+    return text(sql).bindparams(**params).columns(ref=String, kind=String, rank=Float).subquery("search_matches")
+
+
+def search(db, query: str, kinds: Tuple[str, ...] = None, limit: int = 20, offset: int = 0) -> Tuple[int, List]:
+    """(total, [(kind, ref, label)]) best matches first."""
+    matches = matching(db, query, kinds)
+    if matches is None:
+        return 0, []
+    base = db.query(matches.c.kind, matches.c.ref, SearchDocument.label, matches.c.rank).join(
+        SearchDocument, (SearchDocument.kind == matches.c.kind) & (SearchDocument.ref == matches.c.ref))
+    total = base.count()
+    rows = base.order_by(matches.c.rank, matches.c.ref).offset(offset).limit(limit).all()
+    return total, [(row.kind, row.ref, row.label) for row in rows]
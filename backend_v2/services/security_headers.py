@@ -0,0 +1,132 @@
+"""
+Security Headers
+Pure ASGI middleware adding the security and caching headers to every response.
+
+Everything that does not depend on the request - the security headers, the
+CSP string, whether HSTS applies - is encoded once, when the middleware is
+built. Per request only the Cache-Control policy is picked, by walking the
+path through a prefix trie built from SEO_PREFIXES, plus one set lookup for
+UNCACHED_PATHS.
+
+Authenticated responses are not stored by browsers (no-store), except those
+carrying an ETag (services/data_version): they keep the route's
+"private, no-cache" so the browser can revalidate them with If-None-Match.
+
+The middleware only rewrites the http.response.start message and passes
+body messages through untouched, so streamed ZIP/PDF downloads are never
+buffered (unlike @app.middleware("http"), which wraps every response in a
+BaseHTTPMiddleware stream and task).
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Header = Tuple[bytes, bytes]
+
+# Routes are at /auth, /users, etc. (Nginx strips /api prefix before proxying)
+UNCACHED_PATHS = ("/", "/health", "/metrics", "/api/health", "/api/metrics", "/sitemap.xml", "/blog/feed.xml")
+SEO_PREFIXES = ("/prerender/", "/public/stats", "/blog/articles", "/analyzer/", "/sitemaps/")
+
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://cdnjs.cloudflare.com https://www.googletagmanager.com; "
+    "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+    "font-src 'self' https://fonts.gstatic.com; "
+    "img-src 'self' data: blob: https:; "
+    "connect-src 'self' https://analize.online https://*.googleapis.com https://*.google-analytics.com https://*.analytics.google.com; "
+    "frame-ancestors 'none'; "
+    "base-uri 'self'; "
+    "form-action 'self'"
+)
+
+SECURITY_HEADERS = {
+    "X-Frame-Options": "DENY",  # Prevent clickjacking
+    "X-Content-Type-Options": "nosniff",  # Prevent MIME type sniffing
+    "X-XSS-Protection": "1; mode=block",  # XSS protection for older browsers
+    "Referrer-Policy": "strict-origin-when-cross-origin",  # Control referrer information
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()",  # Restrict browser features
+    "Content-Security-Policy": CONTENT_SECURITY_POLICY,  # Restrict resource loading
+}
+HSTS_HEADER = ("Strict-Transport-Security", "max-age=31536000; includeSubDomains")
+
+# Cache policies
+PUBLIC_CACHE = {"Cache-Control": "public, max-age=3600, s-maxage=3600"}
+NO_STORE = {"Cache-Control": "no-store, no-cache, must-revalidate", "Pragma": "no-cache"}
+
+
+def _encode(headers: Dict[str, str]) -> List[Header]:
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+
+class PrefixTrie:
+    """Maps path prefixes to values; match() returns the value of the longest prefix of a path."""
+
+    _VALUE = object()  # Key marking "a prefix ends here" inside a node
+
+    def __init__(self, prefixes: Optional[Dict[str, object]] = None):
+        self._root: dict = {}
+        for prefix, value in (prefixes or {}).items():
+            self.add(prefix, value)
+
+    def add(self, prefix: str, value):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._VALUE] = value
+
+    def match(self, path: str, default=None):
+        node, found = self._root, default
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(self._VALUE, found)
+        return found
+
+
+class SecurityHeadersMiddleware:
+    """Adds SECURITY_HEADERS (plus HSTS when served over https) and the path's cache policy."""
+
+    def __init__(self, app, origins: Iterable[str] = (), uncached_paths=UNCACHED_PATHS, seo_prefixes=SEO_PREFIXES):
+        self.app = app
+        base = dict(SECURITY_HEADERS)
+        # HSTS - only in production (when CORS_ORIGINS contains https://)
+        if any("https://" in origin for origin in origins):
+            base[HSTS_HEADER[0]] = HSTS_HEADER[1]
+
+        # Each policy is (header names it sets, headers); those names replace any the route set
+        def policy(extra: Dict[str, str]):
+            headers = _encode({**base, **extra})
+            return frozenset(name for name, _ in headers), headers
+
+        self._public = policy(PUBLIC_CACHE)
+        self._uncached = policy({})
+        self._private = policy(NO_STORE)
+        self._revalidated = policy({})  # Private response with an ETag: the route's Cache-Control stands
+        self._uncached_paths = frozenset(uncached_paths)
+        self._seo = PrefixTrie({prefix: True for prefix in seo_prefixes})
+
+    def policy_for(self, path: str):
+        if self._seo.match(path, False):
+            return self._public
+        if path in self._uncached_paths:
+            return self._uncached
+        # Prevent caching of authenticated API responses
+        return self._private
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.policy_for(scope["path"])
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                own = message.get("headers", ())
+                names, headers = policy
+                if policy is self._private and any(name.lower() == b"etag" for name, _ in own):
+                    names, headers = self._revalidated
+                message["headers"] = [header for header in own if header[0].lower() not in names] + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,316 @@
+"""
+Sitemap Cache
+Sharded sitemap and blog RSS feed, serialized once and served from memory.
+
+/sitemap.xml is a sitemap index pointing at child sitemaps
+(/sitemaps/<name>.xml): static pages, biomarkers, conditions and blog
+articles, each split into shards of at most MAX_URLS_PER_SHARD URLs (the
+protocol allows 50,000). Every document is kept as UTF-8 and gzip bytes with
+an ETag and Last-Modified, so a crawler fetch is a dict lookup - or a 304.
+
+Blog shards hold articles in id order, so a new article only changes the
+last shard. The published articles are re-read when an article is published
+in this process (invalidate_blog) and otherwise at most every
+BLOG_REFRESH_SECONDS (articles published by other processes); only shards
+whose articles changed are serialized again. Static shards are rebuilt when
+the UTC date changes (their lastmod is today). If the articles can't be read,
+the last good shards and feed are kept; until a first read succeeds every
+request retries it and the feed is unavailable (rss_feed returns None).
+"""
+import gzip
+import hashlib
+import html
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import Response
+
+try:
+    from backend_v2.models import BlogArticle
+except ImportError:
+    from models import BlogArticle
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://analize.online"
+MAX_URLS_PER_SHARD = int(os.getenv("SITEMAP_MAX_URLS_PER_SHARD", "45000"))
+BLOG_REFRESH_SECONDS = int(os.getenv("SITEMAP_BLOG_REFRESH_SECONDS", "300"))
+FEED_SIZE = 50
+
+STATIC_PAGES = [
+    ("/", 1.0, "weekly"),
+    ("/pricing", 0.9, "monthly"),
+    ("/login", 0.7, "monthly"),
+    ("/blog", 0.8, "weekly"),
+    ("/biomarker", 0.8, "weekly"),
+    ("/analyzer", 0.9, "weekly"),
+    ("/despre-noi", 0.7, "monthly"),
+    ("/contact", 0.7, "monthly"),
+    ("/disclaimer-medical", 0.5, "yearly"),
+    ("/demo", 0.7, "monthly"),
+    ("/nutrition-preview", 0.9, "weekly"),
+    ("/terms", 0.3, "yearly"),
+    ("/privacy", 0.3, "yearly"),
+]
+
+_DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend_v2", "src", "data"))
+
+
+def _load_slugs(filename: str) -> List[str]:
+    try:
+        with open(os.path.join(_DATA_DIR, filename), "r", encoding="utf-8") as f:
+            slugs = [item["slug"] for item in json.load(f)]
+        logger.info(f"Sitemap: loaded {len(slugs)} slugs from {filename}")
+        return slugs
+    except Exception as e:
+        logger.warning(f"Sitemap: could not load {filename}: {e}")
+        return []
+
+
+# Loaded once at import time
+_biomarker_slugs = _load_slugs("biomarkers-reference.json")
+_condition_slugs = _load_slugs("conditions-reference.json")
+
+
+@dataclass
+class CachedDocument:
+    body: bytes
+    gzipped: bytes
+    etag: str
+    last_modified: datetime
+    media_type: str
+
+    def headers(self) -> Dict[str, str]:
+        return {"ETag": self.etag, "Last-Modified": format_datetime(self.last_modified, usegmt=True),
+                "Vary": "Accept-Encoding"}
+
+
+def _document(xml: str, media_type: str, last_modified: datetime = None) -> CachedDocument:
+    body = xml.encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    modified = (last_modified or datetime.now(timezone.utc)).replace(microsecond=0)
+    return CachedDocument(body, gzip.compress(body, mtime=0), etag, modified, media_type)
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# --- Serialization -----------------------------------------------------------------
+
+def _url_entry(loc: str, changefreq: str, priority: float, lastmod: str | None = None) -> str:
+    parts = ["  <url>", f"    <loc>{loc}</loc>"]
+    if lastmod:
+        parts.append(f"    <lastmod>{lastmod}</lastmod>")
+    parts.append(f"    <changefreq>{changefreq}</changefreq>")
+    parts.append(f"    <priority>{priority}</priority>")
+    parts.append("  </url>")
+    return "\n".join(parts)
+
+
+def _urlset(entries: List[str]) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        + "\n".join(entries)
+        + "\n</urlset>\n"
+    )
+
+
+def _chunks(items: list) -> List[list]:
+    return [items[i:i + MAX_URLS_PER_SHARD] for i in range(0, len(items), MAX_URLS_PER_SHARD)] or [[]]
+
+
+def _rss_date(value: datetime) -> str:
+    return value.strftime("%a, %d %b %Y %H:%M:%S +0000")
+
+
+def _feed(articles: List[tuple], built: datetime) -> str:
+    items = []
+    for a in articles:
+        pub_date = _rss_date(a.published_at) if a.published_at else _rss_date(built)
+        link = f"{BASE_URL}/blog/{a.slug}"
+        items.append(
+            f"    <item>\n"
+            f"      <title>{html.escape(a.title or '')}</title>\n"
+            f"      <link>{link}</link>\n"
+            f"      <guid isPermaLink=\"true\">{link}</guid>\n"
+            f"      <description>{html.escape(a.meta_description or a.excerpt or '')}</description>\n"
+            f"      <pubDate>{pub_date}</pubDate>\n"
+            f"    </item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n'
+        '  <channel>\n'
+        '    <title>Blog Sănătate — Analize.Online</title>\n'
+        f'    <link>{BASE_URL}/blog</link>\n'
+        '    <description>Articole despre sănătate, nutriție, rețete românești sănătoase, ghiduri biomarkeri și sfaturi de la specialiști AI.</description>\n'
+        '    <language>ro</language>\n'
+        f'    <lastBuildDate>{_rss_date(built)}</lastBuildDate>\n'
+        f'    <atom:link href="{BASE_URL}/blog/feed.xml" rel="self" type="application/rss+xml" />\n'
+        + "\n".join(items) + "\n"
+        '  </channel>\n'
+        '</rss>\n'
+    )
+
+
+# --- Cache -------------------------------------------------------------------------
+
+_lock = threading.RLock()
+_shards: Dict[str, CachedDocument] = {}  # shard name -> document
+_fingerprints: Dict[str, tuple] = {}  # shard name -> what it was built from
+_index: Optional[CachedDocument] = None
+_feed_doc: Optional[CachedDocument] = None
+_static_date: Optional[str] = None
+_blog_checked = 0.0
+
+
+def _set_shard(name: str, fingerprint: tuple, build) -> bool:
+    """Serialize a shard unless it was built from the same data; True if it changed."""
+    if _fingerprints.get(name) == fingerprint and name in _shards:
+        return False
+    _shards[name] = build()
+    _fingerprints[name] = fingerprint
+    return True
+
+
+def _refresh_static(today: str) -> bool:
+    global _static_date
+    if _static_date == today:
+        return False
+    entries = [_url_entry(f"{BASE_URL}{path}", freq, priority, today) for path, priority, freq in STATIC_PAGES]
+    _set_shard("pages", (today,), lambda: _document(_urlset(entries), "application/xml"))
+    for name, path, slugs, priority in (("biomarkers", "biomarker", _biomarker_slugs, 0.7),
+                                        ("conditions", "analize-pentru", _condition_slugs, 0.8)):
+        for number, chunk in enumerate(_chunks(slugs), 1):
+            _set_shard(f"{name}-{number}", tuple(chunk), lambda path=path, chunk=chunk, priority=priority: _document(
+                _urlset([_url_entry(f"{BASE_URL}/{path}/{slug}", "monthly", priority) for slug in chunk]),
+                "application/xml"))
+    _static_date = today
+    return True
+
+
+def _refresh_blog(db) -> bool:
+    """Re-read published articles; serialize the shards and feed that changed."""
+    global _feed_doc
+    articles = db.query(
+        BlogArticle.id, BlogArticle.slug, BlogArticle.title, BlogArticle.excerpt,
+        BlogArticle.meta_description, BlogArticle.published_at, BlogArticle.updated_at
+    ).filter(BlogArticle.status == "published").order_by(BlogArticle.id).all()
+
+    changed = False
+    chunks = _chunks(articles)
+    for number, chunk in enumerate(chunks, 1):
+        fingerprint = tuple((a.id, a.slug, a.published_at, a.updated_at) for a in chunk)
+        entries = [_url_entry(f"{BASE_URL}/blog/{a.slug}", "weekly", 0.6,
+                              a.published_at.strftime("%Y-%m-%d") if a.published_at else None) for a in chunk]
+        newest = max((_utc(a.updated_at or a.published_at) for a in chunk
+                      if a.updated_at or a.published_at), default=None)
+        changed |= _set_shard(f"blog-{number}", fingerprint,
+                              lambda: _document(_urlset(entries), "application/xml", newest))
+    # Shards left over after articles were unpublished
+    for name in [n for n in _shards if n.startswith("blog-") and int(n[5:]) > len(chunks)]:
+        del _shards[name], _fingerprints[name]
+        changed = True
+
+    latest = sorted(articles, key=lambda a: _utc(a.published_at) or datetime.min.replace(tzinfo=timezone.utc),
+                    reverse=True)[:FEED_SIZE]
+    fingerprint = tuple((a.id, a.slug, a.title, a.published_at, a.updated_at) for a in latest)
+    if _fingerprints.get("feed") != fingerprint or _feed_doc is None:
+        built = datetime.now(timezone.utc)
+        _feed_doc = _document(_feed(latest, built), "application/rss+xml; charset=utf-8", built)
+        _fingerprints["feed"] = fingerprint
+    return changed
+
+
+def _ensure(db):
+    """Bring stale parts up to date; no queries while everything is fresh."""
+    global _index, _blog_checked
+    now = time.monotonic()
+    with _lock:
+        changed = _refresh_static(datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+        if now - _blog_checked >= BLOG_REFRESH_SECONDS:
+            try:
+                changed |= _refresh_blog(db)
+                _blog_checked = now
+            except Exception as e:
+                logger.warning(f"Sitemap: could not query blog articles: {e}")
+                if _feed_doc is not None:
+                    _blog_checked = now  # Keep serving the last good documents until the next check
+        if changed or _index is None:
+            entries = "\n".join(
+                f"  <sitemap>\n    <loc>{BASE_URL}/sitemaps/{name}.xml</loc>\n"
+                f"    <lastmod>{doc.last_modified.strftime('%Y-%m-%d')}</lastmod>\n  </sitemap>"
+                for name, doc in sorted(_shards.items(), key=lambda item: _shard_order(item[0]))
+            )
+            _index = _document(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+                f"{entries}\n</sitemapindex>\n",
+                "application/xml",
+                max(doc.last_modified for doc in _shards.values()),
+            )
+
+
+def _shard_order(name: str) -> Tuple[int, int]:
+    kind, _, number = name.partition("-")
+    order = {"pages": 0, "biomarkers": 1, "conditions": 2, "blog": 3}
+    return order.get(kind, 9), int(number or 0)
+
+
+def sitemap_index(db) -> CachedDocument:
+    _ensure(db)
+    return _index
+
+
+def sitemap_shard(db, name: str) -> Optional[CachedDocument]:
+    _ensure(db)
+    return _shards.get(name)
+
+
+def rss_feed(db) -> Optional[CachedDocument]:
+    """The feed, or None if the articles have never been read successfully."""
+    _ensure(db)
+    return _feed_doc
+
+
+def invalidate_blog():
+    """An article was published or changed: re-read the articles on the next request."""
+    global _blog_checked
+    with _lock:
+        _blog_checked = 0.0
+
+
+def reset():
+    global _index, _feed_doc, _static_date, _blog_checked
+    with _lock:
+        _shards.clear()
+        _fingerprints.clear()
+        _index = _feed_doc = _static_date = None
+        _blog_checked = 0.0
+
+
+def respond(request, document: CachedDocument) -> Response:
+    """The document as a response: 304 if the client has it, gzip bytes if it accepts them."""
+    headers = document.headers()
+    gzip_etag = document.etag[:-1] + '-gz"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or document.etag in tags or gzip_etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers.update({"ETag": gzip_etag, "Content-Encoding": "gzip"})
+        return Response(content=document.gzipped, media_type=document.media_type, headers=headers)
+    return Response(content=document.body, media_type=document.media_type, headers=headers)
@@ -1,16 +1,21 @@
 """
 Subscription management service.
 
-Handles tier limits, quota enforcement, and usage tracking.
+Handles tier limits, quota enforcement, and usage tracking. Quota checks read
+a cached per-user Entitlements snapshot (services/entitlements).
 """
 from datetime import datetime, timedelta, timezone
-from typing import Tuple, Optional, Dict, Any
+from typing import Callable, Tuple, Optional, Dict, Any
 from sqlalchemy.orm import Session
 
 try:
     from backend_v2.models import User, Subscription, UsageTracker, FamilyGroup, FamilyMember, Document, LinkedAccount
+    from backend_v2.services import entitlements
+    from backend_v2.services.entitlements import Entitlements
 except ImportError:
     from models import User, Subscription, UsageTracker, FamilyGroup, FamilyMember, Document, LinkedAccount
+    from services import entitlements
+    from services.entitlements import Entitlements
 
 
 # Tier limits configuration
@@ -138,10 +143,8 @@ class SubscriptionService:
 
         return tracker
 
-    def get_user_tier(self, user_id: int) -> str:
-        """Get user's current subscription tier."""
-        subscription = self.get_or_create_subscription(user_id)
-
+    def _effective_tier(self, user_id: int, subscription: Subscription) -> Tuple[str, Optional[int]]:
+        """(tier, family owner id when the tier comes from a family plan)."""
         # Check if user is part of a family plan
         family_member = self.db.query(FamilyMember).filter(
             FamilyMember.user_id == user_id
@@ -154,9 +157,46 @@ class SubscriptionService:
                 Subscription.user_id == family.owner_id
             ).first()
             if owner_subscription and owner_subscription.tier == "family" and owner_subscription.status == "active":
-                return "family"
+                return "family", family.owner_id
+
+        return (subscription.tier if subscription.status in ("active", "trialing") else "free"), None
+
+    def get_entitlements(self, user_id: int, fresh: bool = False) -> Entitlements:
+        """Effective tier, limits and usage; cached unless fresh is set."""
+        if not fresh:
+            snapshot = entitlements.lookup(user_id)
+            if snapshot is not None:
+                return snapshot
+
+        # These may write (and commit); do it before taking the token
+        subscription = self.get_or_create_subscription(user_id)
+        tracker = self.get_or_create_usage_tracker(user_id)
+        self._check_and_reset_monthly_usage(tracker)
 
-        return subscription.tier if subscription.status in ("active", "trialing") else "free"
+        token = entitlements.begin()
+        tier, family_owner_id = self._effective_tier(user_id, subscription)
+        snapshot = Entitlements(
+            user_id=user_id,
+            tier=tier,
+            limits=self.get_tier_limits(tier),
+            documents=self.db.query(Document).filter(Document.user_id == user_id).count(),
+            providers=self.db.query(LinkedAccount).filter(LinkedAccount.user_id == user_id).count(),
+            ai_analyses=tracker.ai_analyses_this_month or 0,
+            month_start=tracker.month_start,
+            family_owner_id=family_owner_id,
+        )
+        return entitlements.store(snapshot, token)
+
+    def _check(self, user_id: int, denied: Callable[[Entitlements], bool]) -> Tuple[Entitlements, bool]:
+        """Run a quota check; a cached snapshot that would deny is re-checked against a fresh one."""
+        snapshot = self.get_entitlements(user_id)
+        if denied(snapshot):
+            snapshot = self.get_entitlements(user_id, fresh=True)
+        return snapshot, denied(snapshot)
+
+    def get_user_tier(self, user_id: int) -> str:
+        """Get user's current subscription tier."""
+        return self.get_entitlements(user_id).tier
 
     def get_tier_limits(self, tier: str) -> Dict[str, Any]:
         """Get limits for a tier."""
@@ -164,19 +204,15 @@ class SubscriptionService:
 
     def get_user_limits(self, user_id: int) -> Dict[str, Any]:
         """Get effective limits for a user."""
-        tier = self.get_user_tier(user_id)
-        return self.get_tier_limits(tier)
+        return self.get_entitlements(user_id).limits.copy()
 
     def check_can_add_provider(self, user_id: int) -> Tuple[bool, str]:
         """Check if user can add another provider."""
-        limits = self.get_user_limits(user_id)
-        current_count = self.db.query(LinkedAccount).filter(
-            LinkedAccount.user_id == user_id
-        ).count()
+        snapshot, denied = self._check(user_id, lambda e: e.providers >= e.limits["max_providers"])
 
-        if current_count >= limits["max_providers"]:
-            tier = self.get_user_tier(user_id)
-            if tier == "free":
+        if denied:
+            limits = snapshot.limits
+            if snapshot.tier == "free":
                 return False, "Ai atins limita de 1 provider medical. Upgradează la Premium pentru provideri nelimitați."
             return False, f"Ai atins limita de {limits['max_providers']} provideri."
 
@@ -184,14 +220,11 @@ class SubscriptionService:
 
     def check_can_upload_document(self, user_id: int) -> Tuple[bool, str]:
         """Check if user can upload more documents."""
-        limits = self.get_user_limits(user_id)
-        current_count = self.db.query(Document).filter(
-            Document.user_id == user_id
-        ).count()
+        snapshot, denied = self._check(user_id, lambda e: e.documents >= e.limits["max_documents"])
 
-        if current_count >= limits["max_documents"]:
-            tier = self.get_user_tier(user_id)
-            if tier == "free":
+        if denied:
+            limits = snapshot.limits
+            if snapshot.tier == "free":
                 return False, f"Ai atins limita de {limits['max_documents']} documente. Upgradează la Premium pentru 500 documente."
             return False, f"Ai atins limita de {limits['max_documents']} documente."
 
@@ -199,20 +232,21 @@ class SubscriptionService:
 
     def check_can_run_analysis(self, user_id: int, specialist_type: str = "general") -> Tuple[bool, str]:
         """Check if user can run an AI analysis."""
-        limits = self.get_user_limits(user_id)
-        tracker = self.get_or_create_usage_tracker(user_id)
-
-        # Reset monthly counter if needed
-        self._check_and_reset_monthly_usage(tracker)
+        def specialist_denied(e: Entitlements) -> bool:
+            return e.limits["specialists"] != ["all"] and specialist_type not in e.limits["specialists"]
 
         # Check specialist access
-        if limits["specialists"] != ["all"] and specialist_type not in limits["specialists"]:
+        snapshot, denied = self._check(user_id, specialist_denied)
+        if denied:
             return False, f"Analizele de specialitate ({specialist_type}) sunt disponibile doar în planul Premium."
 
-        # Check monthly limit
-        if tracker.ai_analyses_this_month >= limits["ai_analyses_per_month"]:
-            tier = self.get_user_tier(user_id)
-            if tier == "free":
+        # Check monthly limit (the snapshot resets it when a new month starts)
+        snapshot, denied = self._check(
+            user_id, lambda e: e.ai_analyses_this_month >= e.limits["ai_analyses_per_month"]
+        )
+        if denied:
+            limits = snapshot.limits
+            if snapshot.tier == "free":
                 return False, f"Ai folosit toate cele {limits['ai_analyses_per_month']} analize AI din această lună. Upgradează la Premium pentru 30 analize/lună."
             return False, f"Ai atins limita de {limits['ai_analyses_per_month']} analize AI pentru această lună."
 
@@ -270,21 +304,15 @@ class SubscriptionService:
 
     def get_usage_stats(self, user_id: int) -> Dict[str, Any]:
         """Get current usage statistics for a user."""
-        limits = self.get_user_limits(user_id)
+        # Shown to the user: always from a fresh snapshot (which also refreshes the cache)
+        snapshot = self.get_entitlements(user_id, fresh=True)
+        limits = snapshot.limits.copy()
         tracker = self.get_or_create_usage_tracker(user_id)
-        self._check_and_reset_monthly_usage(tracker)
-
-        # Get actual counts
-        document_count = self.db.query(Document).filter(
-            Document.user_id == user_id
-        ).count()
-
-        provider_count = self.db.query(LinkedAccount).filter(
-            LinkedAccount.user_id == user_id
-        ).count()
+        document_count = snapshot.documents
+        provider_count = snapshot.providers
 
         return {
-            "tier": self.get_user_tier(user_id),
+            "tier": snapshot.tier,
             "limits": limits,
             "usage": {
                 "documents": document_count,
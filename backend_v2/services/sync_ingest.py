@@ -0,0 +1,130 @@
+"""
+Sync Ingest
+Set-based duplicate detection and bulk document creation for synced files.
+
+A sync can download hundreds of PDFs. Instead of hashing and querying one
+file at a time, the ingest stage:
+1. Hashes every downloaded file concurrently with large buffered reads
+2. Drops files repeated within the download itself
+3. Resolves duplicates against stored documents with one IN (...) query per
+   batch on the (user_id, file_hash) unique index, plus one for filenames
+4. Inserts the surviving documents in a single transaction
+
+The unique index also stops two concurrent syncs from storing the same file
+twice; the losing insert is skipped rather than failing the sync.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from backend_v2.models import Document
+except ImportError:
+    from models import Document
+
+logger = logging.getLogger(__name__)
+
+HASH_WORKERS = int(os.getenv("SYNC_HASH_WORKERS", "4"))
+HASH_BUFFER_SIZE = 1024 * 1024  # 1 MB reads
+
+# Values per IN (...) clause
+LOOKUP_BATCH_SIZE = 500
+
+
+def hash_file(file_path: str) -> Optional[str]:
+    """MD5 of a file's content (matches Document.file_hash), or None if unreadable."""
+    hasher = hashlib.md5()
+    try:
+        with open(file_path, "rb", buffering=0) as f:
+            buffer = bytearray(HASH_BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(view[:read])
+        return hasher.hexdigest()
+    except Exception:
+        return None
+
+
+def hash_files(paths: List[str]) -> Dict[str, Optional[str]]:
+    """Hash files concurrently (hashlib releases the GIL on large buffers)."""
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(HASH_WORKERS, len(paths))) as executor:
+        return dict(zip(paths, executor.map(hash_file, paths)))
+
+
+def _existing_values(db, user_id: int, column, values: List[str]) -> set:
+    existing = set()
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        rows = db.query(column).filter(
+            Document.user_id == user_id,
+            column.in_(values[start:start + LOOKUP_BATCH_SIZE])
+        ).all()
+        existing.update(row[0] for row in rows)
+    return existing
+
+
+def select_new_documents(db, user_id: int, docs: List[Dict]) -> List[Dict]:
+    """
+    Return the downloaded docs not already stored for the user, in download
+    order, each with its "file_hash" set. Duplicates are matched by content
+    hash first, then by filename.
+    """
+    hashes = hash_files([doc_info["local_path"] for doc_info in docs])
+
+    # Duplicates within this download
+    candidates, seen_hashes, seen_names = [], set(), set()
+    for doc_info in docs:
+        file_hash = hashes.get(doc_info["local_path"])
+        if (file_hash and file_hash in seen_hashes) or doc_info["filename"] in seen_names:
+            continue
+        if file_hash:
+            seen_hashes.add(file_hash)
+        seen_names.add(doc_info["filename"])
+        candidates.append(dict(doc_info, file_hash=file_hash))
+
+    existing_hashes = _existing_values(db, user_id, Document.file_hash, sorted(seen_hashes))
+    existing_names = _existing_values(db, user_id, Document.filename, sorted(seen_names))
+
+    new_docs = [
+        doc_info for doc_info in candidates
+        if doc_info["file_hash"] not in existing_hashes and doc_info["filename"] not in existing_names
+    ]
+    skipped = len(docs) - len(new_docs)
+    if skipped:
+        logger.debug(f"Skipping {skipped} already stored documents for user {user_id}")
+    return new_docs
+
+
+def insert_documents(db, documents: List[Document]) -> List[Document]:
+    """
+    Insert documents in one transaction and return those stored (with ids).
+    If a concurrent sync stored the same file first, only that document is
+    skipped.
+    """
+    if not documents:
+        return []
+    try:
+        db.add_all(documents)
+        db.commit()
+        return documents
+    except IntegrityError:
+        db.rollback()
+
+    stored = []
+    for document in documents:
+        try:
+            with db.begin_nested():
+                db.add(document)
+            stored.append(document)
+        except IntegrityError:
+            logger.debug(f"Skipping {document.filename}: stored by a concurrent sync")
+    db.commit()
+    return stored
@@ -0,0 +1,376 @@
+"""
+Sync Queue
+Provider syncs as rows in sync_jobs, run by out-of-process crawler workers.
+
+With SYNC_EXECUTION=worker the API and the scheduler only enqueue: a manual
+sync or a due account becomes a pending SyncJob, and crawler_worker
+processes (any number, on any host sharing the database) claim and run
+them. Status flows back through the database - the SyncJob row for the
+job itself, sync_progress for the live progress the clients stream.
+
+Jobs are leased rather than locked:
+- claim is a compare-and-set UPDATE (pending -> running) that records the
+  owner (worker_id) and a lease expiry, and is refused while the account
+  has another job with a live lease - two workers never sync one account
+- the owner renews the lease every HEARTBEAT_SECONDS from a keepalive
+  thread and from the crawler status callback; a renewal that finds the job
+  taken over stops the crawler (LeaseLostError)
+- a running job whose lease expired (its worker crashed or was killed) is
+  reclaimed by the next claim: back to pending, or failed after
+  MAX_ATTEMPTS. Capacity frees up within LEASE_SECONDS of a crash.
+- after MAX_RUN_SECONDS the lease is given up: it is no longer renewed, the
+  run's next heartbeat raises LeaseLostError and its outcome is discarded,
+  so a hung sync never holds the account forever or writes after a rerun
+
+The default, SYNC_EXECUTION=inline, runs manual and scheduled syncs in API
+threads with the same claim and lease protocol.
+
+Workers decrypt provider credentials with the service-unlocked vault only
+(VAULT_SERVICE_KEY, see user_vault). A user without a service-encrypted key
+has an unlocked vault only in the API process they logged in to, so their
+manual syncs run inline there even with SYNC_EXECUTION=worker. Their
+scheduled syncs still go to the workers, which fail them as vault-locked.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import exists, or_, select, update
+from sqlalchemy.orm import aliased
+
+try:
+    from backend_v2.models import SyncJob, LinkedAccount
+except ImportError:
+    from models import SyncJob, LinkedAccount
+
+logger = logging.getLogger(__name__)
+
+SYNC_EXECUTION = os.getenv("SYNC_EXECUTION", "inline")
+
+LEASE_SECONDS = int(os.getenv("SYNC_LEASE_SECONDS", "30"))
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3
+MAX_ATTEMPTS = int(os.getenv("SYNC_MAX_ATTEMPTS", "3"))
+# Longest a sync may hold its lease (login, download and processing)
+MAX_RUN_SECONDS = int(os.getenv("SYNC_MAX_RUN_SECONDS", "900"))
+
+# Pending jobs looked at per claim attempt
+CLAIM_BATCH_SIZE = 10
+
+ACTIVE_STATUSES = ("pending", "running")
+
+# Owner id of syncs run in this process by the scheduler (inline mode)
+INLINE_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:inline"
+
+
+class LeaseLostError(Exception):
+    """The job's lease expired and it was reclaimed; this run must stop."""
+    pass
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _session_factory():
+    try:
+        from backend_v2.database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+    return SessionLocal
+
+
+def use_worker() -> bool:
+    """True when syncs are run by crawler workers instead of API threads."""
+    return SYNC_EXECUTION == "worker"
+
+
+def _active_job(db, account) -> Optional[SyncJob]:
+    return db.query(SyncJob).filter(
+        SyncJob.linked_account_id == account.id,
+        SyncJob.status.in_(ACTIVE_STATUSES)
+    ).first()
+
+
+def enqueue(db, account, source: str = "scheduled") -> SyncJob:
+    """Queue a sync of a linked account; returns the account's active job if it already has one."""
+    active = _active_job(db, account)
+    if active:
+        return active
+
+    job = SyncJob(
+        user_id=account.user_id,
+        linked_account_id=account.id,
+        provider_name=account.provider_name,
+        status="pending",
+        source=source,
+    )
+    db.add(job)
+    db.commit()
+    logger.info(f"Queued {source} sync job {job.id} for {account.provider_name} (account {account.id})")
+    return job
+
+
+def enqueue_claimed(db, account, worker_id: str, source: str = "manual") -> Optional[SyncJob]:
+    """
+    Queue a sync of a linked account already leased to worker_id, so no
+    crawler worker picks it up first. Claims the account's pending job if it
+    has one; None if its job is running elsewhere.
+    """
+    reclaim_expired(db)
+    active = _active_job(db, account)
+    if active:
+        return claim(db, worker_id, job_id=active.id) if active.status == "pending" else None
+
+    now = _now()
+    job = SyncJob(
+        user_id=account.user_id,
+        linked_account_id=account.id,
+        provider_name=account.provider_name,
+        status="running",
+        source=source,
+        worker_id=worker_id,
+        started_at=now,
+        heartbeat_at=now,
+        lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+    )
+    db.add(job)
+    db.commit()
+    logger.info(f"Claimed new {source} sync job {job.id} for {account.provider_name} "
+                f"(account {account.id}) as {worker_id}")
+    return job
+
+
+def reclaim_expired(db) -> int:
+    """Requeue (or fail, after MAX_ATTEMPTS) running jobs whose lease expired."""
+    now = _now()
+    expired = db.query(SyncJob).filter(
+        SyncJob.status == "running",
+        or_(SyncJob.lease_expires_at.is_(None), SyncJob.lease_expires_at < now)
+    ).all()
+
+    reclaimed = 0
+    for job in expired:
+        attempts = (job.retry_count or 0) + 1
+        give_up = attempts >= MAX_ATTEMPTS
+        values = {"worker_id": None, "lease_expires_at": None, "retry_count": attempts}
+        if give_up:
+            values.update(status="failed", completed_at=now,
+                          error_message=f"Sync worker stopped responding ({attempts} attempts)")
+        else:
+            values.update(status="pending", started_at=None)
+        # Compare-and-set: another reclaimer or a late heartbeat may have won
+        result = db.execute(
+            update(SyncJob)
+            .where(SyncJob.id == job.id, SyncJob.status == "running",
+                   or_(SyncJob.lease_expires_at.is_(None), SyncJob.lease_expires_at < now))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            continue
+        reclaimed += 1
+        account = db.get(LinkedAccount, job.linked_account_id)
+        if account:
+            if give_up:
+                account.status = "ERROR"
+                account.last_sync_error = values["error_message"]
+                account.error_type = "server_error"
+                account.consecutive_failures = (account.consecutive_failures or 0) + 1
+            elif account.status == "SYNCING":
+                account.status = "ACTIVE"
+        logger.warning(f"Reclaimed sync job {job.id} from {job.worker_id}: "
+                       f"{'failed' if give_up else 'requeued'} (attempt {attempts})")
+    db.commit()
+    return reclaimed
+
+
+def claim(db, worker_id: str, job_id: int = None, skip_providers: List[str] = ()) -> Optional[SyncJob]:
+    """
+    Atomically take the oldest pending job (or job_id) whose account has no
+    live job, leasing it to worker_id for LEASE_SECONDS. Jobs of
+    skip_providers (see provider_health) stay queued.
+    """
+    reclaim_expired(db)
+
+    query = db.query(SyncJob.id).filter(SyncJob.status == "pending")
+    if job_id is not None:
+        query = query.filter(SyncJob.id == job_id)
+    if skip_providers:
+        query = query.filter(SyncJob.provider_name.notin_(skip_providers))
+    candidates = query.order_by(SyncJob.created_at, SyncJob.id).limit(CLAIM_BATCH_SIZE).all()
+
+    running = aliased(SyncJob)
+    for (candidate_id,) in candidates:
+        now = _now()
+        result = db.execute(
+            update(SyncJob)
+            .where(
+                SyncJob.id == candidate_id,
+                SyncJob.status == "pending",
+                ~exists(select(running.id).where(
+                    running.linked_account_id == SyncJob.linked_account_id,
+                    running.status == "running",
+                    running.lease_expires_at >= now
+                ))
+            )
+            .values(status="running", worker_id=worker_id, started_at=now, heartbeat_at=now,
+                    lease_expires_at=now + timedelta(seconds=LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return db.get(SyncJob, candidate_id, populate_existing=True)
+    return None
+
+
+def renew(db, job_id: int, worker_id: str) -> bool:
+    """Extend the lease of a job this worker owns; False if it was reclaimed."""
+    now = _now()
+    result = db.execute(
+        update(SyncJob)
+        .where(SyncJob.id == job_id, SyncJob.worker_id == worker_id, SyncJob.status == "running")
+        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _owns(db, job_id: int, worker_id: str) -> bool:
+    with db.no_autoflush:
+        row = db.query(SyncJob.worker_id, SyncJob.status).filter(SyncJob.id == job_id).first()
+    return row is not None and row.worker_id == worker_id and row.status == "running"
+
+
+def owns(db, job: SyncJob, worker_id: str) -> bool:
+    """True while worker_id still holds the job (checked before writing its outcome)."""
+    return _owns(db, job.id, worker_id)
+
+
+def finish(db, job: SyncJob, error: str = None) -> bool:
+    """Mark a job completed, or failed with an error, unless it was reclaimed meanwhile."""
+    result = db.execute(
+        update(SyncJob)
+        .where(SyncJob.id == job.id, SyncJob.worker_id == job.worker_id, SyncJob.status == "running")
+        .values(status="failed" if error else "completed", error_message=error,
+                completed_at=_now(), lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    db.refresh(job)
+    return result.rowcount == 1
+
+
+def requeue(db, job_id: int, count_attempt: bool = True):
+    """
+    Put a job a worker gave up on (shutdown) back in the queue. Without
+    count_attempt it was never started, so it does not use up a retry.
+    """
+    retry_count = SyncJob.retry_count + 1 if count_attempt else SyncJob.retry_count
+    db.execute(
+        update(SyncJob)
+        .where(SyncJob.id == job_id, SyncJob.status == "running")
+        .values(status="pending", worker_id=None, started_at=None, lease_expires_at=None,
+                retry_count=retry_count)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+# --- Lease keeping ------------------------------------------------------------
+
+# Leases held in this process, by (user_id, provider_name), for the status callback
+_held: Dict[Tuple[int, str], "Lease"] = {}
+_held_lock = threading.Lock()
+
+
+class Lease:
+    """Keeps a claimed job's lease alive while this process runs it."""
+
+    def __init__(self, job: SyncJob, session_factory=None):
+        self.job_id = job.id
+        self.worker_id = job.worker_id
+        self.key = (job.user_id, job.provider_name)
+        self.session_factory = session_factory or _session_factory()
+        self.lost = False
+        self.last_renewed = time.monotonic()
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._keepalive, name=f"lease-{job.id}", daemon=True)
+
+    def renew(self) -> bool:
+        if self.lost:
+            return False
+        if time.monotonic() - self.started > MAX_RUN_SECONDS:
+            # Let a hung sync's lease run out, and stop it before the job is rerun elsewhere
+            self.lost = True
+            logger.error(f"Sync job {self.job_id} ran past {MAX_RUN_SECONDS}s - giving up its lease")
+            return False
+        db = self.session_factory()
+        try:
+            if renew(db, self.job_id, self.worker_id):
+                self.last_renewed = time.monotonic()
+            else:
+                self.lost = True
+                logger.error(f"Lease on sync job {self.job_id} lost - it was reclaimed")
+        except Exception as e:
+            logger.warning(f"Lease renewal of sync job {self.job_id} failed: {e}")
+        finally:
+            db.close()
+        return not self.lost
+
+    def holds(self, db) -> bool:
+        """True while the lease is live and the job still belongs to this worker."""
+        return not self.lost and _owns(db, self.job_id, self.worker_id)
+
+    def heartbeat(self):
+        """From the crawler status callback: renew if due, stop the crawler if the job was taken over."""
+        if not self.lost and time.monotonic() - self.last_renewed >= HEARTBEAT_SECONDS:
+            self.renew()
+        if self.lost:
+            raise LeaseLostError(f"Sync job {self.job_id} was reclaimed by another worker")
+
+    def _keepalive(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            if not self.renew():
+                return
+
+    def start(self):
+        with _held_lock:
+            _held[self.key] = self
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with _held_lock:
+            if _held.get(self.key) is self:
+                del _held[self.key]
+
+
+@contextmanager
+def hold_lease(job: SyncJob, session_factory=None):
+    """Renew the job's lease for the duration of the block."""
+    lease = Lease(job, session_factory)
+    lease.start()
+    try:
+        yield lease
+    finally:
+        lease.stop()
+
+
+def heartbeat(user_id: int, provider_name: str):
+    """Crawler status callback hook: renew the lease of the sync running here, if any."""
+    lease = _held.get((user_id, provider_name))
+    if lease:
+        lease.heartbeat()
+
+
+def holds_lease(db, user_id: int, provider_name: str) -> bool:
+    """Checked before a sync running here writes its outcome: False once its lease was lost."""
+    lease = _held.get((user_id, provider_name))
+    return lease is None or lease.holds(db)
@@ -1,10 +1,18 @@
 """
 Sync status tracking for real-time feedback to users.
+
+Every update is also published on the progress bus, which pushes it to
+/users/sync-events subscribers and shares it with other workers.
 """
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 import threading
 
+try:
+    from backend_v2.services import progress_bus
+except ImportError:
+    from services import progress_bus
+
 # In-memory status store (per user, per provider)
 # Structure: {user_id: {provider_name: SyncStatus}}
 _sync_status: Dict[int, Dict[str, dict]] = {}
@@ -13,56 +21,51 @@ _lock = threading.Lock()
 # Cleanup threshold - remove completed statuses older than this
 STATUS_CLEANUP_MINUTES = 30
 
+# Status key for manual upload processing (syncs use the provider name)
+UPLOAD_CHANNEL = "upload"
 
-_last_cleanup: Optional[datetime] = None
 
 def get_status(user_id: int, provider_name: str) -> Optional[dict]:
-    """Get current sync status for a user/provider."""
-    global _last_cleanup
-
-    # Periodic cleanup (every 5 minutes)
-    if _last_cleanup is None or datetime.now() - _last_cleanup > timedelta(minutes=5):
-        _last_cleanup = datetime.now()
-        # Run cleanup in a separate thread to avoid blocking
-        cleanup_thread = threading.Thread(target=cleanup_old_statuses, daemon=True)
-        cleanup_thread.start()
-
+    """Get current sync status for a user/provider, from any worker."""
     with _lock:
         if user_id in _sync_status and provider_name in _sync_status[user_id]:
             return _sync_status[user_id][provider_name].copy()
-    return None
+    # Not running in this worker - another worker may be syncing it
+    return progress_bus.load_status(user_id, provider_name)
 
 
 def set_status(user_id: int, provider_name: str, stage: str, message: str,
                progress: int = 0, total: int = 0, is_complete: bool = False,
                is_error: bool = False, error_type: str = None):
-    """Update sync status for a user/provider."""
+    """Update sync status for a user/provider and publish it."""
+    status = progress_bus.publish(user_id, provider_name, {
+        "stage": stage,
+        "message": message,
+        "progress": progress,
+        "total": total,
+        "is_complete": is_complete,
+        "is_error": is_error,
+        "error_type": error_type,
+        "updated_at": datetime.now().isoformat()
+    })
     with _lock:
         if user_id not in _sync_status:
             _sync_status[user_id] = {}
-
-        _sync_status[user_id][provider_name] = {
-            "stage": stage,
-            "message": message,
-            "progress": progress,
-            "total": total,
-            "is_complete": is_complete,
-            "is_error": is_error,
-            "error_type": error_type,
-            "updated_at": datetime.now().isoformat()
-        }
+        _sync_status[user_id][provider_name] = status
+    return status
 
 
 def clear_status(user_id: int, provider_name: str):
-    """Clear sync status after completion."""
+    """Clear sync status after completion, here and for every worker."""
     with _lock:
         if user_id in _sync_status and provider_name in _sync_status[user_id]:
             del _sync_status[user_id][provider_name]
+    progress_bus.clear(user_id, provider_name)
 
 
 # Convenience functions for common stages
 def status_starting(user_id: int, provider_name: str):
-    set_status(user_id, provider_name, "starting", "Starting sync...")
+    return set_status(user_id, provider_name, "starting", "Starting sync...")
 
 
 def status_logging_in(user_id: int, provider_name: str):
@@ -116,8 +119,8 @@ def status_error(user_id: int, provider_name: str, error_msg: str, error_type: s
 
 
 def cleanup_old_statuses():
-    """Remove completed status entries older than STATUS_CLEANUP_MINUTES.
-    Call this periodically to prevent memory leaks."""
+    """Remove completed status entries older than STATUS_CLEANUP_MINUTES,
+    here and in the shared progress store. Run by the scheduler janitor."""
     cutoff = datetime.now() - timedelta(minutes=STATUS_CLEANUP_MINUTES)
 
     with _lock:
@@ -143,3 +146,5 @@ def cleanup_old_statuses():
 
         for user_id in users_to_remove:
             del _sync_status[user_id]
+
+    progress_bus.prune(STATUS_CLEANUP_MINUTES)
@@ -0,0 +1,97 @@
+"""
+Sync Watermark
+Per-account incremental sync state for the provider crawlers.
+
+LinkedAccount.sync_state (JSON) remembers what the last successful syncs saw:
+- known: identifiers of documents already synced, newest first (document
+  URL, or a row key where the portal has no links)
+- expected_count: the document count the portal reported, once every one
+  of them has been synced
+
+A crawler given the watermark skips known documents instead of downloading
+them again, stops walking a newest-first list once it reaches a run of known
+rows, and ends the sync right after the count check when the portal still
+lists the same number of documents. The state is only saved after a sync
+completed, so a failed sync never hides documents from the next one, and
+documents that were downloaded but could not be stored are forgotten first.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Identifiers kept per account
+MAX_KNOWN = 1000
+
+# Known rows in a row after which a newest-first list is assumed fully synced
+KNOWN_STREAK_LIMIT = 3
+
+
+class SyncWatermark:
+    """What an account has already synced, plus what the current run saw."""
+
+    def __init__(self, known: Iterable[str] = (), expected_count: Optional[int] = None):
+        self.known_order: List[str] = list(known)
+        self.known = set(self.known_order)
+        self.expected_count = expected_count
+        # Filled in by the crawler during the run
+        self.seen: List[str] = []
+        self.reported_count: Optional[int] = None
+        self.skipped = 0
+
+    def is_known(self, key: Optional[str]) -> bool:
+        return bool(key) and key in self.known
+
+    def mark_seen(self, key: Optional[str]):
+        if key and key not in self.seen:
+            self.seen.append(key)
+
+    def forget(self, key: Optional[str]):
+        """Un-see a downloaded document that could not be stored, so the next sync fetches it again."""
+        if key in self.seen:
+            self.seen.remove(key)
+
+    def is_unchanged(self, reported_count: int) -> bool:
+        """True when the portal reports the same count as the last sync, which saw them all."""
+        return bool(self.known) and reported_count > 0 and reported_count == self.expected_count
+
+    def filter_jobs(self, jobs: List[Dict]) -> List[Dict]:
+        """Drop download jobs for known documents (keyed by "key", else URL)."""
+        new_jobs = []
+        for job in jobs:
+            key = job["key"] = job.get("key") or job.get("url")
+            if self.is_known(key):
+                self.mark_seen(key)
+                self.skipped += 1
+            else:
+                new_jobs.append(job)
+        return new_jobs
+
+
+def load(account) -> SyncWatermark:
+    """Watermark for a LinkedAccount (empty - a full sync - if it has none)."""
+    try:
+        state = json.loads(account.sync_state) if account.sync_state else {}
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring unreadable sync state of account {account.id}")
+        state = {}
+    return SyncWatermark(state.get("known", []), state.get("expected_count"))
+
+
+def record(account, watermark: SyncWatermark):
+    """Fold a completed sync into the account's state (the caller commits)."""
+    seen = set(watermark.seen)
+    known = watermark.seen + [key for key in watermark.known_order if key not in seen]
+    expected_count = watermark.reported_count
+    if expected_count is None or expected_count <= 0:
+        expected_count = watermark.expected_count
+    elif len(known) < expected_count:
+        # Some documents were missed: keep the next sync from ending at the count check
+        expected_count = None
+    account.sync_state = json.dumps({
+        "known": known[:MAX_KNOWN],
+        "expected_count": expected_count,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
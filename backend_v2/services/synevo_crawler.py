@@ -1,6 +1,3 @@
-import os
-import datetime
-import requests
 from typing import Dict, Any, List
 from playwright.sync_api import Page
 
@@ -10,6 +7,10 @@ except ImportError:
     from services.base import BaseCrawler
 
 
+CONSENT_TEXTS = ["Accept", "Accept toate", "De acord", "I agree"]
+PDF_LINK_SELECTOR = "a[href*='/Orders/ResultsPDF/']"
+
+
 class SynevoCrawler(BaseCrawler):
     def __init__(self, headless: bool = True, user_id: int = None):  # Headless by default
         super().__init__("synevo", headless, user_id)
@@ -22,8 +23,9 @@ class SynevoCrawler(BaseCrawler):
 
         try:
             # Handle Cookie Consent if it appears
-            page.wait_for_timeout(2000)
-            for text in ["Accept", "Accept toate", "De acord", "I agree"]:
+            banner = self.wait_for_any(page, [f'text="{text}"' for text in CONSENT_TEXTS],
+                                       "cookie banner", kind="consent")
+            for text in CONSENT_TEXTS if banner else []:
                 btn = page.get_by_text(text, exact=True)
                 if btn.count() > 0:
                     btn.first.click()
@@ -72,28 +74,30 @@ class SynevoCrawler(BaseCrawler):
         # Try Enter key to submit
         self.log("Pressing Enter to login...")
         page.keyboard.press("Enter")
-        page.wait_for_timeout(2000)
 
-        self.log("Clicking login (fallback)...")
-        try:
-            page.locator("button.btnAuth").click(timeout=3000)
-        except:
-            pass
+        def left_login(url):
+            return "Account/Login" not in url
 
-        try:
-            page.get_by_role("button", name="Autentificare").click(timeout=3000)
-        except:
-            pass
+        if not self.wait_for_url(page, left_login, "login redirect", kind="login_step"):
+            self.log("Clicking login (fallback)...")
+            try:
+                page.locator("button.btnAuth").click(timeout=3000)
+            except:
+                pass
+
+            try:
+                page.get_by_role("button", name="Autentificare").click(timeout=3000)
+            except:
+                pass
 
         self.log("Checking login status...")
-        try:
-            page.wait_for_url(lambda u: "Account/Login" not in u, timeout=20000)
+        if self.wait_for_url(page, left_login, "login redirect"):
             self.log("Login URL changed, assuming success.")
-        except:
+        else:
             self.log("URL did not change, might be stuck or SPA.")
 
         # Final check
-        page.wait_for_timeout(5000)
+        page.wait_for_load_state("domcontentloaded")
         current_url = page.url
         if "webresults" in current_url and "Login" not in current_url:
             self.log("Login Successful (Dashboard detected).")
@@ -103,15 +107,14 @@ class SynevoCrawler(BaseCrawler):
 
     def navigate_to_records_sync(self, page: Page):
         self.log("Verifying we are on the dashboard/records page...")
-        try:
-            page.wait_for_selector("a[href*='/Orders/ResultsPDF/']", timeout=10000)
+        if self.wait_for(page, PDF_LINK_SELECTOR, "results list", state="attached", timeout=10000):
             self.log("Records detected (Download buttons visible).")
-        except:
+        else:
             self.log("Download buttons not immediately visible. Attempting to ensure we are on the results page...")
             if "webresults" not in page.url:
                 self.log("Not on webresults, navigating manually...")
                 page.goto(self.dashboard_url)
-            page.wait_for_timeout(3000)
+            self.wait_for(page, PDF_LINK_SELECTOR, "results list", state="attached")
 
     def get_expected_document_count(self, page: Page) -> int:
         """
@@ -124,7 +127,7 @@ class SynevoCrawler(BaseCrawler):
             import re
 
             # Count PDF download links directly - this is the most reliable for Synevo
-            pdf_links = page.locator("a[href*='/Orders/ResultsPDF/']").all()
+            pdf_links = page.locator(PDF_LINK_SELECTOR).all()
             if pdf_links:
                 count = len(pdf_links)
                 self.log(f"Found {count} PDF links (expected document count)")
@@ -152,121 +155,33 @@ class SynevoCrawler(BaseCrawler):
             self.log(f"Error getting expected count: {e}")
             return -1
 
-    def extract_documents_sync(self, page: Page) -> List[Dict[str, Any]]:
-        extracted = []
+    def enumerate_documents_sync(self, page: Page) -> List[Dict[str, Any]]:
+        """Collect the result PDF URLs; the download engine fetches them in parallel."""
         self.log("Scanning for documents...")
 
-        page.wait_for_timeout(5000)  # Wait for list to load
-
-        # Selector identified: a[href*='/Orders/ResultsPDF/']
-        pdf_links = page.locator("a[href*='/Orders/ResultsPDF/']").all()
+        # Wait for list to load
+        self.wait_for(page, PDF_LINK_SELECTOR, "results list", state="attached")
+        pdf_links = page.locator(PDF_LINK_SELECTOR).all()
 
         self.log(f"Found {len(pdf_links)} potential PDF links.")
 
         if len(pdf_links) == 0:
             self.log("No PDF links found. Dumping DOM for debug.")
             page.screenshot(path=f"{self.download_dir}/no_pdfs_found.png")
-            return extracted
+            return []
 
         # Get all href values first to avoid stale element issues
-        pdf_urls = []
+        jobs = []
         for link in pdf_links:
             href = link.get_attribute("href")
             if href:
                 if href.startswith("/"):
                     href = f"https://webresults.synevo.ro{href}"
-                pdf_urls.append(href)
-
-        total_docs = len(pdf_urls)
-        self.log(f"Collected {total_docs} PDF URLs.")
+                doc_id = href.rstrip("/").split("/")[-1]
+                jobs.append({"url": href, "filename": f"{doc_id}.pdf", "category": "Analize Synevo"})
 
-        # Get cookies from the browser context for authenticated requests
-        cookies = page.context.cookies()
-        cookie_header = "; ".join([f"{c['name']}={c['value']}" for c in cookies])
+        self.log(f"Collected {len(jobs)} PDF URLs.")
+        return jobs
 
-        for i, pdf_url in enumerate(pdf_urls):
-            try:
-                current = i + 1
-                self.log(f"Processing document {current}/{total_docs}...")
-                self.update_status("downloading", f"Downloading {current}/{total_docs}", current, total_docs)
-
-                # Extract filename from URL
-                url_parts = pdf_url.rstrip("/").split("/")
-                doc_id = url_parts[-1] if url_parts else f"doc_{i}"
-                filename = f"{doc_id}.pdf"
-                target_path = os.path.join(self.download_dir, filename)
-
-                download_success = False
-
-                # Try Method 1: expect_download
-                try:
-                    with page.expect_download(timeout=10000) as download_info:
-                        page.goto(pdf_url)
-                    download = download_info.value
-                    if os.path.exists(target_path):
-                        os.remove(target_path)
-                    download.save_as(target_path)
-                    download_success = True
-                    self.log(f"Downloaded via browser: {filename}")
-                except Exception as e1:
-                    self.log(f"Browser download failed, trying direct fetch: {e1}")
-
-                # Try Method 2: Direct HTTP request with session cookies
-                if not download_success:
-                    try:
-                        headers = {
-                            "Cookie": cookie_header,
-                            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                        }
-                        response = requests.get(pdf_url, headers=headers, timeout=60)
-                        if response.status_code == 200:
-                            if os.path.exists(target_path):
-                                os.remove(target_path)
-                            with open(target_path, "wb") as f:
-                                f.write(response.content)
-                            download_success = True
-                            self.log(f"Downloaded via HTTP: {filename}")
-                        else:
-                            self.log(f"HTTP request failed with status {response.status_code}")
-                    except Exception as e2:
-                        self.log(f"Direct HTTP download failed: {e2}")
-
-                # Try Method 3: Open in new tab and capture response
-                if not download_success:
-                    try:
-                        new_page = page.context.new_page()
-                        response = new_page.goto(pdf_url, wait_until="networkidle")
-                        if response and response.ok:
-                            content_type = response.headers.get("content-type", "")
-                            if "pdf" in content_type.lower() or "octet-stream" in content_type.lower():
-                                body = response.body()
-                                if os.path.exists(target_path):
-                                    os.remove(target_path)
-                                with open(target_path, "wb") as f:
-                                    f.write(body)
-                                download_success = True
-                                self.log(f"Downloaded via new tab: {filename}")
-                        new_page.close()
-                    except Exception as e3:
-                        self.log(f"New tab download failed: {e3}")
-
-                if download_success and os.path.exists(target_path):
-                    extracted.append({
-                        "filename": filename,
-                        "local_path": target_path,
-                        "date": datetime.datetime.now(),
-                        "category": "Analize Synevo"
-                    })
-                else:
-                    self.log(f"All download methods failed for document {i}")
-
-                # Navigate back to the main page for next iteration
-                if page.url != self.dashboard_url:
-                    page.goto(self.dashboard_url)
-                    page.wait_for_timeout(2000)
-
-            except Exception as e:
-                self.log(f"Failed to download document {i}: {e}")
-                continue
-
-        return extracted
+    def extract_documents_sync(self, page: Page) -> List[Dict[str, Any]]:
+        return self.download_documents(page, self.enumerate_documents_sync(page))
@@ -12,10 +12,14 @@ from sqlalchemy.orm import Session
 try:
     from backend_v2.models import User, LinkedAccount, Document, TestResult, HealthReport
     from backend_v2.services.user_vault import UserVault
+    from backend_v2.services import report_cache
+    from backend_v2.services import encrypted_records
     from backend_v2.services.vault import vault as global_vault
 except ImportError:
     from models import User, LinkedAccount, Document, TestResult, HealthReport
     from services.user_vault import UserVault
+    from services import report_cache
+    from services import encrypted_records
     from services.vault import vault as global_vault
 
 logger = logging.getLogger(__name__)
@@ -177,17 +181,15 @@ def migrate_user_to_per_user_vault(
             results = db.query(TestResult).filter(
                 TestResult.document_id.in_(doc_ids),
                 TestResult.value_enc.is_(None),
+                TestResult.record_enc.is_(None),
                 TestResult.value.isnot(None)
             ).all()
 
             for result in results:
                 try:
-                    if result.value:
-                        result.value_enc = user_vault.encrypt_data(result.value)
-                        result.value = None
-                    if result.numeric_value is not None:
-                        result.numeric_value_enc = user_vault.encrypt_number(result.numeric_value)
-                        result.numeric_value = None
+                    result.record_enc = encrypted_records.encrypt_result(user_vault, result.value, result.numeric_value)
+                    result.value = None
+                    result.numeric_value = None
                     migrated += 1
 
                     if migrated % batch_size == 0:
@@ -217,7 +219,8 @@ def migrate_user_to_per_user_vault(
                     "findings": report.findings,
                     "recommendations": report.recommendations
                 }
-                report.content_enc = user_vault.encrypt_json(content)
+                report.content_enc = encrypted_records.encrypt_report(user_vault, content)
+                report_cache.invalidate_report(report.id)
                 report.summary = None
                 report.findings = None
                 report.recommendations = None
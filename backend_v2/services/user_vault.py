@@ -17,9 +17,10 @@ Security Model:
 import os
 import secrets
 import hashlib
+import time
 import json
 import base64
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, List
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
@@ -344,6 +345,55 @@ def clear_user_vault_session(user_id: int):
         _user_vault_sessions[user_id].lock()
         del _user_vault_sessions[user_id]
 
+    # Imported lazily: report_cache depends on this module via vault_helper
+    try:
+        from backend_v2.services.report_cache import purge_user
+    except ImportError:
+        from services.report_cache import purge_user
+    purge_user(user_id)
+
+
+# Live logins (access token id -> expiry timestamp) sharing each user's vault session
+_login_sessions: Dict[int, Dict[str, float]] = {}
+
+
+def add_login_session(user_id: int, session_id: str, expires_at: float):
+    """Record a login (access token id) that uses the user's vault session until logout or expiry."""
+    _login_sessions.setdefault(user_id, {})[session_id] = expires_at
+
+
+def end_user_vault_session(user_id: int, session_id: Optional[str] = None) -> bool:
+    """
+    Logout of one login session. While the user is still logged in elsewhere
+    (another device, unexpired token) the vault stays unlocked for those
+    sessions. The last logout locks the vault in this process and drops the
+    decrypted data, then reopens it with the service key so background syncs
+    keep running: users with a service-encrypted key stay unlocked by design,
+    and their reports may be decrypted and cached again by those syncs.
+    Returns True if the vault session was ended.
+    """
+    now = time.time()
+    sessions = _login_sessions.pop(user_id, {})
+    sessions.pop(session_id, None)
+    live = {sid: expires_at for sid, expires_at in sessions.items() if expires_at > now}
+    if live:
+        _login_sessions[user_id] = live
+        return False
+    clear_user_vault_session(user_id)
+    unlock_all_service_vaults(user_ids=[user_id])
+    return True
+
+
+def end_all_user_vault_sessions(user_id: int):
+    """Force logout: end every login session of the user and their vault session."""
+    _login_sessions.pop(user_id, None)
+    end_user_vault_session(user_id)
+
+
+def unlocked_user_ids() -> List[int]:
+    """Users whose vault is unlocked in this process."""
+    return [user_id for user_id, vault in list(_user_vault_sessions.items()) if vault.is_unlocked]
+
 
 def is_user_vault_unlocked(user_id: int) -> bool:
     """Check if a user's vault is currently unlocked."""
@@ -373,8 +423,19 @@ def save_service_encrypted_key(user_id: int, vault: UserVault, vault_data: Dict)
     return updated
 
 
-def unlock_all_service_vaults():
-    """On startup, unlock all user vaults that have a service-encrypted key."""
+def has_service_vault(user) -> bool:
+    """True if the service key can unlock this user's vault (background syncs, crawler workers)."""
+    if not _get_service_key() or not user or not user.vault_data:
+        return False
+    try:
+        vd = json.loads(user.vault_data) if isinstance(user.vault_data, str) else user.vault_data
+    except ValueError:
+        return False
+    return bool(vd.get("service_encrypted_vault_key"))
+
+
+def unlock_all_service_vaults(user_ids=None):
+    """On startup, unlock all user vaults that have a service-encrypted key (or only those of user_ids)."""
     import logging
     logger = logging.getLogger(__name__)
     service_key = _get_service_key()
@@ -392,7 +453,10 @@ def unlock_all_service_vaults():
 
         db = SessionLocal()
         try:
-            users = db.query(User).filter(User.vault_data.isnot(None)).all()
+            query = db.query(User).filter(User.vault_data.isnot(None))
+            if user_ids is not None:
+                query = query.filter(User.id.in_(user_ids))
+            users = query.all()
             unlocked = 0
             for user in users:
                 try:
@@ -270,6 +270,16 @@ class Vault:
         self._require_unlocked()
         return self._decrypt(ciphertext, self._data_key).decode('utf-8')
 
+    def encrypt_data_bytes(self, plaintext: bytes) -> bytes:
+        """Encrypt sensitive binary data (compact records) with the data key."""
+        self._require_unlocked()
+        return self._encrypt(plaintext, self._data_key)
+
+    def decrypt_data_bytes(self, ciphertext: bytes) -> bytes:
+        """Decrypt sensitive binary data."""
+        self._require_unlocked()
+        return self._decrypt(ciphertext, self._data_key)
+
     def encrypt_json(self, data: dict) -> bytes:
         """Encrypt a JSON-serializable object."""
         self._require_unlocked()
@@ -162,6 +162,33 @@ class VaultHelper:
                     )
         return global_vault.decrypt_json(ciphertext)
 
+    # Binary encryption (compact records, see services/encrypted_records)
+
+    def encrypt_bytes(self, data: bytes) -> bytes:
+        """Encrypt binary data with the data key."""
+        self._require_available()
+        if self._use_user_vault:
+            return self._user_vault.encrypt_bytes(data)
+        return global_vault.encrypt_data_bytes(data)
+
+    def decrypt_bytes(self, ciphertext: bytes) -> bytes:
+        """Decrypt binary data (also data written by encrypt_data / encrypt_json)."""
+        self._require_available()
+        if self._use_user_vault:
+            try:
+                return self._user_vault.decrypt_bytes(ciphertext)
+            except Exception:
+                if global_vault.is_unlocked:
+                    try:
+                        return global_vault.decrypt_data_bytes(ciphertext)
+                    except Exception:
+                        raise VaultLockedError("Data encryption key mismatch.")
+                else:
+                    raise VaultLockedError(
+                        "Data was encrypted with legacy encryption. Please log out and back in."
+                    )
+        return global_vault.decrypt_data_bytes(ciphertext)
+
     # Number encryption
 
     def encrypt_number(self, value: float) -> bytes:
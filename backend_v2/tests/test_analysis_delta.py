@@ -0,0 +1,127 @@
+"""
+Tests for incremental (delta) health analysis.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import analysis_delta
+from services.health_agents import HealthAnalysisService
+
+
+def bio(name, date, value, flags="NORMAL"):
+    return {"name": name, "value": value, "unit": "mg/dL", "range": "0 - 100",
+            "date": date, "status": "normal" if flags == "NORMAL" else "abnormal", "flags": flags}
+
+
+HISTORY = [
+    bio("Glucose", "2024-01-01", 90),
+    bio("Glucose", "2025-01-01", 95),
+    bio("LDL Cholesterol", "2025-01-01", 120, "HIGH"),
+    bio("Ferritin", "2025-01-01", 50),
+]
+
+
+class TestDelta:
+
+    def test_fingerprint_is_order_independent(self):
+        assert analysis_delta.fingerprint_biomarkers(HISTORY) == \
+            analysis_delta.fingerprint_biomarkers(list(reversed(HISTORY)))
+
+    def test_new_reading_marks_only_that_marker(self):
+        digests = analysis_delta.marker_digests(HISTORY)
+        delta = analysis_delta.compute_delta(digests, HISTORY + [bio("Glucose", "2026-01-01", 130, "HIGH")])
+        assert delta.changed == ["glucose"]
+        assert delta.unchanged == ["ferritin", "ldl cholesterol"]
+        assert delta.removed_count == 0
+
+    def test_removed_and_empty(self):
+        digests = analysis_delta.marker_digests(HISTORY)
+        assert analysis_delta.is_delta_empty(analysis_delta.compute_delta(digests, HISTORY))
+        delta = analysis_delta.compute_delta(digests, HISTORY[:3])
+        assert delta.removed_count == 1 and not delta.changed
+
+    def test_digests_do_not_store_names(self):
+        digests = analysis_delta.marker_digests(HISTORY)
+        assert not any("glucose" in key for key in digests)
+
+    def test_recent_readings_newest_first(self):
+        readings = analysis_delta.recent_readings(HISTORY, ["glucose"], per_marker=1)
+        assert readings == [HISTORY[1]]
+
+
+class TestIncrementalAnalysis:
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        service = HealthAnalysisService(language="en")
+        self.calls = []
+        self.referrals = []
+
+        def analyze_delta(changed, previous_report, profile_context="", unchanged_count=0, removed_count=0):
+            self.calls.append(("generalist", [b["name"] for b in changed]))
+            return dict(previous_report, specialist_referrals=self.referrals)
+
+        def run_specialist(spec_config, general_report, biomarkers, profile_context, extra_context=""):
+            self.calls.append((spec_config["specialty"], [b["name"] for b in biomarkers]))
+            return {"specialty": spec_config["specialty"], "summary": "updated", "risk_level": "attention"}
+
+        monkeypatch.setattr(service.generalist, "analyze_delta", analyze_delta)
+        monkeypatch.setattr(service, "_run_specialist", run_specialist)
+        return service
+
+    def previous_session(self, service, biomarkers):
+        state = service._session_state(biomarkers, service._format_profile_context())
+        specialists = {}
+        for specialty, markers in (("cardiology", ["ldl"]), ("hematology", ["ferritin"])):
+            spec_state = service._specialist_state(
+                {"specialty": specialty, "relevant_markers": markers}, biomarkers, "full")
+            specialists[specialty] = dict(spec_state, content={"specialty": specialty, "summary": "prior"})
+        return {
+            "general": {"summary": "prior", "risk_level": "normal", "findings": [], "recommendations": []},
+            "context_fingerprint": state["context_fingerprint"],
+            "marker_digests": state["marker_digests"],
+            "specialists": specialists,
+        }
+
+    def test_only_changed_specialist_runs(self, service):
+        previous = self.previous_session(service, HISTORY)
+        self.referrals = [{"specialty": "cardiology", "relevant_markers": ["ldl"]}]
+        updated = HISTORY + [bio("LDL Cholesterol", "2026-01-01", 100)]
+        result = service.run_incremental_analysis(updated, previous)
+
+        assert result["delta"]["mode"] == "incremental"
+        assert result["delta"]["specialists_run"] == ["cardiology"]
+        assert result["delta"]["specialists_carried_forward"] == ["hematology"]
+        assert result["specialists"]["hematology"]["summary"] == "prior"
+        # Generalist and specialist only see the changed marker
+        assert self.calls == [
+            ("generalist", ["LDL Cholesterol", "LDL Cholesterol"]),
+            ("cardiology", ["LDL Cholesterol", "LDL Cholesterol"]),
+        ]
+
+    def test_specialists_no_longer_referred_are_dropped(self, service):
+        previous = self.previous_session(service, HISTORY)
+        # LDL changed and was not referred again; ferritin is gone
+        updated = [b for b in HISTORY if b["name"] != "Ferritin"] + [bio("LDL Cholesterol", "2026-01-01", 100)]
+        result = service.run_incremental_analysis(updated, previous)
+
+        assert result["specialists"] == {}
+        assert sorted(result["delta"]["specialists_dropped"]) == ["cardiology", "hematology"]
+        assert [name for name, _ in self.calls] == ["generalist"]
+
+    def test_unchanged_makes_no_calls(self, service):
+        previous = self.previous_session(service, HISTORY)
+        result = service.run_incremental_analysis(HISTORY, previous)
+        assert result["delta"]["mode"] == "unchanged"
+        assert self.calls == []
+        assert set(result["specialists"]) == {"cardiology", "hematology"}
+
+    def test_profile_change_forces_full_analysis(self, service, monkeypatch):
+        previous = self.previous_session(service, HISTORY)
+        previous["context_fingerprint"] = "stale"
+        monkeypatch.setattr(service, "run_full_analysis", lambda biomarkers: {"delta": {"mode": "full"}})
+        assert service.run_incremental_analysis(HISTORY, previous)["delta"]["mode"] == "full"
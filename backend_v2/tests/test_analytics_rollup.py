@@ -0,0 +1,142 @@
+"""
+Tests for buffered page-view ingestion and the analytics rollups.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-testing-only")
+
+from backend_v2.models import PageView, PageViewRollup
+from backend_v2.routers import analytics
+from backend_v2.services import analytics_rollup, pageview_buffer
+from backend_v2.services.analytics_rollup import HyperLogLog
+
+DAY = datetime(2026, 3, 2, tzinfo=timezone.utc)
+
+
+class TestHyperLogLog:
+
+    def test_estimate_within_error(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f"visitor-{i}")
+        assert abs(sketch.count() - 20000) / 20000 < 0.05
+
+    def test_small_sets_are_exact(self):
+        sketch = HyperLogLog()
+        for i in range(40):
+            sketch.add(f"visitor-{i % 20}")
+        assert sketch.count() == 20
+
+    def test_merge_and_round_trip(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            (a if i % 2 else b).add(str(i))
+        small = HyperLogLog.from_bytes(b.to_bytes())
+        a.merge(small)
+
+        assert b.to_bytes()[:1] == b"S" and a.to_bytes()[:1] == b"D"
+        assert HyperLogLog.from_bytes(a.to_bytes()).registers == a.registers
+        assert abs(a.count() - 3000) / 3000 < 0.05
+
+
+@pytest.fixture
+def db(test_db_session, test_db_engine, monkeypatch):
+    monkeypatch.setattr(pageview_buffer, "SessionLocal", sessionmaker(bind=test_db_engine))
+    # The tests flush explicitly
+    monkeypatch.setattr(pageview_buffer, "_ensure_writer", lambda: None)
+    test_db_session.query(PageView).delete()
+    test_db_session.query(PageViewRollup).delete()
+    test_db_session.commit()
+    yield test_db_session
+    test_db_session.query(PageView).delete()
+    test_db_session.query(PageViewRollup).delete()
+    test_db_session.commit()
+
+
+def view(db, visitor, at, page="/", referrer=None, **extra):
+    db.add(PageView(session_id=f"s-{visitor}", ip_hash=visitor, page=page, referrer=referrer,
+                    created_at=at, **extra))
+    db.commit()
+
+
+def test_pageview_endpoint_only_buffers(db):
+    request = type("Request", (), {"headers": {"user-agent": "Mozilla/5.0 (iPhone)"}, "client": None})()
+    data = analytics.PageViewIn(page="/pricing", session_id="buffered-session")
+
+    assert analytics.track_pageview(data, request).status_code == 204
+    assert db.query(PageView).count() == 0
+
+    assert pageview_buffer.flush() == 1
+    stored = db.query(PageView).one()
+    assert (stored.page, stored.is_mobile, stored.created_at is not None) == ("/pricing", True, True)
+
+
+def test_failed_flush_keeps_views(db, monkeypatch):
+    def broken():
+        raise RuntimeError("database down")
+
+    pageview_buffer.record(dict(session_id="s", page="/"))
+    monkeypatch.setattr(pageview_buffer, "SessionLocal", broken)
+    assert pageview_buffer.flush() == 0
+    assert pageview_buffer.stats()["buffered"] == 1
+
+    monkeypatch.undo()
+    pageview_buffer._buffer.clear()
+
+
+def test_rollups_match_raw_counts(db):
+    yesterday = DAY - timedelta(days=1)
+    view(db, "a", yesterday + timedelta(hours=9))
+    view(db, "b", yesterday + timedelta(hours=10), referrer="https://www.google.com/search")
+    view(db, "a", DAY + timedelta(hours=9), page="/pricing")
+    view(db, "a", DAY + timedelta(hours=9, minutes=5), page="/register", user_id=7)
+    view(db, "c", DAY + timedelta(hours=10), page="/blog/fier", referrer="https://google.com/")
+    view(db, "d", DAY + timedelta(hours=11), page="/blog/fier", is_mobile=True, utm_source="fb")
+
+    analytics_rollup.refresh(db, now=DAY + timedelta(hours=12))
+
+    assert analytics_rollup.total_pageviews(db, DAY) == 4
+    assert analytics_rollup.total_pageviews(db, DAY, prefix="/blog") == 2
+    assert analytics_rollup.unique_visitors(db, "all", DAY) == {"": 3}
+    assert analytics_rollup.returning_visitors(db, DAY) == 1
+    funnel = analytics_rollup.unique_visitors(db, "funnel", DAY)
+    assert (funnel["home"], funnel["pricing"], funnel["registered"]) == (3, 1, 1)
+    assert analytics_rollup.unique_visitors(db, "source", DAY) == {"direct": 2, "google.com": 1}
+    assert analytics_rollup.unique_visitors(db, "visitor_type", DAY) == {"logged_in": 1, "refcode": 1}
+    assert analytics_rollup.pageviews(db, "page", DAY, prefix="/blog/") == [("/blog/fier", 2)]
+    assert analytics_rollup.by_day(db, "all", yesterday) == [
+        {"date": "2026-03-01", "pageviews": 2, "visitors": 2},
+        {"date": "2026-03-02", "pageviews": 4, "visitors": 3},
+    ]
+
+
+def test_refresh_picks_up_late_views(db):
+    view(db, "a", DAY + timedelta(hours=9))
+    analytics_rollup.refresh(db, now=DAY + timedelta(hours=10))
+
+    # Recorded before the last pass but written after it
+    view(db, "b", DAY + timedelta(hours=9, minutes=59))
+    view(db, "c", DAY + timedelta(hours=10, minutes=30))
+    analytics_rollup.refresh(db, now=DAY + timedelta(hours=11))
+
+    assert analytics_rollup.total_pageviews(db, DAY) == 3
+    assert analytics_rollup.unique_visitors(db, "all", DAY) == {"": 3}
+    hours = db.query(PageViewRollup).filter(PageViewRollup.granularity == "hour",
+                                            PageViewRollup.dimension == "all").count()
+    assert hours == 2
+
+
+def test_dashboard_reads_rollups(db):
+    now = datetime.now(timezone.utc)
+    view(db, "a", now - timedelta(days=2), page="/biomarker/glucoza")
+    analytics_rollup.backfill(db, now=now)
+
+    result = analytics.analytics_dashboard(period="7d", db=db, admin=None)
+
+    assert result["visitors"]["total"] == 1 and result["visitors"]["unique"] == 1
+    assert result["top_biomarkers"] == [{"page": "/biomarker/glucoza", "views": 1, "unique": 1,
+                                         "slug": "glucoza"}]
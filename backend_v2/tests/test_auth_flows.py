@@ -176,10 +176,11 @@ class TestTokenValidation:
         """Create user and get token."""
         self.email = f"token_test_{int(time.time())}@test.com"
         self.password = "TokenTestPassword123"
-        client.post("/auth/register", json={
+        registered = client.post("/auth/register", json={
             "email": self.email,
             "password": self.password
         })
+        self.register_headers = {"Authorization": f"Bearer {registered.json().get('access_token')}"}
         response = client.post("/auth/token", data={
             "username": self.email,
             "password": self.password
@@ -233,6 +234,24 @@ class TestTokenValidation:
             response = client.get("/users/me", headers=self.headers)
             assert response.status_code == 200
 
+    def test_logout_locks_vault(self):
+        """Test the last logout locks the user's vault on the server."""
+        if not self.token:
+            pytest.skip("Token setup failed")
+        assert client.get("/auth/vault-status", headers=self.headers).json()["vault_unlocked"]
+        assert client.post("/auth/logout", headers=self.register_headers).status_code == 200
+        response = client.post("/auth/logout", headers=self.headers)
+        assert response.status_code == 200
+        assert not client.get("/auth/vault-status", headers=self.headers).json()["vault_unlocked"]
+
+    def test_logout_keeps_other_sessions_unlocked(self):
+        """Test logging out on one device leaves the vault open for the user's other sessions."""
+        if not self.token:
+            pytest.skip("Token setup failed")
+        response = client.post("/auth/logout", headers=self.register_headers)
+        assert response.status_code == 200
+        assert client.get("/auth/vault-status", headers=self.headers).json()["vault_unlocked"]
+
 
 class TestProtectedEndpoints:
     """Test all protected endpoints require authentication."""
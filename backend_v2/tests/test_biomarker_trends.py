@@ -0,0 +1,137 @@
+"""
+Tests for the vectorized biomarker trends engine.
+Covers slope, percent change, baseline, streaks and range crossings.
+"""
+import os
+import sys
+import time
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.biomarker_trends import (
+    BiomarkerSeries, compute_trends, summarize_transitions, trends_to_records
+)
+
+
+def make_series(rows):
+    """Build a series from (canonical, date, value, flag) tuples."""
+    return BiomarkerSeries(
+        result_ids=range(1, len(rows) + 1),
+        document_ids=range(1, len(rows) + 1),
+        test_names=[r[0] for r in rows],
+        canonical_names=[r[0] for r in rows],
+        flags=[r[3] for r in rows],
+        dates=[r[1] for r in rows],
+        values=[np.nan if r[2] is None else r[2] for r in rows],
+    )
+
+
+class TestComputeTrends:
+    """Per-biomarker statistics."""
+
+    def setup_method(self):
+        self.series = make_series([
+            ("Glucose", datetime(2022, 1, 1), 90, "NORMAL"),
+            ("Glucose", datetime(2023, 1, 1), 110, "HIGH"),
+            ("Glucose", datetime(2024, 1, 1), 120, "HIGH"),
+            ("Glucose", datetime(2025, 1, 1), 95, "NORMAL"),
+            ("Ferritin", datetime(2023, 1, 1), 50, "NORMAL"),
+            ("Ferritin", datetime(2024, 1, 1), 10, "LOW"),
+            ("TSH", datetime(2024, 6, 1), None, "NORMAL"),
+        ])
+        self.trends = compute_trends(self.series)
+
+    def test_counts_and_latest_values(self):
+        glucose = self.trends.loc["Glucose"]
+        assert glucose["count"] == 4
+        assert glucose["latest_value"] == 95
+        assert glucose["previous_value"] == 120
+        assert glucose["pct_change"] == pytest.approx(-20.8333, rel=1e-3)
+
+    def test_baseline_uses_previous_window(self):
+        glucose = self.trends.loc["Glucose"]
+        assert glucose["baseline"] == pytest.approx((90 + 110 + 120) / 3)
+        assert glucose["direction"] == "down"
+
+    def test_slope_is_per_year(self):
+        series = make_series([
+            ("LDL", datetime(2020, 1, 1), 100, "NORMAL"),
+            ("LDL", datetime(2021, 1, 1), 110, "NORMAL"),
+            ("LDL", datetime(2022, 1, 1), 120, "NORMAL"),
+        ])
+        assert compute_trends(series).loc["LDL", "slope_per_year"] == pytest.approx(10, rel=1e-2)
+
+    def test_crossings_and_transitions(self):
+        assert self.trends.loc["Glucose", "crossings"] == 2
+        assert self.trends.loc["Glucose", "latest_transition"] == "improved"
+        assert self.trends.loc["Ferritin", "latest_transition"] == "worsened"
+        assert self.trends.loc["Ferritin", "abnormal_streak"] == 1
+        assert pd.isna(self.trends.loc["TSH", "latest_transition"])
+
+    def test_summarize_transitions(self):
+        assert summarize_transitions(self.trends) == {"improving": 1, "worsening": 1, "stable": 0}
+
+    def test_records_are_json_friendly(self):
+        records = trends_to_records(self.trends, "TSH")
+        assert len(records) == 1
+        assert records[0]["latest_value"] is None
+        assert records[0]["last_date"] == "2024-06-01"
+        assert records[0]["last_crossing_date"] is None
+
+    def test_empty_series(self):
+        trends = compute_trends(make_series([]))
+        assert trends.empty
+        assert summarize_transitions(trends) == {"improving": 0, "worsening": 0, "stable": 0}
+
+    def test_unsorted_input_is_ordered_by_date(self):
+        series = make_series([
+            ("Iron", datetime(2024, 1, 1), 40, "LOW"),
+            ("Iron", datetime(2022, 1, 1), 80, "NORMAL"),
+        ])
+        iron = compute_trends(series).loc["Iron"]
+        assert iron["latest_value"] == 40
+        assert iron["latest_transition"] == "worsened"
+
+
+class TestMatchMask:
+    """Evolution-chart matching on the columnar series."""
+
+    def test_matches_original_and_stored_names(self):
+        series = BiomarkerSeries(
+            result_ids=[1, 2, 3],
+            document_ids=[1, 1, 2],
+            test_names=["Glicemie", "Hemoglobina", "glicemie"],
+            canonical_names=["Glucose", "Hemoglobin", "Glucose"],
+            flags=["NORMAL"] * 3,
+            dates=[datetime(2024, 1, 1)] * 3,
+            values=[90, 14, 92],
+        )
+        assert series.match_mask("Glucose").tolist() == [True, False, True]
+
+
+class TestPerformance:
+    """Trend computation should stay fast for long histories."""
+
+    def test_ten_thousand_results(self):
+        n = 12000
+        rng = np.random.default_rng(0)
+        series = BiomarkerSeries(
+            result_ids=range(n),
+            document_ids=range(n),
+            test_names=[f"B{i % 120}" for i in range(n)],
+            canonical_names=[f"B{i % 120}" for i in range(n)],
+            flags=rng.choice(["NORMAL", "HIGH", "LOW"], n).tolist(),
+            dates=[datetime(2010, 1, 1) + timedelta(days=(i // 120) * 7) for i in range(n)],
+            values=rng.normal(100, 10, n),
+        )
+        compute_trends(series)  # warm up
+        start = time.perf_counter()
+        trends = compute_trends(series)
+        elapsed = time.perf_counter() - start
+        assert len(trends) == 120
+        # Generous bound to stay stable on slow CI machines
+        assert elapsed < 0.1
@@ -0,0 +1,139 @@
+"""
+Tests for the delta sync change feed and GET /changes.
+"""
+import os
+import uuid
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-testing-only")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend_v2.database import get_db
+from backend_v2.models import DataChange, Document, MedicationLog, Medication, Notification, TestResult, User
+from backend_v2.routers import changes
+from backend_v2.routers.documents import get_current_user
+from backend_v2.services import change_feed, data_version
+
+
+def make_user(db):
+    user = User(email=f"feed_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def add_document(db, user_id, results=2):
+    doc = Document(user_id=user_id, filename="lab.pdf", provider="Synevo")
+    doc.results = [TestResult(test_name=f"Test {i}", numeric_value=float(i), flags="NORMAL") for i in range(results)]
+    db.add(doc)
+    db.commit()
+    return doc
+
+
+def feed(db, user_id, cursor=None, limit=change_feed.MAX_PAGE_SIZE):
+    db.expire_all()
+    page = change_feed.read(db, user_id, cursor, limit)
+    return page, [(c.entity, c.entity_id, c.deleted) for c in page.changes]
+
+
+def test_changes_since_cursor_with_tombstones(test_db_session):
+    db = test_db_session
+    user_id = make_user(db).id
+    doc = add_document(db, user_id)
+    doc_id, result_ids = doc.id, [r.id for r in doc.results]
+    note = Notification(user_id=user_id, notification_type="reminder", title="t", message="m")
+    db.add(note)
+    db.commit()
+    note_id = note.id
+
+    first, rows = feed(db, user_id)
+    assert first.reset and not first.has_more
+    # A document is numbered before its test results
+    assert rows == [("document", doc_id, False)] + [("test_result", r, False) for r in result_ids] + \
+        [("notification", note_id, False)]
+
+    nothing, rows = feed(db, user_id, first.cursor)
+    assert rows == [] and not nothing.reset
+
+    # Bulk update, then the document delete path (bulk test result delete + ORM delete)
+    db.query(Notification).filter(Notification.user_id == user_id).update({"is_read": True})
+    db.query(TestResult).filter(TestResult.document_id == doc_id).delete()
+    db.delete(db.get(Document, doc_id))
+    db.commit()
+
+    page, rows = feed(db, user_id, first.cursor)
+    assert sorted(rows) == sorted([("notification", note_id, False), ("document", doc_id, True)] +
+                                  [("test_result", r, True) for r in result_ids])
+    # One row per entity: the feed does not grow with repeated changes
+    assert db.query(DataChange).filter(DataChange.user_id == user_id).count() == len(rows)
+
+    # Tombstones are left out of a reset
+    _, rows = feed(db, user_id)
+    assert rows == [("notification", note_id, False)]
+
+
+def test_pages_and_expired_cursors(test_db_session):
+    db = test_db_session
+    user_id = make_user(db).id
+    other_id = make_user(db).id
+    add_document(db, other_id)
+    med = Medication(user_id=user_id, name="Vitamin D")
+    db.add(med)
+    db.commit()
+    for day in ("2026-01-01", "2026-01-02"):
+        db.add(MedicationLog(medication_id=med.id, user_id=user_id, date=day))
+    db.commit()
+
+    page, rows = feed(db, user_id, limit=2)
+    assert page.has_more and [r[0] for r in rows] == ["medication", "medication_log"]
+    rest, rows = feed(db, user_id, page.cursor, limit=2)
+    assert not rest.has_more and not rest.reset and [r[0] for r in rows] == ["medication_log"]
+
+    seq = rest.cursor.split(".")[0]
+    expired = f"{seq}.{int(page.cursor.split('.')[1]) - (change_feed.CHANGE_FEED_TOMBSTONE_DAYS + 1) * 86400}"
+    assert feed(db, user_id, expired)[0].reset
+    assert feed(db, user_id, "not-a-cursor")[0].reset
+
+
+def test_backfill_and_prune(test_db_session):
+    db = test_db_session
+    user_id = make_user(db).id
+    doc = add_document(db, user_id, results=1)
+    doc_id, result_id = doc.id, doc.results[0].id
+    db.query(DataChange).filter(DataChange.user_id == user_id).delete()
+    db.commit()
+
+    assert change_feed.backfill(db) >= 2
+    _, rows = feed(db, user_id)
+    assert rows == [("document", doc_id, False), ("test_result", result_id, False)]
+    assert change_feed.backfill(db) == 0
+
+    # Rows of deleted accounts are pruned
+    db.query(DataChange).filter(DataChange.user_id == user_id).update({"user_id": -1})
+    db.commit()
+    assert change_feed.prune(db) >= 2
+    assert db.query(DataChange).filter(DataChange.user_id == -1).count() == 0
+
+
+def test_endpoint_serializes_current_rows(test_db_session):
+    db = test_db_session
+    user = make_user(db)
+    doc = add_document(db, user.id, results=1)
+
+    app = FastAPI()
+    app.include_router(changes.router)
+    app.add_exception_handler(data_version.NotModified, data_version.not_modified_handler)
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+
+    body = client.get("/changes").json()
+    assert body["reset"] and not body["has_more"]
+    document, result = body["changes"]
+    assert document["type"] == "document" and document["data"]["provider"] == "Synevo"
+    assert result["type"] == "test_result" and result["data"]["document_id"] == doc.id
+    assert result["data"]["value"] == 0.0 and result["data"]["status"] == "normal"
+
+    caught_up = client.get("/changes", params={"cursor": body["cursor"]}).json()
+    assert caught_up["changes"] == [] and not caught_up["reset"]
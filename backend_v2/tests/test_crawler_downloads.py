@@ -0,0 +1,79 @@
+"""
+Tests for the post-login HTTP download engine shared by the crawlers.
+"""
+import asyncio
+import httpx
+
+from backend_v2.services.synevo_crawler import SynevoCrawler
+
+
+class FakeContext:
+    def cookies(self):
+        return [{"name": "session", "value": "abc123", "domain": "webresults.synevo.ro", "path": "/"}]
+
+
+class FakePage:
+    url = "https://webresults.synevo.ro/ro-RO"
+    context = FakeContext()
+
+    def evaluate(self, script):
+        return "Mozilla/5.0 (replay)"
+
+
+def make_crawler(tmp_path, handler):
+    crawler = SynevoCrawler()
+    crawler.download_dir = str(tmp_path)
+    crawler.download_transport = httpx.MockTransport(handler)
+    return crawler
+
+
+def job(doc_id, filename=None):
+    return {"url": f"https://webresults.synevo.ro/Orders/ResultsPDF/{doc_id}",
+            "filename": filename, "category": "Analize Synevo"}
+
+
+def test_downloads_concurrently_with_browser_session(tmp_path):
+    in_flight, peak, seen_cookies = 0, 0, set()
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        seen_cookies.add(request.headers.get("cookie"))
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        doc_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, headers={"Content-Type": "application/pdf",
+                                            "Content-Disposition": f'attachment; filename="rezultat_{doc_id}.pdf"'},
+                              content=b"%PDF-1.4 " + doc_id.encode())
+
+    crawler = make_crawler(tmp_path, handler)
+    crawler.download_concurrency = 3
+    jobs = [job(i) for i in range(8)] + [job(99, filename="99.pdf")]
+
+    documents = crawler.download_documents(FakePage(), jobs)
+
+    assert [d["filename"] for d in documents[:2]] == ["rezultat_0_001.pdf", "rezultat_1_002.pdf"]
+    assert documents[-1]["filename"] == "99.pdf"
+    assert (tmp_path / "rezultat_7_008.pdf").read_bytes() == b"%PDF-1.4 7"
+    assert not list(tmp_path.glob("*.part"))
+    assert peak == 3
+    assert seen_cookies == {"session=abc123"}
+
+
+def test_rejected_session_falls_back_to_browser(tmp_path, monkeypatch):
+    def handler(request):
+        if request.url.path.endswith("/2"):
+            # Session not accepted: the portal answers with its login page
+            return httpx.Response(200, headers={"Content-Type": "text/html"}, content=b"<form>")
+        return httpx.Response(200, headers={"Content-Type": "application/pdf"}, content=b"%PDF")
+
+    crawler = make_crawler(tmp_path, handler)
+    retried = []
+    monkeypatch.setattr(crawler, "download_in_browser", lambda page, index, job: retried.append(job["url"]))
+
+    documents = crawler.download_documents(FakePage(), [job(1, "1.pdf"), job(2, "2.pdf")])
+
+    assert [d["filename"] for d in documents] == ["1.pdf"]
+    assert retried == ["https://webresults.synevo.ro/Orders/ResultsPDF/2"]
+    assert not (tmp_path / "2.pdf").exists()
@@ -0,0 +1,77 @@
+"""
+Tests for crawler timing profiles and offline replays of the provider portals.
+
+The replay tests need Playwright's bundled Chromium (`playwright install chromium`)
+and are skipped without it.
+"""
+import os
+import pytest
+
+from backend_v2.services import crawler_timing
+
+
+def run(*waits):
+    return {"waits": [{"kind": kind, "label": kind, "ms": ms, "ok": ok} for kind, ms, ok in waits]}
+
+
+class FakePage:
+    def wait_for_timeout(self, ms):
+        pass
+
+
+class TestTimingProfiles:
+
+    def test_provider_profile_has_no_action_delay(self):
+        profile = crawler_timing.get_profile("regina_maria")
+        assert profile["slow_mo"] == 0
+        assert profile["element"] == crawler_timing.PROVIDER_PROFILES["regina_maria"]["element"]
+        assert profile["download"] == crawler_timing.DEFAULT_PROFILE["download"]
+
+    def test_build_profile_from_recorded_runs(self):
+        runs = [run(("element", 400 + i * 10, True), ("element", 15000, False), ("download", 900, True))
+                for i in range(10)]
+
+        profile = crawler_timing.build_profile("synevo", runs)
+
+        # p95 of successful waits x margin; timed out waits are ignored
+        assert profile["element"] == int(490 * crawler_timing.PROFILE_MARGIN)
+        # Raised to the floor
+        assert profile["download"] == max(crawler_timing.MIN_TIMEOUT_MS, int(900 * crawler_timing.PROFILE_MARGIN))
+        # Too few samples or not an observed kind
+        assert "login" not in profile and "navigation" not in profile
+
+    def test_recorded_profile_never_loosens_defaults(self):
+        runs = [run(("consent", 5000, True)) for _ in range(10)]
+        assert crawler_timing.build_profile("medlife", runs)["consent"] == crawler_timing.DEFAULT_PROFILE["consent"]
+
+    def test_wait_until_records_waits(self):
+        from backend_v2.services.synevo_crawler import SynevoCrawler
+        crawler = SynevoCrawler()
+        crawler.timings = crawler_timing.TimingRecorder("synevo", persist=False)
+        checks = iter([False, False, True])
+
+        assert crawler.wait_until(FakePage(), lambda: next(checks), "login status")
+        assert not crawler.wait_until(FakePage(), lambda: False, "never", timeout=0)
+        assert [(w["label"], w["ok"]) for w in crawler.timings.waits] == [("login status", True), ("never", False)]
+
+
+def chromium_available() -> bool:
+    try:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            return os.path.exists(p.chromium.executable_path)
+    except Exception:
+        return False
+
+
+@pytest.mark.skipif(not chromium_available(), reason="Playwright Chromium not installed")
+@pytest.mark.parametrize("provider", ["regina_maria", "synevo", "medlife", "sanador"])
+def test_replay_provider(provider, tmp_path):
+    from backend_v2.services import crawler_replay
+
+    report = crawler_replay.replay(provider, download_dir=str(tmp_path))
+
+    assert crawler_replay.problems(report) == []
+    for doc in report["documents"]:
+        with open(doc["local_path"], "rb") as f:
+            assert f.read(4) == b"%PDF"
@@ -0,0 +1,109 @@
+"""
+Tests for the per-user data version and the conditional GET built on it.
+"""
+import uuid
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from backend_v2.models import Document, LinkedAccount, Notification, Subscription, TestResult, User
+from backend_v2.services import data_version
+from backend_v2.services.security_headers import SecurityHeadersMiddleware
+
+
+def make_user(db):
+    user = User(email=f"dv_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def version(db, user_id):
+    db.expire_all()
+    return db.get(User, user_id).data_version
+
+
+def test_changes_bump_the_owner_version(test_db_session):
+    db = test_db_session
+    user = make_user(db)
+    user_id = user.id
+    other_id = make_user(db).id
+    start = version(db, user_id)
+
+    doc = Document(user_id=user_id, filename="a.pdf", file_path="a.pdf")
+    db.add(doc)
+    db.commit()
+    after_document = version(db, user_id)
+    assert after_document == start + 1
+
+    # Test results carry no user_id; the version is bumped through their document
+    db.add(TestResult(document_id=doc.id, test_name="Glucose", numeric_value=90))
+    db.commit()
+    assert version(db, user_id) == after_document + 1
+
+    db.add(Notification(user_id=user_id, notification_type="reminder", title="t", message="m"))
+    db.commit()
+    db.get(User, user_id).full_name = "Ana"
+    db.commit()
+    assert version(db, user_id) == after_document + 3
+
+    # Bulk updates bump the users of the rows they touch; other users are untouched
+    db.query(Notification).filter(Notification.user_id == user_id).update({"is_read": True})
+    db.commit()
+    assert version(db, user_id) == after_document + 4
+    assert version(db, other_id) == 0
+
+
+def test_tier_and_linked_account_changes_bump_the_version(test_db_session):
+    db = test_db_session
+    user_id = make_user(db).id
+    start = version(db, user_id)
+
+    db.add(Subscription(user_id=user_id, tier="free"))
+    db.commit()
+    db.query(Subscription).filter(Subscription.user_id == user_id).update({"tier": "premium"})
+    db.commit()
+    assert version(db, user_id) == start + 2
+
+    db.add(LinkedAccount(user_id=user_id, provider_name="Synevo"))
+    db.commit()
+    assert version(db, user_id) == start + 3
+
+
+def test_matching_if_none_match_skips_the_endpoint(test_db_session):
+    user = make_user(test_db_session)
+    calls = []
+
+    app = FastAPI()
+    app.add_exception_handler(data_version.NotModified, data_version.not_modified_handler)
+    app.add_middleware(SecurityHeadersMiddleware)
+
+    @app.get("/dashboard/stats", dependencies=[Depends(data_version.conditional_get(lambda: user))])
+    def stats():
+        calls.append(1)
+        return {"documents": 0}
+
+    client = TestClient(app)
+    first = client.get("/dashboard/stats")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith(f'W/"u{user.id}.')
+    # The middleware keeps the revalidation policy instead of no-store
+    assert first.headers["cache-control"] == data_version.CACHE_CONTROL
+    assert "pragma" not in first.headers
+
+    again = client.get("/dashboard/stats", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert calls == [1]
+
+    user.data_version = (user.data_version or 0) + 1
+    changed = client.get("/dashboard/stats", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert calls == [1, 1]
+
+
+def test_etag_comparison_is_weak():
+    assert data_version._matches('"u1.2"', 'W/"u1.2"')
+    assert data_version._matches('W/"u1.1", W/"u1.2"', 'W/"u1.2"')
+    assert data_version._matches("*", 'W/"u1.2"')
+    assert not data_version._matches('W/"u1.1"', 'W/"u1.2"')
@@ -0,0 +1,89 @@
+"""
+Tests for the pending-document processor retrying partly parsed documents.
+"""
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-testing-only")
+
+from backend_v2.models import User, Document, TestResult
+from backend_v2.services import scheduler, user_vault
+from backend_v2.services.ai_service import AIService
+
+
+def parsed(*names, partial=False):
+    result = {"metadata": {}, "results": [{"test_name": name, "value": "1", "unit": "u", "flags": "NORMAL"}
+                                          for name in names]}
+    if partial:
+        result.update(partial=True, errors=["timeout"])
+    return result
+
+
+@pytest.fixture
+def vault_user(test_db_session):
+    user = User(email=f"retry_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    test_db_session.add(user)
+    test_db_session.commit()
+    vault = user_vault.UserVault(user.id)
+    vault.setup_vault("RetryPassword123")
+    user_vault.set_user_vault_session(user.id, vault)
+    yield user, vault
+    user_vault.clear_user_vault_session(user.id)
+
+
+@pytest.fixture
+def encrypted_doc(test_db_session, vault_user, tmp_path):
+    """A synced document: only the vault-encrypted copy is kept, with results of a partial parse."""
+    user, vault = vault_user
+    encrypted_path = tmp_path / "1.enc"
+    encrypted_path.write_bytes(vault.encrypt_bytes(b"%PDF-1.4 lab report"))
+    doc = Document(user_id=user.id, filename="lab.pdf", provider="Synevo", upload_date=datetime.now(),
+                   encrypted_path=str(encrypted_path), is_encrypted=True, is_processed=False)
+    test_db_session.add(doc)
+    test_db_session.flush()
+    test_db_session.add(TestResult(document_id=doc.id, test_name="Glucose", value="1", flags="NORMAL"))
+    test_db_session.commit()
+    return doc
+
+
+def result_names(db, doc):
+    return sorted(name for (name,) in db.query(TestResult.test_name).filter(TestResult.document_id == doc.id))
+
+
+def test_retry_decrypts_and_replaces_partial_results(test_db_session, encrypted_doc, monkeypatch):
+    seen = []
+
+    def process_document(self, file_path):
+        with open(file_path, "rb") as f:
+            seen.append((file_path, f.read()))
+        return parsed("Glucose", "Ferritin")
+    monkeypatch.setattr(AIService, "process_document", process_document)
+
+    assert scheduler.process_single_document(test_db_session, encrypted_doc)
+
+    assert seen[0][1] == b"%PDF-1.4 lab report"
+    assert not os.path.exists(seen[0][0])  # Decrypted copy removed
+    assert encrypted_doc.is_processed
+    assert result_names(test_db_session, encrypted_doc) == ["Ferritin", "Glucose"]
+
+
+def test_retry_still_partial_keeps_results(test_db_session, encrypted_doc, monkeypatch):
+    monkeypatch.setattr(AIService, "process_document", lambda self, path: parsed("Ferritin", partial=True))
+
+    assert not scheduler.process_single_document(test_db_session, encrypted_doc)
+
+    assert encrypted_doc.is_processed
+    assert result_names(test_db_session, encrypted_doc) == ["Glucose"]
+
+
+def test_locked_vault_leaves_document_pending(test_db_session, encrypted_doc, vault_user, monkeypatch):
+    monkeypatch.setattr(AIService, "process_document", lambda self, path: pytest.fail("parsed while locked"))
+    user_vault.clear_user_vault_session(vault_user[0].id)
+
+    assert not scheduler.process_single_document(test_db_session, encrypted_doc)
+
+    assert not encrypted_doc.is_processed
+    assert result_names(test_db_session, encrypted_doc) == ["Glucose"]
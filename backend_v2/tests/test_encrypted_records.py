@@ -0,0 +1,138 @@
+"""
+Tests for the compact encrypted test result and report formats.
+"""
+import json
+import secrets
+import uuid
+
+import pytest
+
+from backend_v2.models import Document, HealthReport, TestResult, User
+from backend_v2.services import encrypted_records
+from backend_v2.services.user_vault import UserVault, clear_user_vault_session, set_user_vault_session
+
+
+def unlocked_vault(user_id):
+    vault = UserVault(user_id)
+    vault._vault_key = secrets.token_bytes(32)
+    vault._is_unlocked = True
+    return vault
+
+
+@pytest.mark.parametrize("value, numeric", [
+    ("5.4", 5.4),
+    ("< 0.5", 0.5),
+    ("5.40", 5.4),
+    ("Negativ", None),
+    (None, 12.0),
+    (None, None),
+])
+def test_result_round_trip(value, numeric):
+    packed = encrypted_records.pack_result(value, numeric)
+    assert encrypted_records.unpack_result(packed) == (value, numeric)
+    if value == str(numeric):
+        assert len(packed) == 2 + 8  # The value is not stored twice
+
+
+def test_report_round_trip_and_legacy_json():
+    content = {"summary": "Totul în regulă", "findings": [{"name": "Glucoza"}] * 20}
+    packed = encrypted_records.pack_report(content)
+    assert encrypted_records.unpack_report(packed) == content
+    assert len(packed) < len(json.dumps(content, ensure_ascii=False).encode("utf-8"))
+    assert encrypted_records.unpack_report(json.dumps(content).encode("utf-8")) == content
+
+
+def test_read_values_accepts_both_formats():
+    vault = unlocked_vault(1)
+    legacy = encrypted_records.read_values(vault, None, vault.encrypt_data("7.1"), vault.encrypt_number(7.1))
+    compact = encrypted_records.read_values(vault, encrypted_records.encrypt_result(vault, "7.1", 7.1))
+    assert legacy == compact == ("7.1", 7.1)
+    assert encrypted_records.read_values(vault, None) == (None, None)
+
+
+def test_compact_user_converts_old_rows(test_db_session):
+    db = test_db_session
+    user = User(email=f"compact_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    vault = unlocked_vault(user.id)
+    set_user_vault_session(user.id, vault)
+    try:
+        doc = Document(user_id=user.id, filename="lab.pdf", provider="Synevo")
+        doc.results = [
+            TestResult(test_name="Glucoza", value_enc=vault.encrypt_data("95"),
+                       numeric_value_enc=vault.encrypt_number(95.0)),
+            TestResult(test_name="Hemoglobina", record_enc=encrypted_records.encrypt_result(vault, "14.2", 14.2)),
+        ]
+        content = {"summary": "ok", "findings": [], "recommendations": []}
+        report = HealthReport(user_id=user.id, report_type="general", title="Raport",
+                              content_enc=vault.encrypt_data(json.dumps(content)))
+        db.add_all([doc, report])
+        db.commit()
+
+        stats = encrypted_records.compact_unlocked_users(db, [user.id])
+        assert stats == {"users": 1, "test_results": 1, "reports": 1}
+
+        db.expire_all()
+        old, new = sorted(doc.results, key=lambda r: r.id)
+        # Legacy ciphertexts stay until the cleanup migration, for rollbacks
+        assert vault.decrypt_data(old.value_enc) == "95"
+        assert encrypted_records.read_result(old, vault) == ("95", 95.0)
+        assert encrypted_records.read_result(new, vault) == ("14.2", 14.2)
+        assert encrypted_records.read_report(vault, report.content_enc) == content
+        # Converted rows are left alone on the next pass
+        assert encrypted_records.compact_user(db, user.id, vault) == {"test_results": 0, "reports": 0, "skipped": 0}
+    finally:
+        clear_user_vault_session(user.id)
+
+
+def test_users_with_unreadable_rows_are_retried(test_db_session, monkeypatch):
+    db = test_db_session
+    user = User(email=f"compact_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    vault = unlocked_vault(user.id)
+    set_user_vault_session(user.id, vault)
+    try:
+        doc = Document(user_id=user.id, filename="lab.pdf", provider="Synevo")
+        doc.results = [TestResult(test_name="Glucoza", value_enc=b"not a ciphertext")]
+        db.add(doc)
+        db.commit()
+
+        assert encrypted_records.compact_unlocked_users(db, [user.id])["test_results"] == 0
+        assert user.id not in encrypted_records._compacted
+
+        # The row becomes readable (e.g. a key issue was fixed) and is converted on the next pass
+        monkeypatch.setattr(encrypted_records, "read_values", lambda *args: ("95", 95.0))
+        assert encrypted_records.compact_unlocked_users(db, [user.id])["test_results"] == 1
+        assert user.id in encrypted_records._compacted
+    finally:
+        encrypted_records._compacted.discard(user.id)
+        clear_user_vault_session(user.id)
+
+
+def test_rows_rewritten_meanwhile_are_not_overwritten(test_db_session, monkeypatch):
+    db = test_db_session
+    user = User(email=f"compact_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    vault = unlocked_vault(user.id)
+    report = HealthReport(user_id=user.id, report_type="general", title="Raport",
+                          content_enc=vault.encrypt_data(json.dumps({"summary": "old"})))
+    db.add(report)
+    db.commit()
+
+    fresh = encrypted_records.encrypt_report(vault, {"summary": "new"})
+    real_encrypt = encrypted_records.encrypt_report
+
+    def encrypt_after_concurrent_write(vault, content):
+        # A request saves a new body between the compactor's SELECT and UPDATE
+        db.connection().execute(HealthReport.__table__.update()
+                                .where(HealthReport.__table__.c.id == report.id)
+                                .values(content_enc=fresh))
+        return real_encrypt(vault, content)
+
+    monkeypatch.setattr(encrypted_records, "encrypt_report", encrypt_after_concurrent_write)
+    assert encrypted_records.compact_user(db, user.id, vault)["reports"] == 0
+    db.expire_all()
+    assert encrypted_records.read_report(vault, report.content_enc) == {"summary": "new"}
@@ -0,0 +1,101 @@
+"""
+Tests for the cached entitlements snapshot behind subscription quota checks.
+"""
+import uuid
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import event
+
+from backend_v2.models import Document, FamilyGroup, FamilyMember, User
+from backend_v2.services import entitlements
+from backend_v2.services.subscription_service import SubscriptionService
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    entitlements.reset()
+    yield
+    entitlements.reset()
+
+
+@pytest.fixture
+def queries(test_db_engine):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_db_engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(test_db_engine, "before_cursor_execute", count)
+
+
+def make_user(db):
+    user = User(email=f"ent_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def test_checks_are_served_from_memory(test_db_session, queries):
+    user_id = make_user(test_db_session).id
+    service = SubscriptionService(test_db_session)
+    assert service.check_can_upload_document(user_id) == (True, "")
+    queries.clear()
+
+    assert service.check_can_upload_document(user_id) == (True, "")
+    assert service.check_can_add_provider(user_id) == (True, "")
+    assert service.check_can_run_analysis(user_id) == (True, "")
+    assert queries == []
+
+
+def test_counters_follow_commits_not_rollbacks(test_db_session):
+    user = make_user(test_db_session)
+    service = SubscriptionService(test_db_session)
+    service.get_entitlements(user.id)
+
+    test_db_session.add_all([Document(user_id=user.id, filename=f"{i}.pdf") for i in range(3)])
+    test_db_session.commit()
+    test_db_session.add(Document(user_id=user.id, filename="rolled-back.pdf"))
+    test_db_session.flush()
+    test_db_session.rollback()
+    assert entitlements.lookup(user.id).documents == 3
+
+    doc = test_db_session.query(Document).filter_by(user_id=user.id).first()
+    test_db_session.delete(doc)
+    test_db_session.commit()
+    assert entitlements.lookup(user.id).documents == 2
+
+    service.increment_ai_usage(user.id)
+    assert entitlements.lookup(user.id).ai_analyses_this_month == 1
+
+
+def test_subscription_and_family_changes_invalidate(test_db_session):
+    owner, member = make_user(test_db_session), make_user(test_db_session)
+    service = SubscriptionService(test_db_session)
+    assert service.get_user_tier(member.id) == "free"
+
+    service.upgrade_to_tier(owner.id, "family")
+    family = FamilyGroup(owner_id=owner.id)
+    test_db_session.add(family)
+    test_db_session.flush()
+    test_db_session.add(FamilyMember(family_id=family.id, user_id=member.id))
+    test_db_session.commit()
+    assert service.get_user_tier(owner.id) == "family"
+    assert service.get_user_tier(member.id) == "family"
+
+    service.downgrade_to_free(owner.id)  # Also drops the member's snapshot
+    assert entitlements.lookup(member.id) is None
+    assert service.get_user_tier(member.id) == "free"
+
+
+def test_stale_snapshot_never_denies(test_db_session):
+    user = make_user(test_db_session)
+    service = SubscriptionService(test_db_session)
+    snapshot = service.get_entitlements(user.id)
+    # As if another worker's cache still counted the user at the limit
+    entitlements.store(replace(snapshot, documents=snapshot.limits["max_documents"]), entitlements.begin())
+
+    assert service.check_can_upload_document(user.id) == (True, "")
+    assert entitlements.lookup(user.id).documents == 0
@@ -0,0 +1,131 @@
+"""
+Tests for the append-only health events timeline.
+"""
+import uuid
+import pytest
+from datetime import datetime
+
+from backend_v2.models import User, Document, HealthEvent
+from backend_v2 import models
+from backend_v2.services import health_events
+from backend_v2.services.health_events import (
+    record_document_events, safe_record_document_events, list_events, backfill_user_events, decode_cursor
+)
+
+
+@pytest.fixture
+def user(test_db_session):
+    user = User(email=f"events_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    test_db_session.add(user)
+    test_db_session.flush()
+    return user
+
+
+def ingest(db, user, date, flags_by_marker, record=True):
+    doc = Document(user_id=user.id, filename=f"lab_{date}.pdf", provider="Synevo",
+                   document_date=datetime.strptime(date, "%Y-%m-%d"),
+                   upload_date=datetime.strptime(date, "%Y-%m-%d"), is_processed=True)
+    db.add(doc)
+    db.flush()
+    for name, flags in flags_by_marker.items():
+        db.add(models.TestResult(document_id=doc.id, test_name=name, canonical_name=name, flags=flags))
+    if record:
+        record_document_events(db, doc)
+    db.flush()
+    return doc
+
+
+class TestRecordDocumentEvents:
+
+    def test_transitions_detected_on_ingest(self, test_db_session, user):
+        db = test_db_session
+        ingest(db, user, "2024-01-01", {"Glucose": "HIGH", "Ferritin": "NORMAL"})
+        ingest(db, user, "2025-01-01", {"Glucose": "NORMAL", "Ferritin": "LOW"})
+
+        events, _ = list_events(db, user.id, limit=10)
+        by_type = {}
+        for event in events:
+            by_type.setdefault(event["type"], []).append(event["title"])
+        assert by_type["improvement"] == ["Glucose returned to normal"]
+        assert by_type["alert"] == ["Ferritin went out of range"]
+        assert len(by_type["document"]) == 2
+
+    def test_reprocessing_does_not_duplicate(self, test_db_session, user):
+        db = test_db_session
+        ingest(db, user, "2024-01-01", {"Glucose": "HIGH"})
+        doc = ingest(db, user, "2025-01-01", {"Glucose": "NORMAL"})
+        assert record_document_events(db, doc) == 0
+
+    def test_back_dated_document_corrects_later_crossing(self, test_db_session, user):
+        db = test_db_session
+        ingest(db, user, "2024-01-01", {"Glucose": "HIGH"})
+        ingest(db, user, "2024-03-01", {"Glucose": "NORMAL"})
+        ingest(db, user, "2024-02-01", {"Glucose": "NORMAL"})
+
+        crossings = [(e.occurred_at.month, e.event_type) for e in db.query(HealthEvent)
+                     .filter(HealthEvent.user_id == user.id, HealthEvent.event_type != "document")]
+        assert crossings == [(2, "improvement")]
+
+    def test_deleting_document_corrects_later_crossing(self, test_db_session, user):
+        db = test_db_session
+        ingest(db, user, "2024-01-01", {"Glucose": "HIGH"})
+        middle = ingest(db, user, "2024-02-01", {"Glucose": "NORMAL"})
+        ingest(db, user, "2024-03-01", {"Glucose": "NORMAL"})
+
+        health_events.delete_document_events(db, [middle.id])
+        db.query(models.TestResult).filter(models.TestResult.document_id == middle.id).delete()
+        db.delete(middle)
+        db.flush()
+
+        crossings = [(e.occurred_at.month, e.event_type) for e in db.query(HealthEvent)
+                     .filter(HealthEvent.user_id == user.id, HealthEvent.event_type != "document")]
+        assert crossings == [(3, "improvement")]
+
+    def test_failed_event_write_keeps_document(self, test_db_session, user, monkeypatch):
+        db = test_db_session
+        doc = ingest(db, user, "2024-01-01", {"Glucose": "HIGH"}, record=False)
+
+        def fail(db, user_id, events):
+            db.add(HealthEvent(user_id=user_id))  # violates NOT NULL columns
+            db.flush()
+        monkeypatch.setattr(health_events, "_add_events", fail)
+
+        assert safe_record_document_events(db, doc) == 0
+        db.flush()
+        assert db.query(Document).filter(Document.id == doc.id).count() == 1
+        assert db.query(models.TestResult).filter(models.TestResult.document_id == doc.id).count() == 1
+
+
+class TestListEvents:
+
+    def test_keyset_pagination(self, test_db_session, user):
+        db = test_db_session
+        for year in range(2020, 2025):
+            ingest(db, user, f"{year}-01-01", {"Glucose": "NORMAL"})
+
+        first, cursor = list_events(db, user.id, limit=2)
+        second, cursor2 = list_events(db, user.id, limit=2, before=cursor)
+        third, cursor3 = list_events(db, user.id, limit=2, before=cursor2)
+
+        dates = [e["date"][:4] for e in first + second + third]
+        assert dates == ["2024", "2023", "2022", "2021", "2020"]
+        assert cursor3 is None
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+
+class TestBackfill:
+
+    def test_backfill_matches_incremental_and_is_idempotent(self, test_db_session, user):
+        db = test_db_session
+        ingest(db, user, "2023-01-01", {"TSH": "NORMAL"}, record=False)
+        ingest(db, user, "2024-01-01", {"TSH": "HIGH"}, record=False)
+        ingest(db, user, "2025-01-01", {"TSH": "NORMAL"}, record=False)
+
+        assert backfill_user_events(db, user.id) == 5
+        db.flush()
+        assert backfill_user_events(db, user.id) == 0
+        types = sorted(e.event_type for e in db.query(HealthEvent).filter(HealthEvent.user_id == user.id))
+        assert types == ["alert", "document", "document", "document", "improvement"]
@@ -0,0 +1,128 @@
+"""
+Tests for the sync progress bus.
+"""
+import asyncio
+import time
+import uuid
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend_v2.models import User
+from backend_v2.services import progress_bus
+
+
+@pytest.fixture
+def store(test_db_engine, test_db_tables):
+    store = progress_bus.DatabaseProgressStore(sessionmaker(bind=test_db_engine))
+    previous = progress_bus._store
+    progress_bus.set_store(store)
+    yield store
+    progress_bus.flush()
+    progress_bus.set_store(previous)
+
+
+@pytest.fixture
+def user_id(test_db_session):
+    user = User(email=f"progress_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    test_db_session.add(user)
+    test_db_session.commit()
+    return user.id
+
+
+def status(stage, progress=0, total=0, is_complete=False):
+    return {"stage": stage, "message": stage, "progress": progress, "total": total,
+            "is_complete": is_complete, "is_error": False, "error_type": None}
+
+
+async def collect(user_id, count, before_read=None):
+    """Subscribe, run before_read once subscribed, and return the first count updates."""
+    updates = []
+    stream = progress_bus.subscribe(user_id, heartbeat=0.05)
+    async for update in stream:
+        if before_read:
+            before_read()
+            before_read = None
+            continue
+        if update is not None:
+            updates.append(update)
+        if len(updates) == count:
+            break
+    await stream.aclose()
+    return updates
+
+
+class TestDelivery:
+
+    def test_slow_subscriber_gets_latest_only(self, store, user_id):
+        def burst():
+            for i in range(1, 6):
+                progress_bus.publish(user_id, "Synevo", status("downloading", i, 5))
+
+        updates = asyncio.run(collect(user_id, 1, before_read=burst))
+        channel, latest = updates[0]
+        assert channel == "Synevo"
+        assert latest["progress"] == 5
+
+    def test_snapshots_from_other_workers_are_delivered(self, store, user_id):
+        # Another worker wrote straight to the shared store
+        def remote_write():
+            store.save({(user_id, "MedLife"): dict(status("scanning"), version=int(time.time() * 1000))})
+            progress_bus.poll_store(0)
+
+        updates = asyncio.run(collect(user_id, 1, before_read=remote_write))
+        assert updates[0][0] == "MedLife"
+        assert updates[0][1]["stage"] == "scanning"
+
+
+class TestStore:
+
+    def test_flush_coalesces_and_keeps_newest(self, store, user_id):
+        for i in range(1, 4):
+            progress_bus.publish(user_id, "Regina Maria", status("processing", i, 3))
+        assert progress_bus.flush() == 1
+        assert progress_bus.load_status(user_id, "Regina Maria")["progress"] == 3
+
+        stale = dict(status("starting"), version=1)
+        store.save({(user_id, "Regina Maria"): stale})
+        assert store.load(user_id)["Regina Maria"]["stage"] == "processing"
+
+    def test_prune_removes_finished(self, store, user_id):
+        progress_bus.publish(user_id, "Sanador", status("complete", is_complete=True))
+        progress_bus.flush()
+        assert progress_bus.prune(complete_minutes=-1) == 1
+        assert store.load(user_id) == {}
+
+    def test_cleared_status_does_not_come_back(self, store, user_id):
+        from backend_v2.services import sync_status
+
+        sync_status.set_status(user_id, "Synevo", "downloading", "Downloading 1/2", 1, 2)
+        progress_bus.flush()
+        sync_status.clear_status(user_id, "Synevo")
+
+        assert sync_status.get_status(user_id, "Synevo") is None
+        progress_bus.flush()
+        assert store.load(user_id) == {}
+
+
+class TestWatcher:
+
+    def test_retiring_watcher_hands_over_before_it_exits(self, store, monkeypatch):
+        import threading
+
+        decided, release = threading.Event(), threading.Event()
+
+        def watcher():
+            assert not progress_bus._keep_watching()  # Nobody subscribed: retire
+            decided.set()
+            release.wait(5)  # Still alive, as if busy closing its connection
+
+        thread = threading.Thread(target=watcher, daemon=True)
+        monkeypatch.setattr(progress_bus, "_watcher_thread", thread)
+        thread.start()
+        decided.wait(5)
+        try:
+            # A subscriber arriving now must not rely on the exiting thread
+            assert progress_bus._watcher_thread is None
+        finally:
+            release.set()
+            thread.join(5)
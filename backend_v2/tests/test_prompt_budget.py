@@ -0,0 +1,80 @@
+"""
+Tests for token-aware prompt building and document chunking.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_budget import (
+    count_tokens, compact_biomarkers, format_biomarker_context, chunk_pages
+)
+from services.ai_service import AIService
+
+
+def bio(name, date, value, status="normal", flags="NORMAL"):
+    return {"name": name, "value": value, "unit": "u", "range": "1 - 2",
+            "date": date, "status": status, "flags": flags}
+
+
+class TestCompactBiomarkers:
+
+    def test_one_series_per_marker_abnormal_first(self):
+        series = compact_biomarkers([
+            bio("Ferritin", "2024-01-01", 50),
+            bio("Glucose", "2023-01-01", 90),
+            bio("Glucose", "2024-01-01", 130, "abnormal", "HIGH"),
+            bio("Glucose", "2022-01-01", 85),
+        ])
+        assert [s["name"] for s in series][0] == "Glucose"
+        glucose = series[0]
+        assert glucose["count"] == 3
+        assert glucose["latest"]["value"] == 130
+        assert glucose["previous"]["value"] == 90
+        assert (glucose["min"], glucose["max"], glucose["trend"]) == (85, 130, "up")
+
+    def test_context_fits_budget_without_dropping_markers(self):
+        biomarkers = [bio(f"Marker {i}", f"20{10 + d}-01-01", 1.5)
+                      for i in range(200) for d in range(10)]
+        biomarkers.append(bio("Marker X", "2024-01-01", 9, "abnormal", "HIGH"))
+        full = format_biomarker_context(biomarkers, token_budget=100000)
+        budgeted = format_biomarker_context(biomarkers, token_budget=1500)
+
+        assert count_tokens(budgeted) <= 1500 < count_tokens(full)
+        assert budgeted.splitlines()[1].strip().startswith("⚠️ Marker X")
+        for i in range(200):
+            assert f"Marker {i}" in budgeted
+
+
+class TestChunking:
+
+    def test_pages_kept_in_order_and_within_budget(self):
+        pages = [f"page {n} " + "Hemoglobina 14.2 g/dL 12 - 16\n" * 40 for n in range(6)]
+        chunks = chunk_pages(pages, token_budget=600)
+        assert len(chunks) > 1
+        assert all(count_tokens(c) <= 600 for c in chunks)
+        joined = "\n".join(chunks)
+        assert [joined.index(f"page {n}") for n in range(6)] == sorted(joined.index(f"page {n}") for n in range(6))
+
+    def test_merge_prefers_known_metadata_and_dedupes(self):
+        merged = AIService._merge_parsed([
+            {"metadata": {"provider": "Unknown", "date": None},
+             "results": [{"test_name": "Hb", "value": "14", "unit": "g/dL"}]},
+            {"metadata": {"provider": "Synevo", "date": "2024-01-01"},
+             "results": [{"test_name": "Hb", "value": "14", "unit": "g/dL"},
+                         {"test_name": "Fe", "value": "80", "unit": "ug/dL"}]},
+        ])
+        assert merged["metadata"] == {"provider": "Synevo", "date": "2024-01-01"}
+        assert [r["test_name"] for r in merged["results"]] == ["Hb", "Fe"]
+        assert "error" not in merged
+
+    def test_merge_reports_failed_chunks(self):
+        ok = {"metadata": {}, "results": [{"test_name": "Hb", "value": "14", "unit": "g/dL"}]}
+        failed = {"error": "timeout", "results": [], "metadata": {}}
+
+        partial = AIService._merge_parsed([ok, failed])
+        assert partial["partial"] is True and partial["errors"] == ["timeout"]
+        assert "error" not in partial
+
+        nothing = AIService._merge_parsed([failed, failed])
+        assert nothing["error"] == "timeout" and "partial" not in nothing
@@ -0,0 +1,101 @@
+"""
+Tests for the per-provider circuit breaker and sync health stats.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from backend_v2.models import User, LinkedAccount, SyncJob
+from backend_v2.services import provider_health, sync_queue
+
+NOW = datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)
+
+
+def job(minutes_ago, status="completed", error=None, duration=60):
+    completed = NOW - timedelta(minutes=minutes_ago)
+    return SimpleNamespace(status=status, error_message=error, completed_at=completed,
+                           started_at=completed - timedelta(seconds=duration))
+
+
+def down(minutes_ago):
+    return job(minutes_ago, "failed", "Synevo Failed: TimeoutError - Timeout 30000ms exceeded")
+
+
+class TestBreaker:
+
+    def test_closed_with_account_errors(self):
+        jobs = [job(1, "failed", "Invalid credentials")] * 5 + [job(60)]
+        assert provider_health.evaluate("Synevo", jobs, NOW)["state"] == "closed"
+
+    def test_opens_after_outage_streak(self):
+        jobs = [down(1), down(5), down(9), job(60)]
+
+        health = provider_health.evaluate("Synevo", jobs, NOW)
+
+        assert health["state"] == "open"
+        assert health["outage_streak"] == 3
+        assert health["retry_at"] == (NOW - timedelta(minutes=1) +
+                                      timedelta(seconds=provider_health.BASE_COOLDOWN_SECONDS)).isoformat()
+
+    def test_half_open_after_cooldown(self):
+        minutes = provider_health.BASE_COOLDOWN_SECONDS // 60 + 1
+        jobs = [down(minutes), down(minutes + 1), down(minutes + 2)]
+        assert provider_health.evaluate("Synevo", jobs, NOW)["state"] == "half_open"
+
+    def test_failed_probe_doubles_cooldown(self):
+        minutes = provider_health.BASE_COOLDOWN_SECONDS // 60 + 1
+        jobs = [down(minutes)] * 4
+        # Past the base cooldown but not the doubled one
+        assert provider_health.evaluate("Synevo", jobs, NOW)["state"] == "open"
+
+    def test_successful_probe_closes(self):
+        jobs = [job(0), down(10), down(11), down(12)]
+        assert provider_health.evaluate("Synevo", jobs, NOW)["state"] == "closed"
+
+    def test_stats(self):
+        jobs = [job(i, duration=30 + i) for i in range(19)] + [down(30), job(60 * 30)]
+
+        health = provider_health.evaluate("Synevo", jobs, NOW)
+
+        assert health["syncs_24h"] == 20
+        assert health["success_rate"] == 0.95
+        assert health["p95_duration_seconds"] == 48.0
+
+
+@pytest.fixture
+def account(test_db_session):
+    provider_health._cache.clear()
+    user = User(email=f"health_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    test_db_session.add(user)
+    test_db_session.commit()
+    provider = f"Portal {uuid.uuid4().hex[:6]}"
+    account = LinkedAccount(user_id=user.id, provider_name=provider, status="ACTIVE", consecutive_failures=0)
+    test_db_session.add(account)
+    test_db_session.commit()
+    yield account
+    provider_health._cache.clear()
+
+
+def test_half_open_provider_allows_one_probe(test_db_session, account):
+    done = datetime.now(timezone.utc) - timedelta(seconds=provider_health.BASE_COOLDOWN_SECONDS + 60)
+    test_db_session.add_all([
+        SyncJob(user_id=account.user_id, linked_account_id=account.id, provider_name=account.provider_name,
+                status="failed", error_message="503 Service Unavailable", started_at=done, completed_at=done)
+        for _ in range(provider_health.FAILURE_THRESHOLD)
+    ])
+    test_db_session.commit()
+
+    assert provider_health.allow_sync(test_db_session, account.provider_name)
+    probe = sync_queue.enqueue(test_db_session, account)
+    assert not provider_health.allow_sync(test_db_session, account.provider_name)
+
+    # The worker may claim the probe, but nothing beyond it
+    assert account.provider_name not in provider_health.blocked_providers(test_db_session)
+    sync_queue.claim(test_db_session, "host-a:1", job_id=probe.id)
+    other = SyncJob(user_id=account.user_id, linked_account_id=account.id + 1000,
+                    provider_name=account.provider_name, status="pending")
+    test_db_session.add(other)
+    test_db_session.commit()
+    assert account.provider_name in provider_health.blocked_providers(test_db_session)
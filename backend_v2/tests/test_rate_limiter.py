@@ -0,0 +1,110 @@
+"""
+Tests for the sliding-window rate limiter and its storages.
+"""
+import multiprocessing
+import sys
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend_v2.models import RateLimitCounter
+from backend_v2.services.rate_limiter import (
+    DatabaseStorage, MemoryStorage, RateLimiter, Rule, SharedMemoryStorage, get_database_limiter,
+)
+
+T0 = 1_800_000_000.0  # Start of a 60s window
+
+
+def test_sliding_window_weights_previous_window():
+    limiter = RateLimiter(MemoryStorage())
+    rule = Rule(limit=4, window=60)
+
+    assert [limiter.hit("k", rule, T0 + i).allowed for i in range(5)] == [True] * 4 + [False]
+    denied = limiter.hit("k", rule, T0 + 10)
+    assert denied.retry_after == 50 + 15  # Next window, then 1/4 of the old hits must slide out
+
+    # Halfway into the next window half of the 4 old hits still count
+    assert limiter.hit("k", rule, T0 + 90).allowed
+    assert limiter.hit("k", rule, T0 + 90).remaining == 0
+    assert not limiter.hit("k", rule, T0 + 90).allowed
+    # Two windows later nothing is left
+    assert limiter.hit("k", rule, T0 + 180).remaining == 3
+
+
+def test_lockout_and_reset():
+    limiter = RateLimiter(MemoryStorage())
+    rule = Rule(limit=2, window=60, lockout=900)
+    limiter.hit("login:1.2.3.4", rule, T0)
+    limiter.hit("login:1.2.3.4", rule, T0)
+
+    locked = limiter.hit("login:1.2.3.4", rule, T0 + 1)
+    assert locked.locked and locked.retry_after == 900
+    assert limiter.hit("login:1.2.3.4", rule, T0 + 600).retry_after == 301  # Still locked after the window
+    assert limiter.hit("login:1.2.3.4", rule, T0 + 902).allowed
+
+    limiter.hit("login:1.2.3.4", rule, T0 + 903)
+    limiter.reset("login:1.2.3.4")
+    assert limiter.hit("login:1.2.3.4", rule, T0 + 903).remaining == 1
+
+
+def test_memory_storage_is_bounded():
+    storage = MemoryStorage(max_keys=100)
+    limiter = RateLimiter(storage)
+    rule = Rule(limit=5, window=60)
+    for i in range(1000):
+        limiter.hit(f"scan:{i}", rule, T0)
+    assert len(storage) == 100
+
+    limiter.hit("scan:late", rule, T0 + 500)  # Everything else has expired and is swept
+    assert len(storage) == 1
+
+
+def _hit_shared(path, count, results):
+    limiter = RateLimiter(SharedMemoryStorage(path, slots=64))
+    results.put(sum(limiter.hit("analyzer:ip", Rule(25, 3600)).allowed for _ in range(count)))
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="shared storage needs fcntl")
+def test_shared_storage_limits_across_workers(tmp_path):
+    path = str(tmp_path / "rate-limits")
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_hit_shared, args=(path, 20, results)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert sum(results.get(timeout=5) for _ in workers) == 25
+
+
+def test_shared_storage_reuses_only_expired_slots(tmp_path):
+    limiter = RateLimiter(SharedMemoryStorage(str(tmp_path / "rate-limits"), slots=16))
+    rule = Rule(limit=1, window=60)
+    allowed = [i for i in range(200) if limiter.hit(f"k:{i}", rule, T0).allowed]
+
+    # Table never grows: once full of live keys, new keys are denied instead of evicting them
+    assert 0 < len(allowed) <= 16
+    assert not any(limiter.hit(f"k:{i}", rule, T0 + 1).allowed for i in allowed)
+    assert limiter.hit("k:new", rule, T0 + 121).allowed  # Expired slots are reused
+    assert (tmp_path / "rate-limits").stat().st_size == 16 * SharedMemoryStorage.SLOT.size
+
+
+def test_database_storage(test_db_engine, test_db_session):
+    limiter = RateLimiter(DatabaseStorage(sessionmaker(bind=test_db_engine)))
+    rule = Rule(limit=2, window=3600)
+    key = "upload:user-db-test"
+
+    assert limiter.hit(key, rule, T0).allowed
+    assert limiter.hit(key, rule, T0 + 1).allowed
+    assert not limiter.hit(key, rule, T0 + 2).allowed
+    row = test_db_session.query(RateLimitCounter).filter_by(action="upload", identifier="user-db-test").one()
+    assert row.count == 2
+
+    limiter.reset(key)
+    assert test_db_session.query(RateLimitCounter).filter_by(action="upload").count() == 0
+
+
+def test_database_limiter_is_shared_per_bind(test_db_engine):
+    limiter = get_database_limiter(test_db_engine)
+    assert get_database_limiter(test_db_engine) is limiter
+    assert isinstance(limiter.storage, DatabaseStorage)
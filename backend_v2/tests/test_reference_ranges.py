@@ -0,0 +1,67 @@
+"""
+Tests for reference range parsing.
+"""
+import os
+import sys
+import pytest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.reference_ranges import (
+    ParsedRange, parse_reference_range, apply_reference_range
+)
+
+
+class TestParseReferenceRange:
+    """Free-text range formats found in Romanian lab reports."""
+
+    @pytest.mark.parametrize("text,low,high", [
+        ("12 - 16", 12.0, 16.0),
+        ("[3.5 - 5.1]", 3.5, 5.1),
+        ("12,5–16,0", 12.5, 16.0),
+        ("-2 - 2", -2.0, 2.0),
+        ("70 - 100 mg/dL", 70.0, 100.0),
+        ("Barbati: 13.5 - 17.5", 13.5, 17.5),
+    ])
+    def test_intervals(self, text, low, high):
+        parsed = parse_reference_range(text)
+        assert parsed.low == low
+        assert parsed.high == high
+        assert parsed.low_inclusive and parsed.high_inclusive
+
+    def test_upper_bounds(self):
+        assert parse_reference_range("< 200") == ParsedRange(high=200.0, high_inclusive=False)
+        assert parse_reference_range("<=5,7") == ParsedRange(high=5.7, high_inclusive=True)
+        assert parse_reference_range("sub 200").high == 200.0
+
+    def test_lower_bounds(self):
+        assert parse_reference_range("> 40") == ParsedRange(low=40.0, low_inclusive=False)
+        assert parse_reference_range("≥ 60 mL/min").low_inclusive is True
+        assert parse_reference_range("peste 40").low == 40.0
+
+    def test_qualitative(self):
+        assert parse_reference_range("Negativ").qualitative == "negative"
+        assert parse_reference_range("nonreactiv").qualitative == "negative"
+        assert parse_reference_range("Pozitiv").qualitative == "positive"
+
+    def test_unparseable(self):
+        assert parse_reference_range(None) is None
+        assert parse_reference_range("") is None
+        assert parse_reference_range("vezi comentariu") is None
+        assert parse_reference_range("< 1:10") is None
+
+
+class TestApplyReferenceRange:
+    """Populating TestResult columns at ingest."""
+
+    def test_sets_columns(self):
+        tr = SimpleNamespace(test_name="Glucose", reference_range="70 - 100")
+        apply_reference_range(tr)
+        assert (tr.ref_low, tr.ref_high) == (70.0, 100.0)
+        assert tr.ref_qualitative is None
+
+    def test_unparseable_leaves_nulls(self):
+        tr = SimpleNamespace(test_name="Note", reference_range="vezi comentariu")
+        assert apply_reference_range(tr) is None
+        assert tr.ref_low is None and tr.ref_high is None
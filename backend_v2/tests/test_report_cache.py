@@ -0,0 +1,84 @@
+"""
+Tests for the decrypted report content cache.
+"""
+import os
+import sys
+import json
+import pytest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import report_cache
+
+
+class FakeVaultHelper:
+    """Counts decryptions; 'ciphertext' is plain JSON bytes."""
+
+    def __init__(self, available=True):
+        self.is_available = available
+        self.decrypt_calls = 0
+
+    def decrypt_bytes(self, ciphertext):
+        self.decrypt_calls += 1
+        return ciphertext
+
+
+def make_report(report_id, content):
+    return SimpleNamespace(id=report_id, content_enc=json.dumps(content).encode())
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    report_cache.clear()
+    yield
+    report_cache.clear()
+
+
+class TestReportCache:
+
+    def test_warm_hit_skips_decryption(self):
+        helper = FakeVaultHelper()
+        report = make_report(1, {"summary": "ok"})
+        assert report_cache.get_report_json(report, 7, helper) == {"summary": "ok"}
+        assert report_cache.get_report_json(report, 7, helper) == {"summary": "ok"}
+        assert helper.decrypt_calls == 1
+
+    def test_new_ciphertext_misses(self):
+        helper = FakeVaultHelper()
+        report = make_report(1, {"summary": "old"})
+        report_cache.get_report_json(report, 7, helper)
+        report.content_enc = json.dumps({"summary": "new"}).encode()
+        assert report_cache.get_report_json(report, 7, helper)["summary"] == "new"
+        assert helper.decrypt_calls == 2
+
+    def test_locked_vault_returns_nothing(self):
+        report = make_report(1, {"summary": "ok"})
+        report_cache.get_report_json(report, 7, FakeVaultHelper())
+        assert report_cache.get_report_json(report, 7, FakeVaultHelper(available=False)) is None
+
+    def test_purge_user_and_invalidate(self):
+        helper = FakeVaultHelper()
+        report_cache.get_report_json(make_report(1, {}), 7, helper)
+        report_cache.get_report_json(make_report(2, {}), 8, helper)
+        report_cache.purge_user(7)
+        assert report_cache.get_cache_stats()["entries"] == 1
+        report_cache.invalidate_report(2)
+        assert report_cache.get_cache_stats()["entries"] == 0
+
+    def test_bounded(self, monkeypatch):
+        monkeypatch.setattr(report_cache, "REPORT_CACHE_MAX_ENTRIES", 2)
+        helper = FakeVaultHelper()
+        for report_id in range(1, 4):
+            report_cache.get_report_json(make_report(report_id, {}), 7, helper)
+        assert report_cache.get_cache_stats()["entries"] == 2
+        # Oldest entry was evicted
+        report_cache.get_report_json(make_report(1, {}), 7, helper)
+        assert helper.decrypt_calls == 4
+
+    def test_callers_get_their_own_copy(self):
+        helper = FakeVaultHelper()
+        report = make_report(1, {"findings": [{"name": "LDL"}]})
+        first = report_cache.get_report_json(report, 7, helper)
+        first["findings"][0]["history"] = [1, 2]
+        assert report_cache.get_report_json(report, 7, helper) == {"findings": [{"name": "LDL"}]}
@@ -0,0 +1,105 @@
+"""
+Tests for the full-text search index (SQLite FTS5 in the test database).
+"""
+import os
+import uuid
+from datetime import datetime, timezone
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-testing-only")
+
+from backend_v2.models import BlogArticle, SearchDocument
+from backend_v2.routers import blog
+from backend_v2.services import search_index
+from backend_v2.services.biomarker_normalizer import fold_diacritics
+
+search_index.register_listeners()
+
+
+def publish(db, title, content, tags="", status="published", days_ago=0):
+    article = BlogArticle(slug=f"articol-{uuid.uuid4().hex[:8]}", title=title, content_html=content,
+                          tags=tags, status=status,
+                          published_at=datetime(2026, 1, 20 - days_ago, tzinfo=timezone.utc))
+    db.add(article)
+    db.commit()
+    return article
+
+
+def slugs(response):
+    return [a["slug"] for a in response["articles"]]
+
+
+def test_fold_matches_normalizer():
+    assert fold_diacritics("Glicemie à jeun ȘI Țesut") == "glicemie à jeun si tesut"
+    assert search_index.fold("<p>Feritină &amp; <b>fier</b></p>") == "feritina & fier"
+
+
+def test_articles_are_indexed_on_write(test_db_session):
+    article = publish(test_db_session, "Vitamina D iarna", "<p>Deficitul de <b>colecalciferol</b></p>",
+                      tags="vitamine,imunitate")
+
+    doc = test_db_session.query(SearchDocument).filter_by(kind="blog", ref=article.slug).one()
+    assert "colecalciferol" in doc.body and "<b>" not in doc.body
+
+    article.content_html = "<p>Despre ergocalciferol</p>"
+    test_db_session.commit()
+    assert slugs(blog.list_articles(page=1, limit=10, tag=None, biomarker="ergocalciferol",
+                                    db=test_db_session)) == [article.slug]
+    assert slugs(blog.list_articles(page=1, limit=10, tag=None, biomarker="colecalciferol",
+                                    db=test_db_session)) == []
+
+    test_db_session.delete(article)
+    test_db_session.commit()
+    assert test_db_session.query(SearchDocument).filter_by(kind="blog", ref=article.slug).count() == 0
+
+
+def test_renamed_article_drops_its_old_index_row(test_db_session):
+    article = publish(test_db_session, "Fierul", "<p>x</p>")
+    old_slug = article.slug
+    article.slug = f"{old_slug}-nou"
+    test_db_session.commit()
+
+    refs = {ref for (ref,) in test_db_session.query(SearchDocument.ref).filter_by(kind="blog")}
+    assert article.slug in refs and old_slug not in refs
+
+
+def test_filters_fall_back_to_columns(test_db_session, monkeypatch):
+    marker = f"homocisteina{uuid.uuid4().hex[:6]}"
+    article = publish(test_db_session, f"Despre {marker}", "<p>x</p>", tags="+++")
+
+    # A filter with no searchable terms filters instead of being dropped
+    by_tag = blog.list_articles(page=1, limit=50, tag="+++", biomarker=None, db=test_db_session)
+    assert article.slug in slugs(by_tag) and by_tag["total"] < test_db_session.query(BlogArticle)\
+        .filter(BlogArticle.status == "published").count()
+
+    # Articles missing from the index (migration not run, listener failure) are still found
+    test_db_session.query(SearchDocument).filter_by(kind="blog", ref=article.slug).delete()
+    test_db_session.commit()
+    assert slugs(blog.list_articles(page=1, limit=10, tag=None, biomarker=marker, db=test_db_session)) == [article.slug]
+    search_index.reindex_articles(test_db_session)
+
+
+def test_biomarker_filter_ranks_and_folds_diacritics(test_db_session):
+    marker = f"trigliceride{uuid.uuid4().hex[:6]}"
+    passing = publish(test_db_session, "Colesterolul", f"<p>Mențiune despre {marker}.</p>", days_ago=0)
+    focused = publish(test_db_session, f"Totul despre {marker}", f"<p>{marker} crescute</p>",
+                      tags=marker, days_ago=5)
+    publish(test_db_session, f"Ciornă {marker}", "<p>x</p>", status="draft")
+
+    result = blog.list_articles(page=1, limit=10, tag=None, biomarker=marker.upper(), db=test_db_session)
+    assert slugs(result) == [focused.slug, passing.slug]
+    assert result["total"] == 2
+
+    tagged = publish(test_db_session, "Ficatul", "<p>x</p>", tags=f"ficat,{marker}-țintă")
+    by_tag = blog.list_articles(page=1, limit=10, tag=f"{marker}-tinta", biomarker=None, db=test_db_session)
+    assert slugs(by_tag) == [tagged.slug]  # Tag matches only the tags, diacritics folded
+
+
+def test_search_covers_reference_pages(test_db_session):
+    assert search_index.sync_reference_data(test_db_session) > 0
+    assert search_index.sync_reference_data(test_db_session) > 0  # Idempotent
+
+    result = blog.search(q="Feritină", kind=None, page=1, limit=20, db=test_db_session)
+    assert result["results"][0] == {"kind": "biomarker", "slug": "feritina", "title": "Feritina"}
+
+    conditions = blog.search(q="anemie", kind="condition", page=1, limit=20, db=test_db_session)
+    assert conditions["results"] and all(r["kind"] == "condition" for r in conditions["results"])
@@ -0,0 +1,72 @@
+"""
+Tests for the pure ASGI security headers middleware.
+"""
+import asyncio
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from backend_v2.services.security_headers import PrefixTrie, SecurityHeadersMiddleware
+
+
+def make_client(origins=("http://localhost:5173",)):
+    app = FastAPI()
+
+    @app.get("/{path:path}")
+    def anything(path: str):
+        return Response("ok", headers={"Cache-Control": "private, max-age=60"})
+
+    app.add_middleware(SecurityHeadersMiddleware, origins=origins)
+    return TestClient(app)
+
+
+def test_cache_policy_by_path():
+    client = make_client()
+
+    private = client.get("/users/me").headers
+    assert private["cache-control"] == "no-store, no-cache, must-revalidate"
+    assert private["pragma"] == "no-cache"
+    assert private["x-frame-options"] == "DENY"
+    assert "frame-ancestors 'none'" in private["content-security-policy"]
+    assert "strict-transport-security" not in private
+
+    seo = client.get("/blog/articles/some-slug").headers
+    assert seo["cache-control"] == "public, max-age=3600, s-maxage=3600"
+    assert "pragma" not in seo
+
+    # Uncached paths keep whatever the route set
+    assert client.get("/sitemap.xml").headers["cache-control"] == "private, max-age=60"
+    assert len(client.get("/users/me").headers.get_list("cache-control")) == 1
+
+
+def test_hsts_only_with_https_origins():
+    client = make_client(origins=("http://localhost:5173", "https://analize.online"))
+    assert client.get("/").headers["strict-transport-security"] == "max-age=31536000; includeSubDomains"
+
+
+def test_prefix_trie_longest_match():
+    trie = PrefixTrie({"/blog": "blog", "/blog/articles": "articles"})
+    assert trie.match("/blog/articles/x") == "articles"
+    assert trie.match("/blog/feed.xml") == "blog"
+    assert trie.match("/bl", "none") == "none"
+
+
+def test_streamed_bodies_pass_through_unbuffered():
+    events = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/zip")]})
+        for i in range(3):
+            events.append(f"produce {i}")
+            await send({"type": "http.response.body", "body": b"x" * 1024, "more_body": i < 2})
+
+    async def send(message):
+        events.append(message["type"] if message["type"] == "http.response.start" else "sent")
+
+    async def receive():
+        return {"type": "http.request"}
+
+    middleware = SecurityHeadersMiddleware(app)
+    asyncio.run(middleware({"type": "http", "path": "/documents/export"}, receive, send))
+
+    assert events == ["http.response.start", "produce 0", "sent", "produce 1", "sent", "produce 2", "sent"]
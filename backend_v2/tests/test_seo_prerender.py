@@ -0,0 +1,119 @@
+"""
+Tests for the compiled SEO prerender template and rendered-page cache.
+"""
+import os
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-testing-only")
+
+from backend_v2.models import BlogArticle
+from backend_v2.routers import seo_prerender
+from backend_v2.services import prerender_cache
+from backend_v2.services.prerender_cache import CompiledTemplate
+
+INDEX_HTML = """<!doctype html><html><head>
+<title>Analize.Online</title>
+<meta name="description" content="default" />
+<meta property="og:title" content="default" /><meta property="og:description" content="default" />
+<meta property="og:url" content="https://analize.online" /><meta property="og:image" content="/og.png" />
+<meta name="twitter:title" content="default" /><meta name="twitter:description" content="default" />
+<meta name="twitter:image" content="/og.png" />
+<link rel="canonical" href="https://analize.online" />
+</head><body><div id="root"></div></body></html>"""
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def template_file(tmp_path, monkeypatch):
+    path = tmp_path / "index.html"
+    path.write_text(INDEX_HTML, encoding="utf-8")
+    monkeypatch.setattr(prerender_cache, "TEMPLATE_PATHS", [str(path)])
+    monkeypatch.setattr(prerender_cache, "TEMPLATE_CHECK_SECONDS", 0)
+    prerender_cache.reset()
+    yield path
+    prerender_cache.reset()
+
+
+def test_render_fills_slots():
+    html = CompiledTemplate(INDEX_HTML).render(
+        title='Fier "seric"', description="desc", url="https://analize.online/x",
+        extra_head="<script>ld</script>", body="<p>content</p>")
+
+    assert "<title>Fier &quot;seric&quot;</title>" in html
+    assert '<meta name="twitter:description" content="desc"' in html
+    assert '<link rel="canonical" href="https://analize.online/x"' in html
+    assert '<meta property="og:image" content="/og.png"' in html  # No og_image: template value kept
+    assert "<script>ld</script>\n</head>" in html
+    assert '<div id="root"><p>content</p></div>' in html
+
+
+def test_pages_are_cached_with_validators(test_db_session, template_file):
+    first = seo_prerender.prerender_page("pricing", FakeRequest(), test_db_session)
+    again = seo_prerender.prerender_page("pricing/", FakeRequest(), test_db_session)
+
+    assert first.status_code == 200 and "Prețuri" in first.body.decode()
+    assert again.headers["etag"] == first.headers["etag"]
+    assert prerender_cache.stats()["hits"] >= 1
+
+    etag = first.headers["etag"]
+    assert seo_prerender.prerender_page("pricing", FakeRequest(**{"if-none-match": etag}),
+                                        test_db_session).status_code == 304
+    since = first.headers["last-modified"]
+    assert seo_prerender.prerender_page("pricing", FakeRequest(**{"if-modified-since": since}),
+                                        test_db_session).status_code == 304
+
+
+def test_template_change_recompiles(test_db_session, template_file):
+    seo_prerender.prerender_page("pricing", FakeRequest(), test_db_session)
+
+    template_file.write_text(INDEX_HTML.replace("<body>", "<body><noscript>v2</noscript>"), encoding="utf-8")
+    os.utime(template_file, (1, 1))
+
+    response = seo_prerender.prerender_page("pricing", FakeRequest(), test_db_session)
+    assert "<noscript>v2</noscript>" in response.body.decode()
+
+
+def test_published_article_replaces_cached_fallback(test_db_session, template_file):
+    slug = f"articol-{uuid.uuid4().hex[:8]}"
+    before = seo_prerender.prerender_page(f"blog/{slug}", FakeRequest(), test_db_session)
+    assert "Articol nou" not in before.body.decode()
+
+    test_db_session.add(BlogArticle(slug=slug, title="Articol nou", content_html="<p>x</p>",
+                                    status="published", published_at=datetime.now(timezone.utc)))
+    test_db_session.commit()
+    prerender_cache.invalidate("/blog")
+
+    after = seo_prerender.prerender_page(f"blog/{slug}", FakeRequest(), test_db_session)
+    assert "<h1>Articol nou</h1>" in after.body.decode()
+    assert after.headers["etag"] != before.headers["etag"]
+
+
+def test_unknown_paths_share_the_fallback_entry(test_db_session, template_file):
+    for n in range(5):
+        seo_prerender.prerender_page(f"nu-exista-{n}", FakeRequest(), test_db_session)
+    assert prerender_cache.stats()["entries"] == 1
+
+
+def test_cache_is_capped_by_size(template_file, monkeypatch):
+    page = prerender_cache.make_page("x" * 100)
+    monkeypatch.setattr(prerender_cache, "PRERENDER_CACHE_MAX_BYTES", 250)
+    for n in range(5):
+        prerender_cache.get_page(f"/p{n}", lambda: page)
+
+    assert prerender_cache.stats()["entries"] == 2 and prerender_cache.stats()["bytes"] == 200
+
+
+def test_page_rendered_before_recompile_is_not_cached(template_file):
+    def render_during_recompile():
+        prerender_cache.reset()  # The template changes while this page renders
+        return prerender_cache.make_page("old template")
+
+    assert prerender_cache.get_page("/pricing", render_during_recompile).html == "old template"
+    assert prerender_cache.stats()["entries"] == 0
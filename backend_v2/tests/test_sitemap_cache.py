@@ -0,0 +1,120 @@
+"""
+Tests for the cached, sharded sitemap and RSS feed.
+"""
+import gzip
+import os
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import event
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-testing-only")
+
+from backend_v2.models import BlogArticle
+from backend_v2.routers import blog, sitemap
+from backend_v2.services import sitemap_cache
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(sitemap_cache, "MAX_URLS_PER_SHARD", 2)
+    sitemap_cache.reset()
+    yield sitemap_cache
+    sitemap_cache.reset()
+
+
+@pytest.fixture
+def queries(test_db_engine):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_db_engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(test_db_engine, "before_cursor_execute", count)
+
+
+def publish(db, title="Articol"):
+    article = BlogArticle(slug=f"articol-{uuid.uuid4().hex[:8]}", title=title, content_html="<p>x</p>",
+                          status="published", published_at=datetime.now(timezone.utc))
+    db.add(article)
+    db.commit()
+    return article
+
+
+def test_index_lists_every_shard(test_db_session, cache):
+    publish(test_db_session)
+    body = sitemap.sitemap_xml(FakeRequest(), test_db_session).body.decode()
+
+    assert "<sitemapindex" in body
+    assert "/sitemaps/pages.xml" in body and "/sitemaps/blog-1.xml" in body
+    # The static pages stay one shard; everything else is split
+    for name in set(cache._shards) - {"pages"}:
+        shard = sitemap.sitemap_shard(name, FakeRequest(), test_db_session).body.decode()
+        assert shard.count("<url>") <= 2
+
+
+def test_steady_state_serves_without_queries(test_db_session, cache, queries):
+    sitemap.sitemap_xml(FakeRequest(), test_db_session)
+    blog.blog_rss_feed(FakeRequest(), test_db_session)
+    queries.clear()
+
+    response = sitemap.sitemap_xml(FakeRequest(**{"accept-encoding": "gzip, br"}), test_db_session)
+    feed = blog.blog_rss_feed(FakeRequest(), test_db_session)
+
+    assert queries == []
+    assert response.headers["content-encoding"] == "gzip"
+    assert b"<sitemapindex" in gzip.decompress(response.body)
+    assert b"<rss" in feed.body
+    etag = feed.headers["etag"]
+    assert blog.blog_rss_feed(FakeRequest(**{"if-none-match": etag}), test_db_session).status_code == 304
+
+
+def test_publish_rebuilds_only_changed_shard(test_db_session, cache):
+    for _ in range(3):
+        publish(test_db_session)
+    sitemap.sitemap_xml(FakeRequest(), test_db_session)
+    blog_shards = sorted(name for name in cache._shards if name.startswith("blog-"))
+    before = {name: cache._shards[name] for name in blog_shards}
+
+    article = publish(test_db_session, title="Articol proaspăt")
+    cache.invalidate_blog()
+    sitemap.sitemap_xml(FakeRequest(), test_db_session)
+
+    changed = [name for name in cache._shards if name.startswith("blog-")
+               and cache._shards[name] is not before.get(name)]
+    assert len(changed) == 1
+    assert article.slug.encode() in cache._shards[changed[0]].body
+    assert "Articol proaspăt" in blog.blog_rss_feed(FakeRequest(), test_db_session).body.decode()
+
+
+def test_unknown_shard_is_404(test_db_session, cache):
+    with pytest.raises(Exception) as exc:
+        sitemap.sitemap_shard("nope-1", FakeRequest(), test_db_session)
+    assert exc.value.status_code == 404
+
+
+def test_feed_survives_failed_article_queries(test_db_session, cache, monkeypatch):
+    real_refresh = sitemap_cache._refresh_blog
+
+    def fail(db):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(sitemap_cache, "_refresh_blog", fail)
+    with pytest.raises(Exception) as exc:
+        blog.blog_rss_feed(FakeRequest(), test_db_session)
+    assert exc.value.status_code == 503
+
+    # The next request retries; once read, the last good feed outlives later failures
+    monkeypatch.setattr(sitemap_cache, "_refresh_blog", real_refresh)
+    good = blog.blog_rss_feed(FakeRequest(), test_db_session)
+    monkeypatch.setattr(sitemap_cache, "_refresh_blog", fail)
+    sitemap_cache.invalidate_blog()
+    assert blog.blog_rss_feed(FakeRequest(), test_db_session).body == good.body
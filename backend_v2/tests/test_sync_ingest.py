@@ -0,0 +1,62 @@
+"""
+Tests for set-based duplicate detection during sync ingest.
+"""
+import hashlib
+import uuid
+import pytest
+
+from backend_v2.models import User, Document
+from backend_v2.services.sync_ingest import hash_file, select_new_documents, insert_documents
+
+
+@pytest.fixture
+def user(test_db_session):
+    user = User(email=f"ingest_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    test_db_session.add(user)
+    test_db_session.commit()
+    return user
+
+
+def download(tmp_path, filename, content):
+    path = tmp_path / filename
+    path.write_bytes(content)
+    return {"filename": filename, "local_path": str(path), "date": None}
+
+
+def test_hash_file_matches_md5(tmp_path):
+    content = b"%PDF" + bytes(range(256)) * 5000
+    doc_info = download(tmp_path, "big.pdf", content)
+    assert hash_file(doc_info["local_path"]) == hashlib.md5(content).hexdigest()
+    assert hash_file(str(tmp_path / "missing.pdf")) is None
+
+
+def test_select_new_documents(test_db_session, user, tmp_path):
+    db = test_db_session
+    db.add(Document(user_id=user.id, filename="stored.pdf", file_hash=hashlib.md5(b"stored").hexdigest()))
+    db.add(Document(user_id=user.id, filename="same_name.pdf", file_hash=None))
+    db.commit()
+
+    docs = [
+        download(tmp_path, "renamed.pdf", b"stored"),     # known content
+        download(tmp_path, "new.pdf", b"new"),
+        download(tmp_path, "new_copy.pdf", b"new"),      # repeated in this download
+        download(tmp_path, "same_name.pdf", b"other"),   # known filename
+    ]
+    new_docs = select_new_documents(db, user.id, docs)
+
+    assert [d["filename"] for d in new_docs] == ["new.pdf"]
+    assert new_docs[0]["file_hash"] == hashlib.md5(b"new").hexdigest()
+
+
+def test_insert_skips_documents_stored_concurrently(test_db_session, user):
+    db = test_db_session
+    db.add(Document(user_id=user.id, filename="first.pdf", file_hash="a" * 32))
+    db.commit()
+
+    stored = insert_documents(db, [
+        Document(user_id=user.id, filename="racing.pdf", file_hash="a" * 32),
+        Document(user_id=user.id, filename="fresh.pdf", file_hash="b" * 32),
+    ])
+
+    assert [d.filename for d in stored] == ["fresh.pdf"]
+    assert db.query(Document).filter(Document.user_id == user.id).count() == 2
@@ -0,0 +1,80 @@
+"""
+Tests for batched result writes and the per-sync abnormal results notification.
+"""
+import uuid
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend_v2.models import User, Document
+from backend_v2 import models
+from backend_v2.services import notification_service, progress_bus
+from backend_v2.services import scheduler
+
+
+PARSED = {
+    "a.pdf": {"results": [
+        {"test_name": "Glucose", "value": "130", "unit": "mg/dL", "reference_range": "70 - 100", "flags": "HIGH"},
+        {"test_name": "Ferritin", "value": "8", "unit": "ng/mL", "reference_range": "15 - 150", "flags": "LOW"},
+        {"test_name": "TSH", "value": "2.1", "unit": "mUI/L", "reference_range": "0.4 - 4", "flags": "NORMAL"},
+    ]},
+    "b.pdf": {"results": [
+        {"test_name": "LDL", "value": "190", "unit": "mg/dL", "reference_range": "< 130", "flags": "HIGH"},
+    ]},
+}
+
+
+class FakeAIService:
+    def process_document(self, path):
+        return PARSED[path.rsplit("/", 1)[-1]]
+
+
+@pytest.fixture
+def user(test_db_session, test_db_engine):
+    progress_bus.set_store(progress_bus.DatabaseProgressStore(sessionmaker(bind=test_db_engine)))
+    user = User(email=f"notify_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    test_db_session.add(user)
+    test_db_session.commit()
+    yield user
+    progress_bus.flush()
+    progress_bus.set_store(progress_bus.DatabaseProgressStore())
+
+
+def test_sync_sends_one_summary_notification(test_db_session, user, tmp_path, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr("backend_v2.services.ai_service.AIService", FakeAIService)
+    monkeypatch.setattr(notification_service, "dispatch_notification",
+                        lambda notify, *args: dispatched.append((notify.__name__, args)))
+
+    docs = []
+    for name, content in (("a.pdf", b"first"), ("b.pdf", b"second")):
+        (tmp_path / name).write_bytes(content)
+        docs.append({"filename": name, "local_path": str(tmp_path / name), "date": None})
+
+    processed = scheduler.process_sync_documents(test_db_session, user.id, "Synevo", docs, sync_job=None)
+
+    assert processed == 2
+    doc_ids = [d.id for d in test_db_session.query(Document).filter(Document.user_id == user.id)]
+    assert test_db_session.query(models.TestResult).filter(models.TestResult.document_id.in_(doc_ids)).count() == 4
+
+    assert len(dispatched) == 1
+    name, (user_id, provider, abnormal) = dispatched[0]
+    assert name == "notify_abnormal_results"
+    assert (user_id, provider) == (user.id, "Synevo")
+    assert [a["biomarker_name"] for a in abnormal] == ["Glucose", "Ferritin", "LDL"]
+
+
+def test_summary_notification_lists_values(monkeypatch):
+    created = []
+    monkeypatch.setattr(notification_service.NotificationService, "create_notification",
+                        lambda self, **kwargs: created.append(kwargs))
+    abnormal = [
+        {"biomarker_name": f"Marker {i}", "value": str(i), "unit": "", "flag": "HIGH", "reference_range": ""}
+        for i in range(12)
+    ]
+
+    notification_service.notify_abnormal_results(None, 1, "Synevo", abnormal)
+
+    assert len(created) == 1
+    assert created[0]["notification_type"] == "abnormal_biomarker"
+    assert created[0]["data"]["count"] == 12
+    assert len(created[0]["data"]["biomarkers"]) == notification_service.ABNORMAL_SUMMARY_MAX_ITEMS
@@ -0,0 +1,219 @@
+"""
+Tests for the sync job queue and the out-of-process crawler worker.
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-testing-only")
+
+from backend_v2.models import User, LinkedAccount, SyncJob
+from backend_v2.services import sync_queue, crawler_worker, progress_bus
+
+
+@pytest.fixture
+def accounts(test_db_session, test_db_engine):
+    progress_bus.set_store(progress_bus.DatabaseProgressStore(sessionmaker(bind=test_db_engine)))
+    user = User(email=f"queue_{uuid.uuid4().hex[:8]}@test.com", hashed_password="x")
+    test_db_session.add(user)
+    test_db_session.commit()
+    linked = [LinkedAccount(user_id=user.id, provider_name=name, status="ACTIVE", consecutive_failures=0)
+              for name in ("Synevo", "Regina Maria")]
+    test_db_session.add_all(linked)
+    test_db_session.commit()
+    # Jobs left by earlier tests would be claimed first
+    test_db_session.query(SyncJob).filter(SyncJob.status.in_(sync_queue.ACTIVE_STATUSES)).update(
+        {"status": "completed"}, synchronize_session=False)
+    test_db_session.commit()
+    yield linked
+    progress_bus.flush()
+    progress_bus.set_store(progress_bus.DatabaseProgressStore())
+
+
+def test_enqueue_keeps_one_active_job_per_account(test_db_session, accounts):
+    first = sync_queue.enqueue(test_db_session, accounts[0], source="manual")
+    again = sync_queue.enqueue(test_db_session, accounts[0], source="scheduled")
+
+    assert again.id == first.id
+    assert first.status == "pending" and first.source == "manual"
+
+
+def test_claim_takes_each_job_once(test_db_session, accounts):
+    jobs = [sync_queue.enqueue(test_db_session, account) for account in accounts]
+
+    claimed = [sync_queue.claim(test_db_session, "host-a:1"), sync_queue.claim(test_db_session, "host-b:2")]
+
+    assert [job.id for job in claimed] == [job.id for job in jobs]
+    assert [job.worker_id for job in claimed] == ["host-a:1", "host-b:2"]
+    assert all(job.status == "running" and job.started_at for job in claimed)
+    assert sync_queue.claim(test_db_session, "host-a:1") is None
+
+
+def running_job(db, account, lease_seconds, worker_id="host-a:1", retry_count=0):
+    job = SyncJob(user_id=account.user_id, linked_account_id=account.id, provider_name=account.provider_name,
+                  status="running", worker_id=worker_id, retry_count=retry_count,
+                  lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=lease_seconds))
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_account_with_running_job_is_not_claimed(test_db_session, accounts):
+    running = running_job(test_db_session, accounts[0], lease_seconds=30)
+    queued = SyncJob(user_id=accounts[0].user_id, linked_account_id=accounts[0].id,
+                     provider_name="Synevo", status="pending")
+    test_db_session.add(queued)
+    test_db_session.commit()
+
+    assert sync_queue.claim(test_db_session, "host-a:1") is None
+
+    sync_queue.finish(test_db_session, running)
+    assert sync_queue.claim(test_db_session, "host-a:1").id == queued.id
+
+
+def test_crashed_worker_job_is_reclaimed(test_db_session, accounts):
+    crashed = running_job(test_db_session, accounts[0], lease_seconds=-1, worker_id="host-a:dead")
+    accounts[0].status = "SYNCING"
+    test_db_session.commit()
+
+    job = sync_queue.claim(test_db_session, "host-b:2")
+
+    assert job.id == crashed.id
+    assert (job.worker_id, job.retry_count) == ("host-b:2", 1)
+    assert job.lease_expires_at is not None
+    # The crashed worker can't renew or finish it any more
+    assert not sync_queue.renew(test_db_session, crashed.id, "host-a:dead")
+    assert not sync_queue.owns(test_db_session, job, "host-a:dead")
+
+
+def test_job_fails_after_max_attempts(test_db_session, accounts):
+    job = running_job(test_db_session, accounts[0], lease_seconds=-1,
+                      retry_count=sync_queue.MAX_ATTEMPTS - 1)
+
+    assert sync_queue.reclaim_expired(test_db_session) == 1
+    test_db_session.refresh(job)
+    test_db_session.refresh(accounts[0])
+
+    assert job.status == "failed" and "stopped responding" in job.error_message
+    assert accounts[0].status == "ERROR"
+
+
+def test_lease_heartbeat_stops_reclaimed_sync(test_db_session, test_db_engine, accounts, monkeypatch):
+    sync_queue.enqueue(test_db_session, accounts[0])
+    job = sync_queue.claim(test_db_session, "host-a:1")
+    lease = sync_queue.Lease(job, sessionmaker(bind=test_db_engine))
+    lease.start()
+    # Every status update renews (the keepalive thread is still in its first wait)
+    monkeypatch.setattr(sync_queue, "HEARTBEAT_SECONDS", 0)
+    try:
+        before = job.lease_expires_at
+        sync_queue.heartbeat(job.user_id, job.provider_name)
+        test_db_session.refresh(job)
+        assert job.lease_expires_at >= before
+
+        # Another worker took the job over
+        test_db_session.query(SyncJob).filter(SyncJob.id == job.id).update({"worker_id": "host-b:2"})
+        test_db_session.commit()
+        with pytest.raises(sync_queue.LeaseLostError):
+            sync_queue.heartbeat(job.user_id, job.provider_name)
+    finally:
+        lease.stop()
+    assert (job.user_id, job.provider_name) not in sync_queue._held
+
+
+def test_requeue_returns_job_to_queue(test_db_session, accounts):
+    job = sync_queue.enqueue(test_db_session, accounts[0])
+    sync_queue.claim(test_db_session, "host-a:1")
+
+    sync_queue.requeue(test_db_session, job.id)
+    test_db_session.refresh(job)
+
+    assert (job.status, job.worker_id, job.retry_count) == ("pending", None, 1)
+
+
+def test_worker_kills_job_over_time_limit(test_db_session, test_db_engine, accounts, monkeypatch):
+    monkeypatch.setattr(crawler_worker, "SessionLocal", sessionmaker(bind=test_db_engine))
+    job = sync_queue.enqueue(test_db_session, accounts[0])
+    sync_queue.claim(test_db_session, "host-a:1")
+
+    worker = crawler_worker.CrawlerWorker(concurrency=1, worker_id="host-a:1", job_timeout=0)
+    process = crawler_worker._mp.Process(target=time.sleep, args=(30,))
+    process.start()
+    worker.running[job.id] = (process, time.monotonic() - 1)
+
+    worker.enforce_limits()
+
+    assert not process.is_alive() and worker.running == {}
+    test_db_session.refresh(job)
+    test_db_session.refresh(accounts[0])
+    assert job.status == "failed" and "timed out" in job.error_message
+    assert accounts[0].status == "ERROR" and accounts[0].error_type == "timeout"
+
+
+def test_lease_given_up_after_max_run(test_db_session, test_db_engine, accounts, monkeypatch):
+    sync_queue.enqueue(test_db_session, accounts[0])
+    job = sync_queue.claim(test_db_session, "host-a:1")
+    lease = sync_queue.Lease(job, sessionmaker(bind=test_db_engine))
+    monkeypatch.setattr(sync_queue, "MAX_RUN_SECONDS", -1)
+
+    assert not lease.renew()
+    assert lease.lost and not lease.holds(test_db_session)
+    with pytest.raises(sync_queue.LeaseLostError):
+        lease.heartbeat()
+
+
+def test_inline_manual_sync_claims_the_account_job(test_db_session, accounts, monkeypatch):
+    from fastapi import BackgroundTasks
+    from backend_v2.routers import users
+
+    monkeypatch.setattr(sync_queue, "SYNC_EXECUTION", "inline")
+    running = running_job(test_db_session, accounts[0], lease_seconds=30, worker_id="host-b:2")
+    tasks = BackgroundTasks()
+
+    # A scheduled or worker sync holds the account
+    assert not users.start_sync(tasks, test_db_session, accounts[0])
+    assert tasks.tasks == []
+
+    sync_queue.finish(test_db_session, running)
+    assert users.start_sync(tasks, test_db_session, accounts[0])
+    job = test_db_session.query(SyncJob).filter(SyncJob.linked_account_id == accounts[0].id,
+                                                SyncJob.status == "running").one()
+    assert (job.source, job.worker_id) == ("manual", sync_queue.INLINE_WORKER_ID)
+    assert tasks.tasks[0].args == (job.id,)
+
+
+def test_worker_mode_runs_manual_sync_inline_without_service_key(test_db_session, accounts, monkeypatch):
+    from fastapi import BackgroundTasks
+    from backend_v2.routers import users
+
+    monkeypatch.setattr(sync_queue, "SYNC_EXECUTION", "worker")
+    monkeypatch.delenv("VAULT_SERVICE_KEY", raising=False)
+    tasks = BackgroundTasks()
+
+    # A worker could not decrypt the credentials: the job is claimed here before any worker sees it
+    assert users.start_sync(tasks, test_db_session, accounts[0])
+    job = test_db_session.query(SyncJob).filter(SyncJob.linked_account_id == accounts[0].id).one()
+    assert (job.status, job.worker_id) == ("running", sync_queue.INLINE_WORKER_ID)
+    assert tasks.tasks[0].args == (job.id,)
+    assert sync_queue.claim(test_db_session, "host-a:1") is None
+
+
+def test_worker_mode_queues_manual_sync_with_service_key(test_db_session, accounts, monkeypatch):
+    import json
+    from fastapi import BackgroundTasks
+    from backend_v2.routers import users
+
+    monkeypatch.setattr(sync_queue, "SYNC_EXECUTION", "worker")
+    monkeypatch.setenv("VAULT_SERVICE_KEY", "service-key")
+    user = test_db_session.get(User, accounts[0].user_id)
+    user.vault_data = json.dumps({"service_encrypted_vault_key": "a2V5"})
+    test_db_session.commit()
+    tasks = BackgroundTasks()
+
+    assert users.start_sync(tasks, test_db_session, accounts[0])
+    job = test_db_session.query(SyncJob).filter(SyncJob.linked_account_id == accounts[0].id).one()
+    assert job.status == "pending" and tasks.tasks == []
@@ -0,0 +1,85 @@
+"""
+Tests for the per-account incremental sync watermark.
+"""
+import json
+from types import SimpleNamespace
+
+from backend_v2.services import sync_watermark
+from backend_v2.services.sync_watermark import SyncWatermark
+
+
+def account(state=None):
+    return SimpleNamespace(id=1, sync_state=json.dumps(state) if state is not None else None)
+
+
+def job(doc_id, **extra):
+    return dict({"url": f"https://webresults.synevo.ro/Orders/ResultsPDF/{doc_id}", "filename": None}, **extra)
+
+
+class TestSyncWatermark:
+
+    def test_new_account_syncs_everything(self):
+        watermark = sync_watermark.load(account())
+        jobs = [job(1), job(2)]
+
+        assert watermark.filter_jobs(jobs) == jobs
+        assert not watermark.is_unchanged(2)
+
+    def test_known_documents_are_skipped(self):
+        watermark = SyncWatermark([job(2)["url"], "row:12.03.2024 Hemoleucograma"])
+
+        new_jobs = watermark.filter_jobs([job(3), job(2), job(9, key="row:12.03.2024 Hemoleucograma")])
+
+        assert [j["url"] for j in new_jobs] == [job(3)["url"]]
+        assert new_jobs[0]["key"] == job(3)["url"]
+        assert watermark.skipped == 2
+        assert watermark.seen == [job(2)["url"], "row:12.03.2024 Hemoleucograma"]
+
+    def test_same_count_ends_sync_early(self):
+        watermark = sync_watermark.load(account({"known": ["a", "b"], "expected_count": 2}))
+
+        assert watermark.is_unchanged(2)
+        assert not watermark.is_unchanged(3)
+        assert not watermark.is_unchanged(-1)
+
+    def test_record_puts_new_documents_first(self):
+        acc = account({"known": ["b", "a"], "expected_count": 2})
+        watermark = sync_watermark.load(acc)
+        watermark.reported_count = 3
+        watermark.mark_seen("c")
+        watermark.mark_seen("b")
+
+        sync_watermark.record(acc, watermark)
+
+        state = json.loads(acc.sync_state)
+        assert state["known"] == ["c", "b", "a"]
+        assert state["expected_count"] == 3
+
+    def test_incomplete_sync_does_not_store_count(self):
+        acc = account()
+        watermark = sync_watermark.load(acc)
+        watermark.reported_count = 5
+        watermark.mark_seen("a")
+
+        sync_watermark.record(acc, watermark)
+
+        # Only 1 of 5 documents synced: the next sync must look at the list again
+        assert json.loads(acc.sync_state)["expected_count"] is None
+        assert not sync_watermark.load(acc).is_unchanged(5)
+
+    def test_unreadable_state_means_full_sync(self):
+        acc = SimpleNamespace(id=1, sync_state="{not json")
+        assert sync_watermark.load(acc).known == set()
+
+    def test_documents_not_stored_are_fetched_again(self):
+        acc = account()
+        watermark = sync_watermark.load(acc)
+        watermark.mark_seen("stored")
+        watermark.mark_seen("failed")
+        watermark.forget("failed")
+        watermark.forget(None)
+
+        sync_watermark.record(acc, watermark)
+
+        assert json.loads(acc.sync_state)["known"] == ["stored"]
+        assert sync_watermark.load(acc).filter_jobs([job(1, key="failed")]) != []
@@ -209,6 +209,11 @@ export const AuthProvider = ({ children }) => {
     };
 
     const logout = () => {
+        // Lock the vault on the server; the local session ends either way
+        const token = sessionStorage.getItem('token');
+        if (token) {
+            api.post('/auth/logout', null, { headers: { Authorization: `Bearer ${token}` } }).catch(() => {});
+        }
         sessionStorage.removeItem('token');
         setUser(null);
     };
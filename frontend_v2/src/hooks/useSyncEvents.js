@@ -0,0 +1,75 @@
+import { useEffect, useRef } from 'react';
+import api from '../api/client';
+
+const RECONNECT_DELAY_MS = 3000;
+
+// Parse one SSE block ("event: ...\ndata: ...") into { event, data }
+function parseEvent(block) {
+    let event = 'message';
+    const data = [];
+    for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trimStart());
+    }
+    return data.length ? { event, data: data.join('\n') } : null;
+}
+
+/**
+ * Subscribe to /users/sync-events while `enabled`.
+ * Calls onProgress(status) for each progress update; status.provider names the
+ * provider (or "upload"). Uses fetch streaming because EventSource cannot send
+ * the Authorization header. Reconnects after network errors.
+ */
+const useSyncEvents = (enabled, onProgress) => {
+    const handlerRef = useRef(onProgress);
+    handlerRef.current = onProgress;
+
+    useEffect(() => {
+        if (!enabled) return;
+
+        const controller = new AbortController();
+        let retryTimer = null;
+
+        const connect = async () => {
+            try {
+                const token = sessionStorage.getItem('token');
+                const res = await fetch(`${api.defaults.baseURL}/users/sync-events`, {
+                    headers: token ? { Authorization: `Bearer ${token}` } : {},
+                    signal: controller.signal,
+                });
+                if (!res.ok || !res.body) throw new Error(`Sync events failed: ${res.status}`);
+
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                for (;;) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const parsed = parseEvent(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                        if (parsed?.event === 'progress') {
+                            handlerRef.current(JSON.parse(parsed.data));
+                        }
+                    }
+                }
+            } catch (e) {
+                if (controller.signal.aborted) return;
+                console.error('Sync events stream failed', e);
+            }
+            if (!controller.signal.aborted) {
+                retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+            }
+        };
+
+        connect();
+        return () => {
+            controller.abort();
+            clearTimeout(retryTimer);
+        };
+    }, [enabled]);
+};
+
+export default useSyncEvents;
@@ -113,8 +113,12 @@ const Evolution = () => {
             const res = await api.get(`/dashboard/evolution/${encodeURIComponent(name)}`);
             setRawData(res.data);
 
-            if (res.data.length > 0 && res.data[0].ref_range) {
-                setRefRange(parseRefRange(res.data[0].ref_range));
+            // Bounds parsed at ingest; older rows only have the range text
+            const first = res.data[0];
+            if (first && (first.ref_low != null || first.ref_high != null)) {
+                setRefRange({ min: first.ref_low ?? null, max: first.ref_high ?? null });
+            } else if (first?.ref_range) {
+                setRefRange(parseRefRange(first.ref_range));
             }
         } catch (e) {
             console.error("Failed to fetch evolution data", e);
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useTranslation } from 'react-i18next';
 import usePageTitle from '../hooks/usePageTitle';
+import useSyncEvents from '../hooks/useSyncEvents';
 import api from '../api/client';
 import { Building, Link as LinkIcon, RefreshCw, CheckCircle, AlertCircle, Shield, Loader2, Save, Pencil, X, AlertTriangle, KeyRound, Wifi, Clock, Server, Heart, FlaskConical, Stethoscope, Hospital } from 'lucide-react';
 import { cn } from '../lib/utils';
@@ -419,41 +420,37 @@ const LinkedAccounts = () => {
         syncingRef.current = syncing;
     }, [syncing]);
 
-    useEffect(() => {
-        if (!syncing) return;
-
-        const currentProvider = syncing;
-
-        const pollStatus = async () => {
-            if (syncingRef.current !== currentProvider) return;
+    // Latest streamed status per provider, and the status version the current
+    // sync started at (from POST /sync). Older statuses belong to earlier syncs.
+    const latestStatusRef = useRef({});
+    const syncStartVersionRef = useRef(null);
 
-            try {
-                const res = await api.get(`/users/sync-status/${currentProvider}`);
+    const applySyncStatus = () => {
+        const currentProvider = syncingRef.current;
+        const status = latestStatusRef.current[currentProvider];
+        const startVersion = syncStartVersionRef.current;
+        if (!currentProvider || !status || startVersion === null || status.version < startVersion) return;
 
-                if (syncingRef.current !== currentProvider) return;
+        setSyncStatus(prev => ({ ...prev, [currentProvider]: status }));
 
-                setSyncStatus(prev => ({ ...prev, [currentProvider]: res.data }));
-
-                if (res.data.is_complete) {
-                    if (res.data.is_error) {
-                        setMessage({ type: 'error', text: res.data.message });
-                    } else {
-                        setMessage({ type: 'success', text: res.data.message });
-                    }
-                    setSyncing(null);
-                    setTimeout(() => {
-                        setSyncStatus(prev => ({ ...prev, [currentProvider]: null }));
-                    }, 2000);
-                }
-            } catch (e) {
-                console.error("Status poll failed", e);
+        if (status.is_complete) {
+            if (status.is_error) {
+                setMessage({ type: 'error', text: status.message });
+            } else {
+                setMessage({ type: 'success', text: status.message });
             }
-        };
+            syncingRef.current = null;
+            setSyncing(null);
+            setTimeout(() => {
+                setSyncStatus(prev => ({ ...prev, [currentProvider]: null }));
+            }, 2000);
+        }
+    };
 
-        pollStatus();
-        const interval = setInterval(pollStatus, 1500);
-        return () => clearInterval(interval);
-    }, [syncing]);
+    useSyncEvents(Boolean(syncing), (status) => {
+        latestStatusRef.current[status.provider] = status;
+        applySyncStatus();
+    });
 
     const fetchAccounts = async () => {
         try {
@@ -510,6 +507,8 @@ const LinkedAccounts = () => {
     };
 
     const handleSync = async (provider) => {
+        syncingRef.current = provider;
+        syncStartVersionRef.current = null;
         setSyncing(provider);
         setMessage(null);
         setSyncStatus(prev => ({ ...prev, [provider]: { stage: 'starting', message: t('linkedAccounts.syncStages.starting') } }));
@@ -518,6 +517,8 @@ const LinkedAccounts = () => {
             if (res.data.status === 'in_progress') {
                 setMessage({ type: 'info', text: t('linkedAccounts.syncing') });
             }
+            syncStartVersionRef.current = res.data.version ?? 0;
+            applySyncStatus();
         } catch (e) {
             setMessage({ type: 'error', text: `${t('common.error')}: ${e.response?.data?.detail || e.message}` });
             setSyncing(null);